@@ -7,8 +7,12 @@ em produção no AWS Lambda.
 """
 
 import os
+from datetime import date
+from typing import Dict
 from dotenv import load_dotenv
 
+from utils.exceptions import ConfigurationError
+
 # Carregar variáveis de ambiente do arquivo .env
 # Isso funciona apenas em desenvolvimento local
 # No Lambda, as variáveis são injetadas diretamente pelo AWS
@@ -42,12 +46,87 @@ MS_GRAPH_REFRESH_TOKEN = os.getenv("MS_GRAPH_REFRESH_TOKEN")
 MS_GRAPH_ACCESS_TOKEN = os.getenv("MS_GRAPH_ACCESS_TOKEN")
 MS_GRAPH_TOKEN_EXPIRATION_INITIAL = os.getenv("MS_GRAPH_TOKEN_EXPIRATION_INITIAL", "0")
 
+# Armazenamento dos tokens renovados: 'dynamodb' (compartilhado entre
+# containers do Lambda), 'file' (desenvolvimento local) ou 'memory'
+_RUNNING_ON_LAMBDA = bool(os.getenv("AWS_LAMBDA_FUNCTION_NAME"))
+MS_GRAPH_TOKEN_STORE = os.getenv("MS_GRAPH_TOKEN_STORE", "dynamodb" if _RUNNING_ON_LAMBDA else "file")
+MS_GRAPH_TOKEN_FILE = os.getenv("MS_GRAPH_TOKEN_FILE", ".ms_graph_tokens.json")
+# Cópia local dos tokens no Lambda (/tmp é o único diretório gravável)
+MS_GRAPH_TOKEN_CACHE_FILE = os.getenv("MS_GRAPH_TOKEN_CACHE_FILE", "/tmp/.ms_graph_tokens.json")
+
+# Renovação proativa: o token é renovado quando faltar menos que isso para expirar
+MS_GRAPH_TOKEN_REFRESH_MARGIN_SECONDS = int(os.getenv("MS_GRAPH_TOKEN_REFRESH_MARGIN_SECONDS", "300"))
+# Validade do lock de renovação (liberado sozinho se o container falhar)
+MS_GRAPH_TOKEN_LOCK_SECONDS = int(os.getenv("MS_GRAPH_TOKEN_LOCK_SECONDS", "30"))
+# Tempo máximo aguardando a renovação feita por outro container
+MS_GRAPH_TOKEN_WAIT_SECONDS = float(os.getenv("MS_GRAPH_TOKEN_WAIT_SECONDS", "5"))
+
+# Tabela do Excel (Inserir > Tabela) que recebe as despesas. Se a planilha
+# não tiver essa tabela, as linhas são escritas após o intervalo usado da aba
+EXCEL_EXPENSE_TABLE_NAME = os.getenv("EXCEL_EXPENSE_TABLE_NAME", "Despesas")
+
+# Particionamento da planilha por período: 'none', 'year' (Despesas_2026) ou
+# 'month' (Despesas_2026_03); as consultas por período leem apenas as abas do período
+EXCEL_WORKSHEET_SHARDING = os.getenv("EXCEL_WORKSHEET_SHARDING", "none").lower()
+# Particionamento mensal: meses mais antigos que isso vão para a aba anual (arquivo)
+EXCEL_SHARD_ARCHIVE_AFTER_MONTHS = int(os.getenv("EXCEL_SHARD_ARCHIVE_AFTER_MONTHS", "12"))
+
+# Leitura do histórico: 'range' (valores do usedRange em JSON), 'download'
+# (baixa o .xlsx e lê localmente: metade dos bytes, mais CPU) ou 'auto'
+# (download a partir do tamanho do arquivo abaixo, em bytes)
+EXCEL_HISTORY_READ_MODE = os.getenv("EXCEL_HISTORY_READ_MODE", "range").lower()
+EXCEL_HISTORY_DOWNLOAD_MIN_BYTES = int(
+    os.getenv("EXCEL_HISTORY_DOWNLOAD_MIN_BYTES", "1048576")
+)
+
+# Gravação das despesas no Excel: 'sync' (a ferramenta aguarda a escrita) ou
+# 'write_behind' (a despesa vai para um journal durável e é confirmada na hora;
+# o worker grava no Excel em lote)
+EXCEL_WRITE_MODE = os.getenv("EXCEL_WRITE_MODE", "sync").lower()
+# Journal do write-behind: 'dynamodb' (Lambda) ou 'file' (execução local)
+EXPENSE_JOURNAL_STORE = os.getenv("EXPENSE_JOURNAL_STORE", "file").lower()
+EXPENSE_JOURNAL_FILE = os.getenv("EXPENSE_JOURNAL_FILE", ".expense_journal.json")
+# Despesas do journal gravadas no Excel por escrita
+EXPENSE_JOURNAL_FLUSH_BATCH_SIZE = int(os.getenv("EXPENSE_JOURNAL_FLUSH_BATCH_SIZE", "500"))
+# Validade do lock de flush (liberado sozinho se o worker falhar)
+EXPENSE_JOURNAL_FLUSH_LOCK_SECONDS = int(os.getenv("EXPENSE_JOURNAL_FLUSH_LOCK_SECONDS", "120"))
+
+# Armazenamento das despesas: 'excel' (a planilha é a fonte de verdade) ou
+# 'ledger' (ledger próprio como fonte de verdade; o Excel vira uma exportação
+# sincronizada em segundo plano pelo worker)
+EXPENSE_BACKEND = os.getenv("EXPENSE_BACKEND", "excel").lower()
+# Ledger: 'dynamodb' (Lambda) ou 'sqlite' (execução local)
+LEDGER_STORE = os.getenv("LEDGER_STORE", "sqlite").lower()
+LEDGER_SQLITE_PATH = os.getenv("LEDGER_SQLITE_PATH", ".ledger.sqlite3")
+# Despesas pendentes exportadas ao Excel por escrita
+LEDGER_EXPORT_BATCH_SIZE = int(os.getenv("LEDGER_EXPORT_BATCH_SIZE", "200"))
+# Validade do lock de exportação (liberado sozinho se o worker falhar)
+LEDGER_EXPORT_LOCK_SECONDS = int(os.getenv("LEDGER_EXPORT_LOCK_SECONDS", "120"))
+# Data (YYYY-MM-DD) em que o ledger passou a ser a fonte de verdade: despesas
+# anteriores continuam sendo lidas do Excel (vazio = tudo vem do ledger)
+LEDGER_CUTOVER_DATE = os.getenv("LEDGER_CUTOVER_DATE", "").strip()
+
 
 # ============================================
 # AWS DynamoDB
 # ============================================
 DYNAMODB_TABLE_NAME = os.getenv("DYNAMODB_TABLE_NAME", "FinancialAssistantThreads")
 
+# Tabela para idempotência dos webhooks (chave: MessageSid do Twilio)
+IDEMPOTENCY_TABLE_NAME = os.getenv("IDEMPOTENCY_TABLE_NAME", "FinancialAssistantIdempotency")
+
+# Tabela para os tokens do Microsoft Graph (compartilhados entre containers)
+TOKEN_TABLE_NAME = os.getenv("TOKEN_TABLE_NAME", "FinancialAssistantTokens")
+
+# Tabela para o cache compartilhado do histórico de despesas
+CACHE_TABLE_NAME = os.getenv("CACHE_TABLE_NAME", "FinancialAssistantCache")
+
+# Tabela do journal do write-behind (EXCEL_WRITE_MODE=write_behind)
+JOURNAL_TABLE_NAME = os.getenv("JOURNAL_TABLE_NAME", "FinancialAssistantJournal")
+
+# Tabela do ledger de despesas (EXPENSE_BACKEND=ledger)
+LEDGER_TABLE_NAME = os.getenv("LEDGER_TABLE_NAME", "FinancialAssistantLedger")
+
 # Endpoint personalizado para DynamoDB Local (apenas dev local)
 # Se não estiver definido, usa o serviço DynamoDB da AWS
 DYNAMODB_ENDPOINT_URL = os.getenv("DYNAMODB_ENDPOINT_URL")
@@ -58,27 +137,211 @@ DYNAMODB_ENDPOINT_URL = os.getenv("DYNAMODB_ENDPOINT_URL")
 # ============================================
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
 
+# Tempo reservado ao final da invocação do Lambda para sempre conseguir
+# responder ao usuário, mesmo que as etapas anteriores esgotem o prazo (segundos)
+LAMBDA_REPLY_RESERVE_SECONDS = float(
+    os.getenv("LAMBDA_REPLY_RESERVE_SECONDS", "3")
+)
+
+# Política de retry das chamadas externas (backoff exponencial com jitter)
+RETRY_MAX_ATTEMPTS = int(os.getenv("RETRY_MAX_ATTEMPTS", "3"))
+RETRY_BASE_DELAY_SECONDS = float(os.getenv("RETRY_BASE_DELAY_SECONDS", "0.25"))
+RETRY_MAX_DELAY_SECONDS = float(os.getenv("RETRY_MAX_DELAY_SECONDS", "5"))
+
+# Circuit breaker por dependência (OpenAI, Microsoft Graph, Twilio)
+CIRCUIT_BREAKER_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_BREAKER_FAILURE_THRESHOLD", "5"))
+CIRCUIT_BREAKER_RESET_SECONDS = float(os.getenv("CIRCUIT_BREAKER_RESET_SECONDS", "30"))
+
+# Pool de conexões HTTP compartilhado pelos serviços (keep-alive)
+HTTP_POOL_CONNECTIONS = int(os.getenv("HTTP_POOL_CONNECTIONS", "4"))  # Hosts distintos
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "10"))  # Conexões por host
+HTTP_KEEPALIVE_EXPIRY_SECONDS = float(os.getenv("HTTP_KEEPALIVE_EXPIRY_SECONDS", "60"))
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "true").lower() == "true"
+
+# Timeouts máximos de cada etapa (segundos). Cada etapa usa o menor entre
+# o seu timeout e o tempo restante do prazo da requisição
+ASSISTANT_RUN_MAX_WAIT_SECONDS = float(
+    os.getenv("ASSISTANT_RUN_MAX_WAIT_SECONDS", "60")
+)
+AUDIO_DOWNLOAD_TIMEOUT_SECONDS = float(
+    os.getenv("AUDIO_DOWNLOAD_TIMEOUT_SECONDS", "30")
+)
+AUDIO_TRANSCRIPTION_TIMEOUT_SECONDS = float(
+    os.getenv("AUDIO_TRANSCRIPTION_TIMEOUT_SECONDS", "30")
+)
+GRAPH_REQUEST_TIMEOUT_SECONDS = float(
+    os.getenv("GRAPH_REQUEST_TIMEOUT_SECONDS", "20")
+)
+
+# Janela para agrupar requisições concorrentes ao Graph em um único
+# $batch (milissegundos). 0 desativa o agrupamento
+GRAPH_BATCH_WINDOW_MS = int(os.getenv("GRAPH_BATCH_WINDOW_MS", "20"))
+
+# Sessões persistentes de workbook do Excel: expiram após esse tempo sem
+# uso (segundos) e são renovadas quando faltar menos que a margem. 0 desativa
+EXCEL_WORKBOOK_SESSION_TTL_SECONDS = int(os.getenv("EXCEL_WORKBOOK_SESSION_TTL_SECONDS", "300"))
+EXCEL_WORKBOOK_SESSION_REFRESH_MARGIN_SECONDS = int(
+    os.getenv("EXCEL_WORKBOOK_SESSION_REFRESH_MARGIN_SECONDS", "60")
+)
+
 # Timeout máximo para execução de ferramentas (segundos)
 TOOL_EXECUTION_TIMEOUT_SECONDS = int(
     os.getenv("TOOL_EXECUTION_TIMEOUT_SECONDS", "60")
 )
 
+# Número máximo de tool calls executadas em paralelo em uma mesma rodada
+TOOL_MAX_CONCURRENCY = int(
+    os.getenv("TOOL_MAX_CONCURRENCY", "4")
+)
+
+# Limite de execuções simultâneas por ferramenta, no formato
+# "ferramenta=limite,ferramenta=limite" (ferramentas ausentes usam
+# apenas o limite global acima). Interpretado por
+# parse_tool_concurrency_limits, e não no import, para que um valor
+# inválido seja recusado pela validação com uma mensagem clara
+TOOL_CONCURRENCY_LIMITS = os.getenv("TOOL_CONCURRENCY_LIMITS", "add_expense=2")
+
+# Orçamento de tamanho de cada output de ferramenta enviado ao Assistant
+# (bytes de JSON, ~4 bytes por token). Listas maiores são paginadas/cortadas
+TOOL_OUTPUT_MAX_BYTES = int(os.getenv("TOOL_OUTPUT_MAX_BYTES", "8000"))
+
+# Número máximo de despesas por página do get_expense_history
+TOOL_OUTPUT_PAGE_SIZE = int(os.getenv("TOOL_OUTPUT_PAGE_SIZE", "50"))
+
 # Intervalo de polling para verificar status do Assistant Run (segundos)
-ASSISTANT_RUN_POLLING_INTERVAL_SECONDS = int(
+# Aceita frações (ex: 0.25). Usado apenas quando o streaming está
+# desabilitado ou como fallback se o stream falhar
+ASSISTANT_RUN_POLLING_INTERVAL_SECONDS = float(
     os.getenv("ASSISTANT_RUN_POLLING_INTERVAL_SECONDS", "1")
 )
 
+# Número máximo de rodadas de tool calls em um mesmo run
+# (ex: consultar histórico e depois adicionar despesa = 2 rodadas)
+MAX_TOOL_CALL_ROUNDS = int(
+    os.getenv("MAX_TOOL_CALL_ROUNDS", "5")
+)
+
+# Executa o Assistant via event stream (reage aos eventos assim que chegam,
+# sem esperar o intervalo de polling)
+ASSISTANT_RUN_STREAMING = os.getenv("ASSISTANT_RUN_STREAMING", "true").lower() == "true"
+
+
+# ============================================
+# Idempotência dos Webhooks
+# ============================================
+# Habilita a deduplicação de retries do Twilio pelo MessageSid
+IDEMPOTENCY_ENABLED = os.getenv("IDEMPOTENCY_ENABLED", "true").lower() == "true"
+
+# Tempo de retenção dos registros de idempotência (segundos)
+IDEMPOTENCY_TTL_SECONDS = int(
+    os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400")
+)
+
+# Tempo após o qual um processamento "em andamento" é considerado
+# abandonado (ex: Lambda encerrado) e pode ser refeito (segundos)
+IDEMPOTENCY_IN_PROGRESS_TIMEOUT_SECONDS = int(
+    os.getenv("IDEMPOTENCY_IN_PROGRESS_TIMEOUT_SECONDS", "120")
+)
+
+# Número máximo de registros mantidos no cache em memória do container
+IDEMPOTENCY_CACHE_SIZE = int(
+    os.getenv("IDEMPOTENCY_CACHE_SIZE", "1000")
+)
+
+
+# ============================================
+# Cache do Histórico de Despesas
+# ============================================
+# Número máximo de planilhas (workbook, aba) mantidas em memória no container
+EXPENSE_CACHE_MAX_ENTRIES = int(os.getenv("EXPENSE_CACHE_MAX_ENTRIES", "32"))
+
+# Cache compartilhado entre containers: 'none' ou 'dynamodb'
+EXPENSE_CACHE_SHARED_BACKEND = os.getenv("EXPENSE_CACHE_SHARED_BACKEND", "none").lower()
+
+# Tempo de retenção das entradas no cache compartilhado (segundos)
+EXPENSE_CACHE_TTL_SECONDS = int(os.getenv("EXPENSE_CACHE_TTL_SECONDS", "86400"))
+
+# Validade do cursor da próxima linha livre de cada planilha (segundos);
+# ao expirar, a próxima escrita relê o intervalo usado da planilha
+EXCEL_ROW_CURSOR_TTL_SECONDS = int(os.getenv("EXCEL_ROW_CURSOR_TTL_SECONDS", "3600"))
+
+
+# ============================================
+# Processamento Assíncrono (Fila)
+# ============================================
+# Modo de processamento do webhook:
+# - "sync": processa a mensagem no próprio webhook e responde via TwiML
+# - "async": enfileira a mensagem, responde TwiML vazio imediatamente e
+#   o worker envia a resposta pela API REST do Twilio
+MESSAGE_PROCESSING_MODE = os.getenv("MESSAGE_PROCESSING_MODE", "sync").lower()
+
+# URL da fila SQS usada no modo assíncrono
+# Se não estiver definida, usa uma fila local (memória ou arquivo); no
+# modo assíncrono, a fila local exige LOCAL_QUEUE_FILE (ver validate_configuration)
+MESSAGE_QUEUE_URL = os.getenv("MESSAGE_QUEUE_URL")
+
+# Arquivo para persistir a fila local (opcional, apenas dev local)
+LOCAL_QUEUE_FILE = os.getenv("LOCAL_QUEUE_FILE")
+
 
 # ============================================
 # Validações
 # ============================================
 
+# Indica se a validação já foi executada neste container
+_configuration_validated = False
+
+
+def parse_tool_concurrency_limits(spec: str) -> Dict[str, int]:
+    """
+    Interpreta TOOL_CONCURRENCY_LIMITS ("ferramenta=limite,...").
+    
+    Args:
+        spec: Valor da configuração (itens vazios são ignorados)
+    
+    Returns:
+        dict: {ferramenta: limite}
+    
+    Raises:
+        ConfigurationError: Se algum item não for "ferramenta=inteiro positivo"
+    """
+    limits = {}
+    
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        
+        name, _, limit = item.partition("=")
+        try:
+            value = int(limit)
+        except ValueError:
+            value = 0
+        
+        if not name.strip() or value < 1:
+            raise ConfigurationError(
+                f"TOOL_CONCURRENCY_LIMITS deve estar no formato ferramenta=limite "
+                f"(limite inteiro positivo); item inválido: {item.strip()!r}"
+            )
+        
+        limits[name.strip()] = value
+    
+    return limits
+
+
 def validate_configuration():
     """
     Valida se as configurações essenciais estão presentes.
     
     Exibe avisos para configurações faltantes, mas não bloqueia
     a aplicação (útil para testes e desenvolvimento incremental).
+    A exceção é o modo assíncrono sem fila durável: as mensagens seriam
+    confirmadas ao Twilio e perdidas.
+    
+    Raises:
+        ConfigurationError: Se MESSAGE_PROCESSING_MODE=async sem
+                            MESSAGE_QUEUE_URL nem LOCAL_QUEUE_FILE, se
+                            LEDGER_CUTOVER_DATE não for uma data YYYY-MM-DD
+                            ou se TOOL_CONCURRENCY_LIMITS for inválido
     """
     # Validar OpenAI
     if not OPENAI_API_KEY or not ASSISTANT_ID:
@@ -101,6 +364,32 @@ def validate_configuration():
             "MS_GRAPH_CLIENT_SECRET) podem estar faltando."
         )
     
+    # Validar fila do modo assíncrono: a fila apenas em memória não é
+    # consumida por ninguém (o worker roda em outro processo)
+    if MESSAGE_PROCESSING_MODE == "async" and not (MESSAGE_QUEUE_URL or LOCAL_QUEUE_FILE):
+        raise ConfigurationError(
+            "MESSAGE_PROCESSING_MODE=async requer MESSAGE_QUEUE_URL (SQS) "
+            "ou LOCAL_QUEUE_FILE (desenvolvimento local)"
+        )
+    
+    # Validar ledger: sem a data de corte, o histórico gravado no Excel
+    # antes da troca de backend não aparece nas consultas
+    if LEDGER_CUTOVER_DATE:
+        try:
+            date.fromisoformat(LEDGER_CUTOVER_DATE)
+        except ValueError:
+            raise ConfigurationError(
+                f"LEDGER_CUTOVER_DATE deve estar no formato YYYY-MM-DD (recebido: {LEDGER_CUTOVER_DATE!r})"
+            )
+    elif EXPENSE_BACKEND == "ledger":
+        print(
+            "⚠️  AVISO: EXPENSE_BACKEND=ledger sem LEDGER_CUTOVER_DATE: despesas "
+            "gravadas no Excel antes do ledger não aparecem nas consultas."
+        )
+    
+    # Validar limites de concorrência das ferramentas
+    parse_tool_concurrency_limits(TOOL_CONCURRENCY_LIMITS)
+    
     # Informar sobre DynamoDB Local
     if DYNAMODB_ENDPOINT_URL:
         print(
@@ -112,7 +401,20 @@ def validate_configuration():
         )
 
 
-# Executar validação ao importar o módulo
-# Comentar esta linha se quiser desabilitar os avisos
-validate_configuration()
+def validate_configuration_once():
+    """
+    Executa validate_configuration apenas uma vez por container.
+    
+    Chamada pelos handlers na primeira invocação, em vez de no import
+    do módulo, para não pesar no cold start. Uma configuração inválida
+    é verificada (e recusada) novamente a cada invocação.
+    
+    Raises:
+        ConfigurationError: Se a configuração for inválida
+    """
+    global _configuration_validated
+    
+    if not _configuration_validated:
+        validate_configuration()
+        _configuration_validated = True
 
@@ -5,23 +5,38 @@ Este módulo orquestra todo o fluxo de conversação:
 1. Obter ou criar thread do usuário
 2. Adicionar mensagem à thread
 3. Executar o assistant
-4. Processar tool calls se necessário
+4. Processar tool calls (em quantas rodadas forem necessárias)
 5. Retornar resposta final
 """
 
 import json
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 
 from services.openai_service import openai_service
 from services.audio_service import audio_service
 from data_access.thread_repository import thread_repository
 from tools.tool_executor import tool_executor
+from config.settings import MAX_TOOL_CALL_ROUNDS
+from utils.deadline import Deadline
 from utils.logger import setup_logger
-from utils.exceptions import FinancialAssistantError, OpenAIAPIError, DynamoDBError, ToolExecutionError
+from utils.exceptions import (
+    FinancialAssistantError,
+    OpenAIAPIError,
+    DynamoDBError,
+    ToolExecutionError,
+    DeadlineExceededError,
+)
+from utils.service_registry import registry
 
 # Logger específico deste módulo
 logger = setup_logger(__name__)
 
+# Resposta degradada quando o prazo da requisição se esgota
+DEADLINE_REPLY = (
+    "Desculpe, sua solicitação está demorando mais que o esperado. "
+    "Por favor, tente novamente em alguns instantes."
+)
+
 
 class ConversationManager:
     """
@@ -36,7 +51,12 @@ class ConversationManager:
         logger.info("ConversationManager inicializado")
 
     def handle_incoming_message(
-        self, sender_id: str, message_text: str = "", media_url: str = "", media_content_type: str = ""
+        self,
+        sender_id: str,
+        message_text: str = "",
+        media_url: str = "",
+        media_content_type: str = "",
+        deadline: Optional[Deadline] = None,
     ) -> str:
         """
         Processa uma mensagem recebida e retorna a resposta do assistant.
@@ -46,7 +66,8 @@ class ConversationManager:
         2. Obter/criar thread para o usuário
         3. Adicionar mensagem à thread
         4. Executar o assistant
-        5. Se necessário, executar tool calls e resubmeter
+        5. Se necessário, executar tool calls e continuar o mesmo run
+           (repetindo enquanto o Assistant solicitar novas ferramentas)
         6. Retornar resposta final
 
         Args:
@@ -54,27 +75,23 @@ class ConversationManager:
             message_text: Texto da mensagem enviada pelo usuário (opcional)
             media_url: URL do arquivo de mídia (opcional)
             media_content_type: Tipo MIME da mídia (opcional, ex: 'audio/ogg')
+            deadline: Prazo da requisição (opcional, derivado do contexto do Lambda)
 
         Returns:
-            str: Resposta gerada pelo assistant
+            str: Resposta gerada pelo assistant (ou DEADLINE_REPLY se o
+                 prazo se esgotar antes da conclusão)
 
         Raises:
             FinancialAssistantError: Se houver erro no processamento
         """
+        thread_id = None
+        run_id = None
+
         logger.info(f"Processando mensagem de {sender_id}. " f"Texto: {bool(message_text)}, Mídia: {bool(media_url)}")
 
         try:
             # Etapa 1: Processar áudio se houver mídia de tipo áudio
-            audio_transcription = ""
-            if media_url and media_content_type.startswith("audio/"):
-                logger.info("Detectado áudio na mensagem, processando transcrição...")
-                try:
-                    audio_transcription = audio_service.process_audio_message(media_url)
-                    logger.info(f"Áudio transcrito: {audio_transcription[:100]}...")
-                except FinancialAssistantError as e:
-                    logger.error(f"Erro ao processar áudio: {str(e)}")
-                    # Continuar mesmo se falhar a transcrição, usando apenas o texto
-                    audio_transcription = "[Erro ao processar áudio]"
+            audio_transcription = self._transcribe_audio(media_url, media_content_type, deadline)
 
             # Etapa 2: Combinar texto e transcrição de áudio
             # Estratégia: se ambos existirem, combinar; senão usar o que existir
@@ -94,37 +111,32 @@ class ConversationManager:
             openai_service.add_message(thread_id, final_message)
 
             # Etapa 5: Executar o assistant
-            run_result = openai_service.run_assistant(thread_id)
+            run_result = openai_service.run_assistant(thread_id, deadline=deadline)
+            run_id = run_result["run_id"]
 
-            # Etapa 6: Processar tool calls se necessário
-            if run_result["status"] == "requires_action":
-                logger.info("Assistant requer execução de ferramentas")
-                self._process_tool_calls(thread_id, run_result)
-
-                # Após submeter tool outputs, aguardar conclusão
-                # O Assistant continuará processando automaticamente
-                run_result = openai_service.run_assistant(thread_id)
+            # Etapa 6: Processar tool calls enquanto o run solicitar
+            run_result = self._run_tool_rounds(thread_id, run_result, deadline, sender_id)
+            if run_result is None:
+                return "Desculpe, não consegui concluir sua solicitação. Pode reformular?"
 
             # Etapa 7: Obter e retornar resposta final
-            if run_result["status"] == "completed":
-                messages = openai_service.get_messages(thread_id, limit=1)
-
-                if messages and messages[0]["role"] == "assistant":
-                    response = messages[0]["content"]
-                    logger.info(f"Resposta gerada com sucesso para {sender_id}")
-                    return response
-                else:
-                    logger.warning("Nenhuma resposta do assistant encontrada")
-                    return "Desculpe, não consegui gerar uma resposta."
-            else:
-                logger.error(f"Run não concluído corretamente: {run_result['status']}")
-                return "Desculpe, houve um problema ao processar sua mensagem."
+            return self._final_response(thread_id, run_result, sender_id)
+
+        except DeadlineExceededError as e:
+            logger.warning(f"Prazo da requisição esgotado: {str(e)}")
+            return self._deadline_reply(thread_id, run_id)
 
         except DynamoDBError as e:
             logger.error(f"Erro no DynamoDB: {str(e)}")
             raise FinancialAssistantError("Erro ao acessar banco de dados") from e
 
         except OpenAIAPIError as e:
+            # Timeout da OpenAI causado pelo prazo da requisição
+            # (o run abandonado já é cancelado pelo OpenAIService)
+            if deadline is not None and deadline.expired():
+                logger.warning(f"Prazo esgotado aguardando o Assistant: {str(e)}")
+                return DEADLINE_REPLY
+
             logger.error(f"Erro na OpenAI API: {str(e)}")
             raise FinancialAssistantError("Erro ao comunicar com assistente") from e
 
@@ -136,6 +148,105 @@ class ConversationManager:
             logger.error(f"Erro inesperado: {str(e)}")
             raise FinancialAssistantError("Erro interno do sistema") from e
 
+    def _transcribe_audio(self, media_url: str, media_content_type: str, deadline: Optional[Deadline]) -> str:
+        """
+        Transcreve a mídia da mensagem, se for um áudio.
+
+        Args:
+            media_url: URL do arquivo de mídia (opcional)
+            media_content_type: Tipo MIME da mídia (opcional)
+            deadline: Prazo da requisição (opcional)
+
+        Returns:
+            str: Transcrição, string vazia sem áudio, ou um marcador de erro
+                 se a transcrição falhar (a mensagem segue com o texto)
+        """
+        if not media_url or not media_content_type.startswith("audio/"):
+            return ""
+
+        logger.info("Detectado áudio na mensagem, processando transcrição...")
+        try:
+            audio_transcription = audio_service.process_audio_message(media_url, deadline)
+            logger.info(f"Áudio transcrito: {audio_transcription[:100]}...")
+            return audio_transcription
+        except FinancialAssistantError as e:
+            logger.error(f"Erro ao processar áudio: {str(e)}")
+            # Continuar mesmo se falhar a transcrição, usando apenas o texto
+            return "[Erro ao processar áudio]"
+
+    def _run_tool_rounds(
+        self,
+        thread_id: str,
+        run_result: Dict[str, Any],
+        deadline: Optional[Deadline],
+        sender_id: str,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Executa as tool calls enquanto o run solicitar.
+
+        Cada rodada submete os outputs e continua o MESMO run, até
+        MAX_TOOL_CALL_ROUNDS rodadas.
+
+        Args:
+            thread_id: ID da thread
+            run_result: Resultado do run (formato de run_assistant)
+            deadline: Prazo da requisição (opcional)
+            sender_id: ID do remetente (repassado às ferramentas)
+
+        Returns:
+            dict: Resultado do run após a última rodada, ou None se o
+                  limite de rodadas for atingido (o run é cancelado)
+        """
+        rounds = 0
+        while run_result["status"] == "requires_action":
+            if rounds >= MAX_TOOL_CALL_ROUNDS:
+                logger.error(f"Limite de {MAX_TOOL_CALL_ROUNDS} rodadas de tool calls atingido")
+                self._cancel_run(thread_id, run_result["run_id"])
+                return None
+
+            rounds += 1
+            logger.info(f"Assistant requer execução de ferramentas (rodada {rounds})")
+            tool_outputs = self._process_tool_calls(run_result, deadline, sender_id)
+
+            run_result = openai_service.submit_tool_outputs_and_wait(
+                thread_id=thread_id,
+                run_id=run_result["run_id"],
+                tool_outputs=tool_outputs,
+                deadline=deadline,
+            )
+
+        return run_result
+
+    def _final_response(self, thread_id: str, run_result: Dict[str, Any], sender_id: str) -> str:
+        """
+        Obtém a resposta final de um run encerrado.
+
+        Args:
+            thread_id: ID da thread
+            run_result: Resultado do run (formato de run_assistant)
+            sender_id: ID do remetente (usado nos logs)
+
+        Returns:
+            str: Resposta do assistant, ou uma mensagem de erro amigável
+        """
+        if run_result["status"] != "completed":
+            logger.error(f"Run não concluído corretamente: {run_result['status']}")
+            return "Desculpe, houve um problema ao processar sua mensagem."
+
+        # No modo streaming, o texto final já vem no resultado do run
+        if run_result.get("response"):
+            logger.info(f"Resposta gerada com sucesso para {sender_id}")
+            return run_result["response"]
+
+        messages = openai_service.get_messages(thread_id, limit=1)
+
+        if messages and messages[0]["role"] == "assistant":
+            logger.info(f"Resposta gerada com sucesso para {sender_id}")
+            return messages[0]["content"]
+
+        logger.warning("Nenhuma resposta do assistant encontrada")
+        return "Desculpe, não consegui gerar uma resposta."
+
     def _get_or_create_thread(self, sender_id: str) -> str:
         """
         Obtém thread existente ou cria nova para o usuário.
@@ -202,30 +313,60 @@ class ConversationManager:
         logger.warning("Nem texto nem transcrição disponíveis")
         return ""
 
-    def _process_tool_calls(self, thread_id: str, run_result: Dict[str, Any]) -> None:
+    def _deadline_reply(self, thread_id: Optional[str], run_id: Optional[str]) -> str:
+        """
+        Encerra o processamento quando o prazo se esgota.
+
+        Cancela o run em andamento (se houver) para que a thread não
+        fique bloqueada na próxima mensagem do usuário.
+
+        Returns:
+            str: Resposta degradada para o usuário
+        """
+        if thread_id and run_id:
+            self._cancel_run(thread_id, run_id)
+
+        return DEADLINE_REPLY
+
+    def _cancel_run(self, thread_id: str, run_id: str) -> None:
+        """Cancela um run abandonado, sem interromper o fluxo em caso de falha."""
+        try:
+            openai_service.cancel_run(thread_id, run_id)
+        except OpenAIAPIError as e:
+            logger.warning(f"Não foi possível cancelar o run {run_id}: {str(e)}")
+
+    def _process_tool_calls(
+        self, run_result: Dict[str, Any], deadline: Optional[Deadline] = None, sender_id: Optional[str] = None
+    ) -> List[Dict[str, str]]:
         """
         Processa as tool calls solicitadas pelo Assistant.
 
-        Executa cada ferramenta e submete os resultados de volta
-        ao Assistant para que ele continue o processamento.
+        Executa as ferramentas em paralelo e retorna os resultados, na
+        ordem das tool calls, para serem submetidos de volta ao Assistant
+        (que continua o mesmo run).
 
         Args:
-            thread_id: ID da thread
             run_result: Resultado do run contendo required_action
+            deadline: Prazo da requisição (opcional)
+            sender_id: Remetente da mensagem (opcional, repassado às ferramentas)
+
+        Returns:
+            list: Tool outputs no formato [{'tool_call_id': str, 'output': str}]
         """
         required_action = run_result.get("required_action")
 
         if not required_action:
             logger.warning("process_tool_calls chamado sem required_action")
-            return
+            return []
 
         # Extrair tool calls
         tool_calls = required_action.submit_tool_outputs.tool_calls
 
         logger.info(f"Processando {len(tool_calls)} tool call(s)")
 
-        # Executar cada tool call
-        tool_outputs = []
+        # Outputs indexados por tool_call_id (a ordem original é preservada ao final)
+        outputs_by_id: Dict[str, str] = {}
+        executable_calls = []
 
         for tool_call in tool_calls:
             tool_call_id = tool_call.id
@@ -237,40 +378,22 @@ class ConversationManager:
             except json.JSONDecodeError as e:
                 logger.error(f"Erro ao parsear argumentos da tool {tool_name}: {e}")
                 # Retornar erro como output da ferramenta
-                tool_outputs.append(
-                    {
-                        "tool_call_id": tool_call_id,
-                        "output": json.dumps({"error": "Argumentos inválidos", "message": str(e)}),
-                    }
-                )
+                outputs_by_id[tool_call_id] = json.dumps({"error": "Argumentos inválidos", "message": str(e)})
                 continue
 
-            # Executar ferramenta
-            try:
-                logger.debug(f"Executando tool: {tool_name} " f"(call_id: {tool_call_id})")
-
-                output = tool_executor.execute_tool(tool_name, arguments)
-
-                tool_outputs.append({"tool_call_id": tool_call_id, "output": output})
-
-                logger.info(f"Tool {tool_name} executada com sucesso")
+            executable_calls.append({"tool_call_id": tool_call_id, "tool_name": tool_name, "arguments": arguments})
 
-            except ToolExecutionError as e:
-                logger.error(f"Erro ao executar tool {tool_name}: {str(e)}")
-                # Retornar erro como output para o Assistant poder lidar
-                tool_outputs.append(
-                    {
-                        "tool_call_id": tool_call_id,
-                        "output": json.dumps({"error": "Erro na execução", "message": str(e)}),
-                    }
-                )
+        # Executar ferramentas em paralelo (erros viram outputs para o Assistant)
+        for result in tool_executor.execute_tools(executable_calls, deadline=deadline, sender_id=sender_id):
+            outputs_by_id[result["tool_call_id"]] = result["output"]
 
-        # Submeter outputs de volta ao Assistant
-        run_id = run_result["run_id"]
-        logger.info(f"Submetendo {len(tool_outputs)} tool output(s) ao Assistant")
+        tool_outputs = [
+            {"tool_call_id": tool_call.id, "output": outputs_by_id[tool_call.id]} for tool_call in tool_calls
+        ]
 
-        openai_service.submit_tool_outputs(thread_id=thread_id, run_id=run_id, tool_outputs=tool_outputs)
+        logger.info(f"{len(tool_outputs)} tool output(s) prontos para o Assistant")
+        return tool_outputs
 
 
-# Instância global do gerenciador (singleton pattern)
-conversation_manager = ConversationManager()
+# Instância global do gerenciador (singleton pattern, criada no primeiro uso)
+conversation_manager = registry.register("conversation_manager", ConversationManager)
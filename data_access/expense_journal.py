@@ -0,0 +1,310 @@
+"""
+Journal durável das despesas ainda não gravadas no Excel (write-behind).
+
+Com EXCEL_WRITE_MODE=write_behind, cada despesa lançada é gravada
+primeiro neste journal e confirmada ao usuário imediatamente; o worker
+grava as despesas no Excel em lote e as remove do journal (ver
+services/write_behind.py). Enquanto estiverem aqui, as despesas são
+somadas às lidas do Excel, para o usuário ver os próprios lançamentos.
+
+Em produção, o journal fica no DynamoDB (chave: workbook_id + entry_id,
+com entry_id ordenado pelo momento do lançamento). Localmente, um
+arquivo JSON o substitui.
+
+Formato das despesas (dict):
+    {
+        'entry_id': str,           # '<timestamp em ms>-<id>' (ordem de lançamento)
+        'workbook_id': str,
+        'worksheet_name': str,
+        'table_name': str ou None,
+        'date': str,
+        'description': str,
+        'category': str,
+        'amount': float,
+        'created_at': float
+    }
+"""
+
+import json
+import os
+import threading
+import time
+from decimal import Decimal
+from typing import Dict, Any, Iterable, List, Optional
+
+from botocore.exceptions import BotoCoreError, ClientError
+
+from config.settings import (
+    EXPENSE_JOURNAL_STORE,
+    EXPENSE_JOURNAL_FILE,
+    JOURNAL_TABLE_NAME,
+    DYNAMODB_ENDPOINT_URL,
+)
+from utils.logger import setup_logger
+from utils.exceptions import DynamoDBError, FinancialAssistantError
+
+# Logger específico deste módulo
+logger = setup_logger(__name__)
+
+
+class ExpenseJournal:
+    """
+    Interface dos journals de despesas.
+
+    O lock de flush garante que apenas um worker grave as despesas de
+    um workbook por vez (flushes concorrentes duplicariam linhas).
+    """
+
+    def append(self, entries: List[Dict[str, Any]]) -> None:
+        """
+        Grava as despesas no journal.
+
+        Raises:
+            FinancialAssistantError: Se houver erro ao gravar (DynamoDBError
+                                     no journal do DynamoDB)
+        """
+        raise NotImplementedError
+
+    def pending(self, workbook_id: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Retorna as despesas do workbook ainda no journal, na ordem de lançamento."""
+        raise NotImplementedError
+
+    def remove(self, workbook_id: str, entry_ids: Iterable[str]) -> None:
+        """Remove do journal as despesas já gravadas no Excel."""
+        raise NotImplementedError
+
+    def try_acquire_flush_lock(self, workbook_id: str, holder: str, ttl_seconds: float) -> bool:
+        """
+        Tenta obter o direito exclusivo de gravar as despesas do workbook.
+
+        Args:
+            workbook_id: ID do workbook
+            holder: Identificador único de quem está gravando
+            ttl_seconds: Validade do lock (liberado sozinho se o dono falhar)
+
+        Returns:
+            bool: True se o lock foi obtido
+        """
+        raise NotImplementedError
+
+    def release_flush_lock(self, workbook_id: str, holder: str) -> None:
+        """Libera o lock de flush, se ainda pertencer a holder."""
+        raise NotImplementedError
+
+
+class FileExpenseJournal(ExpenseJournal):
+    """
+    Journal em um arquivo JSON (desenvolvimento local e testes).
+
+    O arquivo é relido a cada operação e regravado de forma atômica,
+    permitindo que o webhook e o worker rodem em processos diferentes.
+    """
+
+    def __init__(self, file_path: str = EXPENSE_JOURNAL_FILE):
+        """
+        Args:
+            file_path: Caminho do arquivo do journal
+        """
+        self.file_path = file_path
+        self._lock = threading.Lock()
+
+    def _load(self) -> Dict[str, Any]:
+        """Lê o conteúdo do arquivo ({'entries': {...}, 'locks': {...}})."""
+        if not os.path.exists(self.file_path):
+            return {"entries": {}, "locks": {}}
+
+        try:
+            with open(self.file_path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            raise FinancialAssistantError(f"Falha ao ler o journal local: {str(e)}") from e
+
+    def _save(self, data: Dict[str, Any]) -> None:
+        """Grava o conteúdo no arquivo (arquivo temporário + rename)."""
+        temp_path = f"{self.file_path}.tmp"
+
+        try:
+            with open(temp_path, "w") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(temp_path, self.file_path)
+        except OSError as e:
+            raise FinancialAssistantError(f"Falha ao salvar o journal local: {str(e)}") from e
+
+    def append(self, entries: List[Dict[str, Any]]) -> None:
+        with self._lock:
+            data = self._load()
+            for entry in entries:
+                data["entries"].setdefault(entry["workbook_id"], []).append(entry)
+            self._save(data)
+
+    def pending(self, workbook_id: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        with self._lock:
+            entries = sorted(
+                self._load()["entries"].get(workbook_id, []),
+                key=lambda entry: entry["entry_id"]
+            )
+
+        return entries[:limit] if limit else entries
+
+    def remove(self, workbook_id: str, entry_ids: Iterable[str]) -> None:
+        removed = set(entry_ids)
+
+        with self._lock:
+            data = self._load()
+            remaining = [
+                entry for entry in data["entries"].get(workbook_id, [])
+                if entry["entry_id"] not in removed
+            ]
+            if remaining:
+                data["entries"][workbook_id] = remaining
+            else:
+                data["entries"].pop(workbook_id, None)
+            self._save(data)
+
+    def try_acquire_flush_lock(self, workbook_id: str, holder: str, ttl_seconds: float) -> bool:
+        with self._lock:
+            data = self._load()
+            now = time.time()
+
+            current = data["locks"].get(workbook_id)
+            if current and current["expires_at"] > now:
+                return False
+
+            data["locks"][workbook_id] = {"holder": holder, "expires_at": now + ttl_seconds}
+            self._save(data)
+            return True
+
+    def release_flush_lock(self, workbook_id: str, holder: str) -> None:
+        with self._lock:
+            data = self._load()
+            if data["locks"].get(workbook_id, {}).get("holder") == holder:
+                del data["locks"][workbook_id]
+                self._save(data)
+
+
+class DynamoDBExpenseJournal(ExpenseJournal):
+    """
+    Journal no DynamoDB, compartilhado entre containers.
+
+    As leituras são consistentes, para que a resposta seguinte do
+    Assistant já inclua a despesa recém-lançada. O lock de flush é um
+    item próprio ('lock#<workbook_id>') obtido por escrita condicional.
+    """
+
+    def __init__(self, table_name: str = JOURNAL_TABLE_NAME):
+        """
+        Args:
+            table_name: Nome da tabela do journal
+        """
+        # Import adiado para não pesar no cold start
+        import boto3
+
+        if DYNAMODB_ENDPOINT_URL:
+            dynamodb = boto3.resource("dynamodb", endpoint_url=DYNAMODB_ENDPOINT_URL)
+        else:
+            dynamodb = boto3.resource("dynamodb")
+
+        self.table = dynamodb.Table(table_name)
+
+    def append(self, entries: List[Dict[str, Any]]) -> None:
+        try:
+            with self.table.batch_writer() as batch:
+                for entry in entries:
+                    item = {key: value for key, value in entry.items() if value is not None}
+                    item["amount"] = Decimal(str(entry["amount"]))
+                    item["created_at"] = Decimal(str(entry["created_at"]))
+                    batch.put_item(Item=item)
+        except (ClientError, BotoCoreError) as e:
+            raise DynamoDBError(f"Falha ao gravar despesas no journal: {str(e)}") from e
+
+    def pending(self, workbook_id: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        from boto3.dynamodb.conditions import Key
+
+        kwargs: Dict[str, Any] = {
+            "KeyConditionExpression": Key("workbook_id").eq(workbook_id),
+            "ConsistentRead": True,
+        }
+        entries: List[Dict[str, Any]] = []
+
+        try:
+            while True:
+                response = self.table.query(**kwargs)
+                entries.extend(self._entry(item) for item in response.get("Items", []))
+
+                if "LastEvaluatedKey" not in response or (limit and len(entries) >= limit):
+                    break
+                kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+        except (ClientError, BotoCoreError) as e:
+            raise DynamoDBError(f"Falha ao consultar o journal: {str(e)}") from e
+
+        return entries[:limit] if limit else entries
+
+    @staticmethod
+    def _entry(item: Dict[str, Any]) -> Dict[str, Any]:
+        """Converte um item do DynamoDB em despesa (Decimal -> float)."""
+        entry = dict(item)
+        entry.setdefault("table_name", None)
+        entry["amount"] = float(item.get("amount", 0))
+        entry["created_at"] = float(item.get("created_at", 0))
+        return entry
+
+    def remove(self, workbook_id: str, entry_ids: Iterable[str]) -> None:
+        try:
+            with self.table.batch_writer() as batch:
+                for entry_id in entry_ids:
+                    batch.delete_item(Key={"workbook_id": workbook_id, "entry_id": entry_id})
+        except (ClientError, BotoCoreError) as e:
+            raise DynamoDBError(f"Falha ao remover despesas do journal: {str(e)}") from e
+
+    def try_acquire_flush_lock(self, workbook_id: str, holder: str, ttl_seconds: float) -> bool:
+        now = int(time.time())
+
+        try:
+            self.table.update_item(
+                Key={"workbook_id": f"lock#{workbook_id}", "entry_id": "flush"},
+                UpdateExpression="SET lock_holder = :holder, lock_expires_at = :expires",
+                ConditionExpression="attribute_not_exists(lock_holder) OR lock_expires_at < :now",
+                ExpressionAttributeValues={
+                    ":holder": holder,
+                    ":expires": now + int(ttl_seconds),
+                    ":now": now,
+                },
+            )
+            return True
+
+        except ClientError as e:
+            if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+                return False
+            raise DynamoDBError(f"Falha ao obter lock de flush: {str(e)}") from e
+
+        except BotoCoreError as e:
+            raise DynamoDBError(f"Falha ao obter lock de flush: {str(e)}") from e
+
+    def release_flush_lock(self, workbook_id: str, holder: str) -> None:
+        try:
+            self.table.delete_item(
+                Key={"workbook_id": f"lock#{workbook_id}", "entry_id": "flush"},
+                ConditionExpression="lock_holder = :holder",
+                ExpressionAttributeValues={":holder": holder},
+            )
+
+        except ClientError as e:
+            # Lock já expirado e obtido por outro worker: nada a liberar
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                logger.warning(f"Falha ao liberar lock de flush: {str(e)}")
+
+        except BotoCoreError as e:
+            logger.warning(f"Falha ao liberar lock de flush: {str(e)}")
+
+
+def create_expense_journal() -> ExpenseJournal:
+    """
+    Cria o journal configurado em EXPENSE_JOURNAL_STORE.
+
+    Returns:
+        ExpenseJournal: DynamoDB ('dynamodb') ou arquivo local (padrão)
+    """
+    if EXPENSE_JOURNAL_STORE == "dynamodb":
+        return DynamoDBExpenseJournal()
+
+    return FileExpenseJournal()
@@ -0,0 +1,126 @@
+"""
+Armazenamento compartilhado do cache do histórico de despesas.
+
+Guarda no DynamoDB as linhas já processadas de cada planilha, junto com
+a versão (cTag) do workbook em que foram lidas. Containers diferentes
+do Lambda passam a aproveitar a leitura feita por qualquer um deles.
+As linhas são gravadas em JSON comprimido (gzip) para caber no limite
+de 400 KB por item; planilhas maiores ficam apenas no cache em memória.
+"""
+
+import gzip
+import json
+import time
+from typing import Dict, Any, List, Optional
+
+from botocore.exceptions import BotoCoreError, ClientError
+
+from config.settings import (
+    CACHE_TABLE_NAME,
+    EXPENSE_CACHE_TTL_SECONDS,
+    DYNAMODB_ENDPOINT_URL,
+)
+from services.expense_records import EXPENSE_FIELDS, Expense
+from utils.logger import setup_logger
+from utils.exceptions import DynamoDBError
+
+# Logger específico deste módulo
+logger = setup_logger(__name__)
+
+# Tamanho máximo do conteúdo comprimido (margem sob o limite de 400 KB do item)
+MAX_PAYLOAD_BYTES = 350 * 1024
+
+
+class DynamoDBHistoryCacheStore:
+    """
+    Cache compartilhado das linhas das planilhas no DynamoDB.
+
+    Cada item tem a chave 'cache_key', a versão do workbook ('tag'), as
+    linhas comprimidas ('payload') e um TTL ('expires_at').
+    """
+
+    def __init__(self, table_name: str = CACHE_TABLE_NAME):
+        """
+        Args:
+            table_name: Nome da tabela de cache
+        """
+        # Import adiado para não pesar no cold start
+        import boto3
+
+        if DYNAMODB_ENDPOINT_URL:
+            dynamodb = boto3.resource("dynamodb", endpoint_url=DYNAMODB_ENDPOINT_URL)
+        else:
+            dynamodb = boto3.resource("dynamodb")
+
+        self.table = dynamodb.Table(table_name)
+
+    def get(self, cache_key: str) -> Optional[Dict[str, Any]]:
+        """
+        Busca as linhas armazenadas de uma planilha.
+
+        Args:
+            cache_key: Chave da planilha (workbook e aba)
+
+        Returns:
+            dict {'tag': str, 'rows': list de Expense} ou None se não houver
+
+        Raises:
+            DynamoDBError: Se houver erro ao acessar o DynamoDB
+        """
+        try:
+            response = self.table.get_item(Key={"cache_key": cache_key})
+        except (ClientError, BotoCoreError) as e:
+            raise DynamoDBError(f"Falha ao ler cache do histórico: {str(e)}") from e
+
+        item = response.get("Item")
+        if not item or item.get("expires_at", 0) < time.time():
+            return None
+
+        rows = json.loads(gzip.decompress(bytes(item["payload"])).decode("utf-8"))
+
+        # Mesmo tipo retornado pelo cache em memória e pela leitura da planilha
+        expenses = [Expense(*(row.get(field) for field in EXPENSE_FIELDS)) for row in rows]
+        return {"tag": item["tag"], "rows": expenses}
+
+    def put(self, cache_key: str, tag: str, rows: List[Dict[str, Any]]) -> None:
+        """
+        Armazena as linhas de uma planilha lidas na versão informada.
+
+        Linhas que não são dicts, mas têm a interface de leitura de um
+        (Expense), são gravadas como dicts.
+
+        Raises:
+            DynamoDBError: Se houver erro ao acessar o DynamoDB
+        """
+        payload = gzip.compress(json.dumps(rows, ensure_ascii=False, default=dict).encode("utf-8"))
+
+        if len(payload) > MAX_PAYLOAD_BYTES:
+            logger.info(
+                f"Planilha {cache_key} grande demais para o cache compartilhado "
+                f"({len(payload)} bytes comprimidos)"
+            )
+            return
+
+        try:
+            self.table.put_item(
+                Item={
+                    "cache_key": cache_key,
+                    "tag": tag,
+                    "payload": payload,
+                    "expires_at": int(time.time()) + EXPENSE_CACHE_TTL_SECONDS,
+                }
+            )
+        except (ClientError, BotoCoreError) as e:
+            raise DynamoDBError(f"Falha ao salvar cache do histórico: {str(e)}") from e
+
+    def delete(self, cache_key: str) -> None:
+        """
+        Remove as linhas armazenadas de uma planilha.
+
+        Raises:
+            DynamoDBError: Se houver erro ao acessar o DynamoDB
+        """
+        try:
+            self.table.delete_item(Key={"cache_key": cache_key})
+        except (ClientError, BotoCoreError) as e:
+            raise DynamoDBError(f"Falha ao invalidar cache do histórico: {str(e)}") from e
@@ -0,0 +1,314 @@
+"""
+Repositório de idempotência para os webhooks do Twilio.
+
+O Twilio reenvia o webhook quando a resposta demora. Este módulo registra
+cada MessageSid processado no DynamoDB (escrita condicional com TTL) e
+em um cache em memória do container, permitindo descartar os retries e
+devolver a resposta já gerada em vez de reprocessar a mensagem.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+from botocore.exceptions import BotoCoreError, ClientError
+
+from config.settings import (
+    IDEMPOTENCY_TABLE_NAME,
+    IDEMPOTENCY_TTL_SECONDS,
+    IDEMPOTENCY_IN_PROGRESS_TIMEOUT_SECONDS,
+    IDEMPOTENCY_CACHE_SIZE,
+    IDEMPOTENCY_ENABLED,
+    DYNAMODB_ENDPOINT_URL,
+)
+from utils.logger import setup_logger
+from utils.exceptions import DynamoDBError
+from utils.service_registry import registry
+
+# Logger específico deste módulo
+logger = setup_logger(__name__)
+
+# Status possíveis de um registro de idempotência
+STATUS_IN_PROGRESS = "IN_PROGRESS"
+STATUS_COMPLETED = "COMPLETED"
+
+
+class IdempotencyRepository:
+    """
+    Classe responsável por registrar o processamento de cada MessageSid.
+
+    Fluxo de uso:
+    1. start_processing(): reserva o MessageSid. Retorna None se a reserva
+       foi obtida, ou o registro existente se for uma duplicata.
+    2. complete(): salva a resposta gerada, para devolvê-la aos retries.
+       Com delivered=False, a resposta foi gerada mas ainda não enviada
+       (o worker a reenvia nas novas entregas, sem reprocessar).
+    3. release(): desfaz a reserva em caso de falha, permitindo reprocessar.
+    """
+
+    def __init__(self):
+        """
+        Inicializa o repositório configurando a conexão com DynamoDB.
+
+        Se DYNAMODB_ENDPOINT_URL estiver definido, usa DynamoDB Local.
+        """
+        # Import adiado para não pesar no cold start
+        import boto3
+
+        if DYNAMODB_ENDPOINT_URL:
+            self.dynamodb = boto3.resource("dynamodb", endpoint_url=DYNAMODB_ENDPOINT_URL)
+        else:
+            self.dynamodb = boto3.resource("dynamodb")
+
+        self.table = self.dynamodb.Table(IDEMPOTENCY_TABLE_NAME)
+
+        # Cache em memória dos registros concluídos (containers aquecidos)
+        self._cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+        logger.info(f"Tabela de idempotência configurada: {IDEMPOTENCY_TABLE_NAME}")
+
+    def _cache_get(self, message_sid: str) -> Optional[Dict[str, Any]]:
+        """Busca um registro no cache em memória (LRU)."""
+        with self._cache_lock:
+            record = self._cache.get(message_sid)
+            if record is None:
+                return None
+
+            if record["expires_at"] < time.time():
+                del self._cache[message_sid]
+                return None
+
+            self._cache.move_to_end(message_sid)
+            return record
+
+    def _cache_put(self, message_sid: str, record: Dict[str, Any]) -> None:
+        """Adiciona um registro ao cache em memória, respeitando o limite."""
+        with self._cache_lock:
+            self._cache[message_sid] = record
+            self._cache.move_to_end(message_sid)
+
+            while len(self._cache) > IDEMPOTENCY_CACHE_SIZE:
+                self._cache.popitem(last=False)
+
+    def start_processing(self, message_sid: str) -> Optional[Dict[str, Any]]:
+        """
+        Tenta reservar o processamento de um MessageSid.
+
+        A reserva é uma escrita condicional: só é aceita se o MessageSid
+        ainda não existir, se o registro anterior já expirou ou se um
+        processamento anterior ficou abandonado "em andamento".
+
+        Args:
+            message_sid: MessageSid enviado pelo Twilio
+
+        Returns:
+            None se a reserva foi obtida (mensagem nova), ou o registro
+            existente ({'status': str, 'response': str ou None,
+            'delivered': bool}) se for uma duplicata
+
+        Raises:
+            DynamoDBError: Se houver erro ao acessar o DynamoDB
+        """
+        cached = self._cache_get(message_sid)
+        if cached:
+            logger.info(f"MessageSid {message_sid} encontrado no cache local")
+            return cached
+
+        now = int(time.time())
+
+        try:
+            self.table.put_item(
+                Item={
+                    "message_sid": message_sid,
+                    "status": STATUS_IN_PROGRESS,
+                    "lock_expires_at": now + IDEMPOTENCY_IN_PROGRESS_TIMEOUT_SECONDS,
+                    "expires_at": now + IDEMPOTENCY_TTL_SECONDS,
+                },
+                ConditionExpression=(
+                    "attribute_not_exists(message_sid) "
+                    "OR expires_at < :now "
+                    "OR (#status = :in_progress AND lock_expires_at < :now)"
+                ),
+                ExpressionAttributeNames={"#status": "status"},
+                ExpressionAttributeValues={":now": now, ":in_progress": STATUS_IN_PROGRESS},
+            )
+
+            logger.debug(f"Processamento reservado para MessageSid {message_sid}")
+            return None
+
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                error_message = e.response["Error"]["Message"]
+                logger.error(f"Erro ao reservar MessageSid no DynamoDB: {error_message}")
+                raise DynamoDBError(f"Falha ao registrar idempotência: {error_message}") from e
+
+        except BotoCoreError as e:
+            logger.error(f"Erro de conexão com o DynamoDB: {str(e)}")
+            raise DynamoDBError(f"Falha ao registrar idempotência: {str(e)}") from e
+
+        # Reserva negada: a mensagem já foi (ou está sendo) processada
+        logger.info(f"MessageSid {message_sid} duplicado, descartando retry")
+        record = self._get_record(message_sid)
+
+        if record and record["status"] == STATUS_COMPLETED:
+            self._cache_put(message_sid, record)
+
+        return record or {
+            "status": STATUS_IN_PROGRESS, "response": None, "delivered": False, "expires_at": now
+        }
+
+    def _get_record(self, message_sid: str) -> Optional[Dict[str, Any]]:
+        """Lê o registro de idempotência do DynamoDB."""
+        try:
+            response = self.table.get_item(Key={"message_sid": message_sid}, ConsistentRead=True)
+
+        except ClientError as e:
+            error_message = e.response["Error"]["Message"]
+            logger.error(f"Erro ao ler idempotência no DynamoDB: {error_message}")
+            raise DynamoDBError(f"Falha ao ler idempotência: {error_message}") from e
+
+        except BotoCoreError as e:
+            logger.error(f"Erro de conexão com o DynamoDB: {str(e)}")
+            raise DynamoDBError(f"Falha ao ler idempotência: {str(e)}") from e
+
+        item = response.get("Item")
+        if not item:
+            return None
+
+        return {
+            "status": item.get("status"),
+            "response": item.get("response"),
+            "delivered": item.get("delivered", True),
+            "expires_at": int(item.get("expires_at", 0)),
+        }
+
+    def complete(
+        self,
+        message_sid: str,
+        response_text: Optional[str] = None,
+        delivered: bool = True
+    ) -> None:
+        """
+        Marca o MessageSid como concluído e salva a resposta gerada.
+
+        Args:
+            message_sid: MessageSid enviado pelo Twilio
+            response_text: Resposta gerada para o usuário (opcional)
+            delivered: Se a resposta já foi enviada ao usuário
+
+        Raises:
+            DynamoDBError: Se houver erro ao salvar no DynamoDB
+        """
+        expires_at = int(time.time()) + IDEMPOTENCY_TTL_SECONDS
+        item = {
+            "message_sid": message_sid,
+            "status": STATUS_COMPLETED,
+            "delivered": delivered,
+            "expires_at": expires_at,
+        }
+        if response_text is not None:
+            item["response"] = response_text
+
+        try:
+            self.table.put_item(Item=item)
+
+        except ClientError as e:
+            error_message = e.response["Error"]["Message"]
+            logger.error(f"Erro ao concluir idempotência no DynamoDB: {error_message}")
+            raise DynamoDBError(f"Falha ao concluir idempotência: {error_message}") from e
+
+        except BotoCoreError as e:
+            logger.error(f"Erro de conexão com o DynamoDB: {str(e)}")
+            raise DynamoDBError(f"Falha ao concluir idempotência: {str(e)}") from e
+
+        self._cache_put(
+            message_sid,
+            {
+                "status": STATUS_COMPLETED,
+                "response": response_text,
+                "delivered": delivered,
+                "expires_at": expires_at,
+            },
+        )
+        logger.debug(f"MessageSid {message_sid} marcado como concluído")
+
+    def release(self, message_sid: str) -> None:
+        """
+        Remove a reserva de um MessageSid após uma falha no processamento.
+
+        Args:
+            message_sid: MessageSid enviado pelo Twilio
+
+        Raises:
+            DynamoDBError: Se houver erro ao deletar do DynamoDB
+        """
+        with self._cache_lock:
+            self._cache.pop(message_sid, None)
+
+        try:
+            self.table.delete_item(Key={"message_sid": message_sid})
+
+        except ClientError as e:
+            error_message = e.response["Error"]["Message"]
+            logger.error(f"Erro ao liberar idempotência no DynamoDB: {error_message}")
+            raise DynamoDBError(f"Falha ao liberar idempotência: {error_message}") from e
+
+        except BotoCoreError as e:
+            logger.error(f"Erro de conexão com o DynamoDB: {str(e)}")
+            raise DynamoDBError(f"Falha ao liberar idempotência: {str(e)}") from e
+
+
+# Instância global do repositório (singleton pattern, criada no primeiro uso)
+idempotency_repository = registry.register("idempotency_repository", IdempotencyRepository)
+
+
+def claim_message(message_sid: str) -> Optional[Dict[str, Any]]:
+    """
+    Reserva o processamento de um MessageSid, sem bloquear em caso de falha.
+
+    Falhas no DynamoDB não impedem o atendimento: a mensagem é
+    processada normalmente, apenas sem proteção contra retries.
+
+    Args:
+        message_sid: MessageSid (ou chave derivada dele)
+
+    Returns:
+        None se a mensagem deve ser processada, ou o registro existente
+        se for um retry de uma mensagem já recebida
+    """
+    if not IDEMPOTENCY_ENABLED or not message_sid:
+        return None
+
+    try:
+        return idempotency_repository.start_processing(message_sid)
+    except DynamoDBError as e:
+        logger.warning(f"Idempotência indisponível, processando mesmo assim: {str(e)}")
+        return None
+
+
+def complete_message(
+    message_sid: str,
+    response_text: Optional[str] = None,
+    delivered: bool = True
+) -> None:
+    """Registra a conclusão de um MessageSid (ignora falhas do DynamoDB)."""
+    if not IDEMPOTENCY_ENABLED or not message_sid:
+        return
+
+    try:
+        idempotency_repository.complete(message_sid, response_text, delivered)
+    except DynamoDBError as e:
+        logger.warning(f"Falha ao registrar conclusão do MessageSid {message_sid}: {str(e)}")
+
+
+def release_message(message_sid: str) -> None:
+    """Libera a reserva de um MessageSid após falha (ignora falhas do DynamoDB)."""
+    if not IDEMPOTENCY_ENABLED or not message_sid:
+        return
+
+    try:
+        idempotency_repository.release(message_sid)
+    except DynamoDBError as e:
+        logger.warning(f"Falha ao liberar MessageSid {message_sid}: {str(e)}")
@@ -0,0 +1,401 @@
+"""
+Armazenamento do ledger de despesas (EXPENSE_BACKEND=ledger).
+
+O ledger é a fonte de verdade das despesas: cada lançamento é gravado
+aqui, indexado por remetente (owner) e data, e exportado para a
+planilha do Excel em segundo plano. Cada despesa fica marcada como
+pendente de exportação até ser gravada no Excel.
+
+Em produção, o ledger fica no DynamoDB (chave: owner + entry_key, com
+entry_key começando pela data) e as pendentes em um índice esparso.
+Localmente, um arquivo SQLite com o mesmo comportamento substitui o
+DynamoDB.
+
+Formato das despesas (dict):
+    {
+        'entry_key': str,          # '<data ISO>#<sequência>' (ordenável por data)
+        'workbook_id': str,
+        'worksheet_name': str,
+        'table_name': str ou None,
+        'date': str,               # YYYY-MM-DD (ou o texto original, se não for uma data)
+        'description': str,
+        'category': str,
+        'amount': float,
+        'created_at': float        # timestamp do lançamento
+    }
+
+A sequência após o '#' cresce a cada lançamento (e dentro de um
+lançamento em lote), definindo a ordem da exportação. As consultas
+(query) também retornam 'export_pending' (bool).
+"""
+
+import sqlite3
+import threading
+import time
+from decimal import Decimal
+from typing import Dict, Any, Iterable, List, Optional
+
+from botocore.exceptions import BotoCoreError, ClientError
+
+from config.settings import (
+    LEDGER_STORE,
+    LEDGER_SQLITE_PATH,
+    LEDGER_TABLE_NAME,
+    DYNAMODB_ENDPOINT_URL,
+)
+from utils.logger import setup_logger
+from utils.exceptions import DynamoDBError
+
+# Logger específico deste módulo
+logger = setup_logger(__name__)
+
+# Índice esparso do DynamoDB com as despesas ainda não exportadas
+PENDING_EXPORT_INDEX = "pending-export"
+
+# Colunas das despesas gravadas no ledger
+ENTRY_FIELDS = (
+    "entry_key",
+    "workbook_id",
+    "worksheet_name",
+    "table_name",
+    "date",
+    "description",
+    "category",
+    "amount",
+    "created_at",
+)
+
+
+def _key_range(start_date: Optional[str], end_date: Optional[str]) -> tuple:
+    """Intervalo de entry_key que cobre as datas (inclusivas)."""
+    # '~' é maior que qualquer caractere do identificador após a data
+    return (start_date or "0000-00-00", f"{end_date or '9999-12-31'}#~")
+
+
+def _sequence(entry: Dict[str, Any]) -> str:
+    """Ordem de lançamento da despesa (parte do entry_key após a data)."""
+    return entry["entry_key"].partition("#")[2]
+
+
+class LedgerStore:
+    """
+    Interface dos armazenamentos do ledger.
+
+    O lock de exportação garante que apenas um worker exporte as
+    despesas de um owner por vez (exportações concorrentes duplicariam
+    linhas no Excel).
+    """
+
+    def put(self, owner: str, entries: List[Dict[str, Any]]) -> None:
+        """Grava as despesas, marcadas como pendentes de exportação."""
+        raise NotImplementedError
+
+    def query(
+        self,
+        owner: str,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Retorna as despesas do owner, ordenadas por data.
+
+        Args:
+            owner: Dono das despesas (remetente)
+            start_date: Data inicial inclusiva (YYYY-MM-DD), opcional
+            end_date: Data final inclusiva (YYYY-MM-DD), opcional
+        """
+        raise NotImplementedError
+
+    def pending(self, owner: str, limit: int) -> List[Dict[str, Any]]:
+        """Retorna até 'limit' despesas ainda não exportadas, na ordem de lançamento (sequência)."""
+        raise NotImplementedError
+
+    def mark_exported(self, owner: str, entry_keys: Iterable[str]) -> None:
+        """Marca as despesas como exportadas para o Excel."""
+        raise NotImplementedError
+
+    def try_acquire_export_lock(self, owner: str, holder: str, ttl_seconds: float) -> bool:
+        """
+        Tenta obter o direito exclusivo de exportar as despesas do owner.
+
+        Args:
+            owner: Dono das despesas
+            holder: Identificador único de quem está exportando
+            ttl_seconds: Validade do lock (liberado sozinho se o dono falhar)
+
+        Returns:
+            bool: True se o lock foi obtido
+        """
+        raise NotImplementedError
+
+    def release_export_lock(self, owner: str, holder: str) -> None:
+        """Libera o lock de exportação, se ainda pertencer a holder."""
+        raise NotImplementedError
+
+
+class SQLiteLedgerStore(LedgerStore):
+    """
+    Ledger em um arquivo SQLite (execução local e testes).
+
+    Webhook e worker locais compartilham o mesmo arquivo; o lock de
+    exportação é uma linha da tabela ledger_locks, atualizada apenas
+    se estiver livre ou expirada.
+    """
+
+    def __init__(self, path: str = LEDGER_SQLITE_PATH):
+        """
+        Args:
+            path: Caminho do arquivo do banco (':memory:' para testes)
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        self._connection.row_factory = sqlite3.Row
+
+        with self._lock, self._connection:
+            self._connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS ledger_entries (
+                    owner TEXT NOT NULL,
+                    entry_key TEXT NOT NULL,
+                    workbook_id TEXT NOT NULL,
+                    worksheet_name TEXT NOT NULL,
+                    table_name TEXT,
+                    date TEXT NOT NULL,
+                    description TEXT,
+                    category TEXT,
+                    amount REAL,
+                    created_at REAL NOT NULL,
+                    export_pending INTEGER NOT NULL DEFAULT 1,
+                    PRIMARY KEY (owner, entry_key)
+                )
+                """
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS ledger_pending "
+                "ON ledger_entries (owner, export_pending, created_at)"
+            )
+            self._connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS ledger_locks (
+                    owner TEXT PRIMARY KEY,
+                    holder TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+                """
+            )
+
+    def put(self, owner: str, entries: List[Dict[str, Any]]) -> None:
+        with self._lock, self._connection:
+            self._connection.executemany(
+                f"INSERT OR REPLACE INTO ledger_entries (owner, {', '.join(ENTRY_FIELDS)}, export_pending) "
+                f"VALUES (?, {', '.join('?' for _ in ENTRY_FIELDS)}, 1)",
+                [(owner, *(entry.get(field) for field in ENTRY_FIELDS)) for entry in entries],
+            )
+
+    def query(
+        self,
+        owner: str,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._connection.execute(
+                f"SELECT {', '.join(ENTRY_FIELDS)}, export_pending FROM ledger_entries "
+                "WHERE owner = ? AND entry_key BETWEEN ? AND ? ORDER BY entry_key",
+                (owner, *_key_range(start_date, end_date)),
+            ).fetchall()
+
+        return [{**dict(row), "export_pending": bool(row["export_pending"])} for row in rows]
+
+    def pending(self, owner: str, limit: int) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._connection.execute(
+                f"SELECT {', '.join(ENTRY_FIELDS)} FROM ledger_entries "
+                "WHERE owner = ? AND export_pending = 1 "
+                "ORDER BY substr(entry_key, instr(entry_key, '#') + 1) LIMIT ?",
+                (owner, limit),
+            ).fetchall()
+
+        return [dict(row) for row in rows]
+
+    def mark_exported(self, owner: str, entry_keys: Iterable[str]) -> None:
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "UPDATE ledger_entries SET export_pending = 0 WHERE owner = ? AND entry_key = ?",
+                [(owner, entry_key) for entry_key in entry_keys],
+            )
+
+    def try_acquire_export_lock(self, owner: str, holder: str, ttl_seconds: float) -> bool:
+        now = time.time()
+
+        with self._lock, self._connection:
+            cursor = self._connection.execute(
+                "INSERT INTO ledger_locks (owner, holder, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(owner) DO UPDATE SET holder = excluded.holder, expires_at = excluded.expires_at "
+                "WHERE ledger_locks.expires_at < ?",
+                (owner, holder, now + ttl_seconds, now),
+            )
+            return cursor.rowcount == 1
+
+    def release_export_lock(self, owner: str, holder: str) -> None:
+        with self._lock, self._connection:
+            self._connection.execute(
+                "DELETE FROM ledger_locks WHERE owner = ? AND holder = ?",
+                (owner, holder),
+            )
+
+
+class DynamoDBLedgerStore(LedgerStore):
+    """
+    Ledger no DynamoDB, compartilhado entre containers.
+
+    Chave: owner (HASH) + entry_key (RANGE, começa pela data), o que
+    permite consultar um período com uma única Query. As despesas
+    pendentes têm o atributo export_pending (= owner), que alimenta o
+    índice esparso PENDING_EXPORT_INDEX: ao serem exportadas, o atributo
+    é removido e elas saem do índice.
+
+    O lock de exportação é um item próprio ('lock#<owner>') obtido por
+    escrita condicional, como o lock de refresh dos tokens.
+    """
+
+    def __init__(self, table_name: str = LEDGER_TABLE_NAME):
+        """
+        Args:
+            table_name: Nome da tabela do ledger
+        """
+        # Import adiado para não pesar no cold start
+        import boto3
+
+        if DYNAMODB_ENDPOINT_URL:
+            dynamodb = boto3.resource("dynamodb", endpoint_url=DYNAMODB_ENDPOINT_URL)
+        else:
+            dynamodb = boto3.resource("dynamodb")
+
+        self.table = dynamodb.Table(table_name)
+
+    def put(self, owner: str, entries: List[Dict[str, Any]]) -> None:
+        try:
+            with self.table.batch_writer() as batch:
+                for entry in entries:
+                    item = {field: entry.get(field) for field in ENTRY_FIELDS if entry.get(field) is not None}
+                    item["owner"] = owner
+                    item["export_pending"] = owner
+                    item["amount"] = Decimal(str(entry["amount"]))
+                    item["created_at"] = Decimal(str(entry["created_at"]))
+                    batch.put_item(Item=item)
+        except (ClientError, BotoCoreError) as e:
+            raise DynamoDBError(f"Falha ao gravar despesas no ledger: {str(e)}") from e
+
+    def query(
+        self,
+        owner: str,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        from boto3.dynamodb.conditions import Key
+
+        start, end = _key_range(start_date, end_date)
+        return self._query_all(
+            KeyConditionExpression=Key("owner").eq(owner) & Key("entry_key").between(start, end)
+        )
+
+    def pending(self, owner: str, limit: int) -> List[Dict[str, Any]]:
+        from boto3.dynamodb.conditions import Key
+
+        entries = self._query_all(
+            IndexName=PENDING_EXPORT_INDEX,
+            KeyConditionExpression=Key("export_pending").eq(owner),
+            limit=limit,
+        )
+        return sorted(entries, key=_sequence)
+
+    def _query_all(self, limit: Optional[int] = None, **kwargs: Any) -> List[Dict[str, Any]]:
+        """Executa a Query seguindo a paginação do DynamoDB."""
+        entries: List[Dict[str, Any]] = []
+
+        try:
+            while True:
+                response = self.table.query(**kwargs)
+                entries.extend(self._entry(item) for item in response.get("Items", []))
+
+                if "LastEvaluatedKey" not in response or (limit and len(entries) >= limit):
+                    break
+                kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+        except (ClientError, BotoCoreError) as e:
+            raise DynamoDBError(f"Falha ao consultar o ledger: {str(e)}") from e
+
+        return entries[:limit] if limit else entries
+
+    @staticmethod
+    def _entry(item: Dict[str, Any]) -> Dict[str, Any]:
+        """Converte um item do DynamoDB em despesa (Decimal -> float)."""
+        entry = {field: item.get(field) for field in ENTRY_FIELDS}
+        entry["amount"] = float(item.get("amount", 0))
+        entry["created_at"] = float(item.get("created_at", 0))
+        entry["export_pending"] = "export_pending" in item
+        return entry
+
+    def mark_exported(self, owner: str, entry_keys: Iterable[str]) -> None:
+        try:
+            for entry_key in entry_keys:
+                self.table.update_item(
+                    Key={"owner": owner, "entry_key": entry_key},
+                    UpdateExpression="REMOVE export_pending",
+                )
+        except (ClientError, BotoCoreError) as e:
+            raise DynamoDBError(f"Falha ao marcar despesas exportadas: {str(e)}") from e
+
+    def try_acquire_export_lock(self, owner: str, holder: str, ttl_seconds: float) -> bool:
+        now = int(time.time())
+
+        try:
+            self.table.update_item(
+                Key={"owner": f"lock#{owner}", "entry_key": "export"},
+                UpdateExpression="SET lock_holder = :holder, lock_expires_at = :expires",
+                ConditionExpression="attribute_not_exists(lock_holder) OR lock_expires_at < :now",
+                ExpressionAttributeValues={
+                    ":holder": holder,
+                    ":expires": now + int(ttl_seconds),
+                    ":now": now,
+                },
+            )
+            return True
+
+        except ClientError as e:
+            if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+                return False
+            raise DynamoDBError(f"Falha ao obter lock de exportação: {str(e)}") from e
+
+        except BotoCoreError as e:
+            raise DynamoDBError(f"Falha ao obter lock de exportação: {str(e)}") from e
+
+    def release_export_lock(self, owner: str, holder: str) -> None:
+        try:
+            self.table.delete_item(
+                Key={"owner": f"lock#{owner}", "entry_key": "export"},
+                ConditionExpression="lock_holder = :holder",
+                ExpressionAttributeValues={":holder": holder},
+            )
+
+        except ClientError as e:
+            # Lock já expirado e obtido por outro worker: nada a liberar
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                logger.warning(f"Falha ao liberar lock de exportação: {str(e)}")
+
+        except BotoCoreError as e:
+            logger.warning(f"Falha ao liberar lock de exportação: {str(e)}")
+
+
+def create_ledger_store() -> LedgerStore:
+    """
+    Cria o armazenamento do ledger configurado em LEDGER_STORE.
+
+    Returns:
+        LedgerStore: DynamoDB ('dynamodb') ou SQLite (padrão)
+    """
+    if LEDGER_STORE == "dynamodb":
+        return DynamoDBLedgerStore()
+
+    return SQLiteLedgerStore()
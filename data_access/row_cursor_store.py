@@ -0,0 +1,249 @@
+"""
+Cursores da próxima linha livre de cada planilha (escrita por intervalo).
+
+Sem a tabela do Excel, as despesas são escritas logo abaixo do
+intervalo usado da planilha, o que exigiria ler o usedRange antes de
+cada escrita. O cursor guarda a próxima linha livre de cada (workbook,
+planilha) e é avançado atomicamente a cada escrita: escritas
+concorrentes recebem intervalos distintos e a escrita vira um único
+PATCH no endereço reservado.
+
+A reserva não consulta o Graph. O cursor é descartado (e a próxima
+escrita relê o usedRange) quando uma escrita falha, quando uma leitura
+de uma versão nova do workbook encontra linhas ocupadas além do cursor
+(linhas adicionadas fora da aplicação, ver observe) ou quando expira
+(EXCEL_ROW_CURSOR_TTL_SECONDS), o que limita o tempo em que uma edição
+externa sem leituras no meio passa despercebida.
+
+Em memória por padrão (um container) ou no DynamoDB, na tabela do cache
+compartilhado, com EXPENSE_CACHE_SHARED_BACKEND=dynamodb.
+"""
+
+import threading
+import time
+from typing import Dict, Any, Optional, Tuple
+
+from botocore.exceptions import BotoCoreError, ClientError
+
+from config.settings import (
+    CACHE_TABLE_NAME,
+    DYNAMODB_ENDPOINT_URL,
+    EXCEL_ROW_CURSOR_TTL_SECONDS,
+    EXPENSE_CACHE_SHARED_BACKEND,
+)
+from utils.logger import setup_logger
+from utils.exceptions import DynamoDBError
+
+# Logger específico deste módulo
+logger = setup_logger(__name__)
+
+
+class RowCursorStore:
+    """
+    Interface dos armazenamentos de cursores.
+
+    Linhas são números 1-based da planilha (como nos endereços A1).
+    """
+
+    def advance(self, workbook_id: str, worksheet_name: str, count: int) -> Optional[int]:
+        """
+        Reserva 'count' linhas a partir do cursor, avançando-o atomicamente.
+
+        Returns:
+            int: Primeira linha reservada, ou None se não houver cursor válido
+        """
+        raise NotImplementedError
+
+    def seed(self, workbook_id: str, worksheet_name: str, next_row: int) -> bool:
+        """
+        Cria o cursor, se ainda não houver um válido.
+
+        Returns:
+            bool: True se o cursor foi criado (False: outro processo criou antes)
+        """
+        raise NotImplementedError
+
+    def observe(self, workbook_id: str, worksheet_name: str, next_free_row: int) -> bool:
+        """
+        Confere o cursor com a próxima linha livre vista em uma leitura.
+
+        Linhas ocupadas além do cursor não foram reservadas pela aplicação
+        (foram adicionadas à mão), e o cursor é descartado. Um cursor
+        adiante da leitura é normal: escritas reservadas e ainda não
+        concluídas, ou linhas apagadas.
+
+        Returns:
+            bool: True se o cursor foi descartado
+        """
+        raise NotImplementedError
+
+    def invalidate(self, workbook_id: str, worksheet_name: str) -> None:
+        """Descarta o cursor (a próxima escrita relê o usedRange)."""
+        raise NotImplementedError
+
+
+class MemoryRowCursorStore(RowCursorStore):
+    """Cursores em memória, compartilhados pelas threads do container."""
+
+    def __init__(self, ttl_seconds: float = EXCEL_ROW_CURSOR_TTL_SECONDS):
+        """
+        Args:
+            ttl_seconds: Validade de um cursor desde a última revalidação
+        """
+        self.ttl_seconds = ttl_seconds
+        self._cursors: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def _valid(self, key: Tuple[str, str]) -> Optional[Dict[str, Any]]:
+        """Retorna o cursor da chave, se existir e não estiver expirado."""
+        cursor = self._cursors.get(key)
+        if cursor is not None and cursor["expires_at"] <= time.time():
+            del self._cursors[key]
+            return None
+        return cursor
+
+    def advance(self, workbook_id: str, worksheet_name: str, count: int) -> Optional[int]:
+        with self._lock:
+            cursor = self._valid((workbook_id, worksheet_name))
+            if cursor is None:
+                return None
+
+            first_row = cursor["next_row"]
+            cursor["next_row"] += count
+            return first_row
+
+    def seed(self, workbook_id: str, worksheet_name: str, next_row: int) -> bool:
+        with self._lock:
+            key = (workbook_id, worksheet_name)
+            if self._valid(key) is not None:
+                return False
+
+            self._cursors[key] = {
+                "next_row": next_row,
+                "expires_at": time.time() + self.ttl_seconds,
+            }
+            return True
+
+    def observe(self, workbook_id: str, worksheet_name: str, next_free_row: int) -> bool:
+        with self._lock:
+            key = (workbook_id, worksheet_name)
+            cursor = self._valid(key)
+            if cursor is None or cursor["next_row"] >= next_free_row:
+                return False
+
+            del self._cursors[key]
+            return True
+
+    def invalidate(self, workbook_id: str, worksheet_name: str) -> None:
+        with self._lock:
+            self._cursors.pop((workbook_id, worksheet_name), None)
+
+
+class DynamoDBRowCursorStore(RowCursorStore):
+    """
+    Cursores no DynamoDB, compartilhados entre containers.
+
+    Ficam na tabela do cache compartilhado, com chave 'cursor#<workbook>#<aba>'.
+    O avanço é um update atômico (next_row + count) que retorna o valor
+    anterior; a criação é uma escrita condicional, para que dois
+    containers que leram o mesmo usedRange não reservem as mesmas linhas.
+    """
+
+    def __init__(self, table_name: str = CACHE_TABLE_NAME, ttl_seconds: float = EXCEL_ROW_CURSOR_TTL_SECONDS):
+        """
+        Args:
+            table_name: Nome da tabela do cache compartilhado
+            ttl_seconds: Validade de um cursor desde a última revalidação
+        """
+        # Import adiado para não pesar no cold start
+        import boto3
+
+        if DYNAMODB_ENDPOINT_URL:
+            dynamodb = boto3.resource("dynamodb", endpoint_url=DYNAMODB_ENDPOINT_URL)
+        else:
+            dynamodb = boto3.resource("dynamodb")
+
+        self.table = dynamodb.Table(table_name)
+        self.ttl_seconds = ttl_seconds
+
+    @staticmethod
+    def _key(workbook_id: str, worksheet_name: str) -> Dict[str, str]:
+        return {"cache_key": f"cursor#{workbook_id}#{worksheet_name}"}
+
+    @staticmethod
+    def _is_conditional_failure(error: ClientError) -> bool:
+        return error.response["Error"]["Code"] == "ConditionalCheckFailedException"
+
+    def advance(self, workbook_id: str, worksheet_name: str, count: int) -> Optional[int]:
+        try:
+            response = self.table.update_item(
+                Key=self._key(workbook_id, worksheet_name),
+                UpdateExpression="SET next_row = next_row + :count",
+                ConditionExpression="attribute_exists(next_row) AND expires_at > :now",
+                ExpressionAttributeValues={":count": count, ":now": int(time.time())},
+                ReturnValues="UPDATED_OLD",
+            )
+        except ClientError as e:
+            if self._is_conditional_failure(e):
+                return None
+            raise DynamoDBError(f"Falha ao avançar o cursor da planilha: {str(e)}") from e
+        except BotoCoreError as e:
+            raise DynamoDBError(f"Falha ao avançar o cursor da planilha: {str(e)}") from e
+
+        return int(response["Attributes"]["next_row"])
+
+    def seed(self, workbook_id: str, worksheet_name: str, next_row: int) -> bool:
+        now = int(time.time())
+
+        try:
+            self.table.put_item(
+                Item={
+                    **self._key(workbook_id, worksheet_name),
+                    "next_row": next_row,
+                    "expires_at": now + int(self.ttl_seconds),
+                },
+                ConditionExpression="attribute_not_exists(cache_key) OR expires_at <= :now",
+                ExpressionAttributeValues={":now": now},
+            )
+            return True
+        except ClientError as e:
+            if self._is_conditional_failure(e):
+                return False
+            raise DynamoDBError(f"Falha ao criar o cursor da planilha: {str(e)}") from e
+        except BotoCoreError as e:
+            raise DynamoDBError(f"Falha ao criar o cursor da planilha: {str(e)}") from e
+
+    def observe(self, workbook_id: str, worksheet_name: str, next_free_row: int) -> bool:
+        # Exclusão condicional: um cursor já adiante da leitura é mantido
+        try:
+            self.table.delete_item(
+                Key=self._key(workbook_id, worksheet_name),
+                ConditionExpression="next_row < :free",
+                ExpressionAttributeValues={":free": next_free_row},
+            )
+            return True
+        except ClientError as e:
+            if self._is_conditional_failure(e):
+                return False
+            raise DynamoDBError(f"Falha ao validar o cursor da planilha: {str(e)}") from e
+        except BotoCoreError as e:
+            raise DynamoDBError(f"Falha ao validar o cursor da planilha: {str(e)}") from e
+
+    def invalidate(self, workbook_id: str, worksheet_name: str) -> None:
+        try:
+            self.table.delete_item(Key=self._key(workbook_id, worksheet_name))
+        except (ClientError, BotoCoreError) as e:
+            raise DynamoDBError(f"Falha ao descartar o cursor da planilha: {str(e)}") from e
+
+
+def create_row_cursor_store() -> RowCursorStore:
+    """
+    Cria o armazenamento de cursores conforme EXPENSE_CACHE_SHARED_BACKEND.
+
+    Returns:
+        RowCursorStore: DynamoDB ('dynamodb') ou memória (padrão)
+    """
+    if EXPENSE_CACHE_SHARED_BACKEND == "dynamodb":
+        return DynamoDBRowCursorStore()
+
+    return MemoryRowCursorStore()
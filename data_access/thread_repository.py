@@ -5,13 +5,13 @@ Este módulo é responsável por persistir e recuperar o mapeamento
 entre sender_id (telefone do usuário) e thread_id (conversa do Assistant).
 """
 
-import boto3
 from botocore.exceptions import ClientError
 from typing import Optional
 
 from config.settings import DYNAMODB_TABLE_NAME, DYNAMODB_ENDPOINT_URL
 from utils.logger import setup_logger
 from utils.exceptions import DynamoDBError
+from utils.service_registry import registry
 
 # Logger específico deste módulo
 logger = setup_logger(__name__)
@@ -32,6 +32,9 @@ class ThreadRepository:
         Se DYNAMODB_ENDPOINT_URL estiver definido, usa DynamoDB Local.
         Caso contrário, usa o serviço DynamoDB da AWS.
         """
+        # Import adiado para não pesar no cold start
+        import boto3
+        
         # Configurar conexão com DynamoDB
         if DYNAMODB_ENDPOINT_URL:
             # Modo desenvolvimento local
@@ -165,6 +168,7 @@ class ThreadRepository:
 
 
 # Instância global do repositório (singleton pattern)
-# Esta instância pode ser importada e reutilizada em toda a aplicação
-thread_repository = ThreadRepository()
+# Esta instância pode ser importada e reutilizada em toda a aplicação;
+# a conexão com o DynamoDB só é criada no primeiro uso
+thread_repository = registry.register("thread_repository", ThreadRepository)
 
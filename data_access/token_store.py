@@ -0,0 +1,308 @@
+"""
+Armazenamento compartilhado dos tokens OAuth do Microsoft Graph.
+
+Em produção, os tokens ficam no DynamoDB e são compartilhados entre
+todos os containers do Lambda, com um lock (escrita condicional) que
+garante que apenas um container renove o token por vez: o refresh
+token é rotacionado a cada renovação, e renovações concorrentes o
+invalidariam. Uma cópia em /tmp evita a leitura do DynamoDB em
+invocações aquecidas.
+
+Localmente, os tokens podem ficar em arquivo ou apenas em memória.
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Dict, Any, Optional
+
+from botocore.exceptions import BotoCoreError, ClientError
+
+from config.settings import (
+    MS_GRAPH_TOKEN_STORE,
+    MS_GRAPH_TOKEN_FILE,
+    MS_GRAPH_TOKEN_CACHE_FILE,
+    TOKEN_TABLE_NAME,
+    DYNAMODB_ENDPOINT_URL,
+)
+from utils.logger import setup_logger
+from utils.exceptions import DynamoDBError
+
+# Logger específico deste módulo
+logger = setup_logger(__name__)
+
+# Chave do registro de tokens do Microsoft Graph
+MS_GRAPH_TOKEN_ID = "ms_graph"
+
+
+class TokenStore:
+    """
+    Interface dos armazenamentos de tokens.
+
+    Os tokens são um dict {'access_token', 'refresh_token', 'expiration_time'}.
+    A implementação padrão do lock vale apenas dentro do processo (suficiente
+    para um único container); o DynamoDBTokenStore a substitui por um lock
+    distribuído.
+    """
+
+    def __init__(self):
+        """Inicializa o lock de refresh local."""
+        self._lock_guard = threading.Lock()
+        self._lock_owner: Optional[str] = None
+        self._lock_expires_at = 0.0
+
+    def load(self) -> Optional[Dict[str, Any]]:
+        """Retorna os tokens armazenados, ou None se não houver."""
+        raise NotImplementedError
+
+    def save(self, tokens: Dict[str, Any]) -> None:
+        """Armazena os tokens renovados."""
+        raise NotImplementedError
+
+    def try_acquire_refresh_lock(self, owner: str, ttl_seconds: float) -> bool:
+        """
+        Tenta obter o direito exclusivo de renovar o token.
+
+        Args:
+            owner: Identificador único de quem está renovando
+            ttl_seconds: Validade do lock (liberado sozinho se o dono falhar)
+
+        Returns:
+            bool: True se o lock foi obtido
+        """
+        with self._lock_guard:
+            now = time.time()
+            if self._lock_owner and self._lock_expires_at > now:
+                return False
+
+            self._lock_owner = owner
+            self._lock_expires_at = now + ttl_seconds
+            return True
+
+    def release_refresh_lock(self, owner: str) -> None:
+        """Libera o lock de renovação, se ainda pertencer a owner."""
+        with self._lock_guard:
+            if self._lock_owner == owner:
+                self._lock_owner = None
+                self._lock_expires_at = 0.0
+
+
+class MemoryTokenStore(TokenStore):
+    """Armazena os tokens apenas em memória (testes e execução local)."""
+
+    def __init__(self):
+        super().__init__()
+        self._tokens: Optional[Dict[str, Any]] = None
+
+    def load(self) -> Optional[Dict[str, Any]]:
+        return dict(self._tokens) if self._tokens else None
+
+    def save(self, tokens: Dict[str, Any]) -> None:
+        self._tokens = dict(tokens)
+
+
+class FileTokenStore(TokenStore):
+    """
+    Armazena os tokens em um arquivo JSON.
+
+    Usado em desenvolvimento local e como cache em /tmp no Lambda
+    (o restante do sistema de arquivos do Lambda é somente leitura).
+    """
+
+    def __init__(self, file_path: str):
+        """
+        Args:
+            file_path: Caminho do arquivo de tokens
+        """
+        super().__init__()
+        self.file_path = file_path
+
+    def load(self) -> Optional[Dict[str, Any]]:
+        if not os.path.exists(self.file_path):
+            return None
+
+        try:
+            with open(self.file_path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Falha ao ler tokens de {self.file_path}: {e}")
+            return None
+
+    def save(self, tokens: Dict[str, Any]) -> None:
+        # Escrita atômica: grava em arquivo temporário e renomeia
+        temp_path = f"{self.file_path}.tmp"
+
+        try:
+            with open(temp_path, "w") as f:
+                json.dump(tokens, f)
+            os.replace(temp_path, self.file_path)
+        except OSError as e:
+            logger.error(f"Erro ao salvar tokens em {self.file_path}: {e}")
+
+
+class DynamoDBTokenStore(TokenStore):
+    """
+    Armazena os tokens no DynamoDB, compartilhados entre containers.
+
+    O lock de renovação é uma escrita condicional no mesmo item:
+    só é obtido se não houver dono ou se o lock anterior expirou.
+    """
+
+    def __init__(self, table_name: str = TOKEN_TABLE_NAME, token_id: str = MS_GRAPH_TOKEN_ID):
+        """
+        Args:
+            table_name: Nome da tabela de tokens
+            token_id: Chave do registro de tokens
+        """
+        super().__init__()
+
+        # Import adiado para não pesar no cold start
+        import boto3
+
+        if DYNAMODB_ENDPOINT_URL:
+            dynamodb = boto3.resource("dynamodb", endpoint_url=DYNAMODB_ENDPOINT_URL)
+        else:
+            dynamodb = boto3.resource("dynamodb")
+
+        self.table = dynamodb.Table(table_name)
+        self.token_id = token_id
+
+    def load(self) -> Optional[Dict[str, Any]]:
+        try:
+            response = self.table.get_item(Key={"token_id": self.token_id}, ConsistentRead=True)
+        except (ClientError, BotoCoreError) as e:
+            raise DynamoDBError(f"Falha ao ler tokens: {str(e)}") from e
+
+        item = response.get("Item")
+        if not item or "refresh_token" not in item:
+            return None
+
+        return {
+            "access_token": item.get("access_token"),
+            "refresh_token": item.get("refresh_token"),
+            "expiration_time": float(item.get("expiration_time", 0)),
+        }
+
+    def save(self, tokens: Dict[str, Any]) -> None:
+        try:
+            # update_item preserva os atributos do lock
+            self.table.update_item(
+                Key={"token_id": self.token_id},
+                UpdateExpression="SET access_token = :a, refresh_token = :r, expiration_time = :e",
+                ExpressionAttributeValues={
+                    ":a": tokens["access_token"],
+                    ":r": tokens["refresh_token"],
+                    ":e": int(tokens["expiration_time"]),
+                },
+            )
+        except (ClientError, BotoCoreError) as e:
+            raise DynamoDBError(f"Falha ao salvar tokens: {str(e)}") from e
+
+    def try_acquire_refresh_lock(self, owner: str, ttl_seconds: float) -> bool:
+        now = int(time.time())
+
+        try:
+            self.table.update_item(
+                Key={"token_id": self.token_id},
+                UpdateExpression="SET lock_owner = :owner, lock_expires_at = :expires",
+                ConditionExpression="attribute_not_exists(lock_owner) OR lock_expires_at < :now",
+                ExpressionAttributeValues={
+                    ":owner": owner,
+                    ":expires": now + int(ttl_seconds),
+                    ":now": now,
+                },
+            )
+            return True
+
+        except ClientError as e:
+            if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+                return False
+            raise DynamoDBError(f"Falha ao obter lock de refresh: {str(e)}") from e
+
+        except BotoCoreError as e:
+            raise DynamoDBError(f"Falha ao obter lock de refresh: {str(e)}") from e
+
+    def release_refresh_lock(self, owner: str) -> None:
+        try:
+            self.table.update_item(
+                Key={"token_id": self.token_id},
+                UpdateExpression="REMOVE lock_owner, lock_expires_at",
+                ConditionExpression="lock_owner = :owner",
+                ExpressionAttributeValues={":owner": owner},
+            )
+
+        except ClientError as e:
+            # Lock já expirado e obtido por outro container: nada a liberar
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                logger.warning(f"Falha ao liberar lock de refresh: {str(e)}")
+
+        except BotoCoreError as e:
+            logger.warning(f"Falha ao liberar lock de refresh: {str(e)}")
+
+
+class CachedTokenStore(TokenStore):
+    """
+    Combina um armazenamento compartilhado com um cache local (/tmp).
+
+    A leitura usa o cache enquanto o access token ainda estiver válido,
+    evitando o acesso ao armazenamento compartilhado em invocações
+    aquecidas. Escritas e locks vão sempre para o armazenamento compartilhado.
+    """
+
+    def __init__(self, primary: TokenStore, cache: TokenStore, min_validity_seconds: float = 0):
+        """
+        Args:
+            primary: Armazenamento compartilhado (ex: DynamoDB)
+            cache: Cache local (ex: arquivo em /tmp)
+            min_validity_seconds: Validade mínima para usar o token do cache
+        """
+        super().__init__()
+        self.primary = primary
+        self.cache = cache
+        self.min_validity_seconds = min_validity_seconds
+
+    def load(self) -> Optional[Dict[str, Any]]:
+        cached = self.cache.load()
+        if cached and cached.get("expiration_time", 0) > time.time() + self.min_validity_seconds:
+            return cached
+
+        tokens = self.primary.load()
+        if tokens:
+            self.cache.save(tokens)
+        return tokens
+
+    def save(self, tokens: Dict[str, Any]) -> None:
+        self.primary.save(tokens)
+        self.cache.save(tokens)
+
+    def try_acquire_refresh_lock(self, owner: str, ttl_seconds: float) -> bool:
+        return self.primary.try_acquire_refresh_lock(owner, ttl_seconds)
+
+    def release_refresh_lock(self, owner: str) -> None:
+        self.primary.release_refresh_lock(owner)
+
+
+def create_token_store(min_validity_seconds: float = 0) -> TokenStore:
+    """
+    Cria o armazenamento de tokens conforme MS_GRAPH_TOKEN_STORE.
+
+    Args:
+        min_validity_seconds: Validade mínima para usar o cache local
+
+    Returns:
+        TokenStore: 'dynamodb' (com cache em /tmp), 'file' ou 'memory'
+    """
+    if MS_GRAPH_TOKEN_STORE == "dynamodb":
+        logger.info(f"Tokens do Microsoft Graph no DynamoDB ({TOKEN_TABLE_NAME})")
+        return CachedTokenStore(
+            DynamoDBTokenStore(),
+            FileTokenStore(MS_GRAPH_TOKEN_CACHE_FILE),
+            min_validity_seconds,
+        )
+
+    if MS_GRAPH_TOKEN_STORE == "memory":
+        return MemoryTokenStore()
+
+    logger.info(f"Tokens do Microsoft Graph no arquivo {MS_GRAPH_TOKEN_FILE}")
+    return FileTokenStore(MS_GRAPH_TOKEN_FILE)
@@ -3,6 +3,13 @@ Handler principal do AWS Lambda para o Assistente Financeiro.
 
 Este módulo serve como entry point da função Lambda, processando
 webhooks do Twilio (WhatsApp) e retornando respostas TwiML.
+
+No modo assíncrono (MESSAGE_PROCESSING_MODE=async), o handler apenas
+valida e enfileira a mensagem, retornando um TwiML vazio imediatamente.
+O processamento e a resposta ficam a cargo do worker (worker_function.py).
+
+Retries do Twilio (mesmo MessageSid) são descartados pela camada de
+idempotência, que devolve a resposta já gerada quando disponível.
 """
 
 import json
@@ -10,9 +17,22 @@ from urllib.parse import parse_qs
 from typing import Dict, Any
 
 from conversation_manager import conversation_manager
+from data_access.idempotency_repository import (
+    STATUS_COMPLETED,
+    claim_message,
+    complete_message,
+    release_message,
+)
 from services.twilio_service import twilio_service
+from services.queue_service import message_queue
+from config.settings import (
+    MESSAGE_PROCESSING_MODE,
+    LAMBDA_REPLY_RESERVE_SECONDS,
+    validate_configuration_once,
+)
+from utils.deadline import Deadline
 from utils.logger import setup_logger
-from utils.exceptions import FinancialAssistantError
+from utils.exceptions import FinancialAssistantError, QueueError
 
 # Logger específico deste módulo
 logger = setup_logger(__name__)
@@ -33,8 +53,14 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         dict: Resposta HTTP com TwiML para o Twilio
     """
     logger.info("=== Início da execução do Lambda ===")
+    validate_configuration_once()
+
+    # Prazo da requisição, reservando tempo para sempre responder ao usuário
+    deadline = Deadline.from_lambda_context(context, reserve_seconds=LAMBDA_REPLY_RESERVE_SECONDS)
     logger.debug(f"Event recebido: {json.dumps(event)}")
 
+    message_sid = ""
+
     try:
         # Etapa 1: Parsear o body da requisição
         # O Twilio envia dados como application/x-www-form-urlencoded
@@ -54,6 +80,7 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         # O Twilio envia os valores como listas, pegamos o primeiro item
         sender_id = params.get("From", [""])[0]
         message_body = params.get("Body", [""])[0]
+        message_sid = params.get("MessageSid", [""])[0]
 
         # Extrair informações de mídia (áudio, imagem, vídeo, etc.)
         num_media = params.get("NumMedia", ["0"])[0]
@@ -75,44 +102,139 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         if media_url:
             logger.info(f"Mídia recebida de {sender_id}: {media_content_type} - {media_url[:50]}...")
 
-        # Etapa 3: Processar mensagem através do ConversationManager
-        try:
-            response_text = conversation_manager.handle_incoming_message(
-                sender_id=sender_id,
-                message_text=message_body,
-                media_url=media_url,
-                media_content_type=media_content_type,
-            )
-
-            logger.info("Mensagem processada com sucesso")
-
-        except FinancialAssistantError as e:
-            # Erro conhecido da aplicação - retornar mensagem amigável
-            logger.error(f"Erro ao processar mensagem: {str(e)}")
-            response_text = (
-                "Desculpe, ocorreu um erro ao processar sua mensagem. "
-                "Por favor, tente novamente em alguns instantes."
-            )
+        # Etapa 3: Descartar retries do Twilio para mensagens já recebidas
+        duplicate = claim_message(message_sid)
+        if duplicate is not None:
+            return _create_duplicate_response(duplicate)
+
+        message = {
+            "sender_id": sender_id,
+            "message_text": message_body,
+            "media_url": media_url,
+            "media_content_type": media_content_type,
+            "message_sid": message_sid,
+        }
+
+        # Etapa 3.1 (modo assíncrono): enfileirar e responder imediatamente
+        if MESSAGE_PROCESSING_MODE == "async" and _enqueue_message(message):
+            return _create_twiml_response(twilio_service.create_empty_response())
+
+        # Etapa 3.2: Processar mensagem através do ConversationManager
+        response_text = _process_message(message, deadline)
 
         # Etapa 4: Gerar resposta TwiML
         twiml = twilio_service.create_twiml_response(response_text)
 
         # Etapa 5: Retornar resposta HTTP para o API Gateway
-        return {
-            "statusCode": 200,
-            "headers": {"Content-Type": "text/xml", "Access-Control-Allow-Origin": "*"},  # Para CORS
-            "body": twiml,
-        }
+        return _create_twiml_response(twiml)
 
     except Exception as e:
         # Erro inesperado - logar e retornar erro genérico
         logger.error(f"Erro crítico não tratado no lambda_handler: {str(e)}", exc_info=True)
+        release_message(message_sid)
         return _create_error_response(status_code=500, message="Erro interno do servidor")
 
     finally:
         logger.info("=== Fim da execução do Lambda ===")
 
 
+def _enqueue_message(message: Dict[str, Any]) -> bool:
+    """
+    Enfileira a mensagem para o worker (modo assíncrono).
+
+    Args:
+        message: Mensagem no formato consumido pelo worker
+
+    Returns:
+        bool: True se a mensagem foi enfileirada; False se a fila falhou
+              (a mensagem deve ser processada de forma síncrona)
+    """
+    try:
+        message_queue.enqueue(message)
+        logger.info("Mensagem enfileirada para processamento assíncrono")
+        complete_message(message["message_sid"])
+        return True
+
+    except QueueError as e:
+        # Sem fila disponível, processar de forma síncrona
+        logger.error(f"Falha ao enfileirar, processando de forma síncrona: {str(e)}")
+        return False
+
+
+def _process_message(message: Dict[str, Any], deadline: Deadline) -> str:
+    """
+    Processa a mensagem de forma síncrona através do ConversationManager.
+
+    Args:
+        message: Mensagem recebida (mesmo formato da fila)
+        deadline: Prazo da requisição
+
+    Returns:
+        str: Resposta do assistant, ou uma mensagem amigável de erro
+    """
+    try:
+        response_text = conversation_manager.handle_incoming_message(
+            sender_id=message["sender_id"],
+            message_text=message["message_text"],
+            media_url=message["media_url"],
+            media_content_type=message["media_content_type"],
+            deadline=deadline,
+        )
+
+        logger.info("Mensagem processada com sucesso")
+        complete_message(message["message_sid"], response_text)
+        return response_text
+
+    except FinancialAssistantError as e:
+        # Erro conhecido da aplicação - retornar mensagem amigável
+        logger.error(f"Erro ao processar mensagem: {str(e)}")
+        release_message(message["message_sid"])
+        return (
+            "Desculpe, ocorreu um erro ao processar sua mensagem. "
+            "Por favor, tente novamente em alguns instantes."
+        )
+
+
+def _create_duplicate_response(record: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Cria a resposta para um retry de mensagem já recebida.
+
+    Se a mensagem original já foi concluída e a resposta está disponível,
+    ela é devolvida novamente. Caso contrário (ainda em processamento ou
+    respondida pelo worker), retorna um TwiML vazio.
+
+    Args:
+        record: Registro de idempotência existente
+
+    Returns:
+        dict: Resposta HTTP formatada
+    """
+    if record.get("status") == STATUS_COMPLETED and record.get("response"):
+        logger.info("Retry de mensagem concluída: devolvendo resposta em cache")
+        return _create_twiml_response(twilio_service.create_twiml_response(record["response"]))
+
+    logger.info("Retry de mensagem em processamento: respondendo TwiML vazio")
+    return _create_twiml_response(twilio_service.create_empty_response())
+
+
+def _create_twiml_response(twiml: str, status_code: int = 200) -> Dict[str, Any]:
+    """
+    Cria a resposta HTTP contendo um TwiML.
+
+    Args:
+        twiml: XML TwiML a retornar
+        status_code: Código HTTP da resposta
+
+    Returns:
+        dict: Resposta HTTP formatada
+    """
+    return {
+        "statusCode": status_code,
+        "headers": {"Content-Type": "text/xml", "Access-Control-Allow-Origin": "*"},  # Para CORS
+        "body": twiml,
+    }
+
+
 def _create_error_response(status_code: int, message: str) -> Dict[str, Any]:
     """
     Cria uma resposta HTTP de erro.
@@ -127,11 +249,7 @@ def _create_error_response(status_code: int, message: str) -> Dict[str, Any]:
     # Gerar TwiML de erro para o usuário
     twiml = twilio_service.create_error_response()
 
-    return {
-        "statusCode": status_code,
-        "headers": {"Content-Type": "text/xml", "Access-Control-Allow-Origin": "*"},
-        "body": twiml,
-    }
+    return _create_twiml_response(twiml, status_code=status_code)
 
 
 # Para testes locais
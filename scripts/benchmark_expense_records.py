@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Benchmark de memória do histórico: despesas em dicts x registros Expense.
+
+Processa a mesma resposta do usedRange ({'values': [...]}) pelos dois
+caminhos do get_expense_history e mede o tempo e o pico de memória (RSS)
+de cada um, em um subprocesso próprio (ver benchmark_history_download.py).
+Os dois caminhos mantêm a planilha inteira (como no cache do histórico)
+e retornam as despesas filtradas.
+
+Caminhos comparados:
+    dicts     anterior: um dict por linha, cópia da lista e lista filtrada,
+              com a lista 'values' viva até o fim da leitura
+    records   atual: um Expense (__slots__) por linha, com as linhas de
+              'values' liberadas à medida que são convertidas
+
+Uso:
+    python scripts/benchmark_expense_records.py [--rows 100000]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+# Permitir importar os módulos da aplicação a partir de scripts/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmark_history_download import generate_values, peak_rss_kb  # noqa: E402
+from services.excel_service import ExcelService  # noqa: E402
+from services.expense_filters import compile_filters  # noqa: E402
+
+VARIANTS = ['dicts', 'records']
+
+# Consultas medidas: histórico completo e uma categoria (~1/7 das linhas)
+QUERIES = {
+    'todas': None,
+    'categoria': {'category': 'Alimentação'},
+}
+
+
+def read_dicts(values: list, filters: dict) -> list:
+    """Caminho anterior do get_expense_history (dicts e listas intermediárias)."""
+    def parse(rows):
+        rows = iter(rows)
+        next(rows, None)
+        for row in rows:
+            if len(row) >= 4:
+                yield {'date': row[0], 'description': row[1], 'category': row[2], 'amount': row[3]}
+
+    cached = list(parse(values))
+    expenses = list(cached)
+
+    if filters:
+        expenses = [exp for exp in expenses if all(exp.get(k) == v for k, v in filters.items())]
+
+    return expenses
+
+
+def read_records(values: list, filters: dict) -> list:
+    """Caminho atual do get_expense_history (ver ExcelService._load_worksheet)."""
+    expense_filter = compile_filters(filters)
+
+    cached = list(ExcelService._parse_expense_rows(ExcelService._consume_rows(values)))
+    expenses = ExcelService._select(cached, expense_filter.predicate)
+
+    return expense_filter.order(expenses)
+
+
+def measure_child(variant: str, query: str, path: str) -> None:
+    """Executa uma leitura e imprime (em JSON) tempo, despesas e pico de RSS."""
+    reader = read_records if variant == 'records' else read_dicts
+
+    baseline = peak_rss_kb()
+    start = time.perf_counter()
+
+    with open(path, 'rb') as file:
+        values = json.loads(file.read()).get('values', [])
+    expenses = reader(values, QUERIES[query])
+
+    elapsed = time.perf_counter() - start
+    peak = peak_rss_kb()
+
+    print(json.dumps({
+        'expenses': len(expenses),
+        'seconds': elapsed,
+        'peak_rss_kb': peak,
+        'delta_rss_kb': peak - baseline
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--rows', type=int, nargs='+', default=[100_000])
+    parser.add_argument('--child', nargs=3, metavar=('VARIANT', 'QUERY', 'PATH'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        measure_child(*args.child)
+        return
+
+    for count in args.rows:
+        print(f"\n📊 Histórico com {count:,} despesas\n")
+        print(f"  {'consulta':<10} {'caminho':<8} {'despesas':>9} {'tempo (ms)':>11} {'pico RSS (MB)':>14} {'+RSS (MB)':>10}")
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'range-values')
+            with open(path, 'w', encoding='utf-8') as file:
+                json.dump({'values': generate_values(count)}, file)
+
+            for query in QUERIES:
+                results = {}
+
+                for variant in VARIANTS:
+                    output = subprocess.run(
+                        [sys.executable, os.path.abspath(__file__), '--child', variant, query, path],
+                        check=True,
+                        capture_output=True,
+                        text=True
+                    ).stdout
+                    results[variant] = result = json.loads(output.strip().splitlines()[-1])
+
+                    print(
+                        f"  {query:<10} {variant:<8} {result['expenses']:>9,} "
+                        f"{result['seconds'] * 1000:>11.1f} "
+                        f"{result['peak_rss_kb'] / 1024:>14.1f} "
+                        f"{result['delta_rss_kb'] / 1024:>10.1f}"
+                    )
+
+                assert results['dicts']['expenses'] == results['records']['expenses']
+
+    print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Benchmark da leitura do histórico: usedRange em JSON x download do .xlsx.
+
+Gera fixtures com o mesmo conteúdo nos dois formatos e mede, para cada
+caminho de leitura do ExcelService, os bytes transferidos, o tempo de
+processamento no cliente e o pico de memória (RSS) do processo. Cada
+medição roda em um subprocesso próprio, para o pico de RSS não ser
+contaminado pelas anteriores. O tempo de rede não é simulado: ele cresce
+com os bytes transferidos.
+
+Caminhos comparados:
+    range-full    usedRange sem $select (values, text, formulas, formatos...)
+    range-values  usedRange com $select=values (caminho 'range')
+    download      .xlsx lido em blocos e processado em streaming (caminho 'download')
+
+Requer o openpyxl (requirements-dev.txt) para gerar as fixtures .xlsx.
+
+Uso:
+    python scripts/benchmark_history_download.py [--rows 10000 100000]
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+# Permitir importar os módulos da aplicação a partir de scripts/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.excel_service import (  # noqa: E402
+    DOWNLOAD_CHUNK_BYTES,
+    DOWNLOAD_SPOOL_MAX_BYTES,
+    ExcelService
+)
+from services.xlsx_reader import iter_worksheet_rows  # noqa: E402
+
+CATEGORIES = [
+    'Alimentação', 'Transporte', 'Moradia', 'Lazer', 'Saúde', 'Educação', 'Outros'
+]
+HEADER = ['Data', 'Descrição', 'Categoria', 'Valor']
+VARIANTS = ['range-full', 'range-values', 'download']
+
+
+def generate_values(count: int, seed: int = 42) -> list:
+    """Gera as linhas da planilha (cabeçalho + despesas, datas como série do Excel)."""
+    rng = random.Random(seed)
+    first_serial = 44927  # 2023-01-01
+
+    return [HEADER] + [
+        [
+            first_serial + rng.randrange(3 * 365),
+            f'Despesa {index}',
+            rng.choice(CATEGORIES),
+            round(rng.uniform(1, 500), 2)
+        ]
+        for index in range(count)
+    ]
+
+
+def write_fixtures(values: list, directory: str) -> dict:
+    """Grava as respostas equivalentes de cada caminho e retorna os arquivos."""
+    from openpyxl import Workbook
+
+    paths = {variant: os.path.join(directory, variant) for variant in VARIANTS}
+
+    # Resposta completa do usedRange: cada célula aparece em várias propriedades
+    text = [[str(value) for value in row] for row in values]
+    with open(paths['range-full'], 'w', encoding='utf-8') as file:
+        json.dump({
+            'address': f"Despesas!A1:D{len(values)}",
+            'rowCount': len(values),
+            'columnCount': 4,
+            'values': values,
+            'text': text,
+            'formulas': values,
+            'formulasLocal': values,
+            'formulasR1C1': values,
+            'numberFormat': [['General'] * 4 for _ in values],
+            'valueTypes': [['Double', 'String', 'String', 'Double'] for _ in values]
+        }, file)
+
+    with open(paths['range-values'], 'w', encoding='utf-8') as file:
+        json.dump({'values': values}, file)
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Despesas')
+    for row in values:
+        sheet.append(row)
+    workbook.save(paths['download'])
+
+    return paths
+
+
+def read_range(path: str) -> int:
+    """Processa a resposta do usedRange como o ExcelService (corpo inteiro + JSON)."""
+    with open(path, 'rb') as file:
+        body = file.read()
+
+    values = json.loads(body).get('values', [])
+    return len(list(ExcelService._parse_expense_rows(values)))
+
+
+def read_download(path: str) -> int:
+    """Processa o .xlsx como o ExcelService (blocos para arquivo temporário + leitura em streaming)."""
+    with open(path, 'rb') as file, tempfile.SpooledTemporaryFile(max_size=DOWNLOAD_SPOOL_MAX_BYTES) as content:
+        for chunk in iter(lambda: file.read(DOWNLOAD_CHUNK_BYTES), b''):
+            content.write(chunk)
+        content.seek(0)
+
+        rows = iter_worksheet_rows(content, 'Despesas', max_columns=4)
+        return len(list(ExcelService._parse_expense_rows(rows)))
+
+
+def peak_rss_kb() -> int:
+    """
+    Pico de memória residente do processo (VmHWM, em KB).
+
+    Diferente de ru_maxrss, o VmHWM não herda o pico do processo pai.
+    """
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith('VmHWM:'):
+                return int(line.split()[1])
+    raise RuntimeError("VmHWM indisponível (o benchmark de memória requer Linux)")
+
+
+def measure_child(variant: str, path: str) -> None:
+    """Executa uma leitura e imprime (em JSON) tempo, linhas e pico de RSS."""
+    reader = read_download if variant == 'download' else read_range
+
+    baseline = peak_rss_kb()
+    start = time.perf_counter()
+    count = reader(path)
+    elapsed = time.perf_counter() - start
+    peak = peak_rss_kb()
+
+    print(json.dumps({
+        'rows': count,
+        'seconds': elapsed,
+        'peak_rss_kb': peak,
+        'delta_rss_kb': peak - baseline
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000])
+    parser.add_argument('--child', nargs=2, metavar=('VARIANT', 'PATH'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        measure_child(*args.child)
+        return
+
+    for count in args.rows:
+        print(f"\n📊 Leitura do histórico com {count:,} despesas\n")
+        print(f"  {'caminho':<14} {'bytes':>12} {'tempo (ms)':>12} {'pico RSS (MB)':>14} {'+RSS (MB)':>10}")
+
+        with tempfile.TemporaryDirectory() as directory:
+            paths = write_fixtures(generate_values(count), directory)
+
+            for variant in VARIANTS:
+                output = subprocess.run(
+                    [sys.executable, os.path.abspath(__file__), '--child', variant, paths[variant]],
+                    check=True,
+                    capture_output=True,
+                    text=True
+                ).stdout
+                result = json.loads(output.strip().splitlines()[-1])
+
+                assert result['rows'] == count
+                print(
+                    f"  {variant:<14} {os.path.getsize(paths[variant]):>12,} "
+                    f"{result['seconds'] * 1000:>12.1f} "
+                    f"{result['peak_rss_kb'] / 1024:>14.1f} "
+                    f"{result['delta_rss_kb'] / 1024:>10.1f}"
+                )
+
+    print()
+
+
+if __name__ == '__main__':
+    main()
@@ -30,6 +30,14 @@ Diretrizes:
 - Seja sempre educado e empático
 - Use linguagem clara e acessível
 - Peça confirmação antes de registrar despesas
+- Para várias despesas na mesma mensagem, use bulk_add_expenses em uma única chamada
+- Para totais ("quanto gastei em..."), use get_expense_summary em vez de get_expense_history
+- Para rankings, evolução e comparações, use analyze_expenses, top_expenses,
+  expense_running_total e compare_expense_periods (nunca some linhas manualmente)
+- Para listar despesas específicas (período, faixa de valor, trecho da descrição),
+  use os filtros de get_expense_history em vez de buscar tudo e filtrar
+- Se get_expense_history retornar truncated=true, responda com o 'summary' e só peça
+  a próxima página (cursor=next_cursor) se o usuário precisar das despesas individuais
 - Forneça resumos claros quando solicitado
 - Use emojis quando apropriado (💰 📊 ✅)
 
@@ -39,6 +47,31 @@ Formato de dados:
 - Categorias comuns: Alimentação, Transporte, Moradia, Lazer, Saúde, Educação, Outros
 """
 
+# Parâmetros comuns às ferramentas de análise
+ANALYTICS_PARAMETERS = {
+    "workbook_id": {
+        "type": "string",
+        "description": "ID do arquivo Excel no OneDrive"
+    },
+    "worksheet_name": {
+        "type": "string",
+        "description": "Nome da planilha/aba"
+    },
+    "start_date": {
+        "type": "string",
+        "description": "Data inicial (inclusiva) no formato YYYY-MM-DD"
+    },
+    "end_date": {
+        "type": "string",
+        "description": "Data final (inclusiva) no formato YYYY-MM-DD"
+    },
+    "categories": {
+        "type": "array",
+        "description": "Considerar apenas estas categorias",
+        "items": {"type": "string"}
+    }
+}
+
 # Definição das ferramentas (tools)
 TOOLS = [
     {
@@ -78,11 +111,69 @@ TOOLS = [
             }
         }
     },
+    {
+        "type": "function",
+        "function": {
+            "name": "bulk_add_expenses",
+            "description": (
+                "Adiciona várias despesas de uma só vez à planilha. "
+                "Use sempre que o usuário informar mais de uma despesa na mesma mensagem"
+            ),
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "workbook_id": {
+                        "type": "string",
+                        "description": "ID do arquivo Excel no OneDrive"
+                    },
+                    "worksheet_name": {
+                        "type": "string",
+                        "description": "Nome da planilha/aba (ex: 'Despesas')"
+                    },
+                    "table_name": {
+                        "type": "string",
+                        "description": "Nome da tabela do Excel (opcional)"
+                    },
+                    "expenses": {
+                        "type": "array",
+                        "description": "Lista de despesas a adicionar",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "date": {
+                                    "type": "string",
+                                    "description": "Data da despesa no formato YYYY-MM-DD"
+                                },
+                                "description": {
+                                    "type": "string",
+                                    "description": "Descrição da despesa"
+                                },
+                                "category": {
+                                    "type": "string",
+                                    "description": "Categoria da despesa (ex: Alimentação, Transporte)"
+                                },
+                                "amount": {
+                                    "type": "number",
+                                    "description": "Valor da despesa em reais"
+                                }
+                            },
+                            "required": ["date", "description", "category", "amount"]
+                        }
+                    }
+                },
+                "required": ["workbook_id", "worksheet_name", "expenses"]
+            }
+        }
+    },
     {
         "type": "function",
         "function": {
             "name": "get_expense_history",
-            "description": "Recupera histórico de despesas da planilha",
+            "description": (
+                "Recupera histórico de despesas da planilha, paginado. As despesas vêm em "
+                "'columns'/'rows'. Se 'truncated' for true, há mais páginas (use "
+                "'next_cursor') e 'summary' traz os totais de todas as despesas"
+            ),
             "parameters": {
                 "type": "object",
                 "properties": {
@@ -96,18 +187,188 @@ TOOLS = [
                     },
                     "filters": {
                         "type": "object",
-                        "description": "Filtros opcionais (ex: {'category': 'Alimentação'})",
+                        "description": (
+                            "Filtros opcionais, combinados (ex: {'start_date': '2025-10-01', "
+                            "'min_amount': 100, 'sort_by': 'amount', 'descending': true, 'limit': 5})"
+                        ),
                         "properties": {
+                            "start_date": {
+                                "type": "string",
+                                "description": "Data inicial (inclusiva) no formato YYYY-MM-DD"
+                            },
+                            "end_date": {
+                                "type": "string",
+                                "description": "Data final (inclusiva) no formato YYYY-MM-DD"
+                            },
+                            "min_amount": {
+                                "type": "number",
+                                "description": "Valor mínimo (inclusivo) em R$"
+                            },
+                            "max_amount": {
+                                "type": "number",
+                                "description": "Valor máximo (inclusivo) em R$"
+                            },
                             "category": {
                                 "type": "string",
-                                "description": "Filtrar por categoria"
+                                "description": "Filtrar por uma categoria"
+                            },
+                            "categories": {
+                                "type": "array",
+                                "description": "Filtrar por qualquer uma destas categorias",
+                                "items": {"type": "string"}
+                            },
+                            "description_contains": {
+                                "type": "string",
+                                "description": "Trecho da descrição (ex: 'uber'), sem diferenciar maiúsculas"
+                            },
+                            "sort_by": {
+                                "type": "string",
+                                "enum": ["date", "amount"],
+                                "description": "Ordenar por data ou valor"
+                            },
+                            "descending": {
+                                "type": "boolean",
+                                "description": "Ordem decrescente (ex: maiores valores primeiro)"
+                            },
+                            "limit": {
+                                "type": "integer",
+                                "description": "Máximo de despesas no resultado, após ordenar (ex: 5 maiores)"
                             }
                         }
+                    },
+                    "limit": {
+                        "type": "integer",
+                        "description": "Máximo de despesas por página (padrão: 50)"
+                    },
+                    "cursor": {
+                        "type": "string",
+                        "description": "Valor de 'next_cursor' da página anterior, para continuar a lista"
+                    }
+                },
+                "required": ["workbook_id", "worksheet_name"]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "get_expense_summary",
+            "description": (
+                "Retorna totais de despesas (soma e quantidade), gerais e por categoria, "
+                "em um período. Prefira esta ferramenta para perguntas sobre quanto foi gasto"
+            ),
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "workbook_id": {
+                        "type": "string",
+                        "description": "ID do arquivo Excel no OneDrive"
+                    },
+                    "worksheet_name": {
+                        "type": "string",
+                        "description": "Nome da planilha/aba"
+                    },
+                    "start_date": {
+                        "type": "string",
+                        "description": "Data inicial (inclusiva) no formato YYYY-MM-DD"
+                    },
+                    "end_date": {
+                        "type": "string",
+                        "description": "Data final (inclusiva) no formato YYYY-MM-DD"
+                    },
+                    "categories": {
+                        "type": "array",
+                        "description": "Categorias com total próprio (ex: ['Alimentação'])",
+                        "items": {"type": "string"}
+                    }
+                },
+                "required": ["workbook_id", "worksheet_name"]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "analyze_expenses",
+            "description": "Totais, quantidades e médias de despesas agrupados por categoria, mês ou semana",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    **ANALYTICS_PARAMETERS,
+                    "group_by": {
+                        "type": "string",
+                        "enum": ["category", "month", "week"],
+                        "description": "Agrupamento dos totais"
+                    }
+                },
+                "required": ["workbook_id", "worksheet_name", "group_by"]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "top_expenses",
+            "description": "Maiores despesas individuais, ou maiores categorias/meses se group_by for informado",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    **ANALYTICS_PARAMETERS,
+                    "limit": {
+                        "type": "integer",
+                        "description": "Quantidade de itens (padrão: 5)"
+                    },
+                    "group_by": {
+                        "type": "string",
+                        "enum": ["category", "month", "week"],
+                        "description": "Ranquear grupos em vez de despesas individuais"
                     }
                 },
                 "required": ["workbook_id", "worksheet_name"]
             }
         }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "expense_running_total",
+            "description": "Evolução dos gastos: total por período e total acumulado",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    **ANALYTICS_PARAMETERS,
+                    "period": {
+                        "type": "string",
+                        "enum": ["day", "week", "month"],
+                        "description": "Granularidade da evolução (padrão: day)"
+                    }
+                },
+                "required": ["workbook_id", "worksheet_name"]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "compare_expense_periods",
+            "description": "Compara os gastos de dois períodos (ex: este mês x mês passado), no total e por categoria",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "workbook_id": ANALYTICS_PARAMETERS["workbook_id"],
+                    "worksheet_name": ANALYTICS_PARAMETERS["worksheet_name"],
+                    "categories": ANALYTICS_PARAMETERS["categories"],
+                    "current_start": {"type": "string", "description": "Início do período atual (YYYY-MM-DD)"},
+                    "current_end": {"type": "string", "description": "Fim do período atual (YYYY-MM-DD)"},
+                    "previous_start": {"type": "string", "description": "Início do período anterior (YYYY-MM-DD)"},
+                    "previous_end": {"type": "string", "description": "Fim do período anterior (YYYY-MM-DD)"}
+                },
+                "required": [
+                    "workbook_id", "worksheet_name",
+                    "current_start", "current_end", "previous_start", "previous_end"
+                ]
+            }
+        }
     }
 ]
 
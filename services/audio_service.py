@@ -6,13 +6,21 @@ e transcrevê-los usando a API Whisper da OpenAI.
 """
 
 import io
-import requests
 from typing import Optional
 
-from openai import OpenAI
-from config.settings import OPENAI_API_KEY, TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN
+from config.settings import (
+    OPENAI_API_KEY,
+    TWILIO_ACCOUNT_SID,
+    TWILIO_AUTH_TOKEN,
+    AUDIO_DOWNLOAD_TIMEOUT_SECONDS,
+    AUDIO_TRANSCRIPTION_TIMEOUT_SECONDS,
+)
+from services.http_transport import http_session, openai_client, openai_api_error, requests_api_error
+from utils.deadline import Deadline
 from utils.logger import setup_logger
 from utils.exceptions import FinancialAssistantError
+from utils.resilience import call_with_retry
+from utils.service_registry import registry
 
 # Logger específico deste módulo
 logger = setup_logger(__name__)
@@ -31,10 +39,11 @@ class AudioService:
         if not OPENAI_API_KEY:
             raise FinancialAssistantError("OPENAI_API_KEY não está configurada")
 
-        self.client = OpenAI(api_key=OPENAI_API_KEY)
+        # Cliente compartilhado com o OpenAIService (mesmo pool de conexões)
+        self.client = openai_client.get_instance()
         logger.info("AudioService inicializado")
 
-    def download_audio(self, media_url: str) -> bytes:
+    def download_audio(self, media_url: str, deadline: Optional[Deadline] = None) -> bytes:
         """
         Baixa o arquivo de áudio da URL fornecida pelo Twilio.
 
@@ -43,35 +52,50 @@ class AudioService:
 
         Args:
             media_url: URL completa do arquivo de mídia fornecida pelo Twilio
+            deadline: Prazo da requisição (opcional)
 
         Returns:
             bytes: Conteúdo binário do arquivo de áudio
 
         Raises:
             FinancialAssistantError: Se houver erro no download
+            DeadlineExceededError: Se o prazo já estiver esgotado
         """
-        try:
-            logger.debug(f"Baixando áudio de: {media_url[:50]}...")
+        import requests
+
+        if deadline is not None:
+            deadline.check("download_audio")
+
+        logger.debug(f"Baixando áudio de: {media_url[:50]}...")
 
-            # Twilio requer autenticação HTTP Basic com Account SID e Auth Token
-            auth = (TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
+        # Twilio requer autenticação HTTP Basic com Account SID e Auth Token
+        auth = (TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
 
-            # Fazer requisição HTTP GET para baixar o áudio
-            response = requests.get(media_url, auth=auth, timeout=30)  # Timeout de 30 segundos
+        def download() -> bytes:
+            timeout = AUDIO_DOWNLOAD_TIMEOUT_SECONDS
+            if deadline is not None:
+                timeout = deadline.limit(timeout)
 
-            # Verificar se a requisição foi bem-sucedida
-            response.raise_for_status()
+            try:
+                # Fazer requisição HTTP GET para baixar o áudio
+                response = http_session.get(media_url, auth=auth, timeout=timeout)
 
-            audio_data = response.content
-            logger.info(f"Áudio baixado com sucesso. Tamanho: {len(audio_data)} bytes")
+                # Verificar se a requisição foi bem-sucedida
+                response.raise_for_status()
+                return response.content
 
-            return audio_data
+            except requests.exceptions.RequestException as e:
+                raise requests_api_error(e, FinancialAssistantError, "Falha ao baixar arquivo de áudio") from e
 
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Erro ao baixar áudio: {str(e)}")
-            raise FinancialAssistantError(f"Falha ao baixar arquivo de áudio: {str(e)}") from e
+        # Download é idempotente: falhas transitórias são repetidas dentro do prazo
+        audio_data = call_with_retry(download, "twilio", deadline=deadline)
+        logger.info(f"Áudio baixado com sucesso. Tamanho: {len(audio_data)} bytes")
 
-    def transcribe_audio(self, audio_data: bytes, filename: str = "audio.ogg") -> str:
+        return audio_data
+
+    def transcribe_audio(
+        self, audio_data: bytes, filename: str = "audio.ogg", deadline: Optional[Deadline] = None
+    ) -> str:
         """
         Transcreve o áudio usando a API Whisper da OpenAI.
 
@@ -82,25 +106,43 @@ class AudioService:
             audio_data: Dados binários do arquivo de áudio
             filename: Nome do arquivo (usado para indicar formato)
                      Padrão: "audio.ogg" (formato usado pelo WhatsApp)
+            deadline: Prazo da requisição (opcional)
 
         Returns:
             str: Texto transcrito do áudio
 
         Raises:
             FinancialAssistantError: Se houver erro na transcrição
+            DeadlineExceededError: Se o prazo já estiver esgotado
         """
-        try:
-            logger.debug(f"Transcrevendo áudio usando Whisper API. " f"Tamanho: {len(audio_data)} bytes")
+        if deadline is not None:
+            deadline.check("transcribe_audio")
 
-            # Criar um objeto file-like a partir dos bytes
+        def transcribe():
+            timeout = AUDIO_TRANSCRIPTION_TIMEOUT_SECONDS
+            if deadline is not None:
+                timeout = deadline.limit(timeout)
+
+            # Criar um objeto file-like a partir dos bytes (novo a cada tentativa)
             audio_file = io.BytesIO(audio_data)
             audio_file.name = filename  # Whisper usa o nome para detectar formato
 
-            # Chamar API Whisper para transcrição
-            # Usando modelo padrão "whisper-1"
-            transcript = self.client.audio.transcriptions.create(
-                model="whisper-1", file=audio_file, language="pt"  # Forçar português brasileiro
-            )
+            try:
+                # Chamar API Whisper para transcrição
+                # Usando modelo padrão "whisper-1"
+                return self.client.audio.transcriptions.create(
+                    model="whisper-1",
+                    file=audio_file,
+                    language="pt",  # Forçar português brasileiro
+                    timeout=timeout,
+                )
+            except Exception as e:
+                raise openai_api_error(e, FinancialAssistantError, "Falha ao transcrever áudio") from e
+
+        try:
+            logger.debug(f"Transcrevendo áudio usando Whisper API. " f"Tamanho: {len(audio_data)} bytes")
+
+            transcript = call_with_retry(transcribe, "openai", deadline=deadline)
 
             # Extrair texto transcrito
             transcribed_text = transcript.text.strip()
@@ -114,7 +156,7 @@ class AudioService:
             logger.error(f"Erro ao transcrever áudio: {str(e)}")
             raise FinancialAssistantError(f"Falha ao transcrever áudio: {str(e)}") from e
 
-    def process_audio_message(self, media_url: str) -> str:
+    def process_audio_message(self, media_url: str, deadline: Optional[Deadline] = None) -> str:
         """
         Processa uma mensagem de áudio completa: baixa e transcreve.
 
@@ -123,6 +165,7 @@ class AudioService:
 
         Args:
             media_url: URL do arquivo de mídia fornecida pelo Twilio
+            deadline: Prazo da requisição (opcional)
 
         Returns:
             str: Texto transcrito do áudio
@@ -134,11 +177,11 @@ class AudioService:
 
         try:
             # Etapa 1: Baixar o áudio
-            audio_data = self.download_audio(media_url)
+            audio_data = self.download_audio(media_url, deadline)
 
             # Etapa 2: Transcrever usando Whisper
             # WhatsApp via Twilio geralmente envia em formato OGG
-            transcription = self.transcribe_audio(audio_data, filename="audio.ogg")
+            transcription = self.transcribe_audio(audio_data, filename="audio.ogg", deadline=deadline)
 
             logger.info("Mensagem de áudio processada com sucesso")
             return transcription
@@ -151,5 +194,5 @@ class AudioService:
             raise FinancialAssistantError("Erro ao processar mensagem de áudio") from e
 
 
-# Instância global do serviço (singleton pattern)
-audio_service = AudioService()
+# Instância global do serviço (singleton pattern, criada no primeiro uso)
+audio_service = registry.register("audio_service", AudioService)
@@ -6,11 +6,14 @@ e fornece métodos para manipular planilhas Excel no OneDrive.
 Inclui gerenciamento automático de tokens (refresh quando expiram).
 """
 
-import os
+import tempfile
+import threading
 import time
-import json
-import requests
-from typing import Dict, Any, List, Optional
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Set, Tuple
+from urllib.parse import quote
 
 from config.settings import (
     MS_GRAPH_CLIENT_ID,
@@ -18,17 +21,75 @@ from config.settings import (
     MS_GRAPH_TENANT_ID,
     MS_GRAPH_REFRESH_TOKEN,
     MS_GRAPH_ACCESS_TOKEN,
-    MS_GRAPH_TOKEN_EXPIRATION_INITIAL
+    MS_GRAPH_TOKEN_EXPIRATION_INITIAL,
+    MS_GRAPH_TOKEN_REFRESH_MARGIN_SECONDS,
+    MS_GRAPH_TOKEN_LOCK_SECONDS,
+    MS_GRAPH_TOKEN_WAIT_SECONDS,
+    GRAPH_REQUEST_TIMEOUT_SECONDS,
+    GRAPH_BATCH_WINDOW_MS,
+    EXCEL_WORKBOOK_SESSION_TTL_SECONDS,
+    EXCEL_WORKBOOK_SESSION_REFRESH_MARGIN_SECONDS,
+    EXCEL_EXPENSE_TABLE_NAME,
+    EXCEL_HISTORY_READ_MODE,
+    EXCEL_HISTORY_DOWNLOAD_MIN_BYTES,
+    EXCEL_WORKSHEET_SHARDING
 )
+from data_access.row_cursor_store import RowCursorStore, create_row_cursor_store
+from data_access.token_store import TokenStore, create_token_store
+from services.expense_cache import ExpenseHistoryCache, create_expense_cache
+from services.expense_filters import Predicate, compile_filters
+from services.expense_records import Expense
+from services.graph_batch import (
+    GRAPH_BATCH_MAX_REQUESTS,
+    GraphBatchCoalescer,
+    WORKBOOK_SESSION_HEADER,
+    workbook_id_from_url
+)
+from services.http_transport import http_session, requests_api_error
+from services.worksheet_shards import (
+    SHARDING_MONTH,
+    SHARDING_NONE,
+    WORKSHEET_COMPACTION_JOB,
+    expense_day,
+    is_archived,
+    select_worksheets,
+    shard_name,
+    shard_period
+)
+from services.xlsx_reader import iter_worksheet_rows
+from tools.execution_engine import bind_tool_context, current_tool_context
 from utils.logger import setup_logger
-from utils.exceptions import MicrosoftGraphAPIError
+from utils.exceptions import MicrosoftGraphAPIError, DynamoDBError
+from utils.resilience import call_with_retry
+from utils.service_registry import registry
 
 # Logger específico deste módulo
 logger = setup_logger(__name__)
 
-# Arquivo local para persistir tokens (apenas para desenvolvimento local)
-# NÃO USAR EM PRODUÇÃO! Em produção, use AWS Secrets Manager ou similar
-LOCAL_TOKEN_FILE = ".ms_graph_tokens.json"
+GRAPH_BASE_URL = "https://graph.microsoft.com/v1.0"
+
+# Colunas das despesas na planilha: data, descrição, categoria, valor
+EXPENSE_FIRST_COLUMN = "A"
+EXPENSE_LAST_COLUMN = "D"
+DATE_COLUMN = "A"
+CATEGORY_COLUMN = "C"
+AMOUNT_COLUMN = "D"
+
+# Cabeçalho das abas de período criadas pela aplicação
+EXPENSE_HEADER = ['Data', 'Descrição', 'Categoria', 'Valor']
+
+# Data base dos números de série de datas do Excel
+EXCEL_EPOCH = date(1899, 12, 30)
+
+# Download do .xlsx: tamanho dos blocos lidos da rede e limite mantido em
+# memória antes de o arquivo temporário passar para o disco (/tmp)
+DOWNLOAD_CHUNK_BYTES = 256 * 1024
+DOWNLOAD_SPOOL_MAX_BYTES = 8 * 1024 * 1024
+
+# Após uma escrita da aplicação, o arquivo do OneDrive pode levar um tempo
+# para refletir as alterações feitas pela API do workbook; nesse intervalo
+# o histórico é lido pelo usedRange (segundos)
+DOWNLOAD_AFTER_WRITE_DELAY_SECONDS = 300
 
 
 class ExcelService:
@@ -39,84 +100,175 @@ class ExcelService:
     operações CRUD em planilhas Excel no OneDrive.
     """
     
-    def __init__(self):
-        """Inicializa o serviço e carrega/atualiza tokens."""
+    def __init__(
+        self,
+        token_store: Optional[TokenStore] = None,
+        history_cache: Optional[ExpenseHistoryCache] = None,
+        row_cursors: Optional[RowCursorStore] = None
+    ):
+        """
+        Inicializa o serviço com os tokens das variáveis de ambiente.
+        
+        Os tokens renovados ficam no armazenamento de tokens (DynamoDB
+        em produção), consultado apenas quando o token em memória está
+        perto de expirar. Nenhuma requisição de rede é feita aqui.
+        
+        Args:
+            token_store: Armazenamento de tokens (padrão: create_token_store())
+            history_cache: Cache do histórico (padrão: create_expense_cache())
+            row_cursors: Cursores da próxima linha livre (padrão: create_row_cursor_store())
+        """
         # Variáveis de instância para tokens
-        self.access_token: Optional[str] = None
-        self.refresh_token: Optional[str] = None
+        self.access_token: Optional[str] = MS_GRAPH_ACCESS_TOKEN
+        self.refresh_token: Optional[str] = MS_GRAPH_REFRESH_TOKEN
         self.token_expiration_time: float = 0
         
-        # Carregar tokens de forma segura
-        self._load_tokens_securely()
+        if self.access_token and int(MS_GRAPH_TOKEN_EXPIRATION_INITIAL or 0):
+            # Converter tempo de expiração inicial para timestamp futuro
+            self.token_expiration_time = (
+                time.time() + int(MS_GRAPH_TOKEN_EXPIRATION_INITIAL)
+            )
+        
+        if token_store is None:
+            token_store = create_token_store(
+                min_validity_seconds=MS_GRAPH_TOKEN_REFRESH_MARGIN_SECONDS
+            )
+        self.token_store = token_store
+        
+        # Evita renovações simultâneas entre threads do mesmo container
+        self._token_lock = threading.Lock()
+        
+        # (workbook_id, tabela) sem tabela do Excel: escrita via intervalo
+        self._missing_tables: Set[Tuple[str, str]] = set()
+        
+        # Momento da última escrita da aplicação em cada workbook
+        self._last_writes: Dict[str, float] = {}
+        
+        # Linhas já lidas de cada planilha, validadas pela versão do workbook
+        self.history_cache = history_cache or create_expense_cache()
+        
+        # Próxima linha livre de cada planilha (escrita sem ler o usedRange)
+        self.row_cursors = row_cursors or create_row_cursor_store()
+        
+        # Leituras de várias abas de período: {(workbook_id, base): (partes, lista unida)}
+        self._merged_loads: Dict[Tuple[str, str], Tuple[List[Any], List[Expense]]] = {}
+        
+        # Sessões persistentes por workbook: {workbook_id: {'id', 'last_used'}}
+        self._workbook_sessions: Dict[str, Dict[str, Any]] = {}
+        self._session_lock = threading.Lock()
+        
+        # Criação/renovação de sessão em andamento por workbook: {workbook_id: Event}
+        self._session_flights: Dict[str, threading.Event] = {}
+        
+        # Agrupa chamadas concorrentes ao Graph (ex: tool calls paralelas) em $batch
+        self._batch: Optional[GraphBatchCoalescer] = None
+        if GRAPH_BATCH_WINDOW_MS > 0:
+            self._batch = GraphBatchCoalescer(
+                GRAPH_BASE_URL,
+                send_single=self._send,
+                send_batch=self._send_batch,
+                window_seconds=GRAPH_BATCH_WINDOW_MS / 1000,
+                wait_timeout=GRAPH_REQUEST_TIMEOUT_SECONDS + 1
+            )
         
         logger.info("Excel Service inicializado")
     
-    def _load_tokens_securely(self) -> None:
+    def _token_is_fresh(self) -> bool:
+        """Indica se o access token em memória ainda não precisa de renovação."""
+        return bool(self.access_token) and (
+            self.token_expiration_time
+            > time.time() + MS_GRAPH_TOKEN_REFRESH_MARGIN_SECONDS
+        )
+    
+    def _adopt_stored_tokens(self) -> bool:
         """
-        Carrega tokens do arquivo local ou variáveis de ambiente.
+        Carrega os tokens do armazenamento, se forem mais recentes.
         
-        Para desenvolvimento local: tenta carregar do arquivo de tokens,
-        senão usa os do .env e tenta fazer refresh se necessário.
+        Returns:
+            bool: True se o access token carregado ainda está fresco
         """
-        # Tentar carregar do arquivo local primeiro
-        if os.path.exists(LOCAL_TOKEN_FILE):
-            try:
-                with open(LOCAL_TOKEN_FILE, 'r') as f:
-                    tokens = json.load(f)
-                    self.access_token = tokens.get('access_token')
-                    self.refresh_token = tokens.get('refresh_token')
-                    self.token_expiration_time = tokens.get('expiration_time', 0)
-                logger.info("Tokens do Microsoft Graph carregados do arquivo local")
-            except Exception as e:
-                logger.warning(
-                    f"Falha ao carregar tokens locais: {e}. "
-                    "Usando variáveis de ambiente."
-                )
-        
-        # Se ainda não tem tokens, usar do ambiente
-        if not self.refresh_token and MS_GRAPH_REFRESH_TOKEN:
-            self.refresh_token = MS_GRAPH_REFRESH_TOKEN
+        try:
+            tokens = self.token_store.load()
+        except DynamoDBError as e:
+            logger.warning(f"Armazenamento de tokens indisponível: {str(e)}")
+            return False
         
-        if not self.access_token and MS_GRAPH_ACCESS_TOKEN:
-            self.access_token = MS_GRAPH_ACCESS_TOKEN
+        if tokens and tokens.get('expiration_time', 0) > self.token_expiration_time:
+            self.access_token = tokens.get('access_token')
+            self.refresh_token = tokens.get('refresh_token') or self.refresh_token
+            self.token_expiration_time = tokens.get('expiration_time', 0)
+            logger.debug("Tokens do Microsoft Graph carregados do armazenamento")
         
-        if self.token_expiration_time == 0 and MS_GRAPH_TOKEN_EXPIRATION_INITIAL:
-            # Converter tempo de expiração inicial para timestamp futuro
-            self.token_expiration_time = (
-                time.time() + int(MS_GRAPH_TOKEN_EXPIRATION_INITIAL)
-            )
+        return self._token_is_fresh()
+    
+    def _save_tokens(self) -> None:
+        """Salva os tokens renovados no armazenamento compartilhado."""
+        tokens = {
+            'access_token': self.access_token,
+            'refresh_token': self.refresh_token,
+            'expiration_time': self.token_expiration_time
+        }
         
-        # Se o access token está ausente ou expirando, fazer refresh
-        if self.refresh_token and (
-            not self.access_token or 
-            self.token_expiration_time < time.time() + 300  # 5 minutos
-        ):
-            logger.info(
-                "Access token ausente ou expirando em breve. "
-                "Fazendo refresh..."
-            )
-            self._refresh_access_token()
+        try:
+            self.token_store.save(tokens)
+            logger.info("Tokens do Microsoft Graph salvos no armazenamento")
+        except DynamoDBError as e:
+            logger.error(f"Erro ao salvar tokens: {str(e)}")
     
-    def _save_tokens_securely(self) -> None:
+    def _ensure_access_token(self) -> None:
         """
-        Persiste tokens atualizados no arquivo local.
+        Garante um access token válido, renovando-o se necessário.
         
-        ATENÇÃO: Apenas para desenvolvimento local!
-        Em produção, use AWS Secrets Manager, Parameter Store ou similar.
+        Fluxo (single-flight entre containers):
+        1. Token em memória ainda fresco: nada a fazer
+        2. Outro container já renovou: usar o token armazenado
+        3. Obter o lock de renovação e renovar (apenas um container por vez)
+        4. Sem o lock: usar o token atual enquanto não expirar, ou aguardar
+           a renovação do outro container
+        
+        Raises:
+            MicrosoftGraphAPIError: Se não for possível obter um token válido
         """
-        try:
-            tokens = {
-                'access_token': self.access_token,
-                'refresh_token': self.refresh_token,
-                'expiration_time': self.token_expiration_time
-            }
+        with self._token_lock:
+            if self._token_is_fresh() or self._adopt_stored_tokens():
+                return
             
-            with open(LOCAL_TOKEN_FILE, 'w') as f:
-                json.dump(tokens, f)
+            owner = str(uuid.uuid4())
             
-            logger.info("Tokens do Microsoft Graph salvos no arquivo local")
-        except Exception as e:
-            logger.error(f"Erro ao salvar tokens localmente: {e}")
+            try:
+                acquired = self.token_store.try_acquire_refresh_lock(
+                    owner, MS_GRAPH_TOKEN_LOCK_SECONDS
+                )
+            except DynamoDBError as e:
+                # Sem coordenação disponível, renovar mesmo assim
+                logger.warning(f"Lock de refresh indisponível: {str(e)}")
+                self._refresh_access_token()
+                return
+            
+            if acquired:
+                try:
+                    # Outro container pode ter renovado antes do lock
+                    if not self._adopt_stored_tokens():
+                        self._refresh_access_token()
+                finally:
+                    self.token_store.release_refresh_lock(owner)
+                return
+            
+            # Outro container está renovando o token
+            if self.access_token and self.token_expiration_time > time.time():
+                logger.debug("Renovação em andamento em outro container; usando token atual")
+                return
+            
+            wait_until = time.monotonic() + MS_GRAPH_TOKEN_WAIT_SECONDS
+            while time.monotonic() < wait_until:
+                time.sleep(0.25)
+                if self._adopt_stored_tokens():
+                    return
+            
+            raise MicrosoftGraphAPIError(
+                "Renovação do access token em andamento em outro processo",
+                retryable=True
+            )
     
     def _refresh_access_token(self) -> None:
         """
@@ -146,36 +298,356 @@ class ExcelService:
             'refresh_token': self.refresh_token
         }
         
+        logger.debug("Requisitando novo access token...")
+        response = self._request(
+            'POST',
+            token_url,
+            "Falha ao renovar access token",
+            idempotent=False,  # O refresh token pode ser rotacionado
+            headers=headers,
+            data=data
+        )
+        
+        token_data = response.json()
+        
+        # Atualizar tokens
+        self.access_token = token_data['access_token']
+        
+        # Refresh token pode ou não ser atualizado
+        if 'refresh_token' in token_data:
+            self.refresh_token = token_data['refresh_token']
+        
+        # Calcular tempo de expiração
+        expires_in = token_data.get('expires_in', 3600)
+        self.token_expiration_time = time.time() + expires_in
+        
+        # Salvar tokens atualizados (compartilhados com os demais containers)
+        self._save_tokens()
+        
+        logger.info("Access token do Microsoft Graph renovado com sucesso")
+    
+    def _request(
+        self,
+        method: str,
+        url: str,
+        error_message: str,
+        idempotent: bool = True,
+        use_session: bool = True,
+        **kwargs: Any
+    ) -> Any:
+        """
+        Faz uma requisição HTTP com retry, backoff e circuit breaker.
+        
+        Usa a sessão HTTP compartilhada. Chamadas ao Graph feitas ao mesmo
+        tempo por outras threads são agrupadas em um único $batch. Erros
+        transitórios (429/5xx, falhas de conexão) são repetidos dentro do
+        prazo da ferramenta em execução; os demais são lançados imediatamente.
+        
+        Chamadas a um workbook levam o header da sessão persistente do
+        workbook; se a sessão tiver expirado no servidor, ela é recriada
+        e a requisição é repetida uma vez.
+        
+        Args:
+            method: Método HTTP ('GET', 'POST', 'PATCH', ...)
+            url: URL da requisição
+            error_message: Descrição usada na mensagem de erro
+            idempotent: Se a requisição pode ser repetida com segurança
+            use_session: Se deve usar a sessão persistente do workbook
+            **kwargs: Argumentos repassados para requests (headers, json, data)
+        
+        Returns:
+            requests.Response: Resposta bem-sucedida (2xx)
+        
+        Raises:
+            MicrosoftGraphAPIError: Se a requisição falhar
+            CircuitOpenError: Se o Microsoft Graph estiver indisponível
+        """
+        workbook_id = workbook_id_from_url(url) if use_session else None
+        session_id = self._workbook_session(workbook_id) if workbook_id else None
+        
         try:
-            logger.debug("Requisitando novo access token...")
-            response = requests.post(token_url, headers=headers, data=data)
-            response.raise_for_status()
+            return self._call(method, url, error_message, idempotent, session_id, kwargs)
             
-            token_data = response.json()
+        except MicrosoftGraphAPIError as e:
+            if not session_id or not self._is_session_error(e):
+                raise
             
-            # Atualizar tokens
-            self.access_token = token_data['access_token']
+            logger.warning(f"Sessão do workbook {workbook_id} expirada; recriando")
+            self._invalidate_workbook_session(workbook_id, session_id)
+            session_id = self._workbook_session(workbook_id)
             
-            # Refresh token pode ou não ser atualizado
-            if 'refresh_token' in token_data:
-                self.refresh_token = token_data['refresh_token']
+            return self._call(method, url, error_message, idempotent, session_id, kwargs)
+    
+    def _call(
+        self,
+        method: str,
+        url: str,
+        error_message: str,
+        idempotent: bool,
+        session_id: Optional[str],
+        kwargs: Dict[str, Any]
+    ) -> Any:
+        """Executa a requisição (com a sessão do workbook, se houver) sob a política de retry."""
+        if session_id:
+            kwargs = dict(kwargs)
+            kwargs['headers'] = {**kwargs.get('headers', {}), WORKBOOK_SESSION_HEADER: session_id}
+        
+        def send():
+            # Downloads em streaming (corpo binário) não cabem em um $batch
+            if self._batch is not None and url.startswith(GRAPH_BASE_URL) and not kwargs.get('stream'):
+                # Cada chamador aguarda o lote só até o seu próprio prazo
+                return self._batch.submit(
+                    method, url, error_message, idempotent,
+                    wait_timeout=self._request_timeout(), **kwargs
+                )
+            return self._send(method, url, error_message, idempotent, **kwargs)
+        
+        context = current_tool_context()
+        deadline = context.deadline if context is not None else None
+        
+        return call_with_retry(send, "microsoft_graph", deadline=deadline)
+    
+    def _request_many(self, calls: List[Tuple[str, str, str, Dict[str, Any]]]) -> List[Any]:
+        """
+        Faz várias requisições independentes ao mesmo tempo.
+        
+        Com o agrupamento habilitado, as chamadas concorrentes são enviadas
+        juntas em $batch; sem ele, são feitas em sequência.
+        
+        Args:
+            calls: Lista de (method, url, error_message, kwargs)
+        
+        Returns:
+            list: Respostas na mesma ordem das chamadas
+        
+        Raises:
+            MicrosoftGraphAPIError: Se alguma requisição falhar
+        """
+        def call(item: Tuple[str, str, str, Dict[str, Any]]) -> Any:
+            method, url, error_message, kwargs = item
+            return self._request(method, url, error_message, **kwargs)
+        
+        if self._batch is None or len(calls) < 2:
+            return [call(item) for item in calls]
+        
+        workers = min(len(calls), GRAPH_BATCH_MAX_REQUESTS)
+        with self._batch.group(), \
+                ThreadPoolExecutor(max_workers=workers, thread_name_prefix='graph') as pool:
+            return list(pool.map(bind_tool_context(call), calls))
+    
+    def _workbook_session(self, workbook_id: str) -> Optional[str]:
+        """
+        Retorna a sessão persistente do workbook, criando-a se necessário.
+        
+        A sessão é reutilizada enquanto estiver dentro do TTL de inatividade
+        do Excel; perto de expirar, é renovada (refreshSession). Se não for
+        possível criar a sessão, as chamadas seguem sem sessão.
+        
+        A criação e a renovação são feitas por uma única thread por
+        workbook, sem segurar o lock durante a requisição: as demais
+        aguardam o resultado até o próprio prazo e, se ele acabar antes,
+        seguem sem sessão.
+        
+        Args:
+            workbook_id: ID do workbook no OneDrive
+        
+        Returns:
+            str: ID da sessão, ou None se sessões estiverem desativadas/indisponíveis
+        
+        Raises:
+            DeadlineExceededError: Se a ferramenta foi cancelada ou o prazo expirou
+        """
+        if EXCEL_WORKBOOK_SESSION_TTL_SECONDS <= 0:
+            return None
+        
+        while True:
+            with self._session_lock:
+                session = self._workbook_sessions.get(workbook_id)
+                now = time.monotonic()
+                refresh_after = (
+                    EXCEL_WORKBOOK_SESSION_TTL_SECONDS
+                    - EXCEL_WORKBOOK_SESSION_REFRESH_MARGIN_SECONDS
+                )
+                
+                if session is not None and now - session['last_used'] < refresh_after:
+                    session['last_used'] = now
+                    return session['id']
+                
+                flight = self._session_flights.get(workbook_id)
+                if flight is None:
+                    flight = self._session_flights[workbook_id] = threading.Event()
+                    break
             
-            # Calcular tempo de expiração
-            expires_in = token_data.get('expires_in', 3600)
-            self.token_expiration_time = time.time() + expires_in
+            # Outra thread está criando ou renovando a sessão
+            if not flight.wait(self._request_timeout()):
+                logger.warning(f"Sessão do workbook {workbook_id} ainda em criação; seguindo sem sessão")
+                return None
+        
+        try:
+            session_id = self._open_workbook_session(workbook_id, session)
             
-            # Salvar tokens atualizados
-            self._save_tokens_securely()
+            with self._session_lock:
+                if session_id:
+                    self._workbook_sessions[workbook_id] = {
+                        'id': session_id,
+                        'last_used': time.monotonic()
+                    }
+                else:
+                    self._workbook_sessions.pop(workbook_id, None)
             
-            logger.info("Access token do Microsoft Graph renovado com sucesso")
+            return session_id
+        finally:
+            with self._session_lock:
+                del self._session_flights[workbook_id]
+            flight.set()
+    
+    def _open_workbook_session(
+        self,
+        workbook_id: str,
+        session: Optional[Dict[str, Any]]
+    ) -> Optional[str]:
+        """Renova a sessão atual, se ainda não expirou, ou cria uma nova."""
+        if session is not None and (
+            time.monotonic() - session['last_used'] < EXCEL_WORKBOOK_SESSION_TTL_SECONDS
+            and self._refresh_workbook_session(workbook_id, session['id'])
+        ):
+            return session['id']
+        
+        return self._create_workbook_session(workbook_id)
+    
+    def _create_workbook_session(self, workbook_id: str) -> Optional[str]:
+        """Cria uma sessão persistente (as alterações são salvas no arquivo)."""
+        try:
+            response = self._request(
+                'POST',
+                f"{GRAPH_BASE_URL}/me/drive/items/{workbook_id}/workbook/createSession",
+                "Falha ao criar sessão do workbook",
+                use_session=False,
+                headers=self._get_headers(),
+                json={'persistChanges': True}
+            )
+        except MicrosoftGraphAPIError as e:
+            logger.warning(f"Seguindo sem sessão de workbook: {str(e)}")
+            return None
+        
+        logger.info(f"Sessão persistente criada para o workbook {workbook_id}")
+        return response.json().get('id')
+    
+    def _refresh_workbook_session(self, workbook_id: str, session_id: str) -> bool:
+        """Renova uma sessão prestes a expirar. Retorna False se ela já expirou."""
+        try:
+            self._request(
+                'POST',
+                f"{GRAPH_BASE_URL}/me/drive/items/{workbook_id}/workbook/refreshSession",
+                "Falha ao renovar sessão do workbook",
+                use_session=False,
+                headers={**self._get_headers(), WORKBOOK_SESSION_HEADER: session_id}
+            )
+            return True
+        except MicrosoftGraphAPIError as e:
+            logger.info(f"Sessão do workbook {workbook_id} não renovada: {str(e)}")
+            return False
+    
+    def _invalidate_workbook_session(self, workbook_id: str, session_id: str) -> None:
+        """Descarta a sessão do cache (se ainda for a mesma)."""
+        with self._session_lock:
+            session = self._workbook_sessions.get(workbook_id)
+            if session is not None and session['id'] == session_id:
+                del self._workbook_sessions[workbook_id]
+    
+    def _is_session_error(self, error: MicrosoftGraphAPIError) -> bool:
+        """Indica se o erro é de sessão de workbook expirada ou inexistente."""
+        return error.status_code in (400, 404) and 'session' in str(error).lower()
+    
+    def _send(
+        self,
+        method: str,
+        url: str,
+        error_message: str,
+        idempotent: bool = True,
+        timeout: Optional[float] = None,
+        **kwargs: Any
+    ) -> Any:
+        """
+        Envia uma única requisição HTTP (sem retry).
+        
+        Args:
+            timeout: Timeout da requisição (padrão: o prazo da ferramenta,
+                     ver _request_timeout)
+        
+        Raises:
+            MicrosoftGraphAPIError: Se a requisição falhar
+        """
+        import requests
+        
+        if timeout is None:
+            timeout = self._request_timeout()
+        
+        try:
+            response = http_session.request(method, url, timeout=timeout, **kwargs)
+            response.raise_for_status()
+            return response
             
         except requests.exceptions.RequestException as e:
-            error_text = e.response.text if e.response else str(e)
-            logger.error(f"Erro ao renovar access token: {error_text}")
-            raise MicrosoftGraphAPIError(
-                f"Falha ao renovar access token: {error_text}"
+            raise requests_api_error(
+                e, MicrosoftGraphAPIError, error_message, idempotent
             ) from e
     
+    def _send_batch(
+        self,
+        requests_body: List[Dict[str, Any]],
+        idempotent: bool,
+        timeout: float
+    ) -> Dict[str, Any]:
+        """
+        Envia um lote de sub-requisições ao endpoint /$batch do Graph.
+        
+        O lote atende a vários chamadores, então usa o timeout recebido
+        (o maior prazo entre eles) e não o prazo da thread que o envia.
+        
+        Args:
+            requests_body: Sub-requisições no formato do JSON batching
+            idempotent: Se todas as sub-requisições podem ser repetidas
+            timeout: Timeout da requisição em segundos
+        
+        Returns:
+            dict: Corpo da resposta ({'responses': [...]})
+        
+        Raises:
+            MicrosoftGraphAPIError: Se o lote falhar como um todo
+        """
+        response = self._send(
+            'POST',
+            f"{GRAPH_BASE_URL}/$batch",
+            "Falha ao enviar lote de requisições",
+            idempotent,
+            timeout,
+            headers=self._get_headers(),
+            json={'requests': requests_body}
+        )
+        return response.json()
+    
+    def _request_timeout(self) -> float:
+        """
+        Retorna o timeout da próxima requisição ao Graph.
+        
+        Quando chamado de dentro de uma ferramenta, usa apenas o tempo
+        restante do prazo da execução (e interrompe a ferramenta se ela
+        já foi cancelada).
+        
+        Returns:
+            float: Timeout em segundos
+        
+        Raises:
+            DeadlineExceededError: Se a ferramenta foi cancelada ou o prazo expirou
+        """
+        context = current_tool_context()
+        if context is None:
+            return GRAPH_REQUEST_TIMEOUT_SECONDS
+        
+        context.check()
+        return context.deadline.limit(GRAPH_REQUEST_TIMEOUT_SECONDS)
+    
     def _get_headers(self) -> Dict[str, str]:
         """
         Retorna headers HTTP com token de autenticação válido.
@@ -185,13 +657,13 @@ class ExcelService:
         Returns:
             dict: Headers HTTP com Authorization
         """
-        # Verificar se precisa fazer refresh (< 1 minuto para expirar)
-        if not self.access_token or self.token_expiration_time < time.time() + 60:
+        # Renovação proativa (MS_GRAPH_TOKEN_REFRESH_MARGIN_SECONDS antes de expirar)
+        if not self._token_is_fresh():
             logger.info(
                 "Access token ausente ou próximo de expirar. "
                 "Fazendo refresh..."
             )
-            self._refresh_access_token()
+            self._ensure_access_token()
         
         return {
             'Authorization': f'Bearer {self.access_token}',
@@ -224,135 +696,1110 @@ class ExcelService:
         Raises:
             MicrosoftGraphAPIError: Se houver erro ao adicionar despesa
         """
-        try:
-            logger.debug(
-                f"Adicionando despesa ao workbook {workbook_id}, "
-                f"planilha {worksheet_name}"
-            )
-            
-            # Endpoint para adicionar linha à tabela
-            # NOTA: Este é um exemplo. Você precisará ajustar conforme
-            # a estrutura da sua planilha e se está usando uma Table ou Range
-            url = (
-                f"https://graph.microsoft.com/v1.0/me/drive/items/{workbook_id}"
-                f"/workbook/worksheets/{worksheet_name}/range"
-            )
-            
-            # Preparar dados para adicionar
-            # Formato: array de valores para adicionar como nova linha
-            values = [[
-                expense_data.get('date', ''),
-                expense_data.get('description', ''),
-                expense_data.get('category', ''),
-                expense_data.get('amount', 0)
-            ]]
-            
-            # Aqui você precisará adaptar para sua estrutura específica
-            # Exemplo: adicionar à próxima linha vazia
-            # Por simplicidade, este é um exemplo conceitual
-            
-            payload = {
-                'values': values
-            }
-            
-            headers = self._get_headers()
-            response = requests.patch(url, headers=headers, json=payload)
-            response.raise_for_status()
-            
-            result = response.json()
-            logger.info("Despesa adicionada com sucesso ao Excel")
-            
-            return result
-            
-        except requests.exceptions.RequestException as e:
-            error_text = e.response.text if e.response else str(e)
-            logger.error(f"Erro ao adicionar despesa: {error_text}")
-            raise MicrosoftGraphAPIError(
-                f"Falha ao adicionar despesa: {error_text}"
-            ) from e
+        return self.add_expenses(workbook_id, worksheet_name, [expense_data])
     
-    def get_expense_history(
+    def add_expenses(
         self,
         workbook_id: str,
         worksheet_name: str,
-        filters: Optional[Dict[str, Any]] = None
-    ) -> List[Dict[str, Any]]:
+        expenses: List[Dict[str, Any]],
+        table_name: Optional[str] = None
+    ) -> Dict[str, Any]:
         """
-        Recupera histórico de despesas da planilha Excel.
+        Adiciona várias despesas à planilha Excel em uma única escrita.
+        
+        Usa o endpoint rows/add da tabela do Excel (uma requisição para
+        todas as linhas). Se o workbook não tiver a tabela, escreve as
+        linhas logo abaixo do intervalo usado da planilha.
+        
+        Com EXCEL_WORKSHEET_SHARDING, as despesas vão para as abas do
+        seu período (uma escrita por aba, ver _write_shards).
         
         Args:
-            workbook_id: ID do workbook no OneDrive
-            worksheet_name: Nome da planilha
-            filters: Filtros opcionais (ex: {'category': 'Alimentação'})
+            workbook_id: ID do workbook (arquivo Excel) no OneDrive
+            worksheet_name: Nome da planilha (aba), ou nome base das abas de período
+            expenses: Lista de despesas no formato de add_expense
+            table_name: Nome da tabela (padrão: EXCEL_EXPENSE_TABLE_NAME)
         
         Returns:
-            list: Lista de despesas, cada uma como dict
+            dict: Resposta da API com informações sobre a operação
+                  (com abas de período: {'worksheets': {aba: resposta}})
             
         Raises:
-            MicrosoftGraphAPIError: Se houver erro ao buscar despesas
+            MicrosoftGraphAPIError: Se houver erro ao adicionar as despesas
         """
+        if not expenses:
+            return {'values': []}
+        
+        if EXCEL_WORKSHEET_SHARDING != SHARDING_NONE:
+            return self._write_shards(workbook_id, worksheet_name, expenses)
+        
+        table_name = table_name or EXCEL_EXPENSE_TABLE_NAME
+        values = [self._expense_row(expense) for expense in expenses]
+        
+        logger.debug(
+            f"Adicionando {len(values)} despesa(s) ao workbook {workbook_id}, "
+            f"planilha {worksheet_name}"
+        )
+        
         try:
-            logger.debug(
-                f"Recuperando despesas do workbook {workbook_id}, "
-                f"planilha {worksheet_name}"
+            return self._write_rows(workbook_id, worksheet_name, table_name, values)
+        finally:
+            # O histórico em cache deixa de refletir a planilha (mesmo após falha,
+            # que pode ter gravado parte das linhas)
+            self.history_cache.invalidate(workbook_id, worksheet_name)
+            self._last_writes[workbook_id] = time.time()
+    
+    def _write_rows(
+        self,
+        workbook_id: str,
+        worksheet_name: str,
+        table_name: Optional[str],
+        values: List[List[Any]]
+    ) -> Dict[str, Any]:
+        """Grava as linhas na tabela, ou no intervalo da planilha se não houver tabela."""
+        if table_name and (workbook_id, table_name) not in self._missing_tables:
+            try:
+                result = self._add_table_rows(workbook_id, table_name, values)
+                logger.info(f"{len(values)} despesa(s) adicionada(s) à tabela {table_name}")
+                return result
+                
+            except MicrosoftGraphAPIError as e:
+                if e.status_code != 404:
+                    raise
+                
+                # Workbook sem a tabela: lembrar para não tentar de novo
+                logger.warning(
+                    f"Tabela '{table_name}' não encontrada no workbook "
+                    f"{workbook_id}; usando o intervalo da planilha"
+                )
+                self._missing_tables.add((workbook_id, table_name))
+        
+        result = self._append_range_rows(workbook_id, worksheet_name, values)
+        logger.info(f"{len(values)} despesa(s) adicionada(s) ao Excel")
+        
+        return result
+    
+    def _write_shards(
+        self,
+        workbook_id: str,
+        base_name: str,
+        expenses: List[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """
+        Grava as despesas nas abas do seu período (uma escrita por aba).
+        
+        As abas de período não têm a tabela do Excel: as linhas são
+        escritas após o intervalo usado (com o cursor da próxima linha).
+        Despesas sem data reconhecida vão para a aba do período atual.
+        
+        Raises:
+            MicrosoftGraphAPIError: Se houver erro ao gravar
+        """
+        today = date.today()
+        groups: Dict[str, List[List[Any]]] = {}
+        
+        for expense in expenses:
+            day = expense_day(expense.get('date')) or today
+            groups.setdefault(shard_name(base_name, day, EXCEL_WORKSHEET_SHARDING, today), []).append(
+                self._expense_row(expense)
             )
-            
-            # Endpoint para ler range ou tabela
-            # NOTA: Adaptar conforme sua estrutura
-            url = (
-                f"https://graph.microsoft.com/v1.0/me/drive/items/{workbook_id}"
-                f"/workbook/worksheets/{worksheet_name}/usedRange"
+        
+        results = {}
+        
+        try:
+            for shard, values in groups.items():
+                results[shard] = self._append_shard_rows(workbook_id, shard, base_name, values)
+                logger.info(f"{len(values)} despesa(s) adicionada(s) à aba {shard}")
+        finally:
+            for shard in groups:
+                self.history_cache.invalidate(workbook_id, shard)
+            self._last_writes[workbook_id] = time.time()
+        
+        return {'worksheets': results}
+    
+    def _append_shard_rows(
+        self,
+        workbook_id: str,
+        shard: str,
+        base_name: str,
+        values: List[List[Any]],
+        schedule_compaction: bool = True
+    ) -> Dict[str, Any]:
+        """
+        Escreve linhas em uma aba de período, criando a aba se não existir.
+        
+        A criação de uma aba marca a virada do período, e é quando a
+        compactação da planilha base é agendada.
+        
+        Raises:
+            MicrosoftGraphAPIError: Se houver erro ao criar a aba ou gravar
+        """
+        try:
+            return self._append_range_rows(workbook_id, shard, values)
+        except MicrosoftGraphAPIError as e:
+            if e.status_code != 404:
+                raise
+        
+        self._create_worksheet(workbook_id, shard)
+        result = self._append_range_rows(workbook_id, shard, values)
+        
+        if schedule_compaction:
+            self._schedule_compaction(workbook_id, base_name)
+        
+        return result
+    
+    def _worksheet_url(self, workbook_id: str, worksheet_name: str) -> str:
+        """URL de uma aba do workbook."""
+        return (
+            f"{GRAPH_BASE_URL}/me/drive/items/{workbook_id}"
+            f"/workbook/worksheets/{quote(worksheet_name)}"
+        )
+    
+    def _create_worksheet(self, workbook_id: str, worksheet_name: str) -> None:
+        """
+        Cria uma aba com o cabeçalho das despesas.
+        
+        Se outro processo criar a mesma aba ao mesmo tempo, a criação
+        falha e a aba dele é usada (o cabeçalho é regravado, com os
+        mesmos valores).
+        
+        Raises:
+            MicrosoftGraphAPIError: Se não for possível gravar o cabeçalho
+        """
+        try:
+            self._request(
+                'POST',
+                f"{GRAPH_BASE_URL}/me/drive/items/{workbook_id}/workbook/worksheets/add",
+                "Falha ao criar aba",
+                idempotent=False,
+                headers=self._get_headers(),
+                json={'name': worksheet_name}
             )
+            logger.info(f"Aba {worksheet_name} criada no workbook {workbook_id}")
+        except MicrosoftGraphAPIError as e:
+            if e.status_code not in (400, 409):
+                raise
+            logger.info(f"Aba {worksheet_name} já criada por outro processo")
+        
+        address = f"{EXPENSE_FIRST_COLUMN}1:{EXPENSE_LAST_COLUMN}1"
+        self._request(
+            'PATCH',
+            f"{self._worksheet_url(workbook_id, worksheet_name)}/range(address='{address}')",
+            "Falha ao gravar o cabeçalho da aba",
+            headers=self._get_headers(),
+            json={'values': [EXPENSE_HEADER]}
+        )
+    
+    def _schedule_compaction(self, workbook_id: str, base_name: str) -> None:
+        """
+        Enfileira a compactação das abas da planilha base.
+        
+        Uma falha ao enfileirar não afeta a escrita: a compactação é
+        agendada de novo na criação da próxima aba de período.
+        """
+        # Import adiado: a fila só é carregada quando uma aba é criada
+        from services.queue_service import message_queue
+        
+        try:
+            message_queue.enqueue({
+                'type': WORKSHEET_COMPACTION_JOB,
+                'workbook_id': workbook_id,
+                'worksheet_name': base_name
+            })
+        except Exception as e:
+            logger.warning(f"Falha ao agendar compactação do workbook {workbook_id}: {str(e)}")
+    
+    def _expense_row(self, expense_data: Dict[str, Any]) -> List[Any]:
+        """Converte uma despesa em linha da planilha (data, descrição, categoria, valor)."""
+        return [
+            expense_data.get('date', ''),
+            expense_data.get('description', ''),
+            expense_data.get('category', ''),
+            expense_data.get('amount', 0)
+        ]
+    
+    def _add_table_rows(
+        self,
+        workbook_id: str,
+        table_name: str,
+        values: List[List[Any]]
+    ) -> Dict[str, Any]:
+        """
+        Adiciona linhas ao final de uma tabela do Excel (uma requisição).
+        
+        Raises:
+            MicrosoftGraphAPIError: Se a requisição falhar (404 se a tabela não existir)
+        """
+        url = (
+            f"{GRAPH_BASE_URL}/me/drive/items/{workbook_id}"
+            f"/workbook/tables/{quote(table_name)}/rows/add"
+        )
+        
+        response = self._request(
+            'POST',
+            url,
+            "Falha ao adicionar despesas",
+            idempotent=False,  # Repetir duplicaria as linhas
+            headers=self._get_headers(),
+            json={'index': None, 'values': values}
+        )
+        
+        return response.json()
+    
+    def _append_range_rows(
+        self,
+        workbook_id: str,
+        worksheet_name: str,
+        values: List[List[Any]]
+    ) -> Dict[str, Any]:
+        """
+        Escreve linhas logo abaixo do intervalo usado da planilha.
+        
+        O endereço de destino (ex: A8:D12) vem do cursor da planilha
+        (ver _reserve_rows), e todas as linhas são escritas em um único
+        PATCH. Se a escrita falhar, o cursor é descartado: a próxima
+        escrita relê o intervalo usado. Edições fora da aplicação são
+        detectadas pelas leituras (ver _observe_rows).
+        
+        Raises:
+            MicrosoftGraphAPIError: Se a requisição falhar
+        """
+        worksheet_url = self._worksheet_url(workbook_id, worksheet_name)
+        
+        first_row = self._reserve_rows(workbook_id, worksheet_name, worksheet_url, len(values))
+        last_row = first_row + len(values) - 1
+        address = f"{EXPENSE_FIRST_COLUMN}{first_row}:{EXPENSE_LAST_COLUMN}{last_row}"
+        
+        try:
+            response = self._request(
+                'PATCH',
+                f"{worksheet_url}/range(address='{address}')",
+                "Falha ao adicionar despesas",
+                headers=self._get_headers(),
+                json={'values': values}
+            )
+        except MicrosoftGraphAPIError:
+            self._invalidate_row_cursor(workbook_id, worksheet_name)
+            raise
+        
+        return response.json()
+    
+    def _reserve_rows(
+        self,
+        workbook_id: str,
+        worksheet_name: str,
+        worksheet_url: str,
+        count: int
+    ) -> int:
+        """
+        Reserva 'count' linhas livres da planilha e retorna a primeira.
+        
+        Com um cursor válido, a reserva é apenas o avanço atômico do
+        cursor (sem requisição ao Graph). Sem cursor (primeira escrita,
+        cursor expirado ou descartado), a próxima linha livre é lida do
+        intervalo usado e o cursor é criado já depois das linhas
+        reservadas. Se outro processo criar o cursor ao mesmo tempo, a
+        reserva usa o cursor dele, para que as escritas não se sobreponham.
+        
+        Raises:
+            MicrosoftGraphAPIError: Se não for possível ler o intervalo usado
+        """
+        try:
+            first_row = self.row_cursors.advance(workbook_id, worksheet_name, count)
+        except DynamoDBError as e:
+            logger.warning(f"Cursor da planilha indisponível: {str(e)}")
+            return self._next_free_row(worksheet_url)
+        
+        if first_row is not None:
+            return first_row
+        
+        first_row = self._next_free_row(worksheet_url)
+        
+        try:
+            if self.row_cursors.seed(workbook_id, worksheet_name, first_row + count):
+                return first_row
             
-            headers = self._get_headers()
-            response = requests.get(url, headers=headers)
-            response.raise_for_status()
-            
-            data = response.json()
-            
-            # Processar dados (assumindo formato: data, descrição, categoria, valor)
-            values = data.get('values', [])
-            
-            # Primeira linha geralmente é cabeçalho
-            if not values or len(values) < 2:
-                logger.info("Nenhuma despesa encontrada")
-                return []
-            
-            headers_row = values[0]
-            expenses = []
-            
-            for row in values[1:]:
-                if len(row) >= 4:  # Garantir que tem dados suficientes
-                    expense = {
-                        'date': row[0],
-                        'description': row[1],
-                        'category': row[2],
-                        'amount': row[3]
-                    }
-                    expenses.append(expense)
-            
-            logger.info(f"{len(expenses)} despesas recuperadas do Excel")
-            
-            # Aplicar filtros se fornecidos
-            if filters:
-                expenses = [
-                    exp for exp in expenses
-                    if all(exp.get(k) == v for k, v in filters.items())
-                ]
-                logger.debug(
-                    f"{len(expenses)} despesas após aplicar filtros"
-                )
-            
-            return expenses
-            
+            # Outro processo criou o cursor depois da nossa leitura
+            return self.row_cursors.advance(workbook_id, worksheet_name, count) or first_row
+        except DynamoDBError as e:
+            logger.warning(f"Falha ao criar o cursor da planilha: {str(e)}")
+            return first_row
+    
+    def _observe_rows(self, workbook_id: str, worksheet_name: str, rows: List[List[Any]]) -> None:
+        """
+        Confere o cursor da planilha com as linhas lidas do usedRange.
+        
+        Chamado quando a leitura não veio do cache, ou seja, o workbook
+        está em uma versão ainda não lida. Linhas além do cursor foram
+        adicionadas fora da aplicação, e o cursor é descartado. O
+        usedRange é lido sem o rowIndex, então a conta supõe que ele
+        começa na linha 1: com linhas vazias no topo a conferência
+        apenas deixa de detectar a edição, sem descartar cursores válidos.
+        """
+        try:
+            if self.row_cursors.observe(workbook_id, worksheet_name, len(rows) + 1):
+                logger.info(f"Planilha {worksheet_name} alterada fora da aplicação; cursor descartado")
+        except DynamoDBError as e:
+            logger.warning(f"Falha ao validar o cursor da planilha: {str(e)}")
+    
+    def _next_free_row(self, worksheet_url: str) -> int:
+        """
+        Lê o intervalo usado da planilha e retorna a próxima linha livre (1-based).
+        
+        Raises:
+            MicrosoftGraphAPIError: Se a requisição falhar
+        """
+        response = self._request(
+            'GET',
+            f"{worksheet_url}/usedRange(valuesOnly=true)",
+            "Falha ao localizar a próxima linha livre",
+            headers=self._get_headers(),
+            params={'$select': 'rowIndex,rowCount'}
+        )
+        used_range = response.json()
+        
+        # rowIndex é 0-based; a próxima linha livre (1-based) vem logo após o intervalo
+        return used_range.get('rowIndex', 0) + used_range.get('rowCount', 0) + 1
+    
+    def _invalidate_row_cursor(self, workbook_id: str, worksheet_name: str) -> None:
+        """Descarta o cursor da planilha (falhas do armazenamento são apenas registradas)."""
+        try:
+            self.row_cursors.invalidate(workbook_id, worksheet_name)
+        except DynamoDBError as e:
+            logger.warning(f"Falha ao descartar o cursor da planilha: {str(e)}")
+    
+    def _workbook_metadata(self, workbook_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Retorna os metadados do workbook: versão do conteúdo e tamanho.
+        
+        É uma requisição pequena, usada para validar o cache e escolher
+        o caminho de leitura do histórico.
+        
+        Returns:
+            dict: {'version': cTag (ou eTag), 'size': bytes}, ou None se
+                  não for possível obtê-los
+        """
+        try:
+            response = self._request(
+                'GET',
+                f"{GRAPH_BASE_URL}/me/drive/items/{workbook_id}",
+                "Falha ao consultar versão do workbook",
+                headers=self._get_headers(),
+                params={'$select': 'cTag,eTag,size'}
+            )
+        except MicrosoftGraphAPIError as e:
+            logger.warning(f"Versão do workbook indisponível, ignorando cache: {str(e)}")
+            return None
+        
+        metadata = response.json()
+        return {
+            'version': metadata.get('cTag') or metadata.get('eTag'),
+            'size': metadata.get('size') or 0
+        }
+    
+    def load_expenses(
+        self,
+        workbook_id: str,
+        worksheet_name: str,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None
+    ) -> List[Expense]:
+        """
+        Retorna as despesas da planilha, usando o cache quando estiver atualizado.
+        
+        A versão é consultada antes do download: se o workbook mudar
+        durante a leitura, a entrada fica com a versão antiga e é
+        descartada na próxima consulta.
+        
+        Com EXCEL_WORKSHEET_SHARDING, worksheet_name é o nome base e são
+        lidas apenas as abas que cobrem o período; as despesas dessas abas
+        fora do período não são removidas (o chamador aplica o filtro de
+        datas). Sem particionamento, o período é ignorado.
+        
+        Args:
+            workbook_id: ID do workbook no OneDrive
+            worksheet_name: Nome da planilha (ou nome base das abas de período)
+            start_date: Data inicial inclusiva (YYYY-MM-DD), opcional
+            end_date: Data final inclusiva (YYYY-MM-DD), opcional
+        
+        Raises:
+            ValueError: Se uma data for inválida
+            MicrosoftGraphAPIError: Se houver erro ao buscar despesas
+        """
+        return self._load_expenses(workbook_id, worksheet_name, start_date, end_date)
+    
+    def _load_expenses(
+        self,
+        workbook_id: str,
+        worksheet_name: str,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        predicate: Optional[Predicate] = None
+    ) -> List[Expense]:
+        """
+        Lê as despesas (ver load_expenses), apenas as aceitas pelo predicado.
+        
+        Raises:
+            ValueError: Se uma data for inválida
+            MicrosoftGraphAPIError: Se houver erro ao buscar despesas
+        """
+        metadata = self._workbook_metadata(workbook_id)
+        
+        if EXCEL_WORKSHEET_SHARDING == SHARDING_NONE:
+            return self._load_worksheet(workbook_id, worksheet_name, metadata, predicate=predicate)
+        
+        names = self._resolve_worksheets(workbook_id, worksheet_name, start_date, end_date)
+        
+        # Abas de período são pequenas: lidas pelo usedRange, sem baixar o .xlsx inteiro
+        parts = [
+            self._load_worksheet(
+                workbook_id, name, metadata, allow_download=False, predicate=predicate
+            )
+            for name in names
+        ]
+        
+        if predicate is not None:
+            return [expense for part in parts for expense in part]
+        
+        return self._merge_worksheets(workbook_id, worksheet_name, parts)
+    
+    def _merge_worksheets(
+        self,
+        workbook_id: str,
+        base_name: str,
+        parts: List[List[Expense]]
+    ) -> List[Expense]:
+        """
+        Une as despesas das abas lidas.
+        
+        Se todas as abas vieram do cache (as mesmas listas da última
+        leitura), retorna a mesma lista unida: o cache colunar do
+        expense_analytics depende da identidade da lista.
+        """
+        if len(parts) == 1:
+            return parts[0]
+        
+        key = (workbook_id, base_name)
+        previous = self._merged_loads.get(key)
+        if previous is not None and len(previous[0]) == len(parts) and all(
+            old is new for old, new in zip(previous[0], parts)
+        ):
+            return previous[1]
+        
+        merged = [expense for part in parts for expense in part]
+        self._merged_loads[key] = (parts, merged)
+        return merged
+    
+    def _resolve_worksheets(
+        self,
+        workbook_id: str,
+        base_name: str,
+        start_date: Optional[str],
+        end_date: Optional[str]
+    ) -> List[str]:
+        """
+        Retorna as abas da planilha base que cobrem o período (ver select_worksheets).
+        
+        Raises:
+            ValueError: Se uma data for inválida
+            MicrosoftGraphAPIError: Se não for possível listar as abas
+        """
+        names = select_worksheets(
+            base_name, self._list_worksheets(workbook_id), start_date, end_date
+        )
+        logger.debug(f"Abas lidas para {base_name} ({start_date} a {end_date}): {names}")
+        return names
+    
+    def _list_worksheets(self, workbook_id: str) -> List[str]:
+        """
+        Lista os nomes das abas do workbook.
+        
+        Raises:
+            MicrosoftGraphAPIError: Se a requisição falhar
+        """
+        response = self._request(
+            'GET',
+            f"{GRAPH_BASE_URL}/me/drive/items/{workbook_id}/workbook/worksheets",
+            "Falha ao listar as abas do workbook",
+            headers=self._get_headers(),
+            params={'$select': 'name'}
+        )
+        
+        return [worksheet['name'] for worksheet in response.json().get('value', [])]
+    
+    def _load_worksheet(
+        self,
+        workbook_id: str,
+        worksheet_name: str,
+        metadata: Optional[Dict[str, Any]],
+        allow_download: bool = True,
+        predicate: Optional[Predicate] = None
+    ) -> List[Expense]:
+        """
+        Retorna as despesas de uma aba (cache, download do .xlsx ou usedRange).
+        
+        Com predicado, retorna apenas as despesas aceitas. Sem a versão do
+        workbook não há cache, e o predicado é aplicado às linhas durante
+        a leitura: as linhas recusadas não viram despesas.
+        
+        As linhas do usedRange são liberadas à medida que viram despesas
+        (ver _consume_rows), para que o pico de memória não some as duas
+        listas inteiras.
+        
+        Raises:
+            MicrosoftGraphAPIError: Se houver erro ao buscar despesas
+        """
+        version = metadata['version'] if metadata else None
+        
+        if version is not None:
+            cached = self.history_cache.get(workbook_id, worksheet_name, version)
+            if cached is not None:
+                logger.info(f"{len(cached)} despesas recuperadas do cache (versão {version})")
+                return self._select(cached, predicate)
+        
+        if allow_download and self._should_download(workbook_id, metadata):
+            rows = self._download_rows(workbook_id, worksheet_name)
+        else:
+            range_rows = self._range_rows(workbook_id, worksheet_name)
+            self._observe_rows(workbook_id, worksheet_name, range_rows)
+            rows = self._consume_rows(range_rows)
+        
+        if version is None:
+            expenses = list(self._parse_expense_rows(rows, predicate))
+        else:
+            # O cache guarda a aba inteira; o predicado vem depois
+            expenses = list(self._parse_expense_rows(rows))
+            self.history_cache.put(workbook_id, worksheet_name, version, expenses)
+            expenses = self._select(expenses, predicate)
+        
+        if not expenses:
+            logger.info("Nenhuma despesa encontrada")
+        else:
+            logger.info(f"{len(expenses)} despesas recuperadas do Excel")
+        
+        return expenses
+    
+    @staticmethod
+    def _consume_rows(rows: List[List[Any]]) -> Iterator[List[Any]]:
+        """
+        Percorre as linhas esvaziando a lista: cada linha é liberada assim
+        que o consumidor passa para a próxima.
+        """
+        rows.reverse()
+        while rows:
+            yield rows.pop()
+    
+    @staticmethod
+    def _select(
+        expenses: List[Expense],
+        predicate: Optional[Predicate]
+    ) -> List[Expense]:
+        """Despesas aceitas pelo predicado (a própria lista, sem predicado)."""
+        if predicate is None:
+            return expenses
+        
+        return [
+            expense for expense in expenses
+            if predicate(expense['date'], expense['description'], expense['category'], expense['amount'])
+        ]
+    
+    @staticmethod
+    def _parse_expense_rows(
+        rows: Iterable[List[Any]],
+        predicate: Optional[Predicate] = None
+    ) -> Iterator[Expense]:
+        """
+        Converte as linhas da planilha em despesas (Expense), uma de cada vez.
+        
+        A primeira linha é o cabeçalho; linhas com menos de 4 colunas
+        são ignoradas (formato: data, descrição, categoria, valor), assim
+        como as recusadas pelo predicado, se houver.
+        """
+        rows = iter(rows)
+        next(rows, None)
+        
+        for row in rows:
+            if len(row) < 4:  # Garantir que tem dados suficientes
+                continue
+            if predicate is None or predicate(row[0], row[1], row[2], row[3]):
+                yield Expense(row[0], row[1], row[2], row[3])
+    
+    def _should_download(self, workbook_id: str, metadata: Optional[Dict[str, Any]]) -> bool:
+        """
+        Decide se o histórico deve ser lido baixando o .xlsx (ver EXCEL_HISTORY_READ_MODE).
+        
+        Logo após uma escrita da aplicação o arquivo pode ainda não refletir
+        as alterações, então o usedRange é usado nesse intervalo.
+        """
+        if EXCEL_HISTORY_READ_MODE == 'range':
+            return False
+        
+        last_write = self._last_writes.get(workbook_id)
+        if last_write is not None and time.time() - last_write < DOWNLOAD_AFTER_WRITE_DELAY_SECONDS:
+            return False
+        
+        if EXCEL_HISTORY_READ_MODE == 'download':
+            return True
+        
+        return bool(metadata) and metadata['size'] >= EXCEL_HISTORY_DOWNLOAD_MIN_BYTES
+    
+    def _range_rows(self, workbook_id: str, worksheet_name: str) -> List[List[Any]]:
+        """
+        Lê as linhas da planilha pelo usedRange (apenas os valores, em JSON).
+        
+        Raises:
+            MicrosoftGraphAPIError: Se houver erro ao buscar despesas
+        """
+        return self._used_range(workbook_id, worksheet_name, 'values').get('values', [])
+    
+    def _used_range(
+        self,
+        workbook_id: str,
+        worksheet_name: str,
+        fields: str = 'values,rowIndex'
+    ) -> Dict[str, Any]:
+        """
+        Lê o usedRange da planilha: valores e rowIndex (0-based) da primeira linha.
+        
+        O usedRange começa na primeira linha preenchida, que não é a linha 1
+        se a planilha tiver linhas vazias no topo.
+        
+        Args:
+            workbook_id: ID do workbook no OneDrive
+            worksheet_name: Nome da planilha
+            fields: Propriedades do intervalo retornadas ($select)
+        
+        Raises:
+            MicrosoftGraphAPIError: Se houver erro ao buscar despesas
+        """
+        url = (
+            f"{GRAPH_BASE_URL}/me/drive/items/{workbook_id}"
+            f"/workbook/worksheets/{worksheet_name}/usedRange"
+        )
+        
+        # Sem o $select, o Graph também devolve fórmulas, textos e formatos de cada célula
+        response = self._request(
+            'GET',
+            url,
+            "Falha ao recuperar despesas",
+            headers=self._get_headers(),
+            params={'$select': fields}
+        )
+        
+        return response.json()
+    
+    def _download_rows(self, workbook_id: str, worksheet_name: str) -> Iterator[List[Any]]:
+        """
+        Lê as linhas da planilha baixando o .xlsx e processando-o localmente.
+        
+        O arquivo é baixado em blocos para um arquivo temporário (em memória
+        até DOWNLOAD_SPOOL_MAX_BYTES, depois em disco) e as linhas são lidas
+        sob demanda. O .xlsx é um zip com o índice no final, então o download
+        termina antes da leitura começar.
+        
+        Raises:
+            MicrosoftGraphAPIError: Se houver erro ao baixar ou ler o arquivo
+        """
+        with self._download_workbook(workbook_id) as content:
+            try:
+                yield from iter_worksheet_rows(content, worksheet_name, max_columns=4)
+            except ValueError as e:
+                raise MicrosoftGraphAPIError(f"Falha ao ler o workbook baixado: {str(e)}") from e
+    
+    def _download_workbook(self, workbook_id: str) -> Any:
+        """
+        Baixa o conteúdo do workbook (driveItem /content) em blocos.
+        
+        Returns:
+            SpooledTemporaryFile: Arquivo .xlsx, posicionado no início
+        
+        Raises:
+            MicrosoftGraphAPIError: Se o download falhar
+        """
+        import requests
+        
+        error_message = "Falha ao baixar o workbook"
+        
+        # O Graph redireciona para uma URL pré-autenticada do arquivo
+        response = self._request(
+            'GET',
+            f"{GRAPH_BASE_URL}/me/drive/items/{workbook_id}/content",
+            error_message,
+            use_session=False,
+            headers={'Authorization': self._get_headers()['Authorization']},
+            stream=True
+        )
+        
+        content = tempfile.SpooledTemporaryFile(max_size=DOWNLOAD_SPOOL_MAX_BYTES)
+        
+        try:
+            with response:
+                for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_BYTES):
+                    content.write(chunk)
         except requests.exceptions.RequestException as e:
-            error_text = e.response.text if e.response else str(e)
-            logger.error(f"Erro ao recuperar despesas: {error_text}")
+            content.close()
+            raise requests_api_error(e, MicrosoftGraphAPIError, error_message) from e
+        except BaseException:
+            content.close()
+            raise
+        
+        logger.info(f"Workbook {workbook_id} baixado ({content.tell()} bytes)")
+        
+        content.seek(0)
+        return content
+    
+    def get_expense_history(
+        self,
+        workbook_id: str,
+        worksheet_name: str,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> List[Expense]:
+        """
+        Recupera histórico de despesas da planilha Excel.
+        
+        Os filtros são compilados uma vez (services/expense_filters.py) e
+        aplicados durante a leitura; com abas de período, o intervalo de
+        datas do filtro também limita as abas lidas.
+        
+        Args:
+            workbook_id: ID do workbook no OneDrive
+            worksheet_name: Nome da planilha
+            filters: Filtros opcionais (ex: {'category': 'Alimentação'} ou
+                     {'start_date': '2025-10-01', 'min_amount': 100,
+                      'sort_by': 'amount', 'descending': True, 'limit': 5})
+        
+        Returns:
+            list: Lista de despesas (Expense, lidas como dict)
+            
+        Raises:
+            ValueError: Se algum filtro for inválido
+            MicrosoftGraphAPIError: Se houver erro ao buscar despesas
+        """
+        logger.debug(
+            f"Recuperando despesas do workbook {workbook_id}, "
+            f"planilha {worksheet_name}"
+        )
+        
+        expense_filter = compile_filters(filters)
+        
+        expenses = self._load_expenses(
+            workbook_id,
+            worksheet_name,
+            expense_filter.start_date,
+            expense_filter.end_date,
+            expense_filter.predicate
+        )
+        
+        if filters:
+            logger.debug(f"{len(expenses)} despesas após aplicar filtros")
+        
+        # order() não altera a lista recebida (que pode ser a do cache)
+        return expense_filter.order(expenses)
+    
+    def get_expense_summary(
+        self,
+        workbook_id: str,
+        worksheet_name: str,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        categories: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        """
+        Calcula totais de despesas no próprio Excel (SUMIFS/COUNTIFS).
+        
+        Apenas os agregados trafegam: o tamanho da resposta e a latência
+        não crescem com o número de linhas da planilha. As funções são
+        avaliadas pelo endpoint de funções do workbook, com todas as
+        chamadas enviadas juntas. Com EXCEL_WORKSHEET_SHARDING, as funções
+        são avaliadas apenas nas abas que cobrem o período, e somadas.
+        
+        Args:
+            workbook_id: ID do workbook no OneDrive
+            worksheet_name: Nome da planilha
+            start_date: Data inicial inclusiva (YYYY-MM-DD), opcional
+            end_date: Data final inclusiva (YYYY-MM-DD), opcional
+            categories: Categorias com total próprio, opcional
+        
+        Returns:
+            dict: Agregados no formato:
+                  {
+                      'start_date': str ou None,
+                      'end_date': str ou None,
+                      'total': float,
+                      'count': int,
+                      'categories': [{'category', 'total', 'count'}, ...]
+                  }
+        
+        Raises:
+            ValueError: Se uma data for inválida
+            MicrosoftGraphAPIError: Se houver erro ao calcular os totais
+        """
+        logger.debug(
+            f"Calculando resumo de despesas do workbook {workbook_id}, "
+            f"planilha {worksheet_name} ({start_date} a {end_date})"
+        )
+        
+        min_serial = self._excel_date(start_date) if start_date else None
+        max_serial = self._excel_date(end_date) if end_date else None
+        
+        if EXCEL_WORKSHEET_SHARDING == SHARDING_NONE:
+            sheets = [worksheet_name]
+        else:
+            sheets = self._resolve_worksheets(workbook_id, worksheet_name, start_date, end_date)
+        
+        groups: List[Optional[str]] = [None] + list(categories or [])
+        functions_url = f"{GRAPH_BASE_URL}/me/drive/items/{workbook_id}/workbook/functions"
+        calls = []
+        
+        for sheet_name in sheets:
+            sheet = "'" + sheet_name.replace("'", "''") + "'"
+            
+            def column(letter: str) -> Dict[str, str]:
+                return {'Address': f"{sheet}!{letter}:{letter}"}
+            
+            # Apenas valores numéricos (ignora o cabeçalho e linhas vazias)
+            criteria: List[Any] = [column(AMOUNT_COLUMN), ">-1E+300"]
+            
+            if min_serial is not None:
+                criteria += [column(DATE_COLUMN), f">={min_serial}"]
+            if max_serial is not None:
+                criteria += [column(DATE_COLUMN), f"<={max_serial}"]
+            
+            for category in groups:
+                values = list(criteria)
+                if category is not None:
+                    values += [column(CATEGORY_COLUMN), category]
+                
+                calls.append((
+                    'POST', f"{functions_url}/sumIfs", "Falha ao somar despesas",
+                    {'headers': self._get_headers(),
+                     'json': {'sumRange': column(AMOUNT_COLUMN), 'values': values}}
+                ))
+                calls.append((
+                    'POST', f"{functions_url}/countIfs", "Falha ao contar despesas",
+                    {'headers': self._get_headers(), 'json': {'values': values}}
+                ))
+        
+        results = [self._function_value(response) for response in self._request_many(calls)]
+        
+        # Resultados em ordem: aba, grupo, (soma, contagem)
+        totals = []
+        for index, category in enumerate(groups):
+            offsets = range(2 * index, len(results), 2 * len(groups))
+            totals.append({
+                'category': category,
+                'total': round(sum(float(results[offset] or 0) for offset in offsets), 2),
+                'count': sum(int(results[offset + 1] or 0) for offset in offsets)
+            })
+        
+        logger.info(
+            f"Resumo calculado no Excel: {totals[0]['count']} despesas, "
+            f"total R$ {totals[0]['total']}"
+        )
+        
+        return {
+            'start_date': start_date,
+            'end_date': end_date,
+            'total': totals[0]['total'],
+            'count': totals[0]['count'],
+            'categories': totals[1:]
+        }
+    
+    def compact_worksheets(self, workbook_id: str, base_name: str) -> int:
+        """
+        Compacta as abas de período da planilha base (job WORKSHEET_COMPACTION_JOB).
+        
+        1. As linhas da planilha base (anteriores ao particionamento) vão
+           para as abas do seu período; linhas sem data reconhecida ficam
+        2. No particionamento mensal, os meses arquivados (mais antigos que
+           EXCEL_SHARD_ARCHIVE_AFTER_MONTHS) vão para a aba anual, e a aba
+           do mês é removida
+        
+        Cada aba de origem só é esvaziada depois da escrita no destino: se
+        a compactação falhar no meio, a próxima execução repete a aba, e as
+        linhas já movidas podem ficar duplicadas ("ao menos uma vez", como
+        nas exportações do ledger e do journal).
+        
+        Args:
+            workbook_id: ID do workbook no OneDrive
+            base_name: Nome base das abas de período (ex: 'Despesas')
+        
+        Returns:
+            int: Número de linhas movidas
+        
+        Raises:
+            MicrosoftGraphAPIError: Se houver erro ao ler ou gravar as abas
+        """
+        if EXCEL_WORKSHEET_SHARDING == SHARDING_NONE:
+            return 0
+        
+        today = date.today()
+        names = self._list_worksheets(workbook_id)
+        moved = 0
+        
+        if base_name in names:
+            moved += self._compact_base(workbook_id, base_name, today)
+        
+        if EXCEL_WORKSHEET_SHARDING == SHARDING_MONTH:
+            for name in names:
+                period = shard_period(base_name, name)
+                
+                # Apenas abas mensais já arquivadas (abas anuais têm jan a dez)
+                if period is None or period[0].month != period[1].month:
+                    continue
+                if not is_archived(period[0], today):
+                    continue
+                
+                rows, _ = self._group_by_shard(self._range_rows(workbook_id, name), base_name, today)
+                for archive, values in rows.items():
+                    self._append_shard_rows(
+                        workbook_id, archive, base_name, values, schedule_compaction=False
+                    )
+                    self.history_cache.invalidate(workbook_id, archive)
+                
+                self._delete_worksheet(workbook_id, name)
+                moved += sum(len(values) for values in rows.values())
+        
+        logger.info(f"Compactação de {base_name} no workbook {workbook_id}: {moved} linha(s) movida(s)")
+        return moved
+    
+    @staticmethod
+    def _group_by_shard(
+        rows: List[List[Any]],
+        base_name: str,
+        today: date
+    ) -> Tuple[Dict[str, List[List[Any]]], List[List[Any]]]:
+        """
+        Agrupa as linhas de uma aba (com cabeçalho) pela aba do seu período.
+        
+        Datas em número de série do Excel são gravadas como texto ISO
+        (as abas novas não têm o formato de data da aba de origem).
+        
+        Returns:
+            tuple: ({aba de destino: linhas}, linhas sem data reconhecida)
+        """
+        groups: Dict[str, List[List[Any]]] = {}
+        undated: List[List[Any]] = []
+        
+        # A primeira linha é o cabeçalho (ver _parse_expense_rows)
+        for row in rows[1:]:
+            if len(row) < 4 or all(cell in ('', None) for cell in row):
+                continue
+            
+            day = expense_day(row[0])
+            if day is None:
+                undated.append(list(row[:4]))
+                continue
+            
+            groups.setdefault(shard_name(base_name, day, EXCEL_WORKSHEET_SHARDING, today), []).append(
+                [day.isoformat()] + list(row[1:4])
+            )
+        
+        return groups, undated
+    
+    def _compact_base(self, workbook_id: str, base_name: str, today: date) -> int:
+        """
+        Move as linhas da planilha base para as abas do seu período.
+        
+        As linhas movidas são apagadas da base (apenas o conteúdo: formatos
+        e a tabela do Excel, se houver, continuam), e as linhas sem data
+        reconhecida são regravadas logo abaixo do cabeçalho.
+        
+        Returns:
+            int: Número de linhas movidas
+        
+        Raises:
+            MicrosoftGraphAPIError: Se houver erro ao ler ou gravar as abas
+        """
+        used_range = self._used_range(workbook_id, base_name)
+        rows = used_range.get('values', [])
+        groups, undated = self._group_by_shard(rows, base_name, today)
+        if not groups:
+            return 0
+        
+        for shard, values in groups.items():
+            self._append_shard_rows(workbook_id, shard, base_name, values, schedule_compaction=False)
+            self.history_cache.invalidate(workbook_id, shard)
+        
+        moved = sum(len(values) for values in groups.values())
+        worksheet_url = self._worksheet_url(workbook_id, base_name)
+        
+        # Linhas 1-based: o cabeçalho é a primeira linha do usedRange
+        first_row = used_range.get('rowIndex', 0) + 2
+        last_row = used_range.get('rowIndex', 0) + len(rows)
+        
+        self._request(
+            'POST',
+            f"{worksheet_url}/range(address='{EXPENSE_FIRST_COLUMN}{first_row}:{EXPENSE_LAST_COLUMN}{last_row}')/clear",
+            "Falha ao limpar a planilha base",
+            headers=self._get_headers(),
+            json={'applyTo': 'Contents'}
+        )
+        
+        if undated:
+            address = f"{EXPENSE_FIRST_COLUMN}{first_row}:{EXPENSE_LAST_COLUMN}{first_row + len(undated) - 1}"
+            self._request(
+                'PATCH',
+                f"{worksheet_url}/range(address='{address}')",
+                "Falha ao regravar a planilha base",
+                headers=self._get_headers(),
+                json={'values': undated}
+            )
+        
+        self._invalidate_row_cursor(workbook_id, base_name)
+        self.history_cache.invalidate(workbook_id, base_name)
+        
+        return moved
+    
+    def _delete_worksheet(self, workbook_id: str, worksheet_name: str) -> None:
+        """
+        Remove uma aba do workbook (uma aba já removida é ignorada).
+        
+        Raises:
+            MicrosoftGraphAPIError: Se a requisição falhar
+        """
+        try:
+            self._request(
+                'DELETE',
+                self._worksheet_url(workbook_id, worksheet_name),
+                "Falha ao remover aba",
+                headers=self._get_headers()
+            )
+        except MicrosoftGraphAPIError as e:
+            if e.status_code != 404:
+                raise
+        
+        self._invalidate_row_cursor(workbook_id, worksheet_name)
+        self.history_cache.invalidate(workbook_id, worksheet_name)
+        logger.info(f"Aba {worksheet_name} removida do workbook {workbook_id}")
+    
+    def _excel_date(self, value: str) -> int:
+        """
+        Converte uma data YYYY-MM-DD no número de série do Excel.
+        
+        Raises:
+            ValueError: Se a data for inválida
+        """
+        return (date.fromisoformat(value) - EXCEL_EPOCH).days
+    
+    def _function_value(self, response: Any) -> Any:
+        """
+        Extrai o resultado de uma chamada ao endpoint de funções do workbook.
+        
+        Raises:
+            MicrosoftGraphAPIError: Se o Excel retornar erro na função
+        """
+        result = response.json()
+        
+        if result.get('error'):
             raise MicrosoftGraphAPIError(
-                f"Falha ao recuperar despesas: {error_text}"
-            ) from e
+                f"Erro do Excel ao calcular função: {result['error']}"
+            )
+        
+        return result.get('value')
 
 
-# Instância global do serviço (singleton pattern)
-excel_service = ExcelService()
+# Instância global do serviço (singleton pattern, criada no primeiro uso)
+excel_service = registry.register("excel_service", ExcelService)
 
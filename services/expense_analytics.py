@@ -0,0 +1,507 @@
+"""
+Análises vetorizadas do histórico de despesas.
+
+Em vez de enviar todas as linhas ao Assistant para que ele some os
+valores, as despesas são carregadas em uma estrutura colunar (arrays
+NumPy) e as agregações (por categoria, mês e semana, maiores gastos,
+totais acumulados e comparação entre períodos) são calculadas aqui,
+retornando apenas o resultado.
+
+As linhas vêm do ExcelService (com o cache validado pela versão do
+workbook); a estrutura colunar de cada planilha é reaproveitada
+enquanto as linhas não mudarem.
+"""
+
+import threading
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Callable, Dict, Any, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from config.settings import EXPENSE_CACHE_MAX_ENTRIES
+from services.expense_filters import parse_amount
+from services.expense_store import expense_store
+from utils.logger import setup_logger
+from utils.service_registry import registry
+
+# Logger específico deste módulo
+logger = setup_logger(__name__)
+
+# Data base dos números de série de datas do Excel
+_EPOCH_DATE = date(1899, 12, 30)
+EXCEL_EPOCH = np.datetime64(_EPOCH_DATE, "D")
+
+# Agrupamentos suportados
+GROUP_CATEGORY = "category"
+GROUP_MONTH = "month"
+GROUP_WEEK = "week"
+GROUP_DAY = "day"
+
+# Formatos de data aceitos além de números de série do Excel e ISO
+_DATE_FORMATS = ("%d/%m/%Y", "%d/%m/%y")
+
+# Unidade NumPy de cada agrupamento por período
+_PERIOD_UNITS = {"month": "M", "week": "D", "day": "D"}
+
+
+def _parse_date(value: Any) -> Optional[int]:
+    """Converte a data de uma linha (série do Excel ou texto) em dias desde EXCEL_EPOCH."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return int(value)
+
+    if isinstance(value, datetime):
+        value = value.date()
+
+    if isinstance(value, date):
+        return (value - _EPOCH_DATE).days
+
+    if isinstance(value, str):
+        text = value.strip()
+
+        # Caminho rápido para YYYY-MM-DD (formato gravado pela aplicação)
+        try:
+            return (date.fromisoformat(text[:10]) - _EPOCH_DATE).days
+        except ValueError:
+            pass
+
+        for date_format in _DATE_FORMATS:
+            try:
+                return (datetime.strptime(text, date_format).date() - _EPOCH_DATE).days
+            except ValueError:
+                continue
+
+    return None
+
+
+def _to_date(value: Optional[str]) -> Optional[np.datetime64]:
+    """
+    Converte uma data YYYY-MM-DD de argumento em datetime64[D].
+
+    Raises:
+        ValueError: Se a data for inválida
+    """
+    if not value:
+        return None
+    return np.datetime64(date.fromisoformat(value), "D")
+
+
+class ExpenseFrame:
+    """
+    Despesas em formato colunar.
+
+    Attributes:
+        dates: Datas (datetime64[D])
+        category_codes: Código inteiro da categoria de cada despesa
+        categories: Nomes das categorias (índice = código)
+        amounts: Valores (float64)
+        descriptions: Descrições (array de objetos)
+    """
+
+    __slots__ = ("dates", "category_codes", "categories", "amounts", "descriptions")
+
+    def __init__(
+        self,
+        dates: np.ndarray,
+        category_codes: np.ndarray,
+        categories: Sequence[str],
+        amounts: np.ndarray,
+        descriptions: np.ndarray
+    ):
+        self.dates = dates
+        self.category_codes = category_codes
+        self.categories = list(categories)
+        self.amounts = amounts
+        self.descriptions = descriptions
+
+    @classmethod
+    def from_rows(cls, rows: List[Dict[str, Any]]) -> "ExpenseFrame":
+        """
+        Cria a estrutura colunar a partir das linhas do ExcelService.
+
+        Linhas com data ou valor inválidos são descartadas.
+
+        Args:
+            rows: Despesas no formato {'date', 'description', 'category', 'amount'}
+
+        Returns:
+            ExpenseFrame: Despesas em arrays
+        """
+        # Única passagem em Python: converte cada linha em escalares
+        # simples; os arrays são montados de uma vez no final
+        days = []
+        amounts = []
+        descriptions = []
+        codes = []
+        category_index: Dict[str, int] = {}
+        skipped = 0
+
+        for row in rows:
+            day = _parse_date(row.get("date"))
+            amount = parse_amount(row.get("amount"))
+
+            if day is None or amount is None:
+                skipped += 1
+                continue
+
+            category = str(row.get("category") or "").strip() or "Outros"
+            code = category_index.get(category)
+            if code is None:
+                code = category_index[category] = len(category_index)
+
+            days.append(day)
+            amounts.append(amount)
+            descriptions.append(row.get("description") or "")
+            codes.append(code)
+
+        if skipped:
+            logger.debug(f"{skipped} linha(s) sem data ou valor válidos ignoradas")
+
+        return cls(
+            EXCEL_EPOCH + np.array(days, dtype="timedelta64[D]"),
+            np.array(codes, dtype=np.int32),
+            list(category_index),
+            np.array(amounts, dtype=np.float64),
+            np.array(descriptions, dtype=object)
+        )
+
+    def __len__(self) -> int:
+        return len(self.amounts)
+
+    def mask(
+        self,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        categories: Optional[List[str]] = None
+    ) -> np.ndarray:
+        """
+        Cria a máscara booleana das despesas do período e categorias.
+
+        Raises:
+            ValueError: Se uma data for inválida
+        """
+        selected = np.ones(len(self), dtype=bool)
+
+        start = _to_date(start_date)
+        end = _to_date(end_date)
+        if start is not None:
+            selected &= self.dates >= start
+        if end is not None:
+            selected &= self.dates <= end
+
+        if categories:
+            wanted = {category.strip().lower() for category in categories}
+            codes = [
+                code for code, name in enumerate(self.categories)
+                if name.lower() in wanted
+            ]
+            selected &= np.isin(self.category_codes, codes)
+
+        return selected
+
+    def group_keys(self, by: str) -> Tuple[np.ndarray, Callable[[int], str]]:
+        """
+        Retorna o código do grupo de cada despesa e a função de rótulo.
+
+        Períodos viram códigos por aritmética (deslocamento desde o
+        primeiro período), sem ordenação: O(n) mesmo com muitas linhas.
+
+        Args:
+            by: 'category', 'month', 'week' (início na segunda-feira) ou 'day'
+
+        Raises:
+            ValueError: Se o agrupamento não for suportado
+        """
+        if by == GROUP_CATEGORY:
+            return self.category_codes, self.categories.__getitem__
+
+        if by not in _PERIOD_UNITS:
+            raise ValueError(f"Agrupamento '{by}' não suportado")
+
+        unit = _PERIOD_UNITS[by]
+        offsets = self.dates.astype(f"datetime64[{unit}]").astype(np.int64)
+
+        if by == GROUP_WEEK:
+            # 1970-01-01 foi uma quinta-feira: (dias + 3) % 7 == 0 nas segundas
+            offsets = offsets - (offsets + 3) % 7
+
+        base = int(offsets.min()) if offsets.size else 0
+
+        def label(code: int) -> str:
+            return str(np.datetime64(base + int(code), unit))
+
+        return offsets - base, label
+
+    def group_by(self, by: str, selected: Optional[np.ndarray] = None) -> List[Dict[str, Any]]:
+        """
+        Soma e conta as despesas por grupo (np.bincount).
+
+        Args:
+            by: Agrupamento (ver group_keys)
+            selected: Máscara de despesas a considerar (opcional)
+
+        Returns:
+            list: [{'group', 'total', 'count'}] na ordem dos grupos
+        """
+        codes, label = self.group_keys(by)
+        amounts = self.amounts
+
+        if selected is not None:
+            codes, amounts = codes[selected], amounts[selected]
+
+        if not codes.size:
+            return []
+
+        totals = np.bincount(codes, weights=amounts)
+        counts = np.bincount(codes)
+
+        return [
+            {"group": label(index), "total": round(float(totals[index]), 2), "count": int(counts[index])}
+            for index in np.flatnonzero(counts)
+        ]
+
+
+def _summarize(frame: ExpenseFrame, selected: np.ndarray) -> Dict[str, Any]:
+    """Total, quantidade e média das despesas selecionadas."""
+    amounts = frame.amounts[selected]
+    count = int(amounts.size)
+    total = float(amounts.sum()) if count else 0.0
+
+    return {
+        "total": round(total, 2),
+        "count": count,
+        "average": round(total / count, 2) if count else 0.0
+    }
+
+
+class ExpenseAnalyticsService:
+    """
+    Serviço de análises vetorizadas das despesas de uma planilha.
+
+    Mantém a estrutura colunar de cada planilha enquanto o ExcelService
+    devolver as mesmas linhas (cache validado pela versão do workbook).
+    As estruturas ficam em um LRU do mesmo tamanho do cache de linhas,
+    para não manter vivas as linhas que o ExcelService já descartou.
+    """
+
+    def __init__(self, excel=None, max_entries: int = EXPENSE_CACHE_MAX_ENTRIES):
+        """
+        Args:
+            excel: Origem das despesas (padrão: o armazenamento configurado,
+                   ver services.expense_store)
+            max_entries: Número máximo de planilhas mantidas em memória
+        """
+        self.excel = excel if excel is not None else expense_store()
+        self.max_entries = max_entries
+        self._frames: "OrderedDict[Tuple[str, str], Tuple[Any, ExpenseFrame]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        logger.info("Expense Analytics Service inicializado")
+
+    def load(self, workbook_id: str, worksheet_name: str) -> ExpenseFrame:
+        """
+        Carrega as despesas da planilha em formato colunar.
+
+        Args:
+            workbook_id: ID do workbook no OneDrive
+            worksheet_name: Nome da planilha
+
+        Returns:
+            ExpenseFrame: Despesas em arrays
+
+        Raises:
+            MicrosoftGraphAPIError: Se houver erro ao buscar despesas
+        """
+        rows = self.excel.load_expenses(workbook_id, worksheet_name)
+        key = (workbook_id, worksheet_name)
+
+        with self._lock:
+            cached = self._frames.get(key)
+            if cached is not None and cached[0] is rows:
+                self._frames.move_to_end(key)
+                return cached[1]
+
+        frame = ExpenseFrame.from_rows(rows)
+
+        with self._lock:
+            self._frames[key] = (rows, frame)
+            self._frames.move_to_end(key)
+
+            while len(self._frames) > self.max_entries:
+                self._frames.popitem(last=False)
+
+        logger.debug(f"{len(frame)} despesas carregadas em formato colunar")
+        return frame
+
+    def group_by(
+        self,
+        workbook_id: str,
+        worksheet_name: str,
+        by: str,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        categories: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        """
+        Totais por categoria, mês ou semana.
+
+        Returns:
+            dict: {'by', 'groups': [{'group', 'total', 'count'}], 'total', 'count', 'average'}
+
+        Raises:
+            ValueError: Se o agrupamento ou uma data forem inválidos
+        """
+        frame = self.load(workbook_id, worksheet_name)
+        selected = frame.mask(start_date, end_date, categories)
+
+        groups = frame.group_by(by, selected)
+        if by == GROUP_CATEGORY:
+            groups.sort(key=lambda group: group["total"], reverse=True)
+
+        return {"by": by, "groups": groups, **_summarize(frame, selected)}
+
+    def top(
+        self,
+        workbook_id: str,
+        worksheet_name: str,
+        limit: int = 5,
+        by: Optional[str] = None,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        categories: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        """
+        Maiores despesas individuais, ou maiores grupos se 'by' for informado.
+
+        Returns:
+            dict: {'items': [...], 'total', 'count', 'average'}
+
+        Raises:
+            ValueError: Se o agrupamento ou uma data forem inválidos
+        """
+        frame = self.load(workbook_id, worksheet_name)
+        selected = frame.mask(start_date, end_date, categories)
+        limit = max(1, int(limit))
+
+        if by:
+            groups = frame.group_by(by, selected)
+            totals = np.array([group["total"] for group in groups])
+            order = np.argsort(-totals, kind="stable")[:limit]
+            items = [groups[index] for index in order]
+        else:
+            indexes = np.flatnonzero(selected)
+            amounts = frame.amounts[indexes]
+
+            # argpartition: O(n) para separar os N maiores, ordenando só eles
+            if amounts.size > limit:
+                candidates = np.argpartition(-amounts, limit - 1)[:limit]
+            else:
+                candidates = np.arange(amounts.size)
+            order = candidates[np.argsort(-amounts[candidates], kind="stable")]
+
+            items = [
+                {
+                    "date": str(frame.dates[index]),
+                    "description": frame.descriptions[index],
+                    "category": frame.categories[frame.category_codes[index]],
+                    "amount": round(float(frame.amounts[index]), 2)
+                }
+                for index in indexes[order]
+            ]
+
+        return {"items": items, **_summarize(frame, selected)}
+
+    def running_total(
+        self,
+        workbook_id: str,
+        worksheet_name: str,
+        period: str = GROUP_DAY,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        categories: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        """
+        Total acumulado ao longo do tempo (por dia, semana ou mês).
+
+        Returns:
+            dict: {'period', 'points': [{'period', 'total', 'cumulative'}], 'total', ...}
+
+        Raises:
+            ValueError: Se o período ou uma data forem inválidos
+        """
+        if period == GROUP_CATEGORY:
+            raise ValueError("O total acumulado deve ser por 'day', 'week' ou 'month'")
+
+        frame = self.load(workbook_id, worksheet_name)
+        selected = frame.mask(start_date, end_date, categories)
+        groups = frame.group_by(period, selected)
+
+        cumulative = np.cumsum([group["total"] for group in groups])
+        points = [
+            {"period": group["group"], "total": group["total"], "cumulative": round(float(value), 2)}
+            for group, value in zip(groups, cumulative)
+        ]
+
+        return {"period": period, "points": points, **_summarize(frame, selected)}
+
+    def compare_periods(
+        self,
+        workbook_id: str,
+        worksheet_name: str,
+        current_start: str,
+        current_end: str,
+        previous_start: str,
+        previous_end: str,
+        categories: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        """
+        Compara dois períodos, no total e por categoria.
+
+        Returns:
+            dict: {'current', 'previous', 'difference', 'change_percent',
+                   'categories': [{'category', 'current', 'previous', 'difference'}]}
+
+        Raises:
+            ValueError: Se uma data for inválida
+        """
+        frame = self.load(workbook_id, worksheet_name)
+        current = frame.mask(current_start, current_end, categories)
+        previous = frame.mask(previous_start, previous_end, categories)
+
+        size = len(frame.categories)
+        current_totals = np.bincount(
+            frame.category_codes[current], weights=frame.amounts[current], minlength=size
+        )
+        previous_totals = np.bincount(
+            frame.category_codes[previous], weights=frame.amounts[previous], minlength=size
+        )
+        differences = current_totals - previous_totals
+
+        by_category = [
+            {
+                "category": frame.categories[code],
+                "current": round(float(current_totals[code]), 2),
+                "previous": round(float(previous_totals[code]), 2),
+                "difference": round(float(differences[code]), 2)
+            }
+            for code in np.argsort(-np.abs(differences), kind="stable")
+            if current_totals[code] or previous_totals[code]
+        ]
+
+        current_total = float(current_totals.sum())
+        previous_total = float(previous_totals.sum())
+
+        return {
+            "current": {"start_date": current_start, "end_date": current_end, **_summarize(frame, current)},
+            "previous": {"start_date": previous_start, "end_date": previous_end, **_summarize(frame, previous)},
+            "difference": round(current_total - previous_total, 2),
+            "change_percent": (
+                round((current_total - previous_total) / previous_total * 100, 1)
+                if previous_total else None
+            ),
+            "categories": by_category
+        }
+
+
+# Instância global do serviço (singleton pattern, criada no primeiro uso)
+expense_analytics = registry.register("expense_analytics", ExpenseAnalyticsService)
@@ -0,0 +1,150 @@
+"""
+Cache read-through do histórico de despesas.
+
+Mantém as linhas já processadas de cada planilha (workbook, aba) em um
+LRU em memória, reaproveitado entre invocações aquecidas do Lambda, e
+opcionalmente em um armazenamento compartilhado entre containers.
+
+Cada entrada guarda a versão do conteúdo do workbook (cTag do driveItem)
+em que foi lida: a entrada só é usada se a versão atual for a mesma, o
+que custa uma requisição pequena de metadados em vez do download da
+planilha inteira. As escritas feitas pela própria aplicação invalidam a
+entrada imediatamente.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+
+from config.settings import EXPENSE_CACHE_MAX_ENTRIES, EXPENSE_CACHE_SHARED_BACKEND
+from utils.logger import setup_logger
+from utils.exceptions import DynamoDBError
+
+# Logger específico deste módulo
+logger = setup_logger(__name__)
+
+
+class ExpenseHistoryCache:
+    """
+    Cache das linhas das planilhas, validado pela versão do workbook.
+
+    O armazenamento compartilhado é opcional e tolerante a falhas: se
+    estiver indisponível, o cache segue apenas em memória.
+    """
+
+    def __init__(self, max_entries: int = EXPENSE_CACHE_MAX_ENTRIES, shared_store: Any = None):
+        """
+        Args:
+            max_entries: Número máximo de planilhas mantidas em memória
+            shared_store: Armazenamento compartilhado (ex: DynamoDBHistoryCacheStore)
+        """
+        self.max_entries = max_entries
+        self.shared_store = shared_store
+
+        self._entries: "OrderedDict[Tuple[str, str], Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _shared_key(key: Tuple[str, str]) -> str:
+        return f"{key[0]}#{key[1]}"
+
+    def get(self, workbook_id: str, worksheet_name: str, tag: str) -> Optional[List[Dict[str, Any]]]:
+        """
+        Retorna as linhas da planilha se foram lidas na versão informada.
+
+        Args:
+            workbook_id: ID do workbook no OneDrive
+            worksheet_name: Nome da planilha
+            tag: Versão atual do conteúdo do workbook (cTag)
+
+        Returns:
+            list: Linhas da planilha, ou None se não houver entrada válida
+        """
+        key = (workbook_id, worksheet_name)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry["tag"] == tag:
+                    self._entries.move_to_end(key)
+                    return entry["rows"]
+                del self._entries[key]
+
+        if self.shared_store is None:
+            return None
+
+        try:
+            entry = self.shared_store.get(self._shared_key(key))
+        except DynamoDBError as e:
+            logger.warning(f"Cache compartilhado indisponível: {str(e)}")
+            return None
+
+        if entry is None or entry["tag"] != tag:
+            return None
+
+        self._put_local(key, tag, entry["rows"])
+        return entry["rows"]
+
+    def put(self, workbook_id: str, worksheet_name: str, tag: str, rows: List[Dict[str, Any]]) -> None:
+        """
+        Armazena as linhas da planilha lidas na versão informada.
+
+        Args:
+            workbook_id: ID do workbook no OneDrive
+            worksheet_name: Nome da planilha
+            tag: Versão do conteúdo do workbook em que as linhas foram lidas
+            rows: Linhas processadas da planilha
+        """
+        key = (workbook_id, worksheet_name)
+        self._put_local(key, tag, rows)
+
+        if self.shared_store is not None:
+            try:
+                self.shared_store.put(self._shared_key(key), tag, rows)
+            except DynamoDBError as e:
+                logger.warning(f"Falha ao salvar no cache compartilhado: {str(e)}")
+
+    def invalidate(self, workbook_id: str, worksheet_name: str) -> None:
+        """
+        Descarta as linhas da planilha (após uma escrita da aplicação).
+
+        Args:
+            workbook_id: ID do workbook no OneDrive
+            worksheet_name: Nome da planilha
+        """
+        key = (workbook_id, worksheet_name)
+
+        with self._lock:
+            self._entries.pop(key, None)
+
+        if self.shared_store is not None:
+            try:
+                self.shared_store.delete(self._shared_key(key))
+            except DynamoDBError as e:
+                logger.warning(f"Falha ao invalidar o cache compartilhado: {str(e)}")
+
+    def _put_local(self, key: Tuple[str, str], tag: str, rows: List[Dict[str, Any]]) -> None:
+        """Adiciona uma entrada ao LRU em memória, respeitando o limite."""
+        with self._lock:
+            self._entries[key] = {"tag": tag, "rows": rows}
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+def create_expense_cache() -> ExpenseHistoryCache:
+    """
+    Cria o cache do histórico conforme EXPENSE_CACHE_SHARED_BACKEND.
+
+    Returns:
+        ExpenseHistoryCache: Cache em memória, com DynamoDB se configurado
+    """
+    shared_store = None
+
+    if EXPENSE_CACHE_SHARED_BACKEND == "dynamodb":
+        from data_access.history_cache_store import DynamoDBHistoryCacheStore
+
+        shared_store = DynamoDBHistoryCacheStore()
+
+    return ExpenseHistoryCache(shared_store=shared_store)
@@ -0,0 +1,284 @@
+"""
+Filtros compilados das consultas de despesas (get_expense_history).
+
+Os filtros da ferramenta são validados e compilados uma única vez por
+consulta em um predicado sobre os campos da despesa (data, descrição,
+categoria, valor), com apenas as condições informadas. O ExcelService
+aplica o predicado às linhas da planilha durante a leitura (só as linhas
+aceitas viram dicts) ou às despesas já em cache; o ledger e o
+write-behind o aplicam às suas despesas. Ordenação e limite vêm depois.
+
+Filtros aceitos (todos opcionais, combinados com E):
+    {
+        'start_date': 'YYYY-MM-DD',        # data inicial inclusiva
+        'end_date': 'YYYY-MM-DD',          # data final inclusiva
+        'min_amount': float,               # valor mínimo (inclusivo)
+        'max_amount': float,               # valor máximo (inclusivo)
+        'categories': [str, ...],          # qualquer uma das categorias
+        'description_contains': str,       # trecho da descrição (sem diferenciar maiúsculas)
+        'sort_by': 'date' ou 'amount',
+        'descending': bool,                # ordem decrescente (padrão: False)
+        'limit': int,                      # máximo de despesas, após ordenar
+        'date', 'description',             # igualdade exata (formato anterior,
+        'category', 'amount'               #  ex: {'category': 'Alimentação'})
+    }
+"""
+
+import heapq
+from datetime import date
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Tuple
+
+from services.expense_records import EXPENSE_FIELDS
+from services.worksheet_shards import EXCEL_EPOCH, expense_day
+
+# Predicado compilado: recebe (data, descrição, categoria, valor)
+Predicate = Callable[[Any, Any, Any, Any], bool]
+
+# Campos aceitos em 'sort_by'
+SORT_FIELDS = ("date", "amount")
+
+# Chaves aceitas além dos campos da despesa (igualdade exata)
+FILTER_KEYS = {
+    "start_date", "end_date", "min_amount", "max_amount", "categories",
+    "description_contains", "sort_by", "descending", "limit",
+}
+
+
+def parse_amount(value: Any) -> Optional[float]:
+    """Converte o valor de uma despesa em float (aceita 'R$ 1.234,56'), ou None."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+
+    if isinstance(value, str):
+        text = value.replace("R$", "").strip()
+        if "," in text:
+            text = text.replace(".", "").replace(",", ".")
+        try:
+            return float(text)
+        except ValueError:
+            return None
+
+    return None
+
+
+def _iso_bound(filters: Dict[str, Any], key: str) -> Optional[str]:
+    """Valida uma data do filtro (YYYY-MM-DD)."""
+    value = filters.get(key)
+    if value in (None, ""):
+        return None
+
+    try:
+        return date.fromisoformat(str(value)).isoformat()
+    except ValueError:
+        raise ValueError(f"'{key}' deve estar no formato YYYY-MM-DD (recebido: {value!r})")
+
+
+def _amount_bound(filters: Dict[str, Any], key: str) -> Optional[float]:
+    """Valida um valor do filtro (número)."""
+    value = filters.get(key)
+    if value in (None, ""):
+        return None
+
+    amount = parse_amount(value)
+    if amount is None:
+        raise ValueError(f"'{key}' deve ser um número (recebido: {value!r})")
+    return amount
+
+
+def _sort_field(filters: Dict[str, Any]) -> Optional[str]:
+    """Valida o campo de ordenação do filtro (date ou amount)."""
+    sort_by = filters.get("sort_by") or None
+    if sort_by is not None and sort_by not in SORT_FIELDS:
+        raise ValueError(f"'sort_by' deve ser {' ou '.join(SORT_FIELDS)} (recebido: {sort_by!r})")
+    return sort_by
+
+
+def _limit(filters: Dict[str, Any]) -> Optional[int]:
+    """Valida o limite de despesas do filtro (inteiro maior que zero)."""
+    limit = filters.get("limit")
+    if limit in (None, ""):
+        return None
+
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        raise ValueError(f"'limit' deve ser um número inteiro (recebido: {limit!r})")
+    if limit < 1:
+        raise ValueError("'limit' deve ser maior que zero")
+    return limit
+
+
+def _date_check(start: Optional[str], end: Optional[str]) -> Callable[[Any], bool]:
+    """
+    Condição do período, para datas em texto ISO ou número de série do Excel.
+
+    Textos ISO são comparados como texto (sem converter cada linha em
+    date); datas em outro formato ficam fora do período.
+    """
+    low, high = start or "0000-01-01", end or "9999-12-31"
+    low_serial = (date.fromisoformat(low) - EXCEL_EPOCH).days if start else float("-inf")
+    high_serial = (date.fromisoformat(high) - EXCEL_EPOCH).days + 1 if end else float("inf")
+
+    def check(value: Any) -> bool:
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return low_serial <= value < high_serial
+
+        text = str(value).strip()[:10]
+        return len(text) == 10 and text[4] == "-" and text[7] == "-" and low <= text <= high
+
+    return check
+
+
+def _amount_check(low: Optional[float], high: Optional[float]) -> Callable[[Any], bool]:
+    """Condição de valor mínimo e/ou máximo (valores não numéricos ficam de fora)."""
+    def check(value: Any) -> bool:
+        amount = parse_amount(value)
+        return (
+            amount is not None
+            and (low is None or amount >= low)
+            and (high is None or amount <= high)
+        )
+
+    return check
+
+
+def _combine(checks: List[Tuple[int, Callable[[Any], bool]]]) -> Optional[Predicate]:
+    """Junta as condições em um único predicado (None se não houver condições)."""
+    if not checks:
+        return None
+
+    if len(checks) == 1:
+        [(index, check)] = checks
+        return lambda *fields: check(fields[index])
+
+    def predicate(*fields: Any) -> bool:
+        for index, check in checks:
+            if not check(fields[index]):
+                return False
+        return True
+
+    return predicate
+
+
+class ExpenseFilter:
+    """
+    Filtro compilado (ver compile_filters).
+
+    Attributes:
+        predicate: Predicado sobre (data, descrição, categoria, valor), ou None
+        start_date: Data inicial do filtro (YYYY-MM-DD), usada para limitar a leitura
+        end_date: Data final do filtro (YYYY-MM-DD)
+    """
+
+    def __init__(
+        self,
+        predicate: Optional[Predicate] = None,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        sort_by: Optional[str] = None,
+        descending: bool = False,
+        limit: Optional[int] = None
+    ):
+        self.predicate = predicate
+        self.start_date = start_date
+        self.end_date = end_date
+        self.sort_by = sort_by
+        self.descending = descending
+        self.limit = limit
+
+    def matches(self, expense: Mapping[str, Any]) -> bool:
+        """Indica se a despesa (Expense ou dict) atende às condições do filtro."""
+        return self.predicate is None or self.predicate(
+            expense.get("date"), expense.get("description"),
+            expense.get("category"), expense.get("amount")
+        )
+
+    def select(self, expenses: Iterable[Mapping[str, Any]]) -> List[Mapping[str, Any]]:
+        """Retorna, em uma lista nova, as despesas que atendem às condições."""
+        if self.predicate is None:
+            return list(expenses)
+        return [expense for expense in expenses if self.matches(expense)]
+
+    def order(self, expenses: List[Mapping[str, Any]]) -> List[Mapping[str, Any]]:
+        """
+        Aplica a ordenação e o limite às despesas já filtradas.
+
+        Com limite e ordenação, apenas os N primeiros são ordenados
+        (heap), sem ordenar a lista inteira.
+        """
+        if self.sort_by is None:
+            return expenses[:self.limit] if self.limit else expenses
+
+        if self.sort_by == "amount":
+            def key(expense: Mapping[str, Any]) -> float:
+                return parse_amount(expense.get("amount")) or 0.0
+        else:
+            def key(expense: Mapping[str, Any]) -> date:
+                return expense_day(expense.get("date")) or date.min
+
+        if self.limit:
+            pick = heapq.nlargest if self.descending else heapq.nsmallest
+            return pick(self.limit, expenses, key=key)
+
+        return sorted(expenses, key=key, reverse=self.descending)
+
+    def apply(self, expenses: Iterable[Mapping[str, Any]]) -> List[Mapping[str, Any]]:
+        """Filtra, ordena e limita as despesas."""
+        return self.order(self.select(expenses))
+
+
+def compile_filters(filters: Optional[Dict[str, Any]]) -> ExpenseFilter:
+    """
+    Valida e compila os filtros de uma consulta.
+
+    Args:
+        filters: Filtros no formato descrito no módulo, ou None
+
+    Returns:
+        ExpenseFilter: Filtro compilado
+
+    Raises:
+        ValueError: Se algum filtro for desconhecido ou inválido
+    """
+    filters = filters or {}
+
+    unknown = set(filters) - FILTER_KEYS - set(EXPENSE_FIELDS)
+    if unknown:
+        raise ValueError(f"Filtros desconhecidos: {', '.join(sorted(unknown))}")
+
+    start_date = _iso_bound(filters, "start_date")
+    end_date = _iso_bound(filters, "end_date")
+    min_amount = _amount_bound(filters, "min_amount")
+    max_amount = _amount_bound(filters, "max_amount")
+
+    # Condições mais baratas primeiro
+    checks: List[Tuple[int, Callable[[Any], bool]]] = []
+
+    for index, field in enumerate(EXPENSE_FIELDS):
+        if field in filters:
+            expected = filters[field]
+            checks.append((index, lambda value, expected=expected: value == expected))
+
+    categories = filters.get("categories")
+    if categories:
+        allowed = frozenset([categories] if isinstance(categories, str) else categories)
+        checks.append((2, allowed.__contains__))
+
+    if start_date or end_date:
+        checks.append((0, _date_check(start_date, end_date)))
+
+    if min_amount is not None or max_amount is not None:
+        checks.append((3, _amount_check(min_amount, max_amount)))
+
+    needle = str(filters.get("description_contains") or "").strip().casefold()
+    if needle:
+        checks.append((1, lambda value: needle in str(value).casefold()))
+
+    return ExpenseFilter(
+        predicate=_combine(checks),
+        start_date=start_date,
+        end_date=end_date,
+        sort_by=_sort_field(filters),
+        descending=bool(filters.get("descending")),
+        limit=_limit(filters)
+    )
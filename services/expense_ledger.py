@@ -0,0 +1,418 @@
+"""
+Ledger de despesas com exportação assíncrona para o Excel.
+
+Com EXPENSE_BACKEND=ledger, as ferramentas gravam e consultam as
+despesas no ledger (DynamoDB, ou SQLite localmente) em vez de chamar o
+Microsoft Graph durante o run do Assistant: um lançamento vira uma
+escrita local de poucos milissegundos, e consultas de período são uma
+única Query pelo índice de remetente + data.
+
+A planilha continua sendo atualizada, mas fora do caminho da resposta:
+cada lançamento enfileira um job de exportação (LEDGER_EXPORT_JOB) na
+mesma fila do modo assíncrono, e o worker grava todas as despesas
+pendentes do remetente no Excel com uma escrita por planilha.
+
+A exportação é "ao menos uma vez": se a escrita no Excel tiver sucesso
+e a marcação das despesas falhar, a próxima exportação grava as mesmas
+linhas de novo.
+
+O histórico gravado no Excel antes da troca de backend não é copiado
+para o ledger: as despesas com data anterior a LEDGER_CUTOVER_DATE são
+lidas da planilha (que também recebe as exportações do ledger), somadas
+às do ledger ainda não exportadas.
+"""
+
+import threading
+import time
+import uuid
+from datetime import date
+from typing import Any, Dict, List, Optional, Tuple
+
+from config.settings import (
+    LEDGER_CUTOVER_DATE,
+    LEDGER_EXPORT_BATCH_SIZE,
+    LEDGER_EXPORT_LOCK_SECONDS,
+)
+from data_access.ledger_store import LedgerStore, create_ledger_store
+from services.expense_filters import compile_filters, parse_amount
+from services.expense_records import Expense
+from services.worksheet_shards import expense_day
+from tools.execution_engine import current_tool_context
+from utils.logger import setup_logger
+from utils.service_registry import registry
+
+# Logger específico deste módulo
+logger = setup_logger(__name__)
+
+# Tipo das mensagens de exportação na fila (ver worker_function)
+LEDGER_EXPORT_JOB = "ledger_export"
+
+# Chave das despesas sem data reconhecida: ficam antes de qualquer data e,
+# como no Excel, só aparecem em consultas sem período
+UNDATED_KEY = "0000-00-00"
+
+
+def _iso_date(value: Any) -> str:
+    """
+    Normaliza a data de um período para YYYY-MM-DD.
+
+    Raises:
+        ValueError: Se a data não estiver no formato YYYY-MM-DD
+    """
+    return date.fromisoformat(str(value).strip()[:10]).isoformat()
+
+
+def _day_key(value: Any) -> str:
+    """Data da despesa em YYYY-MM-DD (texto ISO ou série do Excel), ou UNDATED_KEY."""
+    day = expense_day(value)
+    return day.isoformat() if day else UNDATED_KEY
+
+
+def _in_period(day_key: str, start_date: Optional[str], end_date: Optional[str]) -> bool:
+    """Indica se a data está no período (sem período, inclui as despesas sem data)."""
+    if day_key == UNDATED_KEY:
+        return not start_date and not end_date
+    return (not start_date or day_key >= start_date) and (not end_date or day_key <= end_date)
+
+
+class ExpenseLedger:
+    """
+    Armazenamento das despesas no ledger, com a mesma interface do ExcelService.
+
+    As despesas pertencem ao remetente da mensagem (owner), obtido do
+    contexto da ferramenta em execução; fora de uma ferramenta, o owner
+    é o próprio workbook.
+    """
+
+    def __init__(self, store: Optional[LedgerStore] = None, queue=None, excel=None):
+        """
+        Args:
+            store: Armazenamento do ledger (padrão: create_ledger_store())
+            queue: Fila dos jobs de exportação (padrão: message_queue)
+            excel: Serviço de Excel usado na exportação (padrão: excel_service)
+        """
+        self.store = store if store is not None else create_ledger_store()
+        self._queue = queue
+        self._excel = excel
+
+        # Último timestamp (ms) usado nas sequências dos entry_key, para
+        # manter a ordem de lançamento entre chamadas no mesmo milissegundo
+        self._last_stamp = 0
+        self._stamp_lock = threading.Lock()
+
+        logger.info(f"Expense Ledger inicializado ({type(self.store).__name__})")
+
+    @property
+    def queue(self):
+        """Fila dos jobs de exportação (carregada no primeiro uso)."""
+        if self._queue is None:
+            from services.queue_service import message_queue
+            self._queue = message_queue
+        return self._queue
+
+    @property
+    def excel(self):
+        """Serviço de Excel da exportação (carregado no primeiro uso)."""
+        if self._excel is None:
+            from services.excel_service import excel_service
+            self._excel = excel_service
+        return self._excel
+
+    def _owner(self, workbook_id: str) -> str:
+        """Dono das despesas: remetente da mensagem ou, sem ele, o workbook."""
+        context = current_tool_context()
+        sender_id = getattr(context, 'sender_id', None)
+        return sender_id or f"workbook:{workbook_id}"
+
+    def add_expense(
+        self,
+        workbook_id: str,
+        worksheet_name: str,
+        expense_data: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """
+        Grava uma despesa no ledger (ver add_expenses).
+        """
+        return self.add_expenses(workbook_id, worksheet_name, [expense_data])
+
+    def add_expenses(
+        self,
+        workbook_id: str,
+        worksheet_name: str,
+        expenses: List[Dict[str, Any]],
+        table_name: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Grava as despesas no ledger e agenda a exportação para o Excel.
+
+        Datas em texto ISO ou número de série do Excel são normalizadas
+        para YYYY-MM-DD; outros textos são gravados como estão (despesa
+        sem data, como na planilha). Valores aceitam 'R$ 12,50'.
+
+        Args:
+            workbook_id: ID do workbook que recebe a exportação
+            worksheet_name: Nome da planilha que recebe a exportação
+            expenses: Despesas com date, description, category e amount
+            table_name: Nome da tabela do Excel (opcional)
+
+        Returns:
+            dict: {'count': int, 'export_scheduled': bool}
+
+        Raises:
+            ValueError: Se o valor de uma despesa não for numérico
+            DynamoDBError: Se houver erro ao gravar no ledger
+        """
+        if not expenses:
+            return {'count': 0, 'export_scheduled': False}
+
+        owner = self._owner(workbook_id)
+        now = time.time()
+
+        with self._stamp_lock:
+            stamp = max(int(now * 1000), self._last_stamp + 1)
+            self._last_stamp = stamp
+
+        entries = []
+        for index, expense in enumerate(expenses):
+            amount = parse_amount(expense.get('amount', 0))
+            if amount is None:
+                raise ValueError(f"Valor inválido na despesa {index + 1}: {expense.get('amount')!r}")
+
+            day_key = _day_key(expense.get('date'))
+            entries.append({
+                'entry_key': f"{day_key}#{stamp:013d}-{index:04d}-{uuid.uuid4().hex[:8]}",
+                'workbook_id': workbook_id,
+                'worksheet_name': worksheet_name,
+                'table_name': table_name,
+                'date': day_key if day_key != UNDATED_KEY else str(expense.get('date', '')),
+                'description': expense.get('description', ''),
+                'category': expense.get('category', ''),
+                'amount': amount,
+                'created_at': now
+            })
+
+        self.store.put(owner, entries)
+        logger.info(f"{len(entries)} despesa(s) gravada(s) no ledger de {owner}")
+
+        return {'count': len(entries), 'export_scheduled': self._schedule_export(owner)}
+
+    def _schedule_export(self, owner: str) -> bool:
+        """
+        Enfileira a exportação das despesas pendentes do owner.
+
+        Uma falha ao enfileirar não desfaz o lançamento: as despesas
+        continuam pendentes e saem na próxima exportação do owner.
+        """
+        try:
+            self.queue.enqueue({'type': LEDGER_EXPORT_JOB, 'owner': owner})
+            return True
+        except Exception as e:
+            logger.warning(f"Falha ao agendar exportação do ledger de {owner}: {str(e)}")
+            return False
+
+    def load_expenses(self, workbook_id: str, worksheet_name: str) -> List[Expense]:
+        """
+        Retorna as despesas da planilha registradas no ledger, ordenadas por data.
+
+        Inclui as despesas ainda não exportadas para o Excel.
+        """
+        return self._expenses(workbook_id, worksheet_name)
+
+    def _expenses(
+        self,
+        workbook_id: str,
+        worksheet_name: str,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None
+    ) -> List[Expense]:
+        """
+        Consulta o ledger e retorna as despesas no formato do ExcelService.
+
+        Se o período começar antes de LEDGER_CUTOVER_DATE, essa parte vem
+        do Excel (histórico anterior ao ledger e despesas já exportadas),
+        mais as despesas do ledger ainda pendentes de exportação.
+        """
+        entries = [
+            entry
+            for entry in self.store.query(self._owner(workbook_id), start_date, end_date)
+            if entry['workbook_id'] == workbook_id and entry['worksheet_name'] == worksheet_name
+        ]
+
+        if not LEDGER_CUTOVER_DATE or (start_date and start_date >= LEDGER_CUTOVER_DATE):
+            return [self._expense(entry) for entry in entries]
+
+        # Antes do corte, o Excel já tem as despesas exportadas do ledger
+        expenses: List[Expense] = [
+            expense
+            for expense in self.excel.get_expense_history(workbook_id, worksheet_name)
+            if _day_key(expense['date']) < LEDGER_CUTOVER_DATE
+            and _in_period(_day_key(expense['date']), start_date, end_date)
+        ]
+        expenses.extend(
+            self._expense(entry)
+            for entry in entries
+            if entry['entry_key'] >= LEDGER_CUTOVER_DATE or entry.get('export_pending')
+        )
+
+        return sorted(expenses, key=lambda expense: _day_key(expense['date']))
+
+    @staticmethod
+    def _expense(entry: Dict[str, Any]) -> Expense:
+        """Converte uma despesa do ledger em Expense."""
+        return Expense(entry['date'], entry['description'], entry['category'], entry['amount'])
+
+    def get_expense_history(
+        self,
+        workbook_id: str,
+        worksheet_name: str,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> List[Expense]:
+        """
+        Recupera o histórico de despesas do ledger.
+
+        O intervalo de datas do filtro é resolvido pela chave do ledger;
+        as demais condições, pelo filtro compilado.
+
+        Args:
+            workbook_id: ID do workbook no OneDrive
+            worksheet_name: Nome da planilha
+            filters: Filtros opcionais (ver services/expense_filters.py)
+
+        Returns:
+            list: Lista de despesas (Expense, lidas como dict)
+
+        Raises:
+            ValueError: Se algum filtro for inválido
+        """
+        expense_filter = compile_filters(filters)
+
+        expenses = self._expenses(
+            workbook_id, worksheet_name, expense_filter.start_date, expense_filter.end_date
+        )
+
+        return expense_filter.apply(expenses)
+
+    def get_expense_summary(
+        self,
+        workbook_id: str,
+        worksheet_name: str,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        categories: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        """
+        Calcula os totais de despesas do período a partir do ledger.
+
+        Mesmo formato de ExcelService.get_expense_summary; o período é
+        resolvido pela chave do ledger (apenas as despesas do intervalo
+        são lidas).
+
+        Raises:
+            ValueError: Se uma data for inválida
+        """
+        expenses = self._expenses(
+            workbook_id,
+            worksheet_name,
+            _iso_date(start_date) if start_date else None,
+            _iso_date(end_date) if end_date else None
+        )
+
+        def totals(category: Optional[str]) -> Tuple[float, int]:
+            amounts = [
+                parse_amount(expense['amount'])
+                for expense in expenses
+                if category is None or str(expense['category']).casefold() == category.casefold()
+            ]
+            amounts = [amount for amount in amounts if amount is not None]
+            return round(sum(amounts), 2), len(amounts)
+
+        total, count = totals(None)
+        category_totals = []
+
+        for category in categories or []:
+            category_total, category_count = totals(category)
+            category_totals.append({
+                'category': category,
+                'total': category_total,
+                'count': category_count
+            })
+
+        return {
+            'start_date': start_date,
+            'end_date': end_date,
+            'total': total,
+            'count': count,
+            'categories': category_totals
+        }
+
+    def export_pending(self, owner: str, batch_size: int = LEDGER_EXPORT_BATCH_SIZE) -> int:
+        """
+        Exporta para o Excel as despesas pendentes do owner.
+
+        As pendentes são agrupadas por workbook, planilha e tabela, e
+        cada grupo é gravado com uma única escrita (add_expenses). Apenas
+        um worker exporta as despesas de um owner por vez: se outro já
+        estiver exportando, o job termina sem exportar nada, pois o dono
+        do lock continua até não restarem pendentes. Como no flush do
+        journal (WriteBehindExcel.flush), as pendentes são consultadas de
+        novo após liberar o lock, e uma despesa lançada nesse intervalo
+        é exportada retomando o lock.
+
+        Args:
+            owner: Dono das despesas (ver job LEDGER_EXPORT_JOB)
+            batch_size: Máximo de despesas lidas por rodada
+
+        Returns:
+            int: Número de despesas exportadas (0 se outro worker estiver
+                 exportando)
+
+        Raises:
+            MicrosoftGraphAPIError: Se houver erro ao gravar no Excel
+        """
+        exported = 0
+
+        while True:
+            holder = uuid.uuid4().hex
+
+            if not self.store.try_acquire_export_lock(owner, holder, LEDGER_EXPORT_LOCK_SECONDS):
+                logger.info(f"Exportação do ledger de {owner} já em andamento; nada a fazer")
+                break
+
+            try:
+                exported += self._export_locked(owner, batch_size)
+            finally:
+                self.store.release_export_lock(owner, holder)
+
+            if not self.store.pending(owner, 1):
+                break
+
+        logger.info(f"{exported} despesa(s) do ledger de {owner} exportada(s) para o Excel")
+        return exported
+
+    def _export_locked(self, owner: str, batch_size: int) -> int:
+        """Exporta as pendentes do owner até não restar nenhuma (com o lock do owner)."""
+        exported = 0
+
+        while True:
+            entries = self.store.pending(owner, batch_size)
+            if not entries:
+                return exported
+
+            groups: Dict[Tuple[str, str, Optional[str]], List[Dict[str, Any]]] = {}
+            for entry in entries:
+                key = (entry['workbook_id'], entry['worksheet_name'], entry.get('table_name'))
+                groups.setdefault(key, []).append(entry)
+
+            for (workbook_id, worksheet_name, table_name), group in groups.items():
+                self.excel.add_expenses(
+                    workbook_id=workbook_id,
+                    worksheet_name=worksheet_name,
+                    expenses=group,
+                    table_name=table_name
+                )
+                self.store.mark_exported(owner, [entry['entry_key'] for entry in group])
+                exported += len(group)
+
+
+# Instância global do ledger (singleton pattern, criada no primeiro uso)
+expense_ledger = registry.register("expense_ledger", ExpenseLedger)
@@ -0,0 +1,58 @@
+"""
+Registro compacto das despesas lidas (Expense).
+
+As leituras do histórico (ExcelService, ledger, write-behind) retornam
+uma despesa por linha da planilha. Em dicts, cada despesa carrega a
+própria tabela de chaves; o Expense guarda os quatro campos em
+__slots__, com cerca de um terço da memória, e mantém a interface de
+leitura de um dict (expense['date'], expense.get('amount'), dict(expense)),
+usada pelas ferramentas, pelos filtros e pelas análises.
+"""
+
+from collections.abc import Mapping
+from typing import Any, Iterator, List
+
+# Campos da despesa, na ordem das colunas da planilha
+EXPENSE_FIELDS = ("date", "description", "category", "amount")
+
+_FIELD_SET = frozenset(EXPENSE_FIELDS)
+
+
+class Expense(Mapping):
+    """
+    Despesa lida da planilha (data, descrição, categoria, valor).
+
+    Os valores são os das células, sem conversão (datas podem ser texto
+    ISO ou número de série do Excel; valores, número ou texto).
+    """
+
+    __slots__ = EXPENSE_FIELDS
+
+    def __init__(self, date: Any, description: Any, category: Any, amount: Any):
+        self.date = date
+        self.description = description
+        self.category = category
+        self.amount = amount
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in _FIELD_SET:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key not in _FIELD_SET:
+            return default
+        return getattr(self, key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(EXPENSE_FIELDS)
+
+    def __len__(self) -> int:
+        return len(EXPENSE_FIELDS)
+
+    def __repr__(self) -> str:
+        return f"Expense({self.date!r}, {self.description!r}, {self.category!r}, {self.amount!r})"
+
+    def as_row(self) -> List[Any]:
+        """Campos na ordem das colunas da planilha."""
+        return [self.date, self.description, self.category, self.amount]
@@ -0,0 +1,38 @@
+"""
+Escolha do armazenamento das despesas usado pelas ferramentas e análises.
+
+O Excel é a origem padrão. Com EXPENSE_BACKEND=ledger as despesas ficam
+no ledger (exportadas depois para o Excel); com EXCEL_WRITE_MODE=write_behind
+as escritas passam pelo journal. Todos expõem a mesma interface
+(add_expense, add_expenses, get_expense_history, get_expense_summary,
+load_expenses), e a escolha fica apenas aqui.
+"""
+
+from typing import Any
+
+from config.settings import EXCEL_WRITE_MODE, EXPENSE_BACKEND
+from services.excel_service import excel_service
+
+
+def expense_store(excel: Any = None) -> Any:
+    """
+    Retorna o armazenamento das despesas configurado.
+
+    Args:
+        excel: Serviço do Excel usado sem ledger nem write-behind
+               (padrão: excel_service)
+
+    Returns:
+        expense_ledger com EXPENSE_BACKEND=ledger; write_behind_excel com
+        EXCEL_WRITE_MODE=write_behind; ou o serviço do Excel
+    """
+    # Imports adiados: ledger e journal só são carregados quando configurados
+    if EXPENSE_BACKEND == 'ledger':
+        from services.expense_ledger import expense_ledger
+        return expense_ledger
+
+    if EXCEL_WRITE_MODE == 'write_behind':
+        from services.write_behind import write_behind_excel
+        return write_behind_excel
+
+    return excel if excel is not None else excel_service
@@ -0,0 +1,391 @@
+"""
+Agrupamento de requisições ao Microsoft Graph via JSON batching ($batch).
+
+As ferramentas de uma mesma rodada rodam em paralelo e costumam acessar
+o mesmo workbook (ex: uma leitura do histórico e várias escritas). Em vez
+de uma requisição HTTP por operação, as chamadas feitas dentro de uma
+janela curta são enviadas juntas ao endpoint /$batch (até 20 por lote),
+e cada chamador recebe a sua resposta. Escritas no mesmo workbook são
+encadeadas com 'dependsOn', preservando a ordem em que foram feitas.
+Uma requisição sem nenhuma outra em andamento é enviada na hora, sem
+esperar a janela.
+
+Lotes contam como uma única requisição HTTP, mas cada sub-requisição
+continua valendo para os limites de throttling do Graph: respostas 429
+individuais voltam para o chamador correspondente, com o Retry-After.
+As escritas encadeadas após uma falha transitória (respondidas com 424)
+também são repetíveis: elas não chegaram a ser executadas.
+"""
+
+import re
+import threading
+import time
+from contextlib import contextmanager
+from concurrent.futures import Future, TimeoutError as FuturesTimeoutError
+from typing import Any, Callable, Dict, Iterator, List, Optional
+from urllib.parse import urlencode
+
+from services.http_transport import status_api_error
+from utils.logger import setup_logger
+from utils.exceptions import MicrosoftGraphAPIError
+
+# Logger específico deste módulo
+logger = setup_logger(__name__)
+
+# Limite de sub-requisições por lote imposto pelo Microsoft Graph
+GRAPH_BATCH_MAX_REQUESTS = 20
+
+# Header da sessão de workbook, repassado às sub-requisições do lote
+WORKBOOK_SESSION_HEADER = "workbook-session-id"
+
+# Status de uma sub-requisição não executada porque a anterior ('dependsOn') falhou
+FAILED_DEPENDENCY_STATUS = 424
+
+# Identifica o workbook de uma URL (.../drive/items/{id}/workbook/...)
+_WORKBOOK_PATTERN = re.compile(r"/drive/items/([^/]+)/workbook")
+
+
+def workbook_id_from_url(url: str) -> Optional[str]:
+    """Retorna o ID do workbook acessado pela URL, ou None."""
+    match = _WORKBOOK_PATTERN.search(url)
+    return match.group(1) if match else None
+
+
+class GraphBatchResponse:
+    """
+    Resposta de uma sub-requisição do lote.
+
+    Expõe a mesma interface usada de requests.Response pelos serviços
+    (status_code, headers, json(), text).
+    """
+
+    def __init__(self, status_code: int, headers: Dict[str, str], body: Any):
+        """
+        Args:
+            status_code: Status HTTP da sub-requisição
+            headers: Headers da sub-requisição
+            body: Corpo já decodificado (JSON)
+        """
+        self.status_code = status_code
+        self.headers = headers
+        self._body = body
+
+    def json(self) -> Any:
+        """Retorna o corpo decodificado."""
+        return self._body
+
+    @property
+    def text(self) -> str:
+        """Retorna o corpo como texto (usado em mensagens de erro)."""
+        return str(self._body)
+
+
+class _PendingRequest:
+    """Sub-requisição aguardando o envio do lote."""
+
+    __slots__ = ("method", "url", "error_message", "idempotent", "wait_timeout", "kwargs", "future")
+
+    def __init__(
+        self,
+        method: str,
+        url: str,
+        error_message: str,
+        idempotent: bool,
+        wait_timeout: float,
+        kwargs: Dict[str, Any]
+    ):
+        self.method = method
+        self.url = url
+        self.error_message = error_message
+        self.idempotent = idempotent
+        self.wait_timeout = wait_timeout
+        self.kwargs = kwargs
+        self.future: Future = Future()
+
+    @property
+    def is_write(self) -> bool:
+        return self.method.upper() != "GET"
+
+    @property
+    def workbook(self) -> Optional[str]:
+        return workbook_id_from_url(self.url)
+
+
+class GraphBatchCoalescer:
+    """
+    Agrupa requisições ao Graph feitas por threads concorrentes.
+
+    A primeira requisição de uma janela torna-se a "líder": aguarda
+    window_seconds, recolhe todas as requisições pendentes e as envia
+    (diretamente se houver apenas uma, ou em lotes via /$batch). As demais
+    threads apenas aguardam o resultado. Se não houver outra requisição
+    em andamento (nem um grupo aberto com group()), a líder não espera
+    a janela. Não há thread em segundo plano, o que é adequado ao Lambda
+    (nada roda entre invocações).
+
+    O lote é enviado pela thread líder, mas não herda o prazo dela: o
+    timeout do envio é o maior prazo entre os chamadores do lote, e cada
+    chamador espera pela sua resposta apenas até o seu próprio prazo
+    (wait_timeout de submit).
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        send_single: Callable[..., Any],
+        send_batch: Callable[[List[Dict[str, Any]], bool, float], Dict[str, Any]],
+        window_seconds: float,
+        max_batch_size: int = GRAPH_BATCH_MAX_REQUESTS,
+        wait_timeout: float = 60
+    ):
+        """
+        Args:
+            base_url: URL base do Graph (ex: https://graph.microsoft.com/v1.0)
+            send_single: Envia uma requisição isolada:
+                         send_single(method, url, error_message, idempotent, **kwargs)
+            send_batch: Envia o corpo de um lote e retorna a resposta do /$batch:
+                        send_batch(requests, idempotent, timeout)
+            window_seconds: Janela de agrupamento
+            max_batch_size: Máximo de sub-requisições por lote
+            wait_timeout: Espera máxima de um chamador pelo seu resultado
+        """
+        self.base_url = base_url
+        self.send_single = send_single
+        self.send_batch = send_batch
+        self.window_seconds = window_seconds
+        self.max_batch_size = max_batch_size
+        self.wait_timeout = wait_timeout
+
+        self._lock = threading.Lock()
+        self._pending: List[_PendingRequest] = []
+        self._leader_active = False
+        self._in_flight = 0
+
+    @contextmanager
+    def group(self) -> Iterator[None]:
+        """
+        Mantém a janela de agrupamento ativa durante o bloco.
+
+        Para quem vai disparar várias requisições simultâneas (ex: em um
+        pool de threads): sem o grupo, a primeira delas não encontraria
+        outra em andamento e seria enviada sozinha.
+        """
+        with self._lock:
+            self._in_flight += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    def submit(
+        self,
+        method: str,
+        url: str,
+        error_message: str,
+        idempotent: bool = True,
+        wait_timeout: Optional[float] = None,
+        **kwargs: Any
+    ) -> Any:
+        """
+        Agenda uma requisição e aguarda a sua resposta.
+
+        Args:
+            method: Método HTTP
+            url: URL absoluta da requisição (dentro de base_url)
+            error_message: Descrição usada na mensagem de erro
+            idempotent: Se a requisição pode ser repetida com segurança
+            wait_timeout: Espera máxima pela resposta (padrão: o wait_timeout
+                          do agrupador), normalmente o prazo do chamador
+            **kwargs: headers, json e params da requisição
+
+        Returns:
+            Resposta bem-sucedida (requests.Response ou GraphBatchResponse)
+
+        Raises:
+            MicrosoftGraphAPIError: Se a requisição (ou o lote) falhar
+        """
+        request = _PendingRequest(
+            method, url, error_message, idempotent, wait_timeout or self.wait_timeout, kwargs
+        )
+
+        with self._lock:
+            self._pending.append(request)
+            is_leader = not self._leader_active
+            self._leader_active = True
+            concurrent = self._in_flight > 0
+            self._in_flight += 1
+
+        try:
+            if is_leader:
+                if concurrent:
+                    # Aguardar as requisições concorrentes da mesma rodada
+                    time.sleep(self.window_seconds)
+
+                with self._lock:
+                    pending, self._pending = self._pending, []
+                    self._leader_active = False
+
+                self._flush(pending)
+
+            return request.future.result(timeout=request.wait_timeout)
+        except FuturesTimeoutError:
+            raise MicrosoftGraphAPIError(
+                f"{error_message}: lote de requisições sem resposta",
+                retryable=idempotent
+            )
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    def _flush(self, pending: List[_PendingRequest]) -> None:
+        """Envia as requisições recolhidas e entrega os resultados."""
+        if len(pending) == 1:
+            request = pending[0]
+            try:
+                request.future.set_result(self.send_single(
+                    request.method,
+                    request.url,
+                    request.error_message,
+                    request.idempotent,
+                    **request.kwargs
+                ))
+            except BaseException as e:
+                request.future.set_exception(e)
+            return
+
+        for start in range(0, len(pending), self.max_batch_size):
+            self._send_chunk(pending[start:start + self.max_batch_size])
+
+    def _send_chunk(self, chunk: List[_PendingRequest]) -> None:
+        """Envia um lote e distribui as respostas para os chamadores."""
+        logger.info(f"Enviando {len(chunk)} requisições ao Graph em um único $batch")
+
+        body = self._build_batch(chunk)
+        idempotent = all(request.idempotent for request in chunk)
+        # O lote atende a todos: vale o maior prazo entre os chamadores
+        timeout = max(request.wait_timeout for request in chunk)
+
+        try:
+            result = self.send_batch(body, idempotent, timeout)
+        except BaseException as e:
+            for request in chunk:
+                request.future.set_exception(e)
+            return
+
+        responses = {
+            str(response.get("id")): response
+            for response in result.get("responses", [])
+        }
+        errors: Dict[str, MicrosoftGraphAPIError] = {}
+
+        for sub_request, request in zip(body, chunk):
+            response = responses.get(sub_request["id"])
+
+            if response is None:
+                request.future.set_exception(MicrosoftGraphAPIError(
+                    f"{request.error_message}: resposta ausente no lote",
+                    retryable=request.idempotent
+                ))
+                continue
+
+            status = int(response.get("status", 500))
+            headers = response.get("headers") or {}
+            response_body = response.get("body")
+
+            if status < 400:
+                request.future.set_result(GraphBatchResponse(status, headers, response_body))
+                continue
+
+            error = self._dependency_error(sub_request, status, errors, request.error_message)
+            if error is None:
+                error = status_api_error(
+                    status,
+                    headers,
+                    str(response_body),
+                    MicrosoftGraphAPIError,
+                    request.error_message,
+                    request.idempotent
+                )
+
+            errors[sub_request["id"]] = error
+            request.future.set_exception(error)
+
+    @staticmethod
+    def _dependency_error(
+        sub_request: Dict[str, Any],
+        status: int,
+        errors: Dict[str, MicrosoftGraphAPIError],
+        error_message: str
+    ) -> Optional[MicrosoftGraphAPIError]:
+        """
+        Erro de uma sub-requisição não executada por falha transitória da anterior.
+
+        O Graph responde 424 às sub-requisições cuja dependência falhou,
+        sem executá-las: se a dependência pode ser repetida (ex: 429), a
+        dependente também pode, mesmo sendo uma escrita.
+
+        Returns:
+            MicrosoftGraphAPIError repetível, ou None se não for o caso
+        """
+        if status != FAILED_DEPENDENCY_STATUS:
+            return None
+
+        previous = next(
+            (errors[request_id] for request_id in sub_request.get("dependsOn", []) if request_id in errors),
+            None
+        )
+        if previous is None or not previous.retryable:
+            return None
+
+        return MicrosoftGraphAPIError(
+            f"{error_message}: não executada (falha na requisição anterior do lote)",
+            retryable=True,
+            retry_after=previous.retry_after,
+            status_code=status
+        )
+
+    def _build_batch(self, chunk: List[_PendingRequest]) -> List[Dict[str, Any]]:
+        """
+        Monta as sub-requisições do lote.
+
+        Escritas no mesmo workbook dependem da escrita anterior
+        ('dependsOn'), para o Graph executá-las na ordem de chegada.
+        """
+        last_write: Dict[Optional[str], str] = {}
+        requests_body = []
+
+        for index, request in enumerate(chunk):
+            request_id = str(index + 1)
+            params = request.kwargs.get("params")
+            url = request.url[len(self.base_url):]
+            if params:
+                url = f"{url}?{urlencode(params)}"
+
+            sub_request: Dict[str, Any] = {
+                "id": request_id,
+                "method": request.method.upper(),
+                "url": url
+            }
+
+            headers = {}
+            if "json" in request.kwargs:
+                sub_request["body"] = request.kwargs["json"]
+                headers["Content-Type"] = "application/json"
+
+            session_id = (request.kwargs.get("headers") or {}).get(WORKBOOK_SESSION_HEADER)
+            if session_id:
+                headers[WORKBOOK_SESSION_HEADER] = session_id
+
+            if headers:
+                sub_request["headers"] = headers
+
+            if request.is_write:
+                previous = last_write.get(request.workbook)
+                if previous:
+                    sub_request["dependsOn"] = [previous]
+                last_write[request.workbook] = request_id
+
+            requests_body.append(sub_request)
+
+        return requests_body
@@ -0,0 +1,249 @@
+"""
+Camada de transporte HTTP compartilhada.
+
+Mantém, por container do Lambda, os clientes HTTP usados por todos os
+serviços: uma requests.Session com pool de conexões keep-alive (Microsoft
+Graph, download de mídia do Twilio) e um único cliente da OpenAI
+(Assistants e Whisper) sobre um pool httpx, com HTTP/2 quando o pacote
+'h2' estiver instalado. Invocações aquecidas reutilizam as conexões já
+abertas, evitando novos handshakes TCP+TLS a cada chamada.
+"""
+
+import importlib.util
+from typing import Any, Type
+
+from config.settings import (
+    OPENAI_API_KEY,
+    HTTP_POOL_CONNECTIONS,
+    HTTP_POOL_MAXSIZE,
+    HTTP_KEEPALIVE_EXPIRY_SECONDS,
+    HTTP2_ENABLED
+)
+from utils.logger import setup_logger
+from utils.exceptions import FinancialAssistantError
+from utils.resilience import RETRYABLE_STATUS_CODES, parse_retry_after
+from utils.service_registry import registry
+
+# Logger específico deste módulo
+logger = setup_logger(__name__)
+
+
+def create_http_session() -> Any:
+    """
+    Cria a requests.Session compartilhada com pool de conexões.
+
+    Cada host (Graph, login da Microsoft, mídia do Twilio) tem seu próprio
+    pool de até HTTP_POOL_MAXSIZE conexões keep-alive. As respostas são
+    solicitadas com compressão gzip.
+
+    Returns:
+        requests.Session: Sessão configurada
+    """
+    # Import adiado para não pesar no cold start
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+
+    # Sem retries no adapter: a política de retry é da aplicação
+    adapter = HTTPAdapter(
+        pool_connections=HTTP_POOL_CONNECTIONS,
+        pool_maxsize=HTTP_POOL_MAXSIZE,
+        max_retries=0
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+    session.headers.update({
+        "Accept-Encoding": "gzip, deflate",
+        "Connection": "keep-alive"
+    })
+
+    logger.info(
+        f"Sessão HTTP compartilhada criada (pool por host: {HTTP_POOL_MAXSIZE})"
+    )
+    return session
+
+
+def http2_available() -> bool:
+    """Indica se HTTP/2 está habilitado e o pacote 'h2' está instalado."""
+    return HTTP2_ENABLED and importlib.util.find_spec("h2") is not None
+
+
+def create_openai_client() -> Any:
+    """
+    Cria o cliente da OpenAI compartilhado por Assistants e Whisper.
+
+    Usa um pool httpx com keep-alive (e HTTP/2 quando disponível). Em
+    versões do SDK sem DefaultHttpxClient, usa o cliente padrão.
+
+    Returns:
+        openai.OpenAI: Cliente configurado
+    """
+    # Import adiado para não pesar no cold start
+    from openai import OpenAI
+
+    # Sem retries no SDK (max_retries=0): a política de retry é da
+    # aplicação (utils.resilience), limitada pelo prazo da requisição
+    try:
+        import httpx
+        from openai import DefaultHttpxClient
+
+    except ImportError:
+        logger.warning("Pool httpx indisponível, usando cliente padrão da OpenAI")
+        return OpenAI(api_key=OPENAI_API_KEY, max_retries=0)
+
+    use_http2 = http2_available()
+    http_client = DefaultHttpxClient(
+        http2=use_http2,
+        limits=httpx.Limits(
+            max_connections=HTTP_POOL_MAXSIZE,
+            max_keepalive_connections=HTTP_POOL_MAXSIZE,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY_SECONDS
+        )
+    )
+
+    logger.info(f"Cliente OpenAI compartilhado criado (HTTP/2: {use_http2})")
+    return OpenAI(api_key=OPENAI_API_KEY, http_client=http_client, max_retries=0)
+
+
+def _classify(status_code: Any, connect_failed: bool, idempotent: bool) -> bool:
+    """
+    Decide se um erro HTTP é transitório (pode ser repetido).
+
+    Operações não idempotentes (ex: criar run, adicionar linha) só são
+    repetidas quando a requisição certamente não foi processada: 429 ou
+    falha ao estabelecer a conexão.
+    """
+    if status_code is None:
+        return connect_failed or idempotent
+
+    if status_code == 429:
+        return True
+
+    return idempotent and status_code in RETRYABLE_STATUS_CODES
+
+
+def status_api_error(
+    status_code: int,
+    headers: Any,
+    error_text: str,
+    error_class: Type[FinancialAssistantError],
+    message: str,
+    idempotent: bool = True
+) -> FinancialAssistantError:
+    """
+    Cria a exceção da aplicação para uma resposta HTTP de erro.
+    
+    Usado quando não há exceção do requests, como nas sub-respostas
+    de um lote do Microsoft Graph ($batch).
+    
+    Args:
+        status_code: Status HTTP da resposta
+        headers: Headers da resposta (Retry-After)
+        error_text: Corpo da resposta
+        error_class: Classe da exceção da aplicação
+        message: Descrição da operação que falhou
+        idempotent: Se a operação pode ser repetida com segurança
+    
+    Returns:
+        FinancialAssistantError: Exceção com retryable/retry_after/status_code preenchidos
+    """
+    retry_after_header = next(
+        (value for key, value in headers.items() if key.lower() == "retry-after"),
+        None
+    )
+    
+    logger.error(f"{message}: {error_text}")
+    return error_class(
+        f"{message}: {error_text}",
+        retryable=_classify(status_code, connect_failed=False, idempotent=idempotent),
+        retry_after=parse_retry_after(retry_after_header),
+        status_code=status_code
+    )
+
+
+def requests_api_error(
+    exc: Exception,
+    error_class: Type[FinancialAssistantError],
+    message: str,
+    idempotent: bool = True
+) -> FinancialAssistantError:
+    """
+    Converte uma exceção do requests em exceção da aplicação classificada.
+
+    Args:
+        exc: Exceção lançada pelo requests
+        error_class: Classe da exceção da aplicação (ex: MicrosoftGraphAPIError)
+        message: Descrição da operação que falhou
+        idempotent: Se a operação pode ser repetida com segurança
+
+    Returns:
+        FinancialAssistantError: Exceção com retryable/retry_after/status_code preenchidos
+    """
+    import requests
+
+    response = getattr(exc, "response", None)
+    status_code = response.status_code if response is not None else None
+    error_text = response.text if response is not None else str(exc)
+    retry_after = (
+        parse_retry_after(response.headers.get("Retry-After"))
+        if response is not None else None
+    )
+
+    retryable = _classify(
+        status_code,
+        connect_failed=isinstance(exc, requests.exceptions.ConnectTimeout),
+        idempotent=idempotent
+    )
+
+    logger.error(f"{message}: {error_text}")
+    return error_class(
+        f"{message}: {error_text}",
+        retryable=retryable,
+        retry_after=retry_after,
+        status_code=status_code
+    )
+
+
+def openai_api_error(
+    exc: Exception,
+    error_class: Type[FinancialAssistantError],
+    message: str,
+    idempotent: bool = True
+) -> FinancialAssistantError:
+    """
+    Converte uma exceção do SDK da OpenAI em exceção da aplicação classificada.
+
+    Args:
+        exc: Exceção lançada pelo SDK
+        error_class: Classe da exceção da aplicação (ex: OpenAIAPIError)
+        message: Descrição da operação que falhou
+        idempotent: Se a operação pode ser repetida com segurança
+
+    Returns:
+        FinancialAssistantError: Exceção com retryable/retry_after preenchidos
+    """
+    if isinstance(exc, FinancialAssistantError):
+        return exc
+
+    import openai
+
+    retryable = False
+    retry_after = None
+
+    if isinstance(exc, openai.APIStatusError):
+        retry_after = parse_retry_after(exc.response.headers.get("retry-after"))
+        retryable = _classify(exc.status_code, connect_failed=False, idempotent=idempotent)
+
+    elif isinstance(exc, openai.APIConnectionError):
+        retryable = _classify(None, connect_failed=False, idempotent=idempotent)
+
+    logger.error(f"{message}: {str(exc)}")
+    return error_class(f"{message}: {str(exc)}", retryable=retryable, retry_after=retry_after)
+
+
+# Instâncias globais (singleton pattern, criadas no primeiro uso e
+# reutilizadas entre invocações aquecidas do Lambda)
+http_session = registry.register("http_session", create_http_session)
+openai_client = registry.register("openai_client", create_openai_client)
@@ -7,20 +7,28 @@ e recuperação de respostas.
 """
 
 import time
-from typing import Dict, List, Any, Optional
-from openai import OpenAI
+from typing import Callable, Dict, List, Any, Optional
 
 from config.settings import (
     OPENAI_API_KEY,
     ASSISTANT_ID,
-    ASSISTANT_RUN_POLLING_INTERVAL_SECONDS
+    ASSISTANT_RUN_POLLING_INTERVAL_SECONDS,
+    ASSISTANT_RUN_STREAMING,
+    ASSISTANT_RUN_MAX_WAIT_SECONDS
 )
+from services.http_transport import openai_client, openai_api_error
+from utils.deadline import Deadline
+from utils.resilience import call_with_retry
 from utils.logger import setup_logger
 from utils.exceptions import OpenAIAPIError
+from utils.service_registry import registry
 
 # Logger específico deste módulo
 logger = setup_logger(__name__)
 
+# Status de um run que ainda ocupa a thread (outro run não pode ser criado)
+ACTIVE_RUN_STATUSES = ('queued', 'in_progress', 'requires_action', 'cancelling')
+
 
 class OpenAIService:
     """
@@ -37,10 +45,48 @@ class OpenAIService:
         if not ASSISTANT_ID:
             raise OpenAIAPIError("ASSISTANT_ID não está configurado")
         
-        self.client = OpenAI(api_key=OPENAI_API_KEY)
+        # Cliente compartilhado (pool de conexões reutilizado entre invocações)
+        self.client = openai_client.get_instance()
         self.assistant_id = ASSISTANT_ID
         logger.info(f"OpenAI Service inicializado com Assistant ID: {ASSISTANT_ID}")
     
+    def _call(
+        self,
+        operation: str,
+        func: Callable[[], Any],
+        idempotent: bool = True,
+        deadline: Optional[Deadline] = None
+    ) -> Any:
+        """
+        Executa uma chamada à OpenAI API com retry e circuit breaker.
+        
+        Erros transitórios (429, 5xx e falhas de conexão) são repetidos
+        com backoff. Operações que criam recursos (idempotent=False) só
+        são repetidas quando a requisição certamente não foi processada.
+        
+        Args:
+            operation: Nome da operação (usado em logs)
+            func: Função sem argumentos que faz a chamada ao SDK
+            idempotent: Se a chamada pode ser repetida com segurança
+            deadline: Prazo para as tentativas (opcional)
+        
+        Returns:
+            Any: Retorno do SDK
+        
+        Raises:
+            OpenAIAPIError: Se a chamada falhar
+            CircuitOpenError: Se a OpenAI API estiver indisponível
+        """
+        def attempt():
+            try:
+                return func()
+            except Exception as e:
+                raise openai_api_error(
+                    e, OpenAIAPIError, f"Erro em {operation}", idempotent
+                ) from e
+        
+        return call_with_retry(attempt, "openai", deadline=deadline)
+    
     def create_thread(self) -> str:
         """
         Cria uma nova thread de conversa.
@@ -53,7 +99,11 @@ class OpenAIService:
         """
         try:
             logger.debug("Criando nova thread no OpenAI")
-            thread = self.client.beta.threads.create()
+            thread = self._call(
+                "threads.create",
+                lambda: self.client.beta.threads.create(),
+                idempotent=False
+            )
             logger.info(f"Thread criada com sucesso: {thread.id}")
             return thread.id
             
@@ -75,10 +125,14 @@ class OpenAIService:
         try:
             logger.debug(f"Adicionando mensagem à thread {thread_id}")
             
-            self.client.beta.threads.messages.create(
-                thread_id=thread_id,
-                role="user",
-                content=content
+            self._call(
+                "messages.create",
+                lambda: self.client.beta.threads.messages.create(
+                    thread_id=thread_id,
+                    role="user",
+                    content=content
+                ),
+                idempotent=False
             )
             
             logger.info(
@@ -96,17 +150,20 @@ class OpenAIService:
     def run_assistant(
         self,
         thread_id: str,
-        max_wait_seconds: int = 60
+        max_wait_seconds: float = ASSISTANT_RUN_MAX_WAIT_SECONDS,
+        deadline: Optional[Deadline] = None
     ) -> Dict[str, Any]:
         """
         Executa o assistant em uma thread e aguarda a conclusão.
         
-        Faz polling do status da execução até que ela seja concluída,
-        necessite de ação (tool calls) ou atinja o timeout.
+        Por padrão usa o event stream da Assistants API, reagindo aos
+        eventos (tool calls, texto, conclusão) assim que chegam. Se o
+        streaming estiver desabilitado ou falhar, usa polling do status.
         
         Args:
             thread_id: ID da thread
             max_wait_seconds: Tempo máximo de espera em segundos
+            deadline: Prazo da requisição (opcional). A espera nunca o ultrapassa
             
         Returns:
             dict: Informações sobre a execução, incluindo status e tool calls
@@ -114,9 +171,36 @@ class OpenAIService:
                   {
                       'status': str,
                       'run_id': str,
-                      'required_action': dict ou None
+                      'required_action': dict ou None,
+                      'response': str ou None  # texto final (apenas streaming)
                   }
             
+        Raises:
+            OpenAIAPIError: Se houver erro na execução ou timeout
+            DeadlineExceededError: Se o prazo já estiver esgotado
+        """
+        max_wait_seconds = self._limit_wait(max_wait_seconds, deadline, "run_assistant")
+        
+        if ASSISTANT_RUN_STREAMING:
+            return self._run_assistant_streaming(thread_id, max_wait_seconds)
+        
+        return self._run_assistant_polling(thread_id, max_wait_seconds)
+    
+    def _run_assistant_polling(
+        self,
+        thread_id: str,
+        max_wait_seconds: int
+    ) -> Dict[str, Any]:
+        """
+        Cria o run e acompanha seu status por polling.
+        
+        Args:
+            thread_id: ID da thread
+            max_wait_seconds: Tempo máximo de espera em segundos
+        
+        Returns:
+            dict: Resultado no formato de run_assistant
+        
         Raises:
             OpenAIAPIError: Se houver erro na execução ou timeout
         """
@@ -124,30 +208,67 @@ class OpenAIService:
             logger.debug(f"Iniciando execução do Assistant na thread {thread_id}")
             
             # Iniciar a execução
-            run = self.client.beta.threads.runs.create(
-                thread_id=thread_id,
-                assistant_id=self.assistant_id
+            run = self._call(
+                "runs.create",
+                lambda: self.client.beta.threads.runs.create(
+                    thread_id=thread_id,
+                    assistant_id=self.assistant_id
+                ),
+                idempotent=False
             )
             
             logger.info(f"Run iniciado: {run.id} na thread {thread_id}")
             
-            # Polling do status
+        except Exception as e:
+            logger.error(f"Erro ao executar assistant: {str(e)}")
+            raise OpenAIAPIError(
+                f"Falha ao executar assistant: {str(e)}"
+            ) from e
+        
+        return self._poll_run(thread_id, run.id, max_wait_seconds)
+    
+    def _poll_run(
+        self,
+        thread_id: str,
+        run_id: str,
+        max_wait_seconds: float
+    ) -> Dict[str, Any]:
+        """
+        Faz polling do status de um run existente até um estado final.
+        
+        Args:
+            thread_id: ID da thread
+            run_id: ID do run a acompanhar
+            max_wait_seconds: Tempo máximo de espera em segundos
+        
+        Returns:
+            dict: Resultado no formato de run_assistant
+        
+        Raises:
+            OpenAIAPIError: Se houver erro na execução ou timeout
+        """
+        try:
             start_time = time.time()
             while True:
                 # Verificar timeout
                 elapsed = time.time() - start_time
                 if elapsed > max_wait_seconds:
                     logger.error(
-                        f"Timeout ao aguardar conclusão do run {run.id}"
+                        f"Timeout ao aguardar conclusão do run {run_id}"
                     )
+                    self._abandon_run(thread_id, run_id)
                     raise OpenAIAPIError(
                         f"Timeout: Run não concluído em {max_wait_seconds}s"
                     )
                 
                 # Buscar status atualizado
-                run = self.client.beta.threads.runs.retrieve(
-                    thread_id=thread_id,
-                    run_id=run.id
+                run = self._call(
+                    "runs.retrieve",
+                    lambda: self.client.beta.threads.runs.retrieve(
+                        thread_id=thread_id,
+                        run_id=run_id
+                    ),
+                    deadline=Deadline(max_wait_seconds - elapsed)
                 )
                 
                 logger.debug(f"Status do run {run.id}: {run.status}")
@@ -158,7 +279,8 @@ class OpenAIService:
                     return {
                         'status': 'completed',
                         'run_id': run.id,
-                        'required_action': None
+                        'required_action': None,
+                        'response': None
                     }
                 
                 # Verificar se requer ação (tool calls)
@@ -169,7 +291,8 @@ class OpenAIService:
                     return {
                         'status': 'requires_action',
                         'run_id': run.id,
-                        'required_action': run.required_action
+                        'required_action': run.required_action,
+                        'response': None
                     }
                 
                 # Verificar se falhou
@@ -189,6 +312,225 @@ class OpenAIService:
                 f"Falha ao executar assistant: {str(e)}"
             ) from e
     
+    def _run_assistant_streaming(
+        self,
+        thread_id: str,
+        max_wait_seconds: int
+    ) -> Dict[str, Any]:
+        """
+        Cria o run via event stream e consome os eventos até um estado final.
+        
+        Se o stream falhar antes de o run_id ser conhecido, o run pode já
+        ter sido criado no servidor: o run ativo da thread, se houver, é
+        acompanhado por polling; senão, o run é criado por polling. Se
+        falhar depois, continua acompanhando o mesmo run por polling, sem
+        criar um run duplicado.
+        
+        O timeout do stream no SDK vale para cada leitura; o tempo total
+        é verificado a cada evento, e o run é cancelado ao esgotá-lo.
+        
+        Args:
+            thread_id: ID da thread
+            max_wait_seconds: Tempo máximo de espera em segundos
+        
+        Returns:
+            dict: Resultado no formato de run_assistant
+        
+        Raises:
+            OpenAIAPIError: Se houver erro na execução ou timeout
+        """
+        logger.debug(
+            f"Iniciando execução do Assistant (streaming) na thread {thread_id}"
+        )
+        wait = Deadline(max_wait_seconds)
+        state: Dict[str, Any] = {'run_id': None}
+        
+        try:
+            stream_manager = self.client.beta.threads.runs.stream(
+                thread_id=thread_id,
+                assistant_id=self.assistant_id,
+                timeout=max_wait_seconds
+            )
+            return self._consume_run_stream(stream_manager, thread_id, state, wait)
+            
+        except OpenAIAPIError:
+            raise
+        except Exception as e:
+            run_id = state['run_id']
+            
+            if run_id:
+                logger.warning(
+                    f"Stream do run {run_id} interrompido ({str(e)}). "
+                    "Continuando por polling..."
+                )
+                return self._poll_run(thread_id, run_id, wait.remaining())
+            
+            run_id = self._active_run_id(thread_id)
+            if run_id:
+                logger.warning(
+                    f"Falha no stream ({str(e)}), mas o run {run_id} já existe. "
+                    "Continuando por polling..."
+                )
+                return self._poll_run(thread_id, run_id, wait.remaining())
+            
+            logger.warning(
+                f"Falha ao iniciar stream ({str(e)}). Usando polling..."
+            )
+            return self._run_assistant_polling(thread_id, wait.remaining())
+    
+    def _active_run_id(self, thread_id: str) -> Optional[str]:
+        """
+        Retorna o run ainda ativo mais recente da thread, se houver.
+        
+        Usado quando o stream falha antes do primeiro evento: o run pode
+        ter sido criado mesmo assim, e criar outro falharia ("run already
+        active") ou duplicaria a resposta. Uma falha na consulta é tratada
+        como "nenhum run ativo".
+        """
+        try:
+            runs = self._call(
+                "runs.list",
+                lambda: self.client.beta.threads.runs.list(
+                    thread_id=thread_id,
+                    limit=1,
+                    order="desc"
+                )
+            )
+        except Exception as e:
+            logger.warning(f"Não foi possível consultar os runs da thread {thread_id}: {str(e)}")
+            return None
+        
+        for run in runs.data:
+            if run.status in ACTIVE_RUN_STATUSES:
+                return run.id
+        
+        return None
+    
+    def _abandon_run(self, thread_id: str, run_id: Optional[str]) -> None:
+        """Cancela um run cujo prazo esgotou, para não bloquear a thread."""
+        if not run_id:
+            return
+        
+        try:
+            self.cancel_run(thread_id, run_id)
+        except OpenAIAPIError as e:
+            logger.warning(f"Não foi possível cancelar o run {run_id}: {str(e)}")
+    
+    def _consume_run_stream(
+        self,
+        stream_manager: Any,
+        thread_id: str,
+        state: Dict[str, Any],
+        wait: Deadline
+    ) -> Dict[str, Any]:
+        """
+        Consome os eventos de um stream de run até um estado final.
+        
+        Args:
+            stream_manager: Gerenciador de stream retornado pelo SDK
+            thread_id: ID da thread
+            state: Dict compartilhado onde o run_id é registrado assim
+                   que conhecido (usado pelo fallback de polling)
+            wait: Prazo da espera, verificado a cada evento
+        
+        Returns:
+            dict: Resultado no formato de run_assistant
+        
+        Raises:
+            OpenAIAPIError: Se o run falhar, o prazo esgotar ou o stream
+                            terminar sem estado final
+        """
+        text_parts: List[str] = []
+        
+        with stream_manager as stream:
+            for event in stream:
+                event_type = event.event
+                data = event.data
+                
+                if event_type.startswith("thread.run.") and not event_type.startswith("thread.run.step"):
+                    if not state['run_id']:
+                        state['run_id'] = data.id
+                        logger.info(f"Run iniciado (streaming): {data.id}")
+                
+                if wait.expired():
+                    logger.error(f"Prazo esgotado durante o stream do run {state['run_id']}")
+                    self._abandon_run(thread_id, state['run_id'])
+                    raise OpenAIAPIError("Timeout: Run não concluído no prazo (streaming)")
+                
+                if event_type == "thread.message.delta":
+                    # Acumular texto à medida que chega
+                    for block in data.delta.content or []:
+                        if block.type == "text" and block.text and block.text.value:
+                            text_parts.append(block.text.value)
+                
+                elif event_type == "thread.message.completed":
+                    # Texto final e completo da mensagem
+                    text_parts = [
+                        block.text.value
+                        for block in data.content
+                        if block.type == "text"
+                    ]
+                
+                else:
+                    result = self._stream_run_outcome(event_type, data, text_parts)
+                    if result:
+                        return result
+        
+        raise RuntimeError("Stream encerrado sem estado final do run")
+    
+    @staticmethod
+    def _stream_run_outcome(
+        event_type: str,
+        data: Any,
+        text_parts: List[str]
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Interpreta um evento de estado do run recebido pelo stream.
+        
+        Args:
+            event_type: Tipo do evento
+            data: Dados do evento
+            text_parts: Texto acumulado da resposta até aqui
+        
+        Returns:
+            dict ou None: Resultado no formato de run_assistant se o evento
+                          encerra a espera, None caso contrário
+        
+        Raises:
+            OpenAIAPIError: Se o run falhar ou o stream reportar erro
+        """
+        if event_type == "thread.run.requires_action":
+            logger.info(f"Run {data.id} requer ação (tool calls)")
+            return {
+                'status': 'requires_action',
+                'run_id': data.id,
+                'required_action': data.required_action,
+                'response': None
+            }
+        
+        if event_type == "thread.run.completed":
+            logger.info(f"Run {data.id} concluído com sucesso")
+            return {
+                'status': 'completed',
+                'run_id': data.id,
+                'required_action': None,
+                'response': "".join(text_parts) or None
+            }
+        
+        if event_type in [
+            "thread.run.failed",
+            "thread.run.cancelled",
+            "thread.run.expired"
+        ]:
+            error_msg = f"Run {data.id} falhou com status: {data.status}"
+            logger.error(error_msg)
+            raise OpenAIAPIError(error_msg)
+        
+        if event_type == "error":
+            raise OpenAIAPIError(f"Erro no stream do run: {data}")
+        
+        return None
+    
     def submit_tool_outputs(
         self,
         thread_id: str,
@@ -218,10 +560,14 @@ class OpenAIService:
                 f"Submetendo tool outputs para run {run_id} na thread {thread_id}"
             )
             
-            self.client.beta.threads.runs.submit_tool_outputs(
-                thread_id=thread_id,
-                run_id=run_id,
-                tool_outputs=tool_outputs
+            self._call(
+                "runs.submit_tool_outputs",
+                lambda: self.client.beta.threads.runs.submit_tool_outputs(
+                    thread_id=thread_id,
+                    run_id=run_id,
+                    tool_outputs=tool_outputs
+                ),
+                idempotent=False
             )
             
             logger.info(
@@ -236,6 +582,161 @@ class OpenAIService:
                 f"Falha ao submeter tool outputs: {str(e)}"
             ) from e
     
+    def submit_tool_outputs_and_wait(
+        self,
+        thread_id: str,
+        run_id: str,
+        tool_outputs: List[Dict[str, str]],
+        max_wait_seconds: float = ASSISTANT_RUN_MAX_WAIT_SECONDS,
+        deadline: Optional[Deadline] = None
+    ) -> Dict[str, Any]:
+        """
+        Submete os resultados das tool calls e continua o MESMO run.
+        
+        Após receber os outputs, o run segue processando; este método
+        aguarda até que ele conclua ou solicite uma nova rodada de
+        tool calls. Nenhum run novo é criado.
+        
+        Args:
+            thread_id: ID da thread
+            run_id: ID do run que requer as tool outputs
+            tool_outputs: Lista de outputs das ferramentas
+            max_wait_seconds: Tempo máximo de espera em segundos
+            deadline: Prazo da requisição (opcional). A espera nunca o ultrapassa
+        
+        Returns:
+            dict: Resultado no formato de run_assistant
+        
+        Raises:
+            OpenAIAPIError: Se houver erro ao submeter ou na execução
+            DeadlineExceededError: Se o prazo já estiver esgotado
+        """
+        max_wait_seconds = self._limit_wait(
+            max_wait_seconds, deadline, "submit_tool_outputs"
+        )
+        
+        if not ASSISTANT_RUN_STREAMING:
+            self.submit_tool_outputs(thread_id, run_id, tool_outputs)
+            return self.wait_for_run(thread_id, run_id, max_wait_seconds)
+        
+        logger.debug(
+            f"Submetendo tool outputs (streaming) para run {run_id}"
+        )
+        wait = Deadline(max_wait_seconds)
+        
+        try:
+            stream_manager = self.client.beta.threads.runs.submit_tool_outputs_stream(
+                thread_id=thread_id,
+                run_id=run_id,
+                tool_outputs=tool_outputs,
+                timeout=max_wait_seconds
+            )
+            return self._consume_run_stream(stream_manager, thread_id, {'run_id': run_id}, wait)
+            
+        except OpenAIAPIError:
+            raise
+        except Exception as e:
+            logger.warning(
+                f"Stream do run {run_id} interrompido ({str(e)}). "
+                "Continuando por polling..."
+            )
+        
+        result = self.wait_for_run(thread_id, run_id, wait.remaining())
+        
+        # Se os outputs não chegaram a ser aceitos, o run continua
+        # aguardando as mesmas tool calls: submeter novamente
+        if result['status'] == 'requires_action':
+            pending_ids = {
+                call.id
+                for call in result['required_action'].submit_tool_outputs.tool_calls
+            }
+            submitted_ids = {output['tool_call_id'] for output in tool_outputs}
+            
+            if pending_ids == submitted_ids:
+                logger.info(f"Reenviando tool outputs para run {run_id}")
+                self.submit_tool_outputs(thread_id, run_id, tool_outputs)
+                result = self.wait_for_run(thread_id, run_id, wait.remaining())
+        
+        return result
+    
+    def _limit_wait(
+        self,
+        max_wait_seconds: float,
+        deadline: Optional[Deadline],
+        stage: str
+    ) -> float:
+        """
+        Limita a espera de uma etapa ao tempo restante do prazo.
+        
+        Args:
+            max_wait_seconds: Espera máxima desejada
+            deadline: Prazo da requisição (opcional)
+            stage: Nome da etapa (usado na mensagem de erro)
+        
+        Returns:
+            float: Espera máxima efetiva em segundos
+        
+        Raises:
+            DeadlineExceededError: Se o prazo já estiver esgotado
+        """
+        if deadline is None:
+            return max_wait_seconds
+        
+        deadline.check(stage)
+        return deadline.limit(max_wait_seconds)
+    
+    def wait_for_run(
+        self,
+        thread_id: str,
+        run_id: str,
+        max_wait_seconds: float = 60
+    ) -> Dict[str, Any]:
+        """
+        Aguarda um run já existente chegar a um estado final.
+        
+        Args:
+            thread_id: ID da thread
+            run_id: ID do run a acompanhar
+            max_wait_seconds: Tempo máximo de espera em segundos
+        
+        Returns:
+            dict: Resultado no formato de run_assistant
+        
+        Raises:
+            OpenAIAPIError: Se houver erro na execução ou timeout
+        """
+        return self._poll_run(thread_id, run_id, max_wait_seconds)
+    
+    def cancel_run(self, thread_id: str, run_id: str) -> None:
+        """
+        Cancela um run em andamento.
+        
+        Evita que um run abandonado bloqueie a thread ("run already
+        active") na próxima mensagem do usuário.
+        
+        Args:
+            thread_id: ID da thread
+            run_id: ID do run a cancelar
+        
+        Raises:
+            OpenAIAPIError: Se houver erro ao cancelar o run
+        """
+        try:
+            self._call(
+                "runs.cancel",
+                lambda: self.client.beta.threads.runs.cancel(
+                    thread_id=thread_id,
+                    run_id=run_id
+                )
+            )
+            logger.info(f"Run {run_id} cancelado")
+            
+        except Exception as e:
+            logger.error(f"Erro ao cancelar run {run_id}: {str(e)}")
+            raise OpenAIAPIError(
+                f"Falha ao cancelar run: {str(e)}"
+            ) from e
+    
     def get_messages(
         self,
         thread_id: str,
@@ -263,10 +764,13 @@ class OpenAIService:
                 f"Recuperando {limit} mensagens da thread {thread_id}"
             )
             
-            messages = self.client.beta.threads.messages.list(
-                thread_id=thread_id,
-                limit=limit,
-                order="desc"  # Mais recentes primeiro
+            messages = self._call(
+                "messages.list",
+                lambda: self.client.beta.threads.messages.list(
+                    thread_id=thread_id,
+                    limit=limit,
+                    order="desc"  # Mais recentes primeiro
+                )
             )
             
             # Extrair conteúdo das mensagens
@@ -297,6 +801,6 @@ class OpenAIService:
             ) from e
 
 
-# Instância global do serviço (singleton pattern)
-openai_service = OpenAIService()
+# Instância global do serviço (singleton pattern, criada no primeiro uso)
+openai_service = registry.register("openai_service", OpenAIService)
 
@@ -0,0 +1,290 @@
+"""
+Serviço de fila de mensagens para processamento assíncrono.
+
+Este módulo permite desacoplar o webhook do Twilio do processamento
+da mensagem (áudio, Assistant, ferramentas). O webhook apenas enfileira
+a mensagem parseada e um worker separado a processa.
+
+Em produção utiliza o Amazon SQS. Em desenvolvimento local, utiliza
+uma fila em memória, opcionalmente persistida em arquivo.
+"""
+
+import json
+import os
+import threading
+import uuid
+from collections import deque
+from typing import Dict, Any, List, Optional, Tuple
+
+from config.settings import MESSAGE_QUEUE_URL, LOCAL_QUEUE_FILE
+from utils.logger import setup_logger
+from utils.exceptions import QueueError
+from utils.service_registry import registry
+
+# Logger específico deste módulo
+logger = setup_logger(__name__)
+
+# Recebimentos de uma mensagem antes de ela ser dada como falha na fila
+# local (mesmo maxReceiveCount da fila SQS no template.yaml)
+LOCAL_QUEUE_MAX_RECEIVES = 3
+
+
+class MessageQueue:
+    """
+    Interface comum das filas de mensagens.
+
+    Cada mensagem é um dict serializável em JSON. O método receive
+    retorna tuplas (receipt, mensagem); o receipt deve ser passado
+    para delete após o processamento bem-sucedido, ou para release
+    após uma falha (a mensagem volta a ficar visível).
+    """
+
+    def enqueue(self, message: Dict[str, Any]) -> str:
+        """
+        Adiciona uma mensagem à fila.
+
+        Args:
+            message: Dados da mensagem (serializáveis em JSON)
+
+        Returns:
+            str: ID da mensagem enfileirada
+
+        Raises:
+            QueueError: Se houver erro ao enfileirar
+        """
+        raise NotImplementedError
+
+    def receive(self, max_messages: int = 10) -> List[Tuple[str, Dict[str, Any]]]:
+        """
+        Recupera mensagens pendentes da fila.
+
+        Args:
+            max_messages: Número máximo de mensagens a recuperar
+
+        Returns:
+            list: Lista de tuplas (receipt, mensagem)
+
+        Raises:
+            QueueError: Se houver erro ao ler a fila
+        """
+        raise NotImplementedError
+
+    def delete(self, receipt: str) -> None:
+        """
+        Remove definitivamente uma mensagem já processada.
+
+        Args:
+            receipt: Receipt retornado por receive
+
+        Raises:
+            QueueError: Se houver erro ao remover a mensagem
+        """
+        raise NotImplementedError
+
+    def release(self, receipt: str) -> None:
+        """
+        Devolve à fila uma mensagem cujo processamento falhou.
+
+        Args:
+            receipt: Receipt retornado por receive
+
+        Raises:
+            QueueError: Se houver erro ao devolver a mensagem
+        """
+        raise NotImplementedError
+
+
+class SQSMessageQueue(MessageQueue):
+    """Fila de mensagens baseada no Amazon SQS."""
+
+    def __init__(self, queue_url: str):
+        """
+        Inicializa o cliente SQS.
+
+        Args:
+            queue_url: URL da fila SQS
+        """
+        import boto3
+
+        self.queue_url = queue_url
+        self.client = boto3.client("sqs")
+        logger.info(f"Usando fila SQS: {queue_url}")
+
+    def enqueue(self, message: Dict[str, Any]) -> str:
+        """Envia a mensagem para o SQS."""
+        try:
+            response = self.client.send_message(
+                QueueUrl=self.queue_url, MessageBody=json.dumps(message, ensure_ascii=False)
+            )
+            message_id = response["MessageId"]
+            logger.info(f"Mensagem enfileirada no SQS: {message_id}")
+            return message_id
+
+        except Exception as e:
+            logger.error(f"Erro ao enfileirar mensagem no SQS: {str(e)}")
+            raise QueueError(f"Falha ao enfileirar mensagem: {str(e)}") from e
+
+    def receive(self, max_messages: int = 10) -> List[Tuple[str, Dict[str, Any]]]:
+        """Recupera mensagens do SQS (long polling curto)."""
+        try:
+            response = self.client.receive_message(
+                QueueUrl=self.queue_url,
+                MaxNumberOfMessages=min(max_messages, 10),  # Limite do SQS
+                WaitTimeSeconds=1,
+            )
+
+            return [(msg["ReceiptHandle"], json.loads(msg["Body"])) for msg in response.get("Messages", [])]
+
+        except Exception as e:
+            logger.error(f"Erro ao ler mensagens do SQS: {str(e)}")
+            raise QueueError(f"Falha ao ler fila: {str(e)}") from e
+
+    def delete(self, receipt: str) -> None:
+        """Remove a mensagem do SQS."""
+        try:
+            self.client.delete_message(QueueUrl=self.queue_url, ReceiptHandle=receipt)
+
+        except Exception as e:
+            logger.error(f"Erro ao remover mensagem do SQS: {str(e)}")
+            raise QueueError(f"Falha ao remover mensagem: {str(e)}") from e
+
+    def release(self, receipt: str) -> None:
+        """Torna a mensagem visível de novo (após maxReceiveCount, vai para a DLQ)."""
+        try:
+            self.client.change_message_visibility(
+                QueueUrl=self.queue_url, ReceiptHandle=receipt, VisibilityTimeout=0
+            )
+
+        except Exception as e:
+            logger.error(f"Erro ao devolver mensagem ao SQS: {str(e)}")
+            raise QueueError(f"Falha ao devolver mensagem: {str(e)}") from e
+
+
+class LocalMessageQueue(MessageQueue):
+    """
+    Fila local para desenvolvimento e testes.
+
+    Mantém as mensagens em memória e, se um arquivo for informado,
+    persiste o conteúdo da fila em JSON a cada alteração, permitindo
+    que o webhook e o worker rodem em processos diferentes.
+
+    Uma mensagem devolvida com release volta ao início da fila; após
+    LOCAL_QUEUE_MAX_RECEIVES recebimentos, vai para a lista 'failed'
+    (como a DLQ do SQS).
+    """
+
+    def __init__(self, file_path: Optional[str] = None):
+        """
+        Inicializa a fila local.
+
+        Args:
+            file_path: Caminho do arquivo de persistência (opcional)
+        """
+        self.file_path = file_path
+        self._lock = threading.Lock()
+        self._pending: deque = deque()
+        self._in_flight: Dict[str, Dict[str, Any]] = {}
+        self.failed: List[Dict[str, Any]] = []
+
+        if file_path:
+            logger.info(f"Usando fila local persistida em {file_path}")
+        else:
+            logger.info("Usando fila local em memória")
+
+    def _load(self) -> None:
+        """Recarrega as mensagens pendentes do arquivo, se houver."""
+        if not self.file_path or not os.path.exists(self.file_path):
+            return
+
+        try:
+            with open(self.file_path, "r") as f:
+                self._pending = deque(json.load(f))
+        except (OSError, ValueError) as e:
+            raise QueueError(f"Falha ao ler fila local: {str(e)}") from e
+
+    def _save(self) -> None:
+        """Persiste as mensagens pendentes no arquivo, se configurado."""
+        if not self.file_path:
+            return
+
+        try:
+            with open(self.file_path, "w") as f:
+                json.dump(list(self._pending), f, ensure_ascii=False)
+        except OSError as e:
+            raise QueueError(f"Falha ao salvar fila local: {str(e)}") from e
+
+    def enqueue(self, message: Dict[str, Any]) -> str:
+        """Adiciona a mensagem ao final da fila local."""
+        message_id = str(uuid.uuid4())
+
+        with self._lock:
+            self._load()
+            self._pending.append({"id": message_id, "body": message})
+            self._save()
+
+        logger.info(f"Mensagem enfileirada localmente: {message_id}")
+        return message_id
+
+    def receive(self, max_messages: int = 10) -> List[Tuple[str, Dict[str, Any]]]:
+        """Retira até max_messages mensagens do início da fila local."""
+        received = []
+
+        with self._lock:
+            self._load()
+            while self._pending and len(received) < max_messages:
+                entry = self._pending.popleft()
+                entry["receives"] = entry.get("receives", 0) + 1
+                self._in_flight[entry["id"]] = entry
+                received.append((entry["id"], entry["body"]))
+            self._save()
+
+        return received
+
+    def delete(self, receipt: str) -> None:
+        """Confirma o processamento de uma mensagem recebida."""
+        with self._lock:
+            self._in_flight.pop(receipt, None)
+
+    def release(self, receipt: str) -> None:
+        """Devolve a mensagem ao início da fila, ou a dá como falha."""
+        with self._lock:
+            entry = self._in_flight.pop(receipt, None)
+            if entry is None:
+                return
+
+            if entry["receives"] >= LOCAL_QUEUE_MAX_RECEIVES:
+                logger.error(
+                    f"Mensagem local {receipt} falhou {entry['receives']} vezes; "
+                    f"movida para a lista de falhas"
+                )
+                self.failed.append(entry)
+                return
+
+            self._load()
+            self._pending.appendleft(entry)
+            self._save()
+
+    def __len__(self) -> int:
+        """Retorna o número de mensagens pendentes."""
+        with self._lock:
+            self._load()
+            return len(self._pending)
+
+
+def create_message_queue() -> MessageQueue:
+    """
+    Cria a fila adequada ao ambiente.
+
+    Returns:
+        MessageQueue: SQS se MESSAGE_QUEUE_URL estiver definida,
+                      fila local caso contrário (no modo assíncrono,
+                      validate_configuration exige LOCAL_QUEUE_FILE)
+    """
+    if MESSAGE_QUEUE_URL:
+        return SQSMessageQueue(MESSAGE_QUEUE_URL)
+
+    return LocalMessageQueue(LOCAL_QUEUE_FILE)
+
+
+# Instância global da fila (singleton pattern, criada no primeiro uso)
+message_queue = registry.register("message_queue", create_message_queue)
@@ -3,16 +3,23 @@ Serviço para geração de respostas TwiML para o Twilio.
 
 Este módulo cria as respostas no formato TwiML (XML) que o Twilio
 espera receber dos webhooks para enviar mensagens de volta ao usuário.
+Também envia mensagens pela API REST do Twilio, usada no modo de
+processamento assíncrono (quando a resposta não volta pelo webhook).
 """
 
-from twilio.twiml.messaging_response import MessagingResponse
+from typing import List
 
+from config.settings import TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN, TWILIO_WHATSAPP_NUMBER
 from utils.logger import setup_logger
 from utils.exceptions import TwilioAPIError
+from utils.service_registry import registry
 
 # Logger específico deste módulo
 logger = setup_logger(__name__)
 
+# Tamanho máximo do corpo de uma mensagem WhatsApp via Twilio
+MAX_MESSAGE_LENGTH = 1600
+
 
 class TwilioService:
     """
@@ -22,6 +29,29 @@ class TwilioService:
     com as mensagens que devem ser enviadas ao usuário.
     """
     
+    def __init__(self):
+        """Inicializa o serviço (cliente REST criado sob demanda)."""
+        self._client = None
+    
+    def _get_client(self):
+        """
+        Retorna o cliente REST do Twilio, criando-o no primeiro uso.
+        
+        Raises:
+            TwilioAPIError: Se as credenciais não estiverem configuradas
+        """
+        if self._client is None:
+            if not TWILIO_ACCOUNT_SID or not TWILIO_AUTH_TOKEN:
+                raise TwilioAPIError(
+                    "TWILIO_ACCOUNT_SID e TWILIO_AUTH_TOKEN não estão configurados"
+                )
+            
+            from twilio.rest import Client
+            
+            self._client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
+        
+        return self._client
+    
     def create_twiml_response(self, message_text: str) -> str:
         """
         Cria uma resposta TwiML contendo a mensagem especificada.
@@ -40,6 +70,8 @@ class TwilioService:
                 f"Gerando resposta TwiML com mensagem de {len(message_text)} caracteres"
             )
             
+            from twilio.twiml.messaging_response import MessagingResponse
+            
             # Criar objeto de resposta TwiML
             response = MessagingResponse()
             
@@ -60,6 +92,69 @@ class TwilioService:
                 f"Falha ao gerar resposta TwiML: {str(e)}"
             ) from e
     
+    def create_empty_response(self) -> str:
+        """
+        Cria uma resposta TwiML vazia (sem mensagens).
+        
+        Usada no modo assíncrono: o webhook apenas confirma o recebimento
+        e a resposta é enviada depois pela API REST.
+        
+        Returns:
+            str: XML TwiML sem mensagens
+        """
+        from twilio.twiml.messaging_response import MessagingResponse
+        
+        return str(MessagingResponse())
+    
+    def send_message(self, to: str, body: str) -> List[str]:
+        """
+        Envia uma mensagem ao usuário pela API REST de Messages do Twilio.
+        
+        Mensagens maiores que o limite do WhatsApp são divididas em
+        várias partes, enviadas em ordem.
+        
+        Args:
+            to: Destinatário (ex: 'whatsapp:+5511999999999')
+            body: Texto da mensagem
+        
+        Returns:
+            list: SIDs das mensagens enviadas
+        
+        Raises:
+            TwilioAPIError: Se houver erro ao enviar a mensagem
+        """
+        if not TWILIO_WHATSAPP_NUMBER:
+            raise TwilioAPIError("TWILIO_WHATSAPP_NUMBER não está configurado")
+        
+        client = self._get_client()
+        
+        # Dividir mensagens longas respeitando o limite do WhatsApp
+        parts = [
+            body[i:i + MAX_MESSAGE_LENGTH]
+            for i in range(0, len(body), MAX_MESSAGE_LENGTH)
+        ] or [""]
+        
+        try:
+            message_sids = []
+            for part in parts:
+                message = client.messages.create(
+                    from_=TWILIO_WHATSAPP_NUMBER,
+                    to=to,
+                    body=part
+                )
+                message_sids.append(message.sid)
+            
+            logger.info(
+                f"{len(message_sids)} mensagem(ns) enviada(s) para {to} via API REST"
+            )
+            return message_sids
+            
+        except Exception as e:
+            logger.error(f"Erro ao enviar mensagem via API REST: {str(e)}")
+            raise TwilioAPIError(
+                f"Falha ao enviar mensagem: {str(e)}"
+            ) from e
+    
     def create_error_response(self, error_message: str = None) -> str:
         """
         Cria uma resposta TwiML de erro para o usuário.
@@ -83,6 +178,8 @@ class TwilioService:
             
             logger.debug("Gerando resposta TwiML de erro")
             
+            from twilio.twiml.messaging_response import MessagingResponse
+            
             response = MessagingResponse()
             response.message(error_message)
             
@@ -97,6 +194,6 @@ class TwilioService:
             return '<?xml version="1.0" encoding="UTF-8"?><Response><Message>Erro no sistema</Message></Response>'
 
 
-# Instância global do serviço (singleton pattern)
-twilio_service = TwilioService()
+# Instância global do serviço (singleton pattern, criada no primeiro uso)
+twilio_service = registry.register("twilio_service", TwilioService)
 
@@ -0,0 +1,156 @@
+"""
+Particionamento das planilhas de despesas por período (shards).
+
+Com EXCEL_WORKSHEET_SHARDING=year ou month, a planilha informada pelas
+ferramentas (ex: 'Despesas') passa a ser o nome base: cada despesa é
+gravada na aba do seu período ('Despesas_2026' ou 'Despesas_2026_03'),
+e as consultas por período leem apenas as abas que o cobrem. Assim, o
+custo de "quanto gastei este mês" não cresce com a idade da conta.
+
+No particionamento mensal, meses com mais de
+EXCEL_SHARD_ARCHIVE_AFTER_MONTHS meses vão para a aba anual do ano
+('Despesas_2025'), que funciona como arquivo. A compactação
+(ExcelService.compact_worksheets, job WORKSHEET_COMPACTION_JOB) move
+para as abas de período as linhas antigas da planilha base e junta na
+aba anual os meses já arquivados.
+
+Este módulo contém apenas as regras de nomes e períodos (sem chamadas
+ao Microsoft Graph).
+"""
+
+import calendar
+import re
+from datetime import date, timedelta
+from typing import Any, Iterable, List, Optional, Tuple
+
+from config.settings import EXCEL_SHARD_ARCHIVE_AFTER_MONTHS
+
+SHARDING_NONE = "none"
+SHARDING_YEAR = "year"
+SHARDING_MONTH = "month"
+
+# Tipo das mensagens de compactação na fila (ver worker_function)
+WORKSHEET_COMPACTION_JOB = "worksheet_compaction"
+
+# Data base dos números de série de datas do Excel
+EXCEL_EPOCH = date(1899, 12, 30)
+
+# Sufixo das abas de período: _AAAA (ano) ou _AAAA_MM (mês)
+SHARD_SUFFIX = re.compile(r"_(\d{4})(?:_(\d{2}))?$")
+
+
+def expense_day(value: Any) -> Optional[date]:
+    """
+    Converte a data de uma despesa em date.
+
+    Aceita texto ISO ('2026-03-10', com ou sem horário) e números de
+    série do Excel (células formatadas como data).
+
+    Returns:
+        date: Data da despesa, ou None se não for reconhecida
+    """
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        try:
+            return EXCEL_EPOCH + timedelta(days=int(value))
+        except OverflowError:
+            return None
+
+    try:
+        return date.fromisoformat(str(value).strip()[:10])
+    except ValueError:
+        return None
+
+
+def is_archived(day: date, today: date) -> bool:
+    """Indica se o mês da data já vai para a aba anual (particionamento mensal)."""
+    months_ago = (today.year - day.year) * 12 + today.month - day.month
+    return months_ago >= EXCEL_SHARD_ARCHIVE_AFTER_MONTHS
+
+
+def shard_name(
+    base_name: str,
+    day: date,
+    granularity: str,
+    today: Optional[date] = None
+) -> str:
+    """
+    Retorna a aba que guarda as despesas da data.
+
+    Args:
+        base_name: Nome base da planilha (ex: 'Despesas')
+        day: Data da despesa
+        granularity: 'year' ou 'month' (EXCEL_WORKSHEET_SHARDING)
+        today: Data de referência do arquivamento (padrão: hoje)
+
+    Returns:
+        str: Ex: 'Despesas_2026' ou 'Despesas_2026_03'
+    """
+    if granularity == SHARDING_MONTH and not is_archived(day, today or date.today()):
+        return f"{base_name}_{day.year:04d}_{day.month:02d}"
+
+    return f"{base_name}_{day.year:04d}"
+
+
+def shard_period(base_name: str, worksheet_name: str) -> Optional[Tuple[date, date]]:
+    """
+    Retorna o período coberto por uma aba de período da planilha base.
+
+    Returns:
+        tuple: (primeiro dia, último dia), ou None se a aba não for um
+               shard da planilha base
+    """
+    if not worksheet_name.startswith(f"{base_name}_"):
+        return None
+
+    match = SHARD_SUFFIX.fullmatch(worksheet_name[len(base_name):])
+    if not match:
+        return None
+
+    year = int(match.group(1))
+    if match.group(2) is None:
+        return date(year, 1, 1), date(year, 12, 31)
+
+    month = int(match.group(2))
+    if not 1 <= month <= 12:
+        return None
+    return date(year, month, 1), date(year, month, calendar.monthrange(year, month)[1])
+
+
+def select_worksheets(
+    base_name: str,
+    worksheet_names: Iterable[str],
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None
+) -> List[str]:
+    """
+    Seleciona as abas a ler para um período.
+
+    A planilha base (linhas anteriores ao particionamento, ainda não
+    compactadas) é sempre incluída se existir; as abas de período entram
+    quando cobrem alguma data do intervalo, em ordem cronológica.
+
+    Args:
+        base_name: Nome base da planilha
+        worksheet_names: Abas existentes no workbook
+        start_date: Data inicial inclusiva (YYYY-MM-DD), opcional
+        end_date: Data final inclusiva (YYYY-MM-DD), opcional
+
+    Returns:
+        list: Nomes das abas a ler
+
+    Raises:
+        ValueError: Se uma data for inválida
+    """
+    start = date.fromisoformat(start_date) if start_date else date.min
+    end = date.fromisoformat(end_date) if end_date else date.max
+
+    names = list(worksheet_names)
+    shards = []
+
+    for name in names:
+        period = shard_period(base_name, name)
+        if period and period[0] <= end and period[1] >= start:
+            shards.append((period, name))
+
+    selected = [base_name] if base_name in names else []
+    return selected + [name for _, name in sorted(shards)]
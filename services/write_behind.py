@@ -0,0 +1,350 @@
+"""
+Gravação write-behind das despesas no Excel.
+
+Com EXCEL_WRITE_MODE=write_behind, as ferramentas não aguardam o
+Microsoft Graph para lançar despesas: cada lançamento é gravado no
+journal durável (data_access/expense_journal.py), confirmado na hora, e
+um job de flush (JOURNAL_FLUSH_JOB) é enfileirado na mesma fila do modo
+assíncrono. O worker grava todas as despesas pendentes de um workbook
+com uma escrita por planilha e as remove do journal.
+
+Falhas no flush mantêm as despesas no journal e o job volta para a
+fila (nova tentativa pelo SQS); erros transitórios do Graph já são
+repetidos pelo ExcelService. A defasagem do journal (idade da despesa
+pendente mais antiga) é publicada como métrica a cada flush.
+
+As leituras somam as despesas ainda no journal às lidas do Excel, para
+o usuário ver os próprios lançamentos antes do flush. Entre a escrita
+no Excel e a remoção do journal (milissegundos), uma leitura pode ver
+a mesma despesa duas vezes.
+"""
+
+import threading
+import time
+import uuid
+from datetime import date
+from typing import Any, Dict, List, Optional, Tuple
+
+from config.settings import EXPENSE_JOURNAL_FLUSH_BATCH_SIZE, EXPENSE_JOURNAL_FLUSH_LOCK_SECONDS
+from data_access.expense_journal import ExpenseJournal, create_expense_journal
+from services.excel_service import excel_service
+from services.expense_filters import compile_filters, parse_amount
+from services.expense_records import Expense
+from utils.logger import setup_logger
+from utils.metrics import put_metric
+from utils.service_registry import registry
+
+# Logger específico deste módulo
+logger = setup_logger(__name__)
+
+# Tipo das mensagens de flush na fila (ver worker_function)
+JOURNAL_FLUSH_JOB = "journal_flush"
+
+
+def _in_range(value: Any, start_date: Optional[str], end_date: Optional[str]) -> bool:
+    """Indica se a data da despesa está no período (datas fora de YYYY-MM-DD ficam de fora)."""
+    if not start_date and not end_date:
+        return True
+
+    try:
+        day = date.fromisoformat(str(value).strip()[:10])
+    except ValueError:
+        return False
+
+    if start_date and day < date.fromisoformat(start_date):
+        return False
+    return not end_date or day <= date.fromisoformat(end_date)
+
+
+class WriteBehindExcel:
+    """
+    ExcelService com gravação write-behind (mesma interface usada pelas ferramentas).
+    """
+
+    def __init__(self, journal: Optional[ExpenseJournal] = None, queue=None, excel=None):
+        """
+        Args:
+            journal: Journal das despesas pendentes (padrão: create_expense_journal())
+            queue: Fila dos jobs de flush (padrão: message_queue)
+            excel: Serviço de Excel (padrão: excel_service)
+        """
+        self.journal = journal if journal is not None else create_expense_journal()
+        self.excel = excel if excel is not None else excel_service
+        self._queue = queue
+
+        # Último timestamp (ms) usado nos entry_id, para manter a ordem de
+        # lançamento entre chamadas no mesmo milissegundo
+        self._last_stamp = 0
+        self._stamp_lock = threading.Lock()
+
+        logger.info(f"Write-behind do Excel inicializado ({type(self.journal).__name__})")
+
+    @property
+    def queue(self):
+        """Fila dos jobs de flush (carregada no primeiro uso)."""
+        if self._queue is None:
+            from services.queue_service import message_queue
+            self._queue = message_queue
+        return self._queue
+
+    def add_expense(
+        self,
+        workbook_id: str,
+        worksheet_name: str,
+        expense_data: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """
+        Grava uma despesa no journal (ver add_expenses).
+        """
+        return self.add_expenses(workbook_id, worksheet_name, [expense_data])
+
+    def add_expenses(
+        self,
+        workbook_id: str,
+        worksheet_name: str,
+        expenses: List[Dict[str, Any]],
+        table_name: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Grava as despesas no journal e agenda o flush para o Excel.
+
+        Args:
+            workbook_id: ID do workbook (arquivo Excel) no OneDrive
+            worksheet_name: Nome da planilha (aba)
+            expenses: Despesas com date, description, category e amount
+            table_name: Nome da tabela do Excel (opcional)
+
+        Returns:
+            dict: {'count': int, 'flush_scheduled': bool}
+
+        Raises:
+            FinancialAssistantError: Se houver erro ao gravar no journal
+                                     (DynamoDBError no journal do DynamoDB)
+        """
+        if not expenses:
+            return {'count': 0, 'flush_scheduled': False}
+
+        now = time.time()
+
+        with self._stamp_lock:
+            stamp = max(int(now * 1000), self._last_stamp + 1)
+            self._last_stamp = stamp
+
+        entries = [
+            {
+                'entry_id': f"{stamp:013d}-{index:04d}-{uuid.uuid4().hex[:8]}",
+                'workbook_id': workbook_id,
+                'worksheet_name': worksheet_name,
+                'table_name': table_name,
+                'date': expense.get('date', ''),
+                'description': expense.get('description', ''),
+                'category': expense.get('category', ''),
+                'amount': float(expense.get('amount', 0)),
+                'created_at': now
+            }
+            for index, expense in enumerate(expenses)
+        ]
+
+        self.journal.append(entries)
+        logger.info(f"{len(entries)} despesa(s) gravada(s) no journal do workbook {workbook_id}")
+
+        return {'count': len(entries), 'flush_scheduled': self._schedule_flush(workbook_id)}
+
+    def _schedule_flush(self, workbook_id: str) -> bool:
+        """
+        Enfileira o flush das despesas pendentes do workbook.
+
+        Uma falha ao enfileirar não desfaz o lançamento: as despesas
+        continuam no journal e saem no próximo flush do workbook.
+        """
+        try:
+            self.queue.enqueue({'type': JOURNAL_FLUSH_JOB, 'workbook_id': workbook_id})
+            return True
+        except Exception as e:
+            logger.warning(f"Falha ao agendar flush do workbook {workbook_id}: {str(e)}")
+            return False
+
+    def _pending_expenses(self, workbook_id: str, worksheet_name: str) -> List[Expense]:
+        """Despesas da planilha ainda no journal, no formato do ExcelService."""
+        return [
+            Expense(entry['date'], entry['description'], entry['category'], entry['amount'])
+            for entry in self.journal.pending(workbook_id)
+            if entry['worksheet_name'] == worksheet_name
+        ]
+
+    def load_expenses(self, workbook_id: str, worksheet_name: str) -> List[Expense]:
+        """
+        Retorna as despesas do Excel seguidas das que ainda estão no journal.
+
+        Sem pendências, retorna a própria lista do ExcelService (o cache
+        colunar do expense_analytics continua valendo).
+        """
+        expenses = self.excel.load_expenses(workbook_id, worksheet_name)
+        pending = self._pending_expenses(workbook_id, worksheet_name)
+
+        return expenses + pending if pending else expenses
+
+    def get_expense_history(
+        self,
+        workbook_id: str,
+        worksheet_name: str,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> List[Expense]:
+        """
+        Recupera o histórico do Excel, incluindo as despesas ainda no journal.
+
+        As despesas pendentes passam pelo mesmo filtro compilado; com
+        pendências, a ordenação e o limite são refeitos sobre a união.
+
+        Args:
+            workbook_id: ID do workbook no OneDrive
+            worksheet_name: Nome da planilha
+            filters: Filtros opcionais (ver services/expense_filters.py)
+
+        Returns:
+            list: Lista de despesas (Expense, lidas como dict)
+
+        Raises:
+            ValueError: Se algum filtro for inválido
+        """
+        expense_filter = compile_filters(filters)
+
+        expenses = self.excel.get_expense_history(workbook_id, worksheet_name, filters)
+        pending = expense_filter.select(self._pending_expenses(workbook_id, worksheet_name))
+
+        return expense_filter.order(expenses + pending) if pending else expenses
+
+    def get_expense_summary(
+        self,
+        workbook_id: str,
+        worksheet_name: str,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        categories: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        """
+        Totais calculados no Excel somados aos das despesas ainda no journal.
+
+        Mesmo formato de ExcelService.get_expense_summary.
+
+        Raises:
+            ValueError: Se uma data for inválida
+            MicrosoftGraphAPIError: Se houver erro ao calcular os totais
+        """
+        summary = self.excel.get_expense_summary(
+            workbook_id=workbook_id,
+            worksheet_name=worksheet_name,
+            start_date=start_date,
+            end_date=end_date,
+            categories=categories
+        )
+
+        pending = [
+            (expense['category'], parse_amount(expense['amount']))
+            for expense in self._pending_expenses(workbook_id, worksheet_name)
+            if _in_range(expense['date'], start_date, end_date)
+        ]
+        pending = [(category, amount) for category, amount in pending if amount is not None]
+
+        if not pending:
+            return summary
+
+        summary['total'] = round(summary['total'] + sum(amount for _, amount in pending), 2)
+        summary['count'] += len(pending)
+
+        # Categorias sem diferenciar maiúsculas, como o SUMIFS do Excel
+        for group in summary['categories']:
+            name = str(group['category']).casefold()
+            amounts = [amount for category, amount in pending if str(category).casefold() == name]
+            group['total'] = round(group['total'] + sum(amounts), 2)
+            group['count'] += len(amounts)
+
+        return summary
+
+    def lag_seconds(self, workbook_id: str) -> float:
+        """Idade da despesa pendente mais antiga do workbook (0 se não houver)."""
+        pending = self.journal.pending(workbook_id, limit=1)
+        return max(time.time() - pending[0]['created_at'], 0.0) if pending else 0.0
+
+    def flush(self, workbook_id: str, batch_size: int = EXPENSE_JOURNAL_FLUSH_BATCH_SIZE) -> int:
+        """
+        Grava no Excel as despesas pendentes do workbook.
+
+        As pendentes são agrupadas por planilha e tabela, na ordem de
+        lançamento, e cada grupo é gravado com uma única escrita
+        (add_expenses). Apenas um worker grava um workbook por vez: se
+        outro já estiver gravando, o job termina sem gravar nada, pois o
+        dono do lock continua até esvaziar o journal do workbook. Depois
+        de liberar o lock, o journal é consultado de novo: uma despesa
+        lançada entre a última leitura e a liberação teve o seu job
+        descartado (lock ocupado), e o lock é retomado para gravá-la.
+
+        Args:
+            workbook_id: ID do workbook (ver job JOURNAL_FLUSH_JOB)
+            batch_size: Máximo de despesas lidas do journal por rodada
+
+        Returns:
+            int: Número de despesas gravadas (0 se outro worker estiver
+                 gravando o workbook)
+
+        Raises:
+            MicrosoftGraphAPIError: Se houver erro ao gravar no Excel
+        """
+        flushed = 0
+
+        while True:
+            holder = uuid.uuid4().hex
+
+            if not self.journal.try_acquire_flush_lock(workbook_id, holder, EXPENSE_JOURNAL_FLUSH_LOCK_SECONDS):
+                logger.info(f"Flush do workbook {workbook_id} já em andamento; nada a fazer")
+                break
+
+            try:
+                flushed += self._flush_locked(workbook_id, batch_size)
+            finally:
+                self.journal.release_flush_lock(workbook_id, holder)
+
+            if not self.journal.pending(workbook_id, limit=1):
+                break
+
+        put_metric('ExpenseJournalFlushed', flushed)
+        logger.info(f"{flushed} despesa(s) do journal gravada(s) no workbook {workbook_id}")
+        return flushed
+
+    def _flush_locked(self, workbook_id: str, batch_size: int) -> int:
+        """Grava as pendentes até esvaziar o journal (com o lock do workbook)."""
+        flushed = 0
+
+        try:
+            put_metric('ExpenseJournalLagSeconds', self.lag_seconds(workbook_id), 'Seconds')
+
+            while True:
+                entries = self.journal.pending(workbook_id, batch_size)
+                if not entries:
+                    return flushed
+
+                groups: Dict[Tuple[str, Optional[str]], List[Dict[str, Any]]] = {}
+                for entry in entries:
+                    groups.setdefault((entry['worksheet_name'], entry.get('table_name')), []).append(entry)
+
+                for (worksheet_name, table_name), group in groups.items():
+                    self.excel.add_expenses(
+                        workbook_id=workbook_id,
+                        worksheet_name=worksheet_name,
+                        expenses=group,
+                        table_name=table_name
+                    )
+                    self.journal.remove(workbook_id, [entry['entry_id'] for entry in group])
+                    flushed += len(group)
+
+        except Exception:
+            put_metric('ExpenseJournalFlushFailures', 1)
+            logger.error(
+                f"Falha no flush do workbook {workbook_id} ({flushed} despesa(s) gravada(s)); "
+                f"as demais continuam no journal"
+            )
+            raise
+
+
+# Instância global do write-behind (singleton pattern, criada no primeiro uso)
+write_behind_excel = registry.register("write_behind_excel", WriteBehindExcel)
@@ -0,0 +1,193 @@
+"""
+Leitura local e incremental de arquivos .xlsx.
+
+Usado quando o histórico é grande demais para o usedRange em JSON: o
+workbook é baixado em blocos (ver ExcelService) e as linhas da aba são
+lidas em streaming direto do XML da planilha (zipfile + iterparse), uma
+de cada vez, sem montar a planilha inteira em memória.
+
+Apenas os valores das células são lidos, no mesmo formato do usedRange
+do Graph, para que os dois caminhos de leitura produzam as mesmas
+despesas: datas ficam como números de série do Excel, números inteiros
+como int e células vazias como ''. Estilos, fórmulas e formatação são
+ignorados, o que torna a leitura bem mais rápida que a de bibliotecas
+completas de planilhas (ex: openpyxl em modo read_only).
+"""
+
+import posixpath
+import zipfile
+from typing import Any, BinaryIO, Iterator, List
+from xml.etree import ElementTree
+
+# Namespaces do SpreadsheetML
+_MAIN_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_DOC_REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+_PACKAGE_REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+_ROW = f"{_MAIN_NS}row"
+_CELL = f"{_MAIN_NS}c"
+_VALUE = f"{_MAIN_NS}v"
+_TEXT = f"{_MAIN_NS}t"
+_RUN = f"{_MAIN_NS}r"
+_INLINE_STRING = f"{_MAIN_NS}is"
+_STRING_ITEM = f"{_MAIN_NS}si"
+
+
+def _column_index(reference: str) -> int:
+    """Converte a referência de uma célula (ex: 'C12') no índice da coluna (2)."""
+    if reference[1].isdigit():
+        return ord(reference[0]) - 65
+
+    index = 0
+    for char in reference:
+        if not char.isalpha():
+            break
+        index = index * 26 + ord(char.upper()) - 64
+    return index - 1
+
+
+def _string_text(element: ElementTree.Element) -> str:
+    """Texto de uma string (simples ou com formatação por trechos), sem a fonética."""
+    text = element.find(_TEXT)
+    if text is not None:
+        return text.text or ''
+
+    return ''.join(
+        run_text.text or ''
+        for run in element.iterfind(_RUN)
+        for run_text in run.iterfind(_TEXT)
+    )
+
+
+def _sheet_path(archive: zipfile.ZipFile, worksheet_name: str) -> str:
+    """Localiza o XML da aba pelo nome (workbook.xml + relacionamentos)."""
+    workbook = ElementTree.fromstring(archive.read('xl/workbook.xml'))
+
+    relationship_id = None
+    for sheet in workbook.iter(f"{_MAIN_NS}sheet"):
+        if sheet.get('name') == worksheet_name:
+            relationship_id = sheet.get(f"{_DOC_REL_NS}id")
+            break
+
+    if relationship_id is None:
+        raise ValueError(f"Planilha '{worksheet_name}' não encontrada no workbook")
+
+    relationships = ElementTree.fromstring(archive.read('xl/_rels/workbook.xml.rels'))
+    for relationship in relationships.iter(f"{_PACKAGE_REL_NS}Relationship"):
+        if relationship.get('Id') == relationship_id:
+            target = relationship.get('Target', '')
+            if target.startswith('/'):
+                return target.lstrip('/')
+            return posixpath.normpath(posixpath.join('xl', target))
+
+    raise ValueError(f"Arquivo da planilha '{worksheet_name}' não encontrado no workbook")
+
+
+def _shared_strings(archive: zipfile.ZipFile) -> List[str]:
+    """Lê a tabela de strings compartilhadas (textos das células)."""
+    try:
+        source = archive.open('xl/sharedStrings.xml')
+    except KeyError:
+        return []
+
+    strings = []
+    with source:
+        for _, element in ElementTree.iterparse(source):
+            if element.tag == _STRING_ITEM:
+                strings.append(_string_text(element))
+                element.clear()
+
+    return strings
+
+
+def _cell_value(cell: ElementTree.Element, shared_strings: List[str]) -> Any:
+    """Converte o valor bruto de uma célula para o formato do usedRange."""
+    cell_type = cell.get('t', 'n')
+
+    if cell_type == 'inlineStr':
+        inline = cell.find(_INLINE_STRING)
+        return _string_text(inline) if inline is not None else ''
+
+    value = cell.findtext(_VALUE)
+    if value is None:
+        return ''
+
+    if cell_type == 's':
+        return shared_strings[int(value)]
+
+    if cell_type == 'b':
+        return value == '1'
+
+    if cell_type == 'n':
+        number = float(value)
+        return int(number) if number.is_integer() else number
+
+    # 'str' (resultado de fórmula), 'e' (erro) e 'd' (data ISO) ficam como texto
+    return value
+
+
+def iter_worksheet_rows(source: BinaryIO, worksheet_name: str, max_columns: int) -> Iterator[List[Any]]:
+    """
+    Itera as linhas de uma aba de um arquivo .xlsx, sob demanda.
+
+    Linhas sem nenhum valor são ignoradas.
+
+    Args:
+        source: Arquivo .xlsx (binário, com seek)
+        worksheet_name: Nome da aba
+        max_columns: Número de colunas lidas a partir da coluna A
+
+    Yields:
+        list: Valores das células da linha (max_columns itens)
+
+    Raises:
+        ValueError: Se o arquivo não for um .xlsx válido ou a aba não existir
+    """
+    try:
+        archive = zipfile.ZipFile(source)
+    except zipfile.BadZipFile as e:
+        raise ValueError(f"Arquivo .xlsx inválido: {str(e)}") from e
+
+    with archive:
+        try:
+            path = _sheet_path(archive, worksheet_name)
+            shared_strings = _shared_strings(archive)
+            sheet = archive.open(path)
+        except (KeyError, ElementTree.ParseError) as e:
+            raise ValueError(f"Arquivo .xlsx inválido: {str(e)}") from e
+
+        with sheet:
+            try:
+                yield from _iter_rows(sheet, shared_strings, max_columns)
+            except (ElementTree.ParseError, zipfile.BadZipFile) as e:
+                raise ValueError(f"Arquivo .xlsx inválido: {str(e)}") from e
+
+
+def _iter_rows(sheet: BinaryIO, shared_strings: List[str], max_columns: int) -> Iterator[List[Any]]:
+    """Itera as linhas do XML de uma aba (ver iter_worksheet_rows)."""
+    for _, element in ElementTree.iterparse(sheet):
+        if element.tag != _ROW:
+            continue
+
+        values: List[Any] = [''] * max_columns
+        has_value = False
+
+        for position, cell in enumerate(element):
+            if cell.tag != _CELL:
+                continue
+
+            reference = cell.get('r')
+            column = _column_index(reference) if reference else position
+            if column >= max_columns:
+                continue
+
+            value = _cell_value(cell, shared_strings)
+            if value != '':
+                values[column] = value
+                has_value = True
+
+        # Descartar as células já lidas (resta apenas o elemento vazio da linha)
+        element.clear()
+
+        if has_value:
+            yield values
@@ -0,0 +1,23 @@
+"""
+Configuração compartilhada dos testes.
+
+As configurações (config/settings.py) são lidas na importação dos
+módulos, então as variáveis de ambiente obrigatórias precisam existir
+antes de qualquer teste importar a aplicação. Valores já definidos no
+ambiente são mantidos.
+"""
+
+import os
+
+# Credenciais falsas: os testes não acessam a OpenAI nem a AWS reais
+# (os clientes são simulados com Mock e moto)
+TEST_ENVIRONMENT = {
+    'OPENAI_API_KEY': 'sk-test',
+    'ASSISTANT_ID': 'asst_test',
+    'AWS_DEFAULT_REGION': 'us-east-1',
+    'AWS_ACCESS_KEY_ID': 'testing',
+    'AWS_SECRET_ACCESS_KEY': 'testing',
+}
+
+for name, value in TEST_ENVIRONMENT.items():
+    os.environ.setdefault(name, value)
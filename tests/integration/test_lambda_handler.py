@@ -7,6 +7,7 @@ import json
 from unittest.mock import patch, MagicMock
 
 from lambda_function import lambda_handler
+from worker_function import worker_handler
 
 
 @pytest.mark.integration
@@ -108,4 +109,122 @@ class TestLambdaHandler:
         # Deve processar corretamente
         assert response['statusCode'] == 200
         mock_conversation_manager.handle_incoming_message.assert_called_once()
+    
+    @patch('lambda_function.MESSAGE_PROCESSING_MODE', 'async')
+    @patch('lambda_function.complete_message')
+    @patch('lambda_function.claim_message', return_value=None)
+    @patch('lambda_function.message_queue')
+    @patch('lambda_function.conversation_manager')
+    def test_lambda_handler_async_mode_enqueues(
+        self, mock_conversation_manager, mock_message_queue,
+        mock_claim_message, mock_complete_message
+    ):
+        """Testa que o modo assíncrono enfileira e responde TwiML vazio."""
+        event = {
+            'body': 'From=whatsapp%3A%2B5511999999999&Body=teste&MessageSid=SM123',
+            'isBase64Encoded': False
+        }
+        
+        response = lambda_handler(event, {})
+        
+        assert response['statusCode'] == 200
+        assert '<Message>' not in response['body']
+        mock_conversation_manager.handle_incoming_message.assert_not_called()
+        
+        queued = mock_message_queue.enqueue.call_args[0][0]
+        assert queued['sender_id'] == 'whatsapp:+5511999999999'
+        assert queued['message_text'] == 'teste'
+        assert queued['message_sid'] == 'SM123'
+        mock_complete_message.assert_called_once_with('SM123')
+    
+    @patch('lambda_function.claim_message')
+    @patch('lambda_function.conversation_manager')
+    def test_lambda_handler_duplicate_returns_cached_reply(
+        self, mock_conversation_manager, mock_claim_message
+    ):
+        """Testa que um retry do Twilio devolve a resposta já gerada."""
+        mock_claim_message.return_value = {
+            'status': 'COMPLETED',
+            'response': 'Resposta original'
+        }
+        
+        event = {
+            'body': 'From=whatsapp%3A%2B5511999999999&Body=teste&MessageSid=SM456',
+            'isBase64Encoded': False
+        }
+        
+        response = lambda_handler(event, {})
+        
+        assert response['statusCode'] == 200
+        assert 'Resposta original' in response['body']
+        mock_conversation_manager.handle_incoming_message.assert_not_called()
+    
+    @patch('lambda_function.claim_message')
+    @patch('lambda_function.conversation_manager')
+    def test_lambda_handler_duplicate_in_progress(
+        self, mock_conversation_manager, mock_claim_message
+    ):
+        """Testa que um retry durante o processamento recebe TwiML vazio."""
+        mock_claim_message.return_value = {'status': 'IN_PROGRESS', 'response': None}
+        
+        event = {
+            'body': 'From=whatsapp%3A%2B5511999999999&Body=teste&MessageSid=SM789',
+            'isBase64Encoded': False
+        }
+        
+        response = lambda_handler(event, {})
+        
+        assert response['statusCode'] == 200
+        assert '<Message>' not in response['body']
+        mock_conversation_manager.handle_incoming_message.assert_not_called()
+
 
+@pytest.mark.integration
+class TestWorkerHandler:
+    """Testes de integração para o worker da fila."""
+    
+    @patch('worker_function.twilio_service')
+    @patch('worker_function.conversation_manager')
+    def test_worker_processes_and_replies(
+        self, mock_conversation_manager, mock_twilio_service
+    ):
+        """Testa que o worker processa a mensagem e responde via REST."""
+        mock_conversation_manager.handle_incoming_message.return_value = "Resposta"
+        
+        event = {
+            'Records': [{
+                'messageId': 'msg-1',
+                'body': json.dumps({
+                    'sender_id': 'whatsapp:+5511999999999',
+                    'message_text': 'teste'
+                })
+            }]
+        }
+        
+        result = worker_handler(event, {})
+        
+        assert result == {'batchItemFailures': []}
+        mock_twilio_service.send_message.assert_called_once_with(
+            to='whatsapp:+5511999999999', body='Resposta'
+        )
+    
+    @patch('worker_function.twilio_service')
+    @patch('worker_function.conversation_manager')
+    def test_worker_reports_failed_records(
+        self, mock_conversation_manager, mock_twilio_service
+    ):
+        """Testa que falhas de envio são reportadas para reprocessamento."""
+        from utils.exceptions import TwilioAPIError
+        mock_conversation_manager.handle_incoming_message.return_value = "Resposta"
+        mock_twilio_service.send_message.side_effect = TwilioAPIError("falha")
+        
+        event = {
+            'Records': [{
+                'messageId': 'msg-2',
+                'body': json.dumps({'sender_id': 'whatsapp:+5511999999999'})
+            }]
+        }
+        
+        result = worker_handler(event, {})
+        
+        assert result == {'batchItemFailures': [{'itemIdentifier': 'msg-2'}]}
@@ -0,0 +1,135 @@
+"""
+Testes unitários para o ConversationManager.
+"""
+
+import json
+import pytest
+from unittest.mock import Mock, patch
+
+from conversation_manager import ConversationManager, DEADLINE_REPLY
+from utils.deadline import Deadline
+from utils.exceptions import DeadlineExceededError
+
+
+def _tool_call(call_id, name, arguments='{}'):
+    """Cria uma tool call simulada."""
+    call = Mock(id=call_id)
+    call.function.name = name
+    call.function.arguments = arguments
+    return call
+
+
+def _fake_execute_tools(calls, deadline=None, sender_id=None):
+    """Simula execute_tools retornando um output por chamada."""
+    return [
+        {'tool_call_id': call['tool_call_id'], 'output': '{"success": true}',
+         'success': True, 'duration_ms': 1.0}
+        for call in calls
+    ]
+
+
+def _requires_action(run_id, *tool_calls):
+    """Cria um resultado de run que requer tool calls."""
+    required_action = Mock()
+    required_action.submit_tool_outputs.tool_calls = list(tool_calls)
+    return {
+        'status': 'requires_action',
+        'run_id': run_id,
+        'required_action': required_action,
+        'response': None
+    }
+
+
+@pytest.mark.unit
+@patch('conversation_manager.tool_executor')
+@patch('conversation_manager.thread_repository')
+@patch('conversation_manager.openai_service')
+class TestConversationManager:
+    """Testes para o fluxo de conversação."""
+    
+    @pytest.fixture
+    def manager(self):
+        """Fixture que retorna uma instância do ConversationManager."""
+        return ConversationManager()
+    
+    def test_multi_round_tool_calls_continue_same_run(
+        self, mock_openai, mock_threads, mock_tools, manager
+    ):
+        """Testa rodadas encadeadas de tool calls no mesmo run."""
+        mock_threads.get_thread_id.return_value = 'thread_1'
+        mock_tools.execute_tools.side_effect = _fake_execute_tools
+        
+        mock_openai.run_assistant.return_value = _requires_action(
+            'run_1', _tool_call('call_1', 'get_expense_history')
+        )
+        mock_openai.submit_tool_outputs_and_wait.side_effect = [
+            _requires_action('run_1', _tool_call('call_2', 'add_expense')),
+            {'status': 'completed', 'run_id': 'run_1',
+             'required_action': None, 'response': 'Despesa registrada!'},
+        ]
+        
+        response = manager.handle_incoming_message('whatsapp:+5511999999999', 'gastei 10')
+        
+        assert response == 'Despesa registrada!'
+        mock_openai.run_assistant.assert_called_once()
+        assert mock_openai.submit_tool_outputs_and_wait.call_count == 2
+        for call in mock_openai.submit_tool_outputs_and_wait.call_args_list:
+            assert call[1]['run_id'] == 'run_1'
+    
+    @patch('conversation_manager.MAX_TOOL_CALL_ROUNDS', 1)
+    def test_tool_round_limit_cancels_run(
+        self, mock_openai, mock_threads, mock_tools, manager
+    ):
+        """Testa que o limite de rodadas cancela o run."""
+        mock_threads.get_thread_id.return_value = 'thread_1'
+        mock_tools.execute_tools.side_effect = _fake_execute_tools
+        
+        mock_openai.run_assistant.return_value = _requires_action(
+            'run_1', _tool_call('call_1', 'get_expense_history')
+        )
+        mock_openai.submit_tool_outputs_and_wait.return_value = _requires_action(
+            'run_1', _tool_call('call_2', 'get_expense_history')
+        )
+        
+        response = manager.handle_incoming_message('whatsapp:+5511999999999', 'oi')
+        
+        assert 'Desculpe' in response
+        mock_openai.cancel_run.assert_called_once_with('thread_1', 'run_1')
+    
+    def test_tool_outputs_preserve_order(
+        self, mock_openai, mock_threads, mock_tools, manager
+    ):
+        """Testa que os outputs seguem a ordem das tool calls."""
+        mock_tools.execute_tools.side_effect = lambda calls, deadline=None, sender_id=None: list(
+            reversed(_fake_execute_tools(calls))
+        )
+        run_result = _requires_action(
+            'run_1',
+            _tool_call('call_1', 'add_expense'),
+            _tool_call('call_2', 'add_expense', arguments='invalido'),
+            _tool_call('call_3', 'add_expense'),
+        )
+        
+        outputs = manager._process_tool_calls(run_result)
+        
+        assert [o['tool_call_id'] for o in outputs] == ['call_1', 'call_2', 'call_3']
+        assert json.loads(outputs[1]['output'])['error'] == 'Argumentos inválidos'
+    
+    def test_deadline_exceeded_returns_degraded_reply(
+        self, mock_openai, mock_threads, mock_tools, manager
+    ):
+        """Testa a resposta degradada e o cancelamento do run quando o prazo se esgota."""
+        mock_threads.get_thread_id.return_value = 'thread_1'
+        mock_tools.execute_tools.side_effect = _fake_execute_tools
+        mock_openai.run_assistant.return_value = _requires_action(
+            'run_1', _tool_call('call_1', 'get_expense_history')
+        )
+        mock_openai.submit_tool_outputs_and_wait.side_effect = DeadlineExceededError('prazo')
+        
+        response = manager.handle_incoming_message(
+            'whatsapp:+5511999999999', 'oi', deadline=Deadline(5)
+        )
+        
+        assert response == DEADLINE_REPLY
+        mock_openai.cancel_run.assert_called_once_with('thread_1', 'run_1')
+        assert mock_openai.run_assistant.call_args.kwargs['deadline'] is not None
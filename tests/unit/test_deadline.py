@@ -0,0 +1,44 @@
+"""
+Testes unitários para o prazo (deadline) da requisição.
+"""
+
+import pytest
+from unittest.mock import Mock
+
+from utils.deadline import Deadline
+from utils.exceptions import DeadlineExceededError
+
+
+@pytest.mark.unit
+class TestDeadline:
+    """Testes para a classe Deadline."""
+    
+    def test_from_lambda_context_uses_remaining_time(self):
+        """Testa que o prazo usa o tempo restante do Lambda menos a reserva."""
+        context = Mock()
+        context.get_remaining_time_in_millis.return_value = 10000
+        
+        deadline = Deadline.from_lambda_context(context, reserve_seconds=3)
+        
+        assert 6.5 < deadline.remaining() <= 7
+    
+    def test_from_lambda_context_without_context(self):
+        """Testa o prazo padrão quando o contexto não informa o tempo restante."""
+        deadline = Deadline.from_lambda_context({}, default_seconds=5)
+        
+        assert 4.5 < deadline.remaining() <= 5
+    
+    def test_limit_and_expired(self):
+        """Testa limitação de timeouts e expiração."""
+        deadline = Deadline(2)
+        
+        assert deadline.limit(30) <= 2
+        assert deadline.limit(1) == 1
+        assert not deadline.expired()
+        
+        expired = Deadline(-1)
+        assert expired.expired()
+        assert expired.remaining() == 0
+        
+        with pytest.raises(DeadlineExceededError):
+            expired.check("etapa")
@@ -0,0 +1,608 @@
+"""
+Testes unitários para o ExcelService.
+"""
+
+import threading
+import time
+import pytest
+from unittest.mock import Mock, patch
+
+from data_access.token_store import MemoryTokenStore
+from services.excel_service import ExcelService
+from services.expense_records import Expense
+from utils.exceptions import MicrosoftGraphAPIError
+
+EXPENSES = [
+    {'date': '2025-10-21', 'description': 'Almoço', 'category': 'Alimentação', 'amount': 45.5},
+    {'date': '2025-10-21', 'description': 'Uber', 'category': 'Transporte', 'amount': 20.0},
+    {'date': '2025-10-22', 'description': 'Farmácia', 'category': 'Saúde', 'amount': 32.9},
+]
+
+
+@pytest.mark.unit
+class TestExcelServiceBulkAppend:
+    """Testes para a escrita de várias despesas em uma requisição."""
+    
+    @pytest.fixture
+    def service(self):
+        """Fixture que retorna o serviço com um access token válido."""
+        service = ExcelService(token_store=MemoryTokenStore())
+        service.access_token = 'token'
+        service.token_expiration_time = time.time() + 3600
+        return service
+    
+    def test_add_expenses_uses_table_rows_add(self, service):
+        """Testa que N despesas viram uma única chamada rows/add."""
+        with patch.object(service, '_request') as mock_request:
+            mock_request.return_value = Mock(json=Mock(return_value={'index': 7}))
+            
+            service.add_expenses('wb', 'Despesas', EXPENSES, table_name='Gastos')
+        
+        mock_request.assert_called_once()
+        method, url = mock_request.call_args.args[:2]
+        assert method == 'POST'
+        assert url.endswith('/workbook/tables/Gastos/rows/add')
+        assert mock_request.call_args.kwargs['idempotent'] is False
+        assert len(mock_request.call_args.kwargs['json']['values']) == 3
+    
+    def test_add_expenses_falls_back_to_range_without_table(self, service):
+        """Testa a escrita no intervalo calculado quando a tabela não existe."""
+        responses = [
+            MicrosoftGraphAPIError("ItemNotFound", status_code=404),
+            Mock(json=Mock(return_value={'rowIndex': 0, 'rowCount': 5})),
+            Mock(json=Mock(return_value={'address': 'Despesas!A6:D8'})),
+        ]
+        
+        with patch.object(service, '_request', side_effect=responses) as mock_request:
+            service.add_expenses('wb', 'Despesas', EXPENSES, table_name='Gastos')
+        
+        patch_call = mock_request.call_args_list[2]
+        assert patch_call.args[0] == 'PATCH'
+        assert patch_call.args[1].endswith("/range(address='A6:D8')")
+        assert patch_call.kwargs['json']['values'][2] == ['2025-10-22', 'Farmácia', 'Saúde', 32.9]
+        
+        # A tabela ausente não é consultada de novo, e o cursor dispensa o usedRange
+        with patch.object(service, '_request') as mock_request:
+            service.add_expenses('wb', 'Despesas', EXPENSES[:1], table_name='Gastos')
+        
+        assert [c.args[0] for c in mock_request.call_args_list] == ['PATCH']
+        assert mock_request.call_args.args[1].endswith("/range(address='A9:D9')")
+    
+    def test_add_expenses_propagates_other_errors(self, service):
+        """Testa que erros diferentes de 404 não disparam o fallback."""
+        error = MicrosoftGraphAPIError("Forbidden", status_code=403)
+        
+        with patch.object(service, '_request', side_effect=error) as mock_request:
+            with pytest.raises(MicrosoftGraphAPIError):
+                service.add_expenses('wb', 'Despesas', EXPENSES, table_name='Gastos')
+        
+        assert mock_request.call_count == 1
+
+
+@pytest.mark.unit
+class TestExcelServiceWorkbookSessions:
+    """Testes para as sessões persistentes de workbook."""
+    
+    @pytest.fixture
+    def service(self):
+        """Fixture que retorna o serviço sem agrupamento em $batch."""
+        with patch('services.excel_service.GRAPH_BATCH_WINDOW_MS', 0):
+            service = ExcelService(token_store=MemoryTokenStore())
+        service.access_token = 'token'
+        service.token_expiration_time = time.time() + 3600
+        return service
+    
+    def _fake_send(self, session_ids, fail_first_with=None):
+        """Cria um _send falso que registra as chamadas e cria sessões."""
+        calls = []
+        failures = [fail_first_with] if fail_first_with else []
+        
+        def send(method, url, error_message, idempotent=True, **kwargs):
+            calls.append((method, url, kwargs.get('headers', {}).get('workbook-session-id')))
+            if url.endswith('/createSession'):
+                return Mock(json=Mock(return_value={'id': session_ids.pop(0)}))
+            if failures and url.endswith('usedRange'):
+                raise failures.pop()
+            return Mock(json=Mock(return_value={'values': []}))
+        
+        return send, calls
+    
+    def test_consecutive_calls_reuse_session(self, service):
+        """Testa que chamadas seguidas reutilizam a mesma sessão."""
+        send, calls = self._fake_send(['sessao-1'])
+        
+        with patch.object(service, '_send', side_effect=send):
+            service.get_expense_history('wb', 'Despesas')
+            service.get_expense_history('wb', 'Despesas')
+        
+        assert [c[1].endswith('/createSession') for c in calls].count(True) == 1
+        assert [c[2] for c in calls if c[1].endswith('usedRange')] == ['sessao-1', 'sessao-1']
+    
+    def test_expired_session_is_recreated(self, service):
+        """Testa que uma sessão expirada no servidor é recriada e a chamada repetida."""
+        error = MicrosoftGraphAPIError("InvalidSessionReCreatable: session expired", status_code=404)
+        send, calls = self._fake_send(['sessao-1', 'sessao-2'], fail_first_with=error)
+        
+        with patch.object(service, '_send', side_effect=send):
+            service.get_expense_history('wb', 'Despesas')
+        
+        assert [c[2] for c in calls if c[1].endswith('usedRange')] == ['sessao-1', 'sessao-2']
+    
+    def test_idle_session_is_refreshed(self, service):
+        """Testa que uma sessão perto de expirar é renovada em vez de recriada."""
+        send, calls = self._fake_send(['sessao-1'])
+        
+        with patch.object(service, '_send', side_effect=send):
+            service.get_expense_history('wb', 'Despesas')
+            service._workbook_sessions['wb']['last_used'] -= 270  # TTL 300s, margem 60s
+            service.get_expense_history('wb', 'Despesas')
+        
+        urls = [c[1].rsplit('/', 1)[-1] for c in calls]
+        assert urls.count('createSession') == 1
+        assert urls.count('refreshSession') == 1
+    
+    def test_slow_session_creation_does_not_block_other_callers(self, service):
+        """Testa a criação única por workbook, sem lock global e respeitando o prazo de quem espera."""
+        from tools.execution_engine import ToolExecutionEngine
+        from utils.deadline import Deadline
+        
+        release = threading.Event()
+        created = []
+        
+        def create(workbook_id):
+            created.append(workbook_id)
+            if workbook_id == 'wb':
+                release.wait(5)
+            return f'sessao-{workbook_id}'
+        
+        results = {}
+        
+        with patch.object(service, '_create_workbook_session', side_effect=create):
+            creator = threading.Thread(target=lambda: results.update(first=service._workbook_session('wb')))
+            creator.start()
+            while not created:
+                time.sleep(0.01)
+            
+            # Quem espera desiste no próprio prazo; outro workbook não espera
+            started = time.monotonic()
+            waiting = ToolExecutionEngine().run(
+                'get_expense_history', lambda: service._workbook_session('wb'), deadline=Deadline(0.3)
+            )
+            assert (waiting['status'], waiting['value']) == ('success', None)
+            assert service._workbook_session('wb2') == 'sessao-wb2'
+            assert time.monotonic() - started < 2
+            
+            release.set()
+            creator.join()
+            
+            assert results['first'] == 'sessao-wb'
+            assert service._workbook_session('wb') == 'sessao-wb'
+        
+        assert created == ['wb', 'wb2']
+
+
+@pytest.mark.unit
+class TestExcelServiceHistoryCache:
+    """Testes para o cache do histórico validado pela versão do workbook."""
+    
+    @pytest.fixture
+    def service(self):
+        """Fixture que retorna o serviço sem $batch e sem sessões."""
+        with patch('services.excel_service.GRAPH_BATCH_WINDOW_MS', 0):
+            service = ExcelService(token_store=MemoryTokenStore())
+        service.access_token = 'token'
+        service.token_expiration_time = time.time() + 3600
+        return service
+    
+    def _fake_request(self, versions):
+        """Cria um _request falso: metadados com a versão atual e planilha fixa."""
+        calls = []
+        
+        def request(method, url, error_message, idempotent=True, **kwargs):
+            calls.append(url.rsplit('/', 1)[-1])
+            if url.endswith('/wb'):
+                return Mock(json=Mock(return_value={'cTag': versions[0]}))
+            if url.endswith('usedRange'):
+                return Mock(json=Mock(return_value={'values': [
+                    ['Data', 'Descrição', 'Categoria', 'Valor'],
+                    ['2025-10-21', 'Almoço', 'Alimentação', 45.5],
+                    ['2025-10-21', 'Uber', 'Transporte', 20.0],
+                ]}))
+            return Mock(json=Mock(return_value={}))
+        
+        return request, calls
+    
+    def test_unchanged_workbook_is_served_from_cache(self, service):
+        """Testa que perguntas repetidas custam apenas a consulta de versão."""
+        request, calls = self._fake_request(['v1'])
+        
+        with patch.object(service, '_request', side_effect=request):
+            first = service.get_expense_history('wb', 'Despesas')
+            second = service.get_expense_history(
+                'wb', 'Despesas', filters={'category': 'Transporte'}
+            )
+            third = service.get_expense_history('wb', 'Despesas')
+        
+        assert calls.count('usedRange') == 1
+        assert calls.count('wb') == 3
+        assert len(first) == len(third) == 2
+        assert second == [first[1]]
+    
+    def test_changed_version_or_own_write_refreshes(self, service):
+        """Testa que uma nova versão ou uma escrita própria invalidam o cache."""
+        versions = ['v1']
+        request, calls = self._fake_request(versions)
+        
+        with patch.object(service, '_request', side_effect=request):
+            service.get_expense_history('wb', 'Despesas')
+            versions[0] = 'v2'
+            service.get_expense_history('wb', 'Despesas')
+            service.add_expense('wb', 'Despesas', EXPENSES[0])
+            service.get_expense_history('wb', 'Despesas')
+        
+        assert calls.count('usedRange') == 3
+    
+    def test_cache_is_size_bounded(self):
+        """Testa que o LRU descarta as planilhas menos usadas."""
+        from services.expense_cache import ExpenseHistoryCache
+        
+        cache = ExpenseHistoryCache(max_entries=2)
+        cache.put('wb', 'A', 'v1', [1])
+        cache.put('wb', 'B', 'v1', [2])
+        cache.get('wb', 'A', 'v1')
+        cache.put('wb', 'C', 'v1', [3])
+        
+        assert cache.get('wb', 'A', 'v1') == [1]
+        assert cache.get('wb', 'B', 'v1') is None
+        assert cache.get('wb', 'C', 'v2') is None
+    
+    def test_shared_store_roundtrip(self, monkeypatch):
+        """Testa o cache compartilhado no DynamoDB entre dois containers."""
+        import boto3
+        from moto import mock_dynamodb
+        from config.settings import CACHE_TABLE_NAME
+        from data_access.history_cache_store import DynamoDBHistoryCacheStore
+        from services.expense_cache import ExpenseHistoryCache
+        
+        monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+        
+        with mock_dynamodb():
+            boto3.resource('dynamodb', region_name='us-east-1').create_table(
+                TableName=CACHE_TABLE_NAME,
+                KeySchema=[{'AttributeName': 'cache_key', 'KeyType': 'HASH'}],
+                AttributeDefinitions=[{'AttributeName': 'cache_key', 'AttributeType': 'S'}],
+                BillingMode='PAY_PER_REQUEST'
+            )
+            
+            writer = ExpenseHistoryCache(shared_store=DynamoDBHistoryCacheStore())
+            reader = ExpenseHistoryCache(shared_store=DynamoDBHistoryCacheStore())
+            
+            writer.put('wb', 'Despesas', 'v1', EXPENSES)
+            rows = reader.get('wb', 'Despesas', 'v1')
+            assert rows == EXPENSES
+            assert all(isinstance(row, Expense) for row in rows)
+            
+            writer.invalidate('wb', 'Despesas')
+            assert ExpenseHistoryCache(
+                shared_store=DynamoDBHistoryCacheStore()
+            ).get('wb', 'Despesas', 'v1') is None
+
+
+@pytest.mark.unit
+class TestExcelServiceWorkbookDownload:
+    """Testes para a leitura do histórico baixando o .xlsx."""
+    
+    @pytest.fixture
+    def service(self):
+        """Fixture que retorna o serviço sem $batch, com a leitura por tamanho."""
+        with patch('services.excel_service.GRAPH_BATCH_WINDOW_MS', 0):
+            service = ExcelService(token_store=MemoryTokenStore())
+        service.access_token = 'token'
+        service.token_expiration_time = time.time() + 3600
+        
+        with patch('services.excel_service.EXCEL_HISTORY_READ_MODE', 'auto'):
+            yield service
+    
+    @staticmethod
+    def _xlsx_bytes():
+        """Gera um .xlsx com cabeçalho, duas despesas e uma linha vazia."""
+        import io
+        from datetime import datetime
+        from openpyxl import Workbook
+        
+        workbook = Workbook()
+        sheet = workbook.active
+        sheet.title = 'Despesas'
+        sheet.append(['Data', 'Descrição', 'Categoria', 'Valor'])
+        sheet.append([datetime(2025, 10, 21), 'Almoço', 'Alimentação', 45.5])
+        sheet.append([])
+        sheet.append([datetime(2025, 10, 22), 'Uber', None, 20])
+        
+        buffer = io.BytesIO()
+        workbook.save(buffer)
+        return buffer.getvalue()
+    
+    def _fake_request(self, size):
+        """Cria um _request falso: metadados com o tamanho, /content e usedRange."""
+        from unittest.mock import MagicMock
+        
+        content = self._xlsx_bytes()
+        calls = []
+        
+        def request(method, url, error_message, idempotent=True, **kwargs):
+            calls.append((url.rsplit('/', 1)[-1], kwargs))
+            if url.endswith('/wb'):
+                return Mock(json=Mock(return_value={'cTag': 'v1', 'size': size}))
+            if url.endswith('/content'):
+                response = MagicMock()
+                response.iter_content.return_value = [content[:1000], content[1000:]]
+                return response
+            return Mock(json=Mock(return_value={'values': [
+                ['Data', 'Descrição', 'Categoria', 'Valor'],
+                [45951, 'Almoço', 'Alimentação', 45.5],
+                [45952, 'Uber', '', 20],
+            ]}))
+        
+        return request, calls
+    
+    def test_large_workbook_is_downloaded_and_parsed_locally(self, service):
+        """Testa que o .xlsx baixado produz as mesmas despesas do usedRange."""
+        request, calls = self._fake_request(size=50 * 1024 * 1024)
+        
+        with patch.object(service, '_request', side_effect=request):
+            downloaded = service.load_expenses('wb', 'Despesas')
+            service.history_cache.invalidate('wb', 'Despesas')
+            with patch('services.excel_service.EXCEL_HISTORY_READ_MODE', 'range'):
+                from_range = service.load_expenses('wb', 'Despesas')
+        
+        content_kwargs = [kwargs for name, kwargs in calls if name == 'content'][0]
+        assert content_kwargs['stream'] is True
+        assert downloaded == from_range
+        assert downloaded[0] == {
+            'date': 45951, 'description': 'Almoço', 'category': 'Alimentação', 'amount': 45.5
+        }
+    
+    def test_small_workbook_or_recent_write_uses_range(self, service):
+        """Testa que arquivos pequenos e escritas recentes usam o usedRange."""
+        small, small_calls = self._fake_request(size=10 * 1024)
+        large, large_calls = self._fake_request(size=50 * 1024 * 1024)
+        
+        with patch.object(service, '_request', side_effect=small):
+            service.load_expenses('wb', 'Despesas')
+        
+        service.history_cache.invalidate('wb', 'Despesas')
+        service._last_writes['wb'] = time.time()
+        
+        with patch.object(service, '_request', side_effect=large):
+            service.load_expenses('wb', 'Despesas')
+        
+        for calls in (small_calls, large_calls):
+            names = [name for name, _ in calls]
+            assert 'content' not in names
+            assert ('usedRange', {'headers': service._get_headers(), 'params': {'$select': 'values'}}) in calls
+    
+    def test_missing_worksheet_raises(self, service):
+        """Testa que uma aba inexistente no arquivo baixado vira erro do Graph."""
+        request, _ = self._fake_request(size=50 * 1024 * 1024)
+        
+        with patch.object(service, '_request', side_effect=request):
+            with pytest.raises(MicrosoftGraphAPIError):
+                service.load_expenses('wb', 'Outra')
+
+
+@pytest.mark.unit
+class TestExcelServiceExpenseSummary:
+    """Testes para os totais calculados no Excel (SUMIFS/COUNTIFS)."""
+    
+    @pytest.fixture(autouse=True)
+    def no_workbook_sessions(self):
+        """Desativa as sessões de workbook nestes testes."""
+        with patch('services.excel_service.EXCEL_WORKBOOK_SESSION_TTL_SECONDS', 0):
+            yield
+    
+    def _service(self, batch_window_ms=0):
+        with patch('services.excel_service.GRAPH_BATCH_WINDOW_MS', batch_window_ms):
+            service = ExcelService(token_store=MemoryTokenStore())
+        service.access_token = 'token'
+        service.token_expiration_time = time.time() + 3600
+        return service
+    
+    def test_summary_returns_only_aggregates(self):
+        """Testa os critérios enviados e o mapeamento dos resultados."""
+        service = self._service()
+        values = iter([120.456, 7, 45.5, 2])
+        
+        with patch.object(service, '_request') as mock_request:
+            mock_request.side_effect = lambda *args, **kwargs: Mock(
+                json=Mock(return_value={'error': None, 'value': next(values)})
+            )
+            
+            summary = service.get_expense_summary(
+                'wb', 'Despesas', start_date='2025-10-01',
+                end_date='2025-10-31', categories=['Alimentação']
+            )
+        
+        assert summary['total'] == 120.46
+        assert summary['count'] == 7
+        assert summary['categories'] == [
+            {'category': 'Alimentação', 'total': 45.5, 'count': 2}
+        ]
+        
+        urls = [c.args[1].rsplit('/', 1)[-1] for c in mock_request.call_args_list]
+        assert urls == ['sumIfs', 'countIfs', 'sumIfs', 'countIfs']
+        
+        category_values = mock_request.call_args_list[2].kwargs['json']['values']
+        assert ">=45931" in category_values  # 2025-10-01
+        assert "<=45961" in category_values  # 2025-10-31
+        assert category_values[-2:] == [{'Address': "'Despesas'!C:C"}, 'Alimentação']
+    
+    def test_summary_functions_share_one_batch(self):
+        """Testa que as funções do resumo são enviadas em um único $batch."""
+        service = self._service(batch_window_ms=50)
+        
+        def send_batch(requests_body, idempotent, timeout):
+            return {'responses': [
+                {'id': r['id'], 'status': 200, 'body': {'error': None, 'value': 1}}
+                for r in requests_body
+            ]}
+        
+        with patch.object(service, '_send_batch', side_effect=send_batch) as mock_batch:
+            service._batch.send_batch = service._send_batch
+            summary = service.get_expense_summary('wb', 'Despesas', categories=['Saúde', 'Lazer'])
+        
+        assert mock_batch.call_count == 1
+        assert len(mock_batch.call_args.args[0]) == 6
+        assert [c['count'] for c in summary['categories']] == [1, 1]
+    
+    def test_summary_rejects_invalid_date(self):
+        """Testa que datas inválidas falham antes de qualquer requisição."""
+        service = self._service()
+        
+        with patch.object(service, '_request') as mock_request:
+            with pytest.raises(ValueError):
+                service.get_expense_summary('wb', 'Despesas', start_date='31/10/2025')
+        
+        mock_request.assert_not_called()
+
+
+@pytest.mark.unit
+class TestExcelServiceRowCursor:
+    """Testes para o cursor da próxima linha livre (escrita sem a tabela)."""
+    
+    @pytest.fixture
+    def service(self):
+        """Fixture que retorna o serviço sem $batch e sem sessões."""
+        with patch('services.excel_service.GRAPH_BATCH_WINDOW_MS', 0):
+            service = ExcelService(token_store=MemoryTokenStore())
+        service.access_token = 'token'
+        service.token_expiration_time = time.time() + 3600
+        return service
+    
+    def _workbook(self, row_count):
+        """
+        Simula o Graph para uma planilha com row_count linhas ocupadas.
+        
+        Cada PATCH (e cada edição externa, via state['edit']) cria uma
+        versão nova do workbook, como o cTag do OneDrive.
+        """
+        state = {'rows': row_count, 'version': 1, 'calls': []}
+        
+        def edit(rows=1):
+            state['rows'] += rows
+            state['version'] += 1
+        
+        def request(method, url, error_message, **kwargs):
+            name = url.rsplit('/', 1)[-1]
+            state['calls'].append((method, name))
+            
+            if name == 'wb':
+                return Mock(json=Mock(return_value={'cTag': f"v{state['version']}", 'size': 0}))
+            if name == 'usedRange(valuesOnly=true)':
+                return Mock(json=Mock(return_value={'rowIndex': 0, 'rowCount': state['rows']}))
+            if name == 'usedRange':
+                values = [['2025-10-21', 'Item', 'Outros', 1.0] for _ in range(state['rows'])]
+                return Mock(json=Mock(return_value={'values': values}))
+            
+            last_row = int(name.split(':D')[1].rstrip("')"))
+            state['rows'] = max(state['rows'], last_row)
+            edit(rows=0)
+            return Mock(json=Mock(return_value={}))
+        
+        state['edit'] = edit
+        return state, request
+    
+    def test_consecutive_appends_skip_used_range(self, service):
+        """Testa que, com o cursor válido, cada escrita é uma única requisição (o PATCH)."""
+        state, request = self._workbook(5)
+        
+        with patch.object(service, '_request', side_effect=request):
+            service._append_range_rows('wb', 'Despesas', [['a']] * 3)
+            service._append_range_rows('wb', 'Despesas', [['b']] * 2)
+            service._append_range_rows('wb', 'Despesas', [['c']])
+        
+        assert state['calls'] == [
+            ('GET', 'usedRange(valuesOnly=true)'),
+            ('PATCH', "range(address='A6:D8')"),
+            ('PATCH', "range(address='A9:D10')"),
+            ('PATCH', "range(address='A11:D11')"),
+        ]
+    
+    def test_external_edit_seen_by_read_rereads_used_range(self, service):
+        """Testa que uma linha adicionada à mão, vista em uma leitura, não é sobrescrita."""
+        state, request = self._workbook(5)
+        
+        with patch.object(service, '_request', side_effect=request):
+            service._append_range_rows('wb', 'Despesas', [['a']])
+            state['edit']()
+            service.load_expenses('wb', 'Despesas')
+            state['calls'].clear()
+            service._append_range_rows('wb', 'Despesas', [['b']])
+        
+        assert state['calls'] == [
+            ('GET', 'usedRange(valuesOnly=true)'),
+            ('PATCH', "range(address='A8:D8')"),
+        ]
+    
+    def test_read_after_own_write_keeps_cursor(self, service):
+        """Testa que a versão nova produzida pela própria escrita não descarta o cursor."""
+        state, request = self._workbook(5)
+        
+        with patch.object(service, '_request', side_effect=request):
+            service._append_range_rows('wb', 'Despesas', [['a']])
+            service.load_expenses('wb', 'Despesas')
+            state['calls'].clear()
+            service._append_range_rows('wb', 'Despesas', [['b']])
+        
+        assert state['calls'] == [('PATCH', "range(address='A7:D7')")]
+    
+    def test_observe_keeps_cursor_ahead_of_read(self, service):
+        """Testa que escritas reservadas e ainda não lidas não descartam o cursor."""
+        service.row_cursors.seed('wb', 'Despesas', 9)
+        
+        assert service.row_cursors.observe('wb', 'Despesas', 7) is False
+        assert service.row_cursors.observe('wb', 'Despesas', 9) is False
+        assert service.row_cursors.advance('wb', 'Despesas', 1) == 9
+        
+        assert service.row_cursors.observe('wb', 'Despesas', 12) is True
+        assert service.row_cursors.advance('wb', 'Despesas', 1) is None
+    
+    def test_failed_write_invalidates_cursor(self, service):
+        """Testa que uma falha no PATCH descarta o cursor."""
+        service.row_cursors.seed('wb', 'Despesas', 9)
+        
+        with patch.object(service, '_request', side_effect=MicrosoftGraphAPIError("Conflict", status_code=409)):
+            with pytest.raises(MicrosoftGraphAPIError):
+                service._append_range_rows('wb', 'Despesas', [['a']])
+        
+        assert service.row_cursors.advance('wb', 'Despesas', 1) is None
+    
+    def test_shared_cursor_reserves_disjoint_rows(self, monkeypatch):
+        """Testa que containers diferentes reservam intervalos distintos no DynamoDB."""
+        import boto3
+        from moto import mock_dynamodb
+        from config.settings import CACHE_TABLE_NAME
+        from data_access.row_cursor_store import DynamoDBRowCursorStore
+        
+        monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+        
+        with mock_dynamodb():
+            boto3.resource('dynamodb', region_name='us-east-1').create_table(
+                TableName=CACHE_TABLE_NAME,
+                KeySchema=[{'AttributeName': 'cache_key', 'KeyType': 'HASH'}],
+                AttributeDefinitions=[{'AttributeName': 'cache_key', 'AttributeType': 'S'}],
+                BillingMode='PAY_PER_REQUEST'
+            )
+            
+            first, second = DynamoDBRowCursorStore(), DynamoDBRowCursorStore()
+            
+            assert first.advance('wb', 'Despesas', 3) is None
+            assert first.seed('wb', 'Despesas', 9) is True
+            assert second.seed('wb', 'Despesas', 9) is False
+            
+            assert second.advance('wb', 'Despesas', 3) == 9
+            assert first.advance('wb', 'Despesas', 1) == 12
+            
+            # Leitura atrás do cursor o mantém; linhas além dele o descartam
+            assert second.observe('wb', 'Despesas', 10) is False
+            assert second.observe('wb', 'Despesas', 15) is True
+            assert first.advance('wb', 'Despesas', 1) is None
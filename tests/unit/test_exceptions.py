@@ -10,7 +10,10 @@ from utils.exceptions import (
     MicrosoftGraphAPIError,
     DynamoDBError,
     ToolExecutionError,
-    ConfigurationError
+    ConfigurationError,
+    DeadlineExceededError,
+    TransientError,
+    CircuitOpenError
 )
 
 
@@ -59,4 +62,21 @@ class TestExceptions:
         error = ConfigurationError("Erro de configuração")
         assert isinstance(error, FinancialAssistantError)
         assert str(error) == "Erro de configuração"
-
+    
+    def test_deadline_exceeded_error(self):
+        """Testa exceção de prazo esgotado."""
+        error = DeadlineExceededError("Prazo esgotado")
+        assert isinstance(error, FinancialAssistantError)
+        assert str(error) == "Prazo esgotado"
+    
+    def test_retryable_classification(self):
+        """Testa a classificação entre erros transitórios e fatais."""
+        assert FinancialAssistantError("Erro").retryable is False
+        
+        error = TransientError("Limite atingido", retry_after=2)
+        assert isinstance(error, FinancialAssistantError)
+        assert error.retryable is True
+        assert error.retry_after == 2
+        
+        assert OpenAIAPIError("503", retryable=True).retryable is True
+        assert isinstance(CircuitOpenError("Aberto"), FinancialAssistantError)
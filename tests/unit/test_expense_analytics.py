@@ -0,0 +1,130 @@
+"""
+Testes unitários para as análises vetorizadas de despesas.
+"""
+
+import pytest
+from unittest.mock import Mock
+
+from services.expense_analytics import ExpenseAnalyticsService, ExpenseFrame
+
+ROWS = [
+    {'date': 45931, 'description': 'Mercado', 'category': 'Alimentação', 'amount': 200.0},     # 2025-10-01 (qua)
+    {'date': '2025-10-06', 'description': 'Uber', 'category': 'Transporte', 'amount': 30.0},     # segunda
+    {'date': '2025-10-07', 'description': 'Almoço', 'category': 'Alimentação', 'amount': '45,50'},
+    {'date': '15/09/2025', 'description': 'Cinema', 'category': 'Lazer', 'amount': 60},
+    {'date': '2025-09-20', 'description': 'Farmácia', 'category': 'Saúde', 'amount': 80.0},
+    {'date': 'Data', 'description': 'Cabeçalho repetido', 'category': '', 'amount': 'Valor'},
+]
+
+
+@pytest.mark.unit
+class TestExpenseFrame:
+    """Testes para a estrutura colunar."""
+    
+    def test_from_rows_parses_and_skips_invalid(self):
+        """Testa a conversão de datas/valores e o descarte de linhas inválidas."""
+        frame = ExpenseFrame.from_rows(ROWS)
+        
+        assert len(frame) == 5
+        assert str(frame.dates[0]) == '2025-10-01'
+        assert str(frame.dates[3]) == '2025-09-15'
+        assert frame.amounts[2] == 45.5
+        assert frame.categories[frame.category_codes[2]] == 'Alimentação'
+    
+    def test_group_by_month_and_week(self):
+        """Testa os agrupamentos por mês e por semana (início na segunda)."""
+        frame = ExpenseFrame.from_rows(ROWS)
+        
+        months = frame.group_by('month')
+        weeks = frame.group_by('week', frame.mask('2025-10-01', '2025-10-31'))
+        
+        assert months == [
+            {'group': '2025-09', 'total': 140.0, 'count': 2},
+            {'group': '2025-10', 'total': 275.5, 'count': 3},
+        ]
+        assert weeks == [
+            {'group': '2025-09-29', 'total': 200.0, 'count': 1},
+            {'group': '2025-10-06', 'total': 75.5, 'count': 2},
+        ]
+    
+    def test_unsupported_grouping(self):
+        """Testa que agrupamentos desconhecidos são rejeitados."""
+        with pytest.raises(ValueError):
+            ExpenseFrame.from_rows(ROWS).group_by('year')
+
+
+@pytest.mark.unit
+class TestExpenseAnalyticsService:
+    """Testes para o serviço de análises."""
+    
+    @pytest.fixture
+    def excel(self):
+        """Fixture com um ExcelService falso que sempre devolve as mesmas linhas."""
+        excel = Mock()
+        excel.load_expenses.return_value = ROWS
+        return excel
+    
+    @pytest.fixture
+    def service(self, excel):
+        """Fixture que retorna o serviço de análises."""
+        return ExpenseAnalyticsService(excel=excel)
+    
+    def test_frame_is_reused_while_rows_are_unchanged(self, service, excel):
+        """Testa que a estrutura colunar é reaproveitada entre chamadas."""
+        first = service.load('wb', 'Despesas')
+        second = service.load('wb', 'Despesas')
+        
+        excel.load_expenses.return_value = list(ROWS)
+        third = service.load('wb', 'Despesas')
+        
+        assert first is second
+        assert third is not first
+    
+    def test_frames_are_bounded_like_the_row_cache(self, excel):
+        """Testa que apenas as planilhas mais recentes mantêm estrutura (e linhas) em memória."""
+        service = ExpenseAnalyticsService(excel=excel, max_entries=2)
+        
+        for worksheet_name in ('Jan', 'Fev', 'Jan', 'Mar'):
+            service.load('wb', worksheet_name)
+        
+        assert list(service._frames) == [('wb', 'Jan'), ('wb', 'Mar')]
+    
+    def test_group_by_category_sorted_by_total(self, service):
+        """Testa os totais por categoria, do maior para o menor."""
+        result = service.group_by('wb', 'Despesas', 'category')
+        
+        assert [group['group'] for group in result['groups']] == [
+            'Alimentação', 'Saúde', 'Lazer', 'Transporte'
+        ]
+        assert result['total'] == 415.5
+        assert result['count'] == 5
+    
+    def test_top_expenses(self, service):
+        """Testa as maiores despesas individuais e por grupo."""
+        individual = service.top('wb', 'Despesas', limit=2)
+        by_month = service.top('wb', 'Despesas', limit=1, by='month')
+        
+        assert [item['description'] for item in individual['items']] == ['Mercado', 'Farmácia']
+        assert by_month['items'] == [{'group': '2025-10', 'total': 275.5, 'count': 3}]
+    
+    def test_running_total(self, service):
+        """Testa o total acumulado por mês."""
+        result = service.running_total('wb', 'Despesas', period='month')
+        
+        assert [point['cumulative'] for point in result['points']] == [140.0, 415.5]
+    
+    def test_compare_periods(self, service):
+        """Testa a comparação entre outubro e setembro."""
+        result = service.compare_periods(
+            'wb', 'Despesas',
+            '2025-10-01', '2025-10-31',
+            '2025-09-01', '2025-09-30'
+        )
+        
+        assert result['current']['total'] == 275.5
+        assert result['previous']['total'] == 140.0
+        assert result['difference'] == 135.5
+        assert result['change_percent'] == 96.8
+        assert result['categories'][0] == {
+            'category': 'Alimentação', 'current': 245.5, 'previous': 0.0, 'difference': 245.5
+        }
@@ -0,0 +1,158 @@
+"""
+Testes unitários para os filtros compilados do histórico de despesas.
+"""
+
+import time
+import pytest
+from unittest.mock import Mock, patch
+
+from data_access.token_store import MemoryTokenStore
+from services.excel_service import ExcelService
+from services.expense_filters import compile_filters
+
+ROWS = [
+    ['Data', 'Descrição', 'Categoria', 'Valor'],
+    ['2025-10-21', 'Almoço no centro', 'Alimentação', 45.5],
+    ['2025-10-21', 'Uber', 'Transporte', 20.0],
+    [45952, 'Farmácia', 'Saúde', 'R$ 1.032,90'],
+    ['2025-11-03', 'Mercado', 'Alimentação', 230.0],
+    ['2025-11'],
+]
+
+
+def _expense(date, description, category, amount):
+    """Cria uma despesa no formato das ferramentas."""
+    return {'date': date, 'description': description, 'category': category, 'amount': amount}
+
+
+EXPENSES = [_expense(*row) for row in ROWS[1:5]]
+
+
+@pytest.mark.unit
+class TestCompileFilters:
+    """Testes para a validação e o predicado dos filtros."""
+
+    def test_without_filters_accepts_everything(self):
+        """Testa que filtros vazios não geram predicado."""
+        expense_filter = compile_filters(None)
+
+        assert expense_filter.predicate is None
+        assert expense_filter.apply(EXPENSES) == EXPENSES
+
+    def test_date_range_accepts_iso_and_excel_serials(self):
+        """Testa o período com datas em texto e em número de série do Excel (45952 = 2025-10-22)."""
+        expense_filter = compile_filters({'start_date': '2025-10-22', 'end_date': '2025-10-31'})
+
+        assert [e['description'] for e in expense_filter.select(EXPENSES)] == ['Farmácia']
+        assert (expense_filter.start_date, expense_filter.end_date) == ('2025-10-22', '2025-10-31')
+
+    def test_conditions_are_combined(self):
+        """Testa valor mínimo (inclusive 'R$ 1.032,90'), categorias e trecho da descrição."""
+        expensive = compile_filters({'min_amount': 100, 'categories': ['Saúde', 'Alimentação']})
+        assert [e['description'] for e in expensive.select(EXPENSES)] == ['Farmácia', 'Mercado']
+
+        lunch = compile_filters({'description_contains': 'ALMOÇO', 'max_amount': '50'})
+        assert [e['description'] for e in lunch.select(EXPENSES)] == ['Almoço no centro']
+
+        legacy = compile_filters({'category': 'Transporte'})
+        assert legacy.select(EXPENSES) == [EXPENSES[1]]
+
+    def test_sort_and_limit(self):
+        """Testa a ordenação por valor e data, com e sem limite."""
+        top = compile_filters({'sort_by': 'amount', 'descending': True, 'limit': 2})
+        assert [e['description'] for e in top.apply(EXPENSES)] == ['Farmácia', 'Mercado']
+
+        oldest = compile_filters({'sort_by': 'date'})
+        assert [e['date'] for e in oldest.apply(EXPENSES)] == [
+            '2025-10-21', '2025-10-21', 45952, '2025-11-03'
+        ]
+
+        assert compile_filters({'limit': 1}).apply(EXPENSES) == EXPENSES[:1]
+
+    @pytest.mark.parametrize('filters, message', [
+        ({'categoria': 'Lazer'}, 'Filtros desconhecidos: categoria'),
+        ({'start_date': '21/10/2025'}, "'start_date' deve estar no formato YYYY-MM-DD"),
+        ({'min_amount': 'muito'}, "'min_amount' deve ser um número"),
+        ({'sort_by': 'category'}, "'sort_by' deve ser date ou amount"),
+        ({'limit': 0}, "'limit' deve ser maior que zero"),
+    ])
+    def test_invalid_filters_raise(self, filters, message):
+        """Testa que filtros inválidos são recusados antes de qualquer leitura."""
+        with pytest.raises(ValueError, match=message):
+            compile_filters(filters)
+
+
+@pytest.mark.unit
+class TestExcelServiceFilteredHistory:
+    """Testes para a aplicação dos filtros na leitura da planilha."""
+
+    @pytest.fixture
+    def service(self):
+        """Fixture que retorna o serviço sem $batch e sem sessões."""
+        with patch('services.excel_service.GRAPH_BATCH_WINDOW_MS', 0):
+            service = ExcelService(token_store=MemoryTokenStore())
+        service.access_token = 'token'
+        service.token_expiration_time = time.time() + 3600
+        return service
+
+    def _fake_request(self, metadata):
+        """Cria um _request falso: metadados fixos e a planilha ROWS."""
+        def request(method, url, error_message, idempotent=True, **kwargs):
+            if url.endswith('/wb'):
+                return Mock(json=Mock(return_value=metadata))
+            if url.endswith('usedRange'):
+                # Cada resposta traz listas novas (o ExcelService as esvazia ao ler)
+                return Mock(json=Mock(return_value={'values': [list(row) for row in ROWS]}))
+            return Mock(json=Mock(return_value={}))
+
+        return request
+
+    def test_rows_are_filtered_while_parsing(self, service):
+        """Testa que, sem versão do workbook, apenas as linhas aceitas viram despesas."""
+        parsed = []
+        parse = ExcelService._parse_expense_rows
+
+        def spy(rows, predicate=None):
+            for expense in parse(rows, predicate):
+                parsed.append(expense)
+                yield expense
+
+        with patch.object(service, '_request', side_effect=self._fake_request({})), \
+                patch.object(ExcelService, '_parse_expense_rows', staticmethod(spy)):
+            history = service.get_expense_history('wb', 'Despesas', {
+                'min_amount': 40, 'sort_by': 'amount', 'descending': True, 'limit': 2
+            })
+
+        assert [e['description'] for e in history] == ['Farmácia', 'Mercado']
+        assert [e['description'] for e in parsed] == ['Almoço no centro', 'Farmácia', 'Mercado']
+
+    def test_cached_sheet_is_filtered_without_changes(self, service):
+        """Testa que, com versão, o cache guarda a planilha inteira e o filtro não a altera."""
+        with patch.object(service, '_request', side_effect=self._fake_request({'cTag': 'v1'})):
+            filtered = service.get_expense_history('wb', 'Despesas', {'categories': ['Alimentação']})
+            everything = service.get_expense_history('wb', 'Despesas')
+
+        assert [e['description'] for e in filtered] == ['Almoço no centro', 'Mercado']
+        assert len(everything) == 4
+        assert len(service.history_cache.get('wb', 'Despesas', 'v1')) == 4
+
+
+@pytest.mark.unit
+class TestToolExecutorFilters:
+    """Testes para os filtros recebidos pela ferramenta get_expense_history."""
+
+    def test_invalid_filter_is_reported_to_the_assistant(self):
+        """Testa que um filtro inválido vira erro da ferramenta, com a mensagem de validação."""
+        from tools.tool_executor import ToolExecutor
+        from utils.exceptions import ToolExecutionError
+
+        excel = Mock()
+        excel.get_expense_history.side_effect = lambda **kwargs: compile_filters(kwargs['filters'])
+
+        with patch('tools.tool_executor.excel_service', excel), \
+                pytest.raises(ToolExecutionError) as exc_info:
+            ToolExecutor().execute_tool('get_expense_history', {
+                'workbook_id': 'wb', 'worksheet_name': 'Despesas', 'filters': {'limit': -1}
+            })
+
+        assert str(exc_info.value).startswith("Filtro inválido: 'limit' deve ser maior que zero")
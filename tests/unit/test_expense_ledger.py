@@ -0,0 +1,342 @@
+"""
+Testes unitários para o ledger de despesas e a exportação para o Excel.
+"""
+
+import pytest
+from moto import mock_dynamodb
+import boto3
+from unittest.mock import Mock, patch
+
+from data_access.ledger_store import (
+    PENDING_EXPORT_INDEX,
+    DynamoDBLedgerStore,
+    SQLiteLedgerStore,
+)
+from services.expense_ledger import LEDGER_EXPORT_JOB, ExpenseLedger
+from services.expense_records import Expense
+from services.queue_service import LocalMessageQueue
+from tools.execution_engine import ToolExecutionEngine
+from config.settings import LEDGER_TABLE_NAME
+
+
+def _entry(entry_key, date, amount=10.0, created_at=1.0, worksheet_name='Despesas'):
+    """Cria uma despesa no formato gravado no ledger."""
+    return {
+        'entry_key': entry_key,
+        'workbook_id': 'wb',
+        'worksheet_name': worksheet_name,
+        'table_name': None,
+        'date': date,
+        'description': 'Almoço',
+        'category': 'Alimentação',
+        'amount': amount,
+        'created_at': created_at
+    }
+
+
+@pytest.fixture
+def dynamodb_store(monkeypatch):
+    """Fixture que retorna o ledger com uma tabela DynamoDB mockada."""
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+
+    with mock_dynamodb():
+        dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
+        dynamodb.create_table(
+            TableName=LEDGER_TABLE_NAME,
+            KeySchema=[
+                {'AttributeName': 'owner', 'KeyType': 'HASH'},
+                {'AttributeName': 'entry_key', 'KeyType': 'RANGE'}
+            ],
+            AttributeDefinitions=[
+                {'AttributeName': 'owner', 'AttributeType': 'S'},
+                {'AttributeName': 'entry_key', 'AttributeType': 'S'},
+                {'AttributeName': 'export_pending', 'AttributeType': 'S'}
+            ],
+            GlobalSecondaryIndexes=[{
+                'IndexName': PENDING_EXPORT_INDEX,
+                'KeySchema': [
+                    {'AttributeName': 'export_pending', 'KeyType': 'HASH'},
+                    {'AttributeName': 'entry_key', 'KeyType': 'RANGE'}
+                ],
+                'Projection': {'ProjectionType': 'ALL'}
+            }],
+            BillingMode='PAY_PER_REQUEST'
+        )
+
+        yield DynamoDBLedgerStore()
+
+
+@pytest.fixture(params=['sqlite', 'dynamodb'])
+def store(request, tmp_path):
+    """Fixture que retorna cada implementação do ledger."""
+    if request.param == 'sqlite':
+        return SQLiteLedgerStore(str(tmp_path / 'ledger.sqlite3'))
+    return request.getfixturevalue('dynamodb_store')
+
+
+@pytest.mark.unit
+class TestLedgerStore:
+    """Testes para os armazenamentos do ledger (SQLite e DynamoDB)."""
+
+    def test_query_by_owner_and_date(self, store):
+        """Testa a consulta por remetente e período, ordenada por data."""
+        store.put('alice', [
+            _entry('2026-03-10#2', '2026-03-10'),
+            _entry('2026-01-05#1', '2026-01-05', amount=12.5)
+        ])
+        store.put('bob', [_entry('2026-02-01#3', '2026-02-01')])
+
+        assert [e['date'] for e in store.query('alice')] == ['2026-01-05', '2026-03-10']
+        assert store.query('alice')[0]['amount'] == 12.5
+        assert [e['date'] for e in store.query('alice', '2026-03-10', '2026-03-10')] == ['2026-03-10']
+        assert [e['date'] for e in store.query('alice', end_date='2026-02-28')] == ['2026-01-05']
+
+    def test_pending_until_exported(self, store):
+        """Testa que apenas as despesas não exportadas ficam pendentes."""
+        store.put('alice', [
+            _entry('2026-03-10#2', '2026-03-10', created_at=2.0),
+            _entry('2026-01-05#1', '2026-01-05', created_at=1.0)
+        ])
+
+        assert [e['entry_key'] for e in store.pending('alice', 10)] == ['2026-01-05#1', '2026-03-10#2']
+
+        store.mark_exported('alice', ['2026-01-05#1'])
+
+        assert [e['entry_key'] for e in store.pending('alice', 10)] == ['2026-03-10#2']
+        assert len(store.query('alice')) == 2
+
+    def test_export_lock_is_exclusive(self, store):
+        """Testa que apenas um worker obtém o lock de exportação do remetente."""
+        assert store.try_acquire_export_lock('alice', 'worker-a', 60) is True
+        assert store.try_acquire_export_lock('alice', 'worker-b', 60) is False
+        assert store.try_acquire_export_lock('bob', 'worker-b', 60) is True
+
+        store.release_export_lock('alice', 'worker-b')
+        assert store.try_acquire_export_lock('alice', 'worker-b', 60) is False
+
+        store.release_export_lock('alice', 'worker-a')
+        assert store.try_acquire_export_lock('alice', 'worker-b', 60) is True
+
+
+@pytest.mark.unit
+class TestExpenseLedger:
+    """Testes para o ledger de despesas e a exportação assíncrona."""
+
+    @pytest.fixture
+    def queue(self, tmp_path):
+        """Fixture que retorna uma fila local isolada."""
+        return LocalMessageQueue(str(tmp_path / 'queue.json'))
+
+    @pytest.fixture
+    def excel(self):
+        """Fixture que retorna um serviço de Excel simulado."""
+        return Mock()
+
+    @pytest.fixture
+    def ledger(self, tmp_path, queue, excel):
+        """Fixture que retorna o ledger com SQLite, fila local e Excel simulado."""
+        store = SQLiteLedgerStore(str(tmp_path / 'ledger.sqlite3'))
+        return ExpenseLedger(store=store, queue=queue, excel=excel)
+
+    def _add_as(self, ledger, sender_id, expenses, worksheet_name='Despesas'):
+        """Grava as despesas dentro de uma ferramenta do remetente."""
+        result = ToolExecutionEngine().run(
+            'bulk_add_expenses',
+            lambda: ledger.add_expenses('wb', worksheet_name, expenses),
+            sender_id=sender_id
+        )
+        assert result['status'] == 'success', result['error']
+        return result['value']
+
+    def test_add_writes_ledger_and_schedules_export(self, ledger, queue, excel):
+        """Testa que o lançamento grava no ledger e enfileira a exportação, sem chamar o Excel."""
+        result = self._add_as(ledger, 'whatsapp:+5511', [
+            {'date': '2026-03-10', 'description': 'Almoço', 'category': 'Alimentação', 'amount': 45}
+        ])
+
+        assert result == {'count': 1, 'export_scheduled': True}
+        excel.add_expenses.assert_not_called()
+
+        [(_, message)] = queue.receive()
+        assert message == {'type': LEDGER_EXPORT_JOB, 'owner': 'whatsapp:+5511'}
+
+    def test_expenses_are_isolated_by_sender(self, ledger):
+        """Testa que cada remetente consulta apenas as próprias despesas."""
+        self._add_as(ledger, 'alice', [
+            {'date': '2026-03-10', 'description': 'Almoço', 'category': 'Alimentação', 'amount': 45}
+        ])
+
+        engine = ToolExecutionEngine()
+        alice = engine.run('h', lambda: ledger.get_expense_history('wb', 'Despesas'), sender_id='alice')
+        bob = engine.run('h', lambda: ledger.get_expense_history('wb', 'Despesas'), sender_id='bob')
+
+        assert alice['value'] == [
+            {'date': '2026-03-10', 'description': 'Almoço', 'category': 'Alimentação', 'amount': 45.0}
+        ]
+        assert bob['value'] == []
+
+    def test_dates_and_amounts_are_accepted_like_excel(self, ledger):
+        """Testa datas em série do Excel, datas em outro formato e valores como 'R$ 12,50'."""
+        ledger.add_expenses('wb', 'Despesas', [
+            {'date': 46091, 'description': 'a', 'category': 'y', 'amount': 'R$ 12,50'},
+            {'date': '10/03/2026', 'description': 'b', 'category': 'y', 'amount': '1.032,90'}
+        ])
+
+        history = ledger.get_expense_history('wb', 'Despesas')
+        assert [(e['date'], e['amount']) for e in history] == [('10/03/2026', 1032.9), ('2026-03-10', 12.5)]
+
+        # Sem data reconhecida, a despesa fica fora das consultas por período
+        march = ledger.get_expense_history('wb', 'Despesas', {'start_date': '2026-03-01'})
+        assert [e['description'] for e in march] == ['a']
+
+        with pytest.raises(ValueError, match='Valor inválido na despesa 1'):
+            ledger.add_expense('wb', 'Despesas', {
+                'date': '2026-03-10', 'description': 'x', 'category': 'y', 'amount': 'muito'
+            })
+
+    def test_pending_keeps_dictation_order(self, ledger):
+        """Testa que a exportação segue a ordem de lançamento, mesmo no mesmo milissegundo."""
+        with patch('services.expense_ledger.time.time', return_value=1_700_000_000.0):
+            ledger.add_expenses('wb', 'Despesas', [
+                {'date': '2026-03-10', 'description': 'a', 'category': 'y', 'amount': 1},
+                {'date': '2026-01-05', 'description': 'b', 'category': 'y', 'amount': 2}
+            ])
+            ledger.add_expenses('wb', 'Despesas', [
+                {'date': '2025-12-31', 'description': 'c', 'category': 'y', 'amount': 3}
+            ])
+
+        owner = 'workbook:wb'
+        assert [e['amount'] for e in ledger.store.pending(owner, 10)] == [1.0, 2.0, 3.0]
+
+    def test_summary_uses_date_range(self, ledger):
+        """Testa os totais do período calculados a partir do ledger."""
+        ledger.add_expenses('wb', 'Despesas', [
+            {'date': '2026-02-28', 'description': 'a', 'category': 'Lazer', 'amount': 100},
+            {'date': '2026-03-01', 'description': 'b', 'category': 'Alimentação', 'amount': 10.5},
+            {'date': '2026-03-15', 'description': 'c', 'category': 'Lazer', 'amount': 20}
+        ])
+
+        summary = ledger.get_expense_summary(
+            'wb', 'Despesas', start_date='2026-03-01', end_date='2026-03-31', categories=['lazer']
+        )
+
+        assert summary['total'] == 30.5
+        assert summary['count'] == 2
+        assert summary['categories'] == [{'category': 'lazer', 'total': 20.0, 'count': 1}]
+
+    @patch('services.expense_ledger.LEDGER_CUTOVER_DATE', '2026-03-01')
+    def test_history_before_cutover_is_read_from_excel(self, ledger, excel):
+        """Testa que as despesas anteriores ao ledger vêm do Excel, sem duplicar as exportadas."""
+        ledger.add_expenses('wb', 'Despesas', [
+            {'date': '2026-02-25', 'description': 'Exportada', 'category': 'Lazer', 'amount': 5}
+        ])
+        owner = 'workbook:wb'
+        ledger.store.mark_exported(owner, [e['entry_key'] for e in ledger.store.pending(owner, 10)])
+        ledger.add_expenses('wb', 'Despesas', [
+            {'date': '2026-02-20', 'description': 'Pendente', 'category': 'Lazer', 'amount': 7},
+            {'date': '2026-03-10', 'description': 'Nova', 'category': 'Lazer', 'amount': 3}
+        ])
+
+        excel.get_expense_history.return_value = [
+            Expense('2026-01-15', 'Fora do período', 'Lazer', 50.0),
+            Expense(46063, 'Antiga', 'Lazer', 100.0),
+            Expense('2026-02-25', 'Exportada', 'Lazer', 5.0),
+            Expense('2026-03-10', 'Nova', 'Lazer', 3.0)
+        ]
+
+        history = ledger.get_expense_history('wb', 'Despesas', {'start_date': '2026-02-01'})
+        assert [e['description'] for e in history] == ['Antiga', 'Pendente', 'Exportada', 'Nova']
+
+        summary = ledger.get_expense_summary('wb', 'Despesas', start_date='2026-02-01')
+        assert (summary['total'], summary['count']) == (115.0, 4)
+
+        # Períodos a partir do corte não leem o Excel
+        excel.get_expense_history.reset_mock()
+        assert len(ledger.get_expense_history('wb', 'Despesas', {'start_date': '2026-03-01'})) == 1
+        excel.get_expense_history.assert_not_called()
+
+    def test_export_groups_pending_by_worksheet(self, ledger, excel):
+        """Testa que a exportação grava uma vez por planilha e marca as despesas."""
+        expense = {'date': '2026-03-10', 'description': 'Almoço', 'category': 'Alimentação', 'amount': 45}
+        self._add_as(ledger, 'alice', [expense, expense])
+        self._add_as(ledger, 'alice', [expense], worksheet_name='Outra')
+
+        assert ledger.export_pending('alice') == 3
+        assert excel.add_expenses.call_count == 2
+
+        first = excel.add_expenses.call_args_list[0].kwargs
+        assert first['worksheet_name'] == 'Despesas'
+        assert len(first['expenses']) == 2
+
+        # Nada mais pendente: uma nova exportação não chama o Excel
+        excel.add_expenses.reset_mock()
+        assert ledger.export_pending('alice') == 0
+        excel.add_expenses.assert_not_called()
+
+    def test_failed_export_keeps_entries_pending(self, ledger, excel):
+        """Testa que uma falha no Excel mantém as despesas pendentes e libera o lock."""
+        self._add_as(ledger, 'alice', [
+            {'date': '2026-03-10', 'description': 'Almoço', 'category': 'Alimentação', 'amount': 45}
+        ])
+        excel.add_expenses.side_effect = RuntimeError('Graph indisponível')
+
+        with pytest.raises(RuntimeError):
+            ledger.export_pending('alice')
+
+        excel.add_expenses.side_effect = None
+        assert ledger.export_pending('alice') == 1
+
+    def test_export_in_progress_is_left_to_the_lock_holder(self, ledger, excel):
+        """Testa que a exportação concorrente termina sem erro (não volta para a fila nem vai para a DLQ)."""
+        ledger.store.put('alice', [_entry('2026-03-10#1', '2026-03-10')])
+        assert ledger.store.try_acquire_export_lock('alice', 'outro-worker', 60)
+
+        assert ledger.export_pending('alice') == 0
+
+        excel.add_expenses.assert_not_called()
+        assert len(ledger.store.pending('alice', 10)) == 1
+
+    def test_entry_added_before_lock_release_is_exported(self, ledger, queue, excel):
+        """Testa a corrida entre dois workers: o job que encontra o lock ocupado não perde a despesa."""
+        other_worker = ExpenseLedger(store=ledger.store, queue=queue, excel=excel)
+        release = ledger.store.release_export_lock
+        results = []
+
+        def release_after_race(owner, holder):
+            # O dono do lock já viu as pendentes esgotadas; outro worker lança e tenta exportar
+            if not results:
+                other_worker.store.put('alice', [_entry('2026-03-10#2', '2026-03-10')])
+                results.append(other_worker.export_pending('alice'))
+            release(owner, holder)
+
+        ledger.store.put('alice', [_entry('2026-03-10#1', '2026-03-10')])
+
+        with patch.object(ledger.store, 'release_export_lock', side_effect=release_after_race):
+            assert ledger.export_pending('alice') == 2
+
+        assert results == [0]
+        assert excel.add_expenses.call_count == 2
+        assert ledger.store.pending('alice', 10) == []
+
+
+@pytest.mark.unit
+class TestWorkerLedgerExport:
+    """Testes para o roteamento dos jobs de exportação no worker."""
+
+    @patch('worker_function.process_queued_message')
+    def test_worker_routes_export_jobs(self, mock_process):
+        """Testa que jobs de exportação não passam pelo fluxo de conversação."""
+        from worker_function import worker_handler
+
+        event = {'Records': [{
+            'messageId': 'm1',
+            'body': '{"type": "ledger_export", "owner": "alice"}'
+        }]}
+
+        # Mock explícito: não instanciar o ledger real (arquivo SQLite)
+        mock_ledger = Mock()
+        with patch('services.expense_ledger.expense_ledger', mock_ledger):
+            assert worker_handler(event, None) == {'batchItemFailures': []}
+
+        mock_ledger.export_pending.assert_called_once_with('alice')
+        mock_process.assert_not_called()
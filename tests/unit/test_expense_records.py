@@ -0,0 +1,77 @@
+"""
+Testes unitários para os registros de despesas (Expense).
+"""
+
+import pytest
+
+from services.excel_service import ExcelService
+from services.expense_records import Expense
+
+ROW = ['2025-10-21', 'Almoço', 'Alimentação', 45.5]
+AS_DICT = {'date': '2025-10-21', 'description': 'Almoço', 'category': 'Alimentação', 'amount': 45.5}
+
+
+@pytest.mark.unit
+class TestExpense:
+    """Testes para a interface de leitura do Expense."""
+
+    def test_reads_like_a_dict(self):
+        """Testa acesso por chave, get, conversão e comparação com dicts."""
+        expense = Expense(*ROW)
+
+        assert expense['category'] == 'Alimentação'
+        assert expense.get('amount') == 45.5
+        assert expense.get('get') is None
+        assert dict(expense) == AS_DICT
+        assert expense == AS_DICT and AS_DICT == expense
+        assert expense.as_row() == ROW
+
+        with pytest.raises(KeyError):
+            expense['valor']
+
+    def test_has_no_instance_dict(self):
+        """Testa que os campos ficam em __slots__ (sem dict por despesa)."""
+        expense = Expense(*ROW)
+
+        assert not hasattr(expense, '__dict__')
+        with pytest.raises(AttributeError):
+            expense.note = 'extra'
+
+
+@pytest.mark.unit
+class TestExpenseRowParsing:
+    """Testes para a conversão das linhas da planilha em registros."""
+
+    def test_rows_become_records_and_are_released(self):
+        """Testa que as linhas do usedRange viram Expense e saem da lista ao serem lidas."""
+        values = [['Data', 'Descrição', 'Categoria', 'Valor'], list(ROW), ['incompleta']]
+
+        expenses = ExcelService._parse_expense_rows(ExcelService._consume_rows(values))
+        first = next(expenses)
+
+        assert isinstance(first, Expense) and first == AS_DICT
+        assert values == [['incompleta']]
+        assert list(expenses) == []
+        assert values == []
+
+    def test_shared_cache_stores_records_as_dicts(self, monkeypatch):
+        """Testa que o cache compartilhado grava os registros com o formato anterior (dicts)."""
+        import boto3
+        from moto import mock_dynamodb
+        from config.settings import CACHE_TABLE_NAME
+        from data_access.history_cache_store import DynamoDBHistoryCacheStore
+
+        monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+
+        with mock_dynamodb():
+            boto3.resource('dynamodb', region_name='us-east-1').create_table(
+                TableName=CACHE_TABLE_NAME,
+                KeySchema=[{'AttributeName': 'cache_key', 'KeyType': 'HASH'}],
+                AttributeDefinitions=[{'AttributeName': 'cache_key', 'AttributeType': 'S'}],
+                BillingMode='PAY_PER_REQUEST'
+            )
+
+            store = DynamoDBHistoryCacheStore()
+            store.put('wb#Despesas', 'v1', [Expense(*ROW)])
+
+            assert store.get('wb#Despesas') == {'tag': 'v1', 'rows': [AS_DICT]}
@@ -0,0 +1,36 @@
+"""
+Testes unitários para a escolha do armazenamento das despesas.
+"""
+
+import pytest
+from unittest.mock import Mock, patch
+
+from services.expense_analytics import ExpenseAnalyticsService
+from services.expense_store import expense_store
+
+
+@pytest.mark.unit
+class TestExpenseStore:
+    """Testes para expense_store e os seus dois consumidores."""
+
+    @pytest.mark.parametrize('backend, write_mode, expected', [
+        ('excel', 'sync', 'excel'),
+        ('excel', 'write_behind', 'write_behind'),
+        ('ledger', 'write_behind', 'ledger'),
+    ])
+    def test_tools_and_analytics_use_the_same_store(self, backend, write_mode, expected):
+        """Testa que ferramentas e análises recebem o mesmo armazenamento para cada configuração."""
+        # Mocks explícitos: não instanciar ledger (SQLite) nem journal (arquivo) reais
+        stores = {'excel': Mock(), 'write_behind': Mock(), 'ledger': Mock()}
+
+        from tools.tool_executor import ToolExecutor
+
+        with patch('services.expense_store.EXPENSE_BACKEND', backend), \
+                patch('services.expense_store.EXCEL_WRITE_MODE', write_mode), \
+                patch('services.expense_store.excel_service', stores['excel']), \
+                patch('tools.tool_executor.excel_service', stores['excel']), \
+                patch('services.write_behind.write_behind_excel', stores['write_behind']), \
+                patch('services.expense_ledger.expense_ledger', stores['ledger']):
+            assert expense_store() is stores[expected]
+            assert ExpenseAnalyticsService().excel is stores[expected]
+            assert ToolExecutor()._expense_store() is stores[expected]
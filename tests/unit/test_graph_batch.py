@@ -0,0 +1,208 @@
+"""
+Testes unitários para o agrupamento de requisições ao Graph ($batch).
+"""
+
+import threading
+import time
+import pytest
+from unittest.mock import Mock
+
+from services.graph_batch import GraphBatchCoalescer
+from utils.exceptions import MicrosoftGraphAPIError
+
+BASE_URL = 'https://graph.microsoft.com/v1.0'
+WORKBOOK_URL = f'{BASE_URL}/me/drive/items/wb1/workbook'
+
+
+def _run_concurrently(coalescer, calls):
+    """Submete as chamadas em threads simultâneas (em um grupo) e retorna resultados/erros."""
+    results = [None] * len(calls)
+    barrier = threading.Barrier(len(calls))
+    
+    def worker(index, call):
+        barrier.wait()
+        try:
+            results[index] = coalescer.submit(*call[:3], **call[3])
+        except MicrosoftGraphAPIError as e:
+            results[index] = e
+    
+    threads = [
+        threading.Thread(target=worker, args=(index, call))
+        for index, call in enumerate(calls)
+    ]
+    with coalescer.group():
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    
+    return results
+
+
+@pytest.mark.unit
+class TestGraphBatchCoalescer:
+    """Testes para o GraphBatchCoalescer."""
+    
+    def _coalescer(self, send_batch, send_single=None, max_batch_size=20, window_seconds=0.05):
+        return GraphBatchCoalescer(
+            BASE_URL,
+            send_single=send_single or Mock(),
+            send_batch=send_batch,
+            window_seconds=window_seconds,
+            max_batch_size=max_batch_size
+        )
+    
+    def test_single_request_is_sent_directly(self):
+        """Testa que uma requisição isolada não paga o custo do lote nem espera a janela."""
+        send_single = Mock(return_value='resposta')
+        send_batch = Mock()
+        coalescer = self._coalescer(send_batch, send_single, window_seconds=5)
+        
+        started = time.monotonic()
+        result = coalescer.submit('GET', f'{WORKBOOK_URL}/tables', 'Falha')
+        
+        assert result == 'resposta'
+        assert time.monotonic() - started < 1
+        send_batch.assert_not_called()
+    
+    def test_concurrent_requests_share_one_batch(self):
+        """Testa que chamadas concorrentes viram um único $batch ordenado."""
+        def send_batch(requests_body, idempotent, timeout):
+            return {'responses': [
+                {'id': r['id'], 'status': 200, 'body': {'url': r['url']}}
+                for r in requests_body
+            ]}
+        
+        send_batch = Mock(side_effect=send_batch)
+        coalescer = self._coalescer(send_batch)
+        calls = [
+            ('GET', f'{WORKBOOK_URL}/worksheets/Despesas/usedRange', 'Falha', {}),
+            ('POST', f'{WORKBOOK_URL}/tables/Gastos/rows/add', 'Falha',
+             {'idempotent': False, 'json': {'values': [[1]]}}),
+            ('POST', f'{WORKBOOK_URL}/tables/Gastos/rows/add', 'Falha',
+             {'idempotent': False, 'json': {'values': [[2]]}}),
+        ]
+        
+        results = _run_concurrently(coalescer, calls)
+        
+        send_batch.assert_called_once()
+        requests_body, idempotent, _ = send_batch.call_args.args
+        assert len(requests_body) == 3
+        assert idempotent is False
+        
+        writes = [r for r in requests_body if r['method'] == 'POST']
+        assert 'dependsOn' not in writes[0]
+        assert writes[1]['dependsOn'] == [writes[0]['id']]
+        
+        # Cada chamador recebe a resposta da sua própria sub-requisição
+        for call, result in zip(calls, results):
+            assert BASE_URL + result.json()['url'] == call[1]
+    
+    def test_failed_sub_request_only_affects_its_caller(self):
+        """Testa que um 429 no lote volta apenas para o chamador afetado."""
+        send_batch = Mock(return_value={'responses': [
+            {'id': '1', 'status': 200, 'body': {}},
+            {'id': '2', 'status': 429, 'headers': {'Retry-After': '3'}, 'body': {}},
+        ]})
+        coalescer = self._coalescer(send_batch)
+        calls = [
+            ('GET', f'{WORKBOOK_URL}/worksheets/A/usedRange', 'Falha', {}),
+            ('GET', f'{WORKBOOK_URL}/worksheets/B/usedRange', 'Falha', {}),
+        ]
+        
+        results = _run_concurrently(coalescer, calls)
+        
+        errors = [r for r in results if isinstance(r, MicrosoftGraphAPIError)]
+        assert len(errors) == 1
+        assert errors[0].retryable is True
+        assert errors[0].retry_after == 3.0
+        assert errors[0].status_code == 429
+    
+    def test_writes_chained_after_throttled_write_can_be_retried(self):
+        """Testa que o 424 das escritas encadeadas a uma escrita com 429 é repetível."""
+        def send_batch(requests_body, idempotent, timeout):
+            first = requests_body[0]['id']
+            return {'responses': [
+                {'id': first, 'status': 429, 'headers': {'Retry-After': '2'}, 'body': {}}
+            ] + [
+                {'id': r['id'], 'status': 424, 'body': {'error': {'code': 'FailedDependency'}}}
+                for r in requests_body[1:]
+            ]}
+        
+        coalescer = self._coalescer(Mock(side_effect=send_batch))
+        calls = [
+            ('POST', f'{WORKBOOK_URL}/tables/Gastos/rows/add', 'Falha',
+             {'idempotent': False, 'json': {'values': [[i]]}})
+            for i in range(3)
+        ]
+        
+        results = _run_concurrently(coalescer, calls)
+        
+        assert sorted(e.status_code for e in results) == [424, 424, 429]
+        assert all(e.retryable for e in results)
+        assert all(e.retry_after == 2.0 for e in results)
+    
+    def test_chained_write_after_fatal_error_is_not_retried(self):
+        """Testa que o 424 após um erro definitivo (ex: 400) continua não repetível."""
+        send_batch = Mock(side_effect=lambda body, idempotent, timeout: {'responses': [
+            {'id': body[0]['id'], 'status': 400, 'body': {}},
+            {'id': body[1]['id'], 'status': 424, 'body': {}},
+        ]})
+        coalescer = self._coalescer(send_batch)
+        calls = [
+            ('POST', f'{WORKBOOK_URL}/tables/Gastos/rows/add', 'Falha', {'idempotent': False})
+            for _ in range(2)
+        ]
+        
+        results = _run_concurrently(coalescer, calls)
+        
+        assert [e.retryable for e in results] == [False, False]
+    
+    def test_each_caller_waits_only_for_its_own_deadline(self):
+        """Testa que o lote usa o maior prazo e que cada chamador desiste no seu."""
+        release = threading.Event()
+        
+        def send_batch(requests_body, idempotent, timeout):
+            release.wait(5)
+            return {'responses': [{'id': r['id'], 'status': 200, 'body': {}} for r in requests_body]}
+        
+        send_batch = Mock(side_effect=send_batch)
+        coalescer = self._coalescer(send_batch, window_seconds=0.5)
+        results = {}
+        
+        def leader():
+            results['leader'] = coalescer.submit(
+                'GET', f'{WORKBOOK_URL}/worksheets/A/usedRange', 'Falha', wait_timeout=10
+            )
+        
+        with coalescer.group():
+            thread = threading.Thread(target=leader)
+            thread.start()
+            time.sleep(0.1)
+            
+            with pytest.raises(MicrosoftGraphAPIError, match='sem resposta'):
+                coalescer.submit('GET', f'{WORKBOOK_URL}/worksheets/B/usedRange', 'Falha', wait_timeout=0.2)
+            
+            release.set()
+            thread.join()
+        
+        assert send_batch.call_args.args[2] == 10
+        assert results['leader'].status_code == 200
+    
+    def test_batches_are_limited_in_size(self):
+        """Testa que lotes maiores que o limite são divididos."""
+        send_batch = Mock(side_effect=lambda body, idempotent, timeout: {'responses': [
+            {'id': r['id'], 'status': 200, 'body': {}} for r in body
+        ]})
+        coalescer = self._coalescer(send_batch, max_batch_size=2)
+        calls = [
+            ('GET', f'{WORKBOOK_URL}/worksheets/S{i}/usedRange', 'Falha', {'params': {'$select': 'rowCount'}})
+            for i in range(5)
+        ]
+        
+        results = _run_concurrently(coalescer, calls)
+        
+        assert all(r.status_code == 200 for r in results)
+        sizes = [len(c.args[0]) for c in send_batch.call_args_list]
+        assert sizes == [2, 2, 1]
+        assert send_batch.call_args_list[0].args[0][0]['url'].endswith('?%24select=rowCount')
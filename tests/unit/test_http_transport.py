@@ -0,0 +1,63 @@
+"""
+Testes unitários para a camada de transporte HTTP compartilhada.
+"""
+
+import pytest
+from unittest.mock import patch
+
+from services.http_transport import (
+    create_http_session,
+    http2_available,
+    http_session,
+    requests_api_error
+)
+from utils.exceptions import MicrosoftGraphAPIError
+
+
+@pytest.mark.unit
+class TestHttpTransport:
+    """Testes para a sessão HTTP e o cliente OpenAI compartilhados."""
+    
+    def test_session_uses_pooled_adapter(self):
+        """Testa que a sessão monta um adapter com pool e sem retries."""
+        with patch('services.http_transport.HTTP_POOL_MAXSIZE', 7):
+            session = create_http_session()
+        
+        adapter = session.get_adapter('https://graph.microsoft.com')
+        
+        assert adapter._pool_maxsize == 7
+        assert adapter.max_retries.total == 0
+        assert 'gzip' in session.headers['Accept-Encoding']
+    
+    def test_session_is_shared(self):
+        """Testa que todos os serviços recebem a mesma sessão."""
+        assert http_session.get_instance() is http_session.get_instance()
+    
+    def test_http2_respects_setting(self):
+        """Testa que HTTP/2 pode ser desabilitado por configuração."""
+        with patch('services.http_transport.HTTP2_ENABLED', False):
+            assert http2_available() is False
+    
+    def test_requests_error_classification(self):
+        """Testa a classificação de erros HTTP como transitórios ou fatais."""
+        import requests
+        
+        def http_error(status, headers=None):
+            response = requests.Response()
+            response.status_code = status
+            response.headers.update(headers or {})
+            return requests.exceptions.HTTPError(response=response)
+        
+        throttled = requests_api_error(
+            http_error(429, {'Retry-After': '2'}), MicrosoftGraphAPIError, 'Falha', idempotent=False
+        )
+        unavailable = requests_api_error(
+            http_error(503), MicrosoftGraphAPIError, 'Falha', idempotent=False
+        )
+        bad_request = requests_api_error(http_error(400), MicrosoftGraphAPIError, 'Falha')
+        
+        assert throttled.retryable and throttled.retry_after == 2.0
+        assert not unavailable.retryable  # Não idempotente: pode ter sido processada
+        assert not bad_request.retryable
+        assert isinstance(bad_request, MicrosoftGraphAPIError)
+        assert bad_request.status_code == 400
@@ -0,0 +1,155 @@
+"""
+Testes unitários para o IdempotencyRepository com mock do DynamoDB.
+"""
+
+import json
+
+import pytest
+from moto import mock_dynamodb
+import boto3
+from unittest.mock import Mock, patch
+
+from data_access.idempotency_repository import (
+    IdempotencyRepository,
+    STATUS_COMPLETED,
+    STATUS_IN_PROGRESS,
+)
+from config.settings import IDEMPOTENCY_TABLE_NAME
+
+
+@pytest.mark.unit
+class TestIdempotencyRepository:
+    """Testes para o repositório de idempotência."""
+    
+    @pytest.fixture
+    def repository(self, monkeypatch):
+        """Fixture que retorna o repositório com uma tabela mockada."""
+        monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+        
+        with mock_dynamodb():
+            dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
+            dynamodb.create_table(
+                TableName=IDEMPOTENCY_TABLE_NAME,
+                KeySchema=[
+                    {'AttributeName': 'message_sid', 'KeyType': 'HASH'}
+                ],
+                AttributeDefinitions=[
+                    {'AttributeName': 'message_sid', 'AttributeType': 'S'}
+                ],
+                BillingMode='PAY_PER_REQUEST'
+            )
+            
+            yield IdempotencyRepository()
+    
+    def test_first_claim_succeeds(self, repository):
+        """Testa que a primeira reserva de um MessageSid é aceita."""
+        assert repository.start_processing('SM001') is None
+    
+    def test_duplicate_in_progress(self, repository):
+        """Testa que um retry durante o processamento é detectado."""
+        repository.start_processing('SM002')
+        
+        record = repository.start_processing('SM002')
+        
+        assert record['status'] == STATUS_IN_PROGRESS
+        assert record['response'] is None
+    
+    def test_duplicate_completed_returns_response(self, repository):
+        """Testa que um retry após a conclusão devolve a resposta salva."""
+        repository.start_processing('SM003')
+        repository.complete('SM003', 'Despesa registrada ✅')
+        
+        # Limpar cache local para forçar leitura do DynamoDB
+        repository._cache.clear()
+        record = repository.start_processing('SM003')
+        
+        assert record['status'] == STATUS_COMPLETED
+        assert record['response'] == 'Despesa registrada ✅'
+    
+    def test_release_allows_reprocessing(self, repository):
+        """Testa que liberar a reserva permite reprocessar a mensagem."""
+        repository.start_processing('SM004')
+        repository.release('SM004')
+        
+        assert repository.start_processing('SM004') is None
+
+
+@pytest.mark.unit
+class TestWorkerIdempotency:
+    """Testes para o reenvio da resposta pelo worker sem reprocessar a mensagem."""
+    
+    @pytest.fixture
+    def repository(self, monkeypatch):
+        """Fixture que instala um repositório com tabela mockada no lugar do singleton."""
+        monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+        
+        with mock_dynamodb():
+            boto3.resource('dynamodb', region_name='us-east-1').create_table(
+                TableName=IDEMPOTENCY_TABLE_NAME,
+                KeySchema=[{'AttributeName': 'message_sid', 'KeyType': 'HASH'}],
+                AttributeDefinitions=[{'AttributeName': 'message_sid', 'AttributeType': 'S'}],
+                BillingMode='PAY_PER_REQUEST'
+            )
+            
+            repository = IdempotencyRepository()
+            with patch('data_access.idempotency_repository.idempotency_repository', repository), \
+                    patch('data_access.idempotency_repository.IDEMPOTENCY_ENABLED', True):
+                yield repository
+    
+    def test_failed_send_is_retried_without_reprocessing(self, repository):
+        """Testa que, após falha no envio, a nova entrega só reenvia a resposta registrada."""
+        from worker_function import process_queued_message
+        
+        message = {'sender_id': 'whatsapp:+5511999999999', 'message_sid': 'SM010', 'message_text': 'almoço 45'}
+        manager, twilio = Mock(), Mock()
+        manager.handle_incoming_message.return_value = 'Despesa registrada ✅'
+        twilio.send_message.side_effect = [RuntimeError('Twilio indisponível'), None]
+        
+        with patch('worker_function.conversation_manager', manager), \
+                patch('worker_function.twilio_service', twilio):
+            with pytest.raises(RuntimeError):
+                process_queued_message(message)
+            
+            repository._cache.clear()
+            assert process_queued_message(message) == 'Despesa registrada ✅'
+            
+            # Entrega duplicada após o envio: nada é repetido
+            assert process_queued_message(message) == 'Despesa registrada ✅'
+        
+        manager.handle_incoming_message.assert_called_once()
+        assert twilio.send_message.call_count == 2
+        assert repository.start_processing('worker:SM010')['delivered'] is True
+    
+    def test_duplicate_in_progress_is_retried_later(self, repository):
+        """Testa que uma entrega durante o processamento volta para a fila, sem ack."""
+        from worker_function import worker_handler
+        
+        message = {'sender_id': 'whatsapp:+5511999999999', 'message_sid': 'SM011', 'message_text': 'almoço 45'}
+        event = {'Records': [{'messageId': 'msg-1', 'body': json.dumps(message)}]}
+        repository.start_processing('worker:SM011')
+        manager = Mock()
+        
+        with patch('worker_function.conversation_manager', manager), \
+                patch('worker_function.twilio_service', Mock()):
+            result = worker_handler(event, None)
+        
+        assert result == {'batchItemFailures': [{'itemIdentifier': 'msg-1'}]}
+        manager.handle_incoming_message.assert_not_called()
+    
+    def test_expired_claim_is_taken_over(self, repository):
+        """Testa que a reserva abandonada é assumida após lock_expires_at."""
+        from worker_function import process_queued_message
+        
+        message = {'sender_id': 'whatsapp:+5511999999999', 'message_sid': 'SM012', 'message_text': 'almoço 45'}
+        manager, twilio = Mock(), Mock()
+        manager.handle_incoming_message.return_value = 'Despesa registrada ✅'
+        
+        with patch('data_access.idempotency_repository.IDEMPOTENCY_IN_PROGRESS_TIMEOUT_SECONDS', -1):
+            repository.start_processing('worker:SM012')
+        
+        with patch('worker_function.conversation_manager', manager), \
+                patch('worker_function.twilio_service', twilio):
+            assert process_queued_message(message) == 'Despesa registrada ✅'
+        
+        manager.handle_incoming_message.assert_called_once()
+        twilio.send_message.assert_called_once()
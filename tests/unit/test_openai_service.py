@@ -0,0 +1,205 @@
+"""
+Testes unitários para o OpenAIService (execução de runs).
+"""
+
+import time
+import pytest
+from unittest.mock import MagicMock, Mock, patch
+
+from services.openai_service import OpenAIService
+from utils.deadline import Deadline
+from utils.exceptions import OpenAIAPIError, DeadlineExceededError
+
+
+def _event(event_type, **data):
+    """Cria um evento de stream simulado."""
+    return Mock(event=event_type, data=Mock(**data))
+
+
+def _text_block(value):
+    """Cria um bloco de texto simulado."""
+    block = Mock(type='text')
+    block.text.value = value
+    return block
+
+
+def _stream_manager(events):
+    """Cria um gerenciador de stream (context manager) simulado."""
+    manager = MagicMock()
+    manager.__enter__.return_value = iter(events)
+    return manager
+
+
+@pytest.mark.unit
+class TestOpenAIServiceRuns:
+    """Testes para os modos de execução do Assistant."""
+    
+    @pytest.fixture
+    def service(self):
+        """Fixture que retorna o serviço com um cliente mockado."""
+        with patch('services.openai_service.OPENAI_API_KEY', 'sk-test'), \
+                patch('services.openai_service.ASSISTANT_ID', 'asst_test'):
+            service = OpenAIService()
+        service.client = Mock()
+        return service
+    
+    @patch('services.openai_service.ASSISTANT_RUN_STREAMING', True)
+    def test_streaming_completed_returns_text(self, service):
+        """Testa que o streaming devolve o texto final do run."""
+        message_delta = Mock(event='thread.message.delta')
+        message_delta.data.delta.content = [_text_block('Olá')]
+        message_completed = Mock(event='thread.message.completed')
+        message_completed.data.content = [_text_block('Olá, tudo bem?')]
+        
+        service.client.beta.threads.runs.stream.return_value = _stream_manager([
+            _event('thread.run.created', id='run_1'),
+            message_delta,
+            message_completed,
+            _event('thread.run.completed', id='run_1'),
+        ])
+        
+        result = service.run_assistant('thread_1')
+        
+        assert result['status'] == 'completed'
+        assert result['run_id'] == 'run_1'
+        assert result['response'] == 'Olá, tudo bem?'
+        service.client.beta.threads.runs.retrieve.assert_not_called()
+    
+    @patch('services.openai_service.ASSISTANT_RUN_STREAMING', True)
+    def test_streaming_requires_action(self, service):
+        """Testa que o streaming retorna as tool calls solicitadas."""
+        required_action = Mock()
+        service.client.beta.threads.runs.stream.return_value = _stream_manager([
+            _event('thread.run.created', id='run_2'),
+            _event('thread.run.requires_action', id='run_2', required_action=required_action),
+        ])
+        
+        result = service.run_assistant('thread_1')
+        
+        assert result['status'] == 'requires_action'
+        assert result['required_action'] is required_action
+    
+    @patch('services.openai_service.ASSISTANT_RUN_STREAMING', True)
+    def test_streaming_failed_run_raises(self, service):
+        """Testa que um run com falha gera OpenAIAPIError."""
+        service.client.beta.threads.runs.stream.return_value = _stream_manager([
+            _event('thread.run.created', id='run_3'),
+            _event('thread.run.failed', id='run_3', status='failed'),
+        ])
+        
+        with pytest.raises(OpenAIAPIError):
+            service.run_assistant('thread_1')
+    
+    @patch('services.openai_service.ASSISTANT_RUN_STREAMING', True)
+    def test_stream_interrupted_continues_same_run(self, service):
+        """Testa que a queda do stream continua o mesmo run por polling."""
+        def broken_stream():
+            yield _event('thread.run.created', id='run_4')
+            raise ConnectionError("stream caiu")
+        
+        manager = MagicMock()
+        manager.__enter__.return_value = broken_stream()
+        service.client.beta.threads.runs.stream.return_value = manager
+        service.client.beta.threads.runs.retrieve.return_value = Mock(
+            id='run_4', status='completed'
+        )
+        
+        result = service.run_assistant('thread_1')
+        
+        assert result['status'] == 'completed'
+        service.client.beta.threads.runs.create.assert_not_called()
+        service.client.beta.threads.runs.retrieve.assert_called_once_with(
+            thread_id='thread_1', run_id='run_4'
+        )
+    
+    @patch('services.openai_service.ASSISTANT_RUN_STREAMING', True)
+    def test_stream_past_deadline_cancels_run(self, service):
+        """Testa que um stream que não para de enviar eventos respeita o prazo total."""
+        def endless_stream():
+            yield _event('thread.run.created', id='run_7')
+            while True:
+                time.sleep(0.01)
+                yield _event('thread.run.step.delta')
+        
+        service.client.beta.threads.runs.stream.return_value = _stream_manager(endless_stream())
+        
+        with pytest.raises(OpenAIAPIError, match='Timeout'):
+            service.run_assistant('thread_1', max_wait_seconds=0.1)
+        
+        service.client.beta.threads.runs.cancel.assert_called_once_with(
+            thread_id='thread_1', run_id='run_7'
+        )
+    
+    @patch('services.openai_service.ASSISTANT_RUN_STREAMING', True)
+    def test_stream_failure_before_first_event_polls_existing_run(self, service):
+        """Testa que um run já criado no servidor é acompanhado em vez de criar outro."""
+        service.client.beta.threads.runs.stream.side_effect = ConnectionError("sem resposta")
+        service.client.beta.threads.runs.list.return_value = Mock(
+            data=[Mock(id='run_8', status='in_progress')]
+        )
+        service.client.beta.threads.runs.retrieve.return_value = Mock(
+            id='run_8', status='completed'
+        )
+        
+        result = service.run_assistant('thread_1')
+        
+        assert result['status'] == 'completed'
+        service.client.beta.threads.runs.create.assert_not_called()
+        service.client.beta.threads.runs.retrieve.assert_called_once_with(
+            thread_id='thread_1', run_id='run_8'
+        )
+    
+    @patch('services.openai_service.ASSISTANT_RUN_STREAMING', True)
+    def test_stream_failure_without_run_creates_one(self, service):
+        """Testa que, sem run ativo na thread, o fallback cria o run por polling."""
+        service.client.beta.threads.runs.stream.side_effect = ConnectionError("sem resposta")
+        service.client.beta.threads.runs.list.return_value = Mock(
+            data=[Mock(id='run_old', status='completed')]
+        )
+        service.client.beta.threads.runs.create.return_value = Mock(id='run_9')
+        service.client.beta.threads.runs.retrieve.return_value = Mock(
+            id='run_9', status='completed'
+        )
+        
+        result = service.run_assistant('thread_1')
+        
+        assert result['status'] == 'completed'
+        service.client.beta.threads.runs.create.assert_called_once()
+    
+    @patch('services.openai_service.ASSISTANT_RUN_STREAMING', False)
+    def test_polling_mode(self, service):
+        """Testa o modo de polling (streaming desabilitado)."""
+        service.client.beta.threads.runs.create.return_value = Mock(id='run_5')
+        service.client.beta.threads.runs.retrieve.return_value = Mock(
+            id='run_5', status='completed'
+        )
+        
+        result = service.run_assistant('thread_1')
+        
+        assert result['status'] == 'completed'
+        assert result['response'] is None
+        service.client.beta.threads.runs.stream.assert_not_called()
+    
+    @patch('services.openai_service.ASSISTANT_RUN_STREAMING', False)
+    def test_polling_respects_deadline(self, service):
+        """Testa que a espera é limitada pelo prazo e o run é cancelado."""
+        service.client.beta.threads.runs.create.return_value = Mock(id='run_6')
+        service.client.beta.threads.runs.retrieve.return_value = Mock(
+            id='run_6', status='in_progress'
+        )
+        
+        with patch('services.openai_service.ASSISTANT_RUN_POLLING_INTERVAL_SECONDS', 0.01):
+            with pytest.raises(OpenAIAPIError):
+                service.run_assistant('thread_1', deadline=Deadline(0.1))
+        
+        service.client.beta.threads.runs.cancel.assert_called_once_with(
+            thread_id='thread_1', run_id='run_6'
+        )
+    
+    def test_expired_deadline_raises(self, service):
+        """Testa que um prazo esgotado interrompe antes de criar o run."""
+        with pytest.raises(DeadlineExceededError):
+            service.run_assistant('thread_1', deadline=Deadline(0))
+        
+        service.client.beta.threads.runs.create.assert_not_called()
+        service.client.beta.threads.runs.stream.assert_not_called()
@@ -0,0 +1,72 @@
+"""
+Testes unitários para o controle de tamanho dos outputs das ferramentas.
+"""
+
+import json
+import pytest
+
+from tools.output_shaper import (
+    OutputShaper,
+    decode_cursor,
+    encode_cursor,
+    encoded_size,
+    query_fingerprint
+)
+from utils.exceptions import ToolExecutionError
+
+
+@pytest.mark.unit
+class TestOutputShaper:
+    """Testes para o OutputShaper."""
+    
+    def test_small_output_is_only_compacted(self):
+        """Testa que outputs dentro do orçamento só perdem os espaços."""
+        shaper = OutputShaper(max_bytes=1000)
+        
+        output = shaper.shape('tool', {'success': True, 'items': [1, 2]})
+        
+        assert output == '{"success":true,"items":[1,2]}'
+    
+    def test_large_list_is_cut_to_budget(self):
+        """Testa que a maior lista é cortada até o output caber no orçamento."""
+        shaper = OutputShaper(max_bytes=500)
+        value = {'success': True, 'result': {'items': list(range(1000)), 'tags': ['a']}}
+        
+        output = shaper.shape('tool', value)
+        result = json.loads(output)
+        
+        assert len(output.encode('utf-8')) <= 500
+        assert result['truncated'] is True
+        assert result['omitted'] == 1000 - len(result['result']['items'])
+        assert result['result']['items'][:3] == [0, 1, 2]
+        assert len(value['result']['items']) == 1000
+    
+    def test_paginate_walks_all_items_within_budget(self):
+        """Testa que as páginas cabem no orçamento e cobrem todos os itens."""
+        shaper = OutputShaper(max_bytes=300)
+        items = [f'item-{index:04d}' for index in range(200)]
+        fingerprint = query_fingerprint('wb', 'Despesas', None)
+        
+        seen, cursor = [], None
+        while True:
+            page = shaper.paginate(items, lambda part: {'items': list(part)}, cursor, fingerprint, 50)
+            assert encoded_size(page) <= 300
+            seen.extend(page['items'])
+            if not page['truncated']:
+                break
+            cursor = page['next_cursor']
+        
+        assert seen == items
+        assert page['next_cursor'] is None
+    
+    def test_invalid_cursors_are_rejected(self):
+        """Testa cursores malformados ou de outra consulta."""
+        fingerprint = query_fingerprint('wb', 'Despesas', None)
+        
+        assert decode_cursor(encode_cursor(40, fingerprint), fingerprint) == 40
+        
+        with pytest.raises(ToolExecutionError):
+            decode_cursor('@@@', fingerprint)
+        
+        with pytest.raises(ToolExecutionError):
+            decode_cursor(encode_cursor(40, 'outra'), fingerprint)
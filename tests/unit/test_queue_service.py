@@ -0,0 +1,112 @@
+"""
+Testes unitários para a fila de mensagens local.
+"""
+
+import pytest
+from unittest.mock import patch
+
+from services.queue_service import LocalMessageQueue
+from utils.exceptions import ConfigurationError
+
+
+@pytest.mark.unit
+class TestLocalMessageQueue:
+    """Testes para a fila local (memória/arquivo)."""
+    
+    @pytest.fixture
+    def queue(self):
+        """Fixture que retorna uma fila local em memória."""
+        return LocalMessageQueue()
+    
+    def test_enqueue_and_receive(self, queue):
+        """Testa enfileirar e receber mensagens em ordem."""
+        queue.enqueue({'sender_id': 'whatsapp:+5511999999999', 'message_text': 'um'})
+        queue.enqueue({'sender_id': 'whatsapp:+5511999999999', 'message_text': 'dois'})
+        
+        received = queue.receive(max_messages=10)
+        
+        assert [msg['message_text'] for _, msg in received] == ['um', 'dois']
+        assert len(queue) == 0
+    
+    def test_receive_respects_max_messages(self, queue):
+        """Testa que receive não retorna mais que max_messages."""
+        for i in range(3):
+            queue.enqueue({'message_text': str(i)})
+        
+        received = queue.receive(max_messages=2)
+        
+        assert len(received) == 2
+        assert len(queue) == 1
+    
+    def test_file_persistence(self, tmp_path):
+        """Testa que a fila em arquivo é compartilhada entre instâncias."""
+        file_path = str(tmp_path / 'queue.json')
+        
+        producer = LocalMessageQueue(file_path)
+        producer.enqueue({'message_text': 'persistida'})
+        
+        consumer = LocalMessageQueue(file_path)
+        received = consumer.receive()
+        
+        assert len(received) == 1
+        receipt, message = received[0]
+        assert message['message_text'] == 'persistida'
+        
+        consumer.delete(receipt)
+        assert len(producer) == 0
+    
+    def test_release_redelivers_until_max_receives(self, queue):
+        """Testa que uma mensagem devolvida volta à fila, e vai para 'failed' após 3 recebimentos."""
+        queue.enqueue({'message_text': 'falha'})
+        queue.enqueue({'message_text': 'seguinte'})
+        
+        for _ in range(2):
+            [(receipt, message)] = queue.receive(max_messages=1)
+            assert message['message_text'] == 'falha'
+            queue.release(receipt)
+        
+        [(receipt, _)] = queue.receive(max_messages=1)
+        queue.release(receipt)
+        
+        assert [entry['body']['message_text'] for entry in queue.failed] == ['falha']
+        assert [msg['message_text'] for _, msg in queue.receive()] == ['seguinte']
+    
+    @patch('worker_function.process_queued_message', side_effect=RuntimeError('Twilio indisponível'))
+    def test_drain_local_queue_releases_failed_messages(self, mock_process, queue):
+        """Testa que o processamento local com falha devolve a mensagem à fila."""
+        import worker_function
+        
+        queue.enqueue({'message_text': 'oi'})
+        
+        with patch.object(worker_function, 'message_queue', queue):
+            assert worker_function.drain_local_queue() == 0
+        
+        assert len(queue) == 1
+
+
+@pytest.mark.unit
+class TestAsyncQueueConfiguration:
+    """Testes para a validação da fila no modo assíncrono."""
+    
+    def test_async_mode_without_durable_queue_is_rejected(self):
+        """Testa que o modo assíncrono sem SQS nem arquivo recusa a configuração."""
+        from config import settings
+        
+        with patch.object(settings, 'MESSAGE_PROCESSING_MODE', 'async'), \
+                patch.object(settings, 'MESSAGE_QUEUE_URL', None), \
+                patch.object(settings, 'LOCAL_QUEUE_FILE', None), \
+                patch.object(settings, '_configuration_validated', False):
+            with pytest.raises(ConfigurationError):
+                settings.validate_configuration_once()
+            
+            # A configuração inválida não é marcada como validada
+            with pytest.raises(ConfigurationError):
+                settings.validate_configuration_once()
+    
+    def test_async_mode_with_sqs_is_accepted(self):
+        """Testa que o modo assíncrono com SQS é aceito."""
+        from config import settings
+        
+        with patch.object(settings, 'MESSAGE_PROCESSING_MODE', 'async'), \
+                patch.object(settings, 'MESSAGE_QUEUE_URL', 'https://sqs.example/fila'):
+            settings.validate_configuration()
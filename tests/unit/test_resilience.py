@@ -0,0 +1,107 @@
+"""
+Testes unitários para a política de retry e os circuit breakers.
+"""
+
+import pytest
+from unittest.mock import Mock, patch
+
+from utils.deadline import Deadline
+from utils.exceptions import (
+    CircuitOpenError,
+    MicrosoftGraphAPIError,
+    TransientError
+)
+from utils.resilience import (
+    CircuitBreaker,
+    RetryPolicy,
+    STATE_CLOSED,
+    STATE_OPEN,
+    call_with_retry,
+    get_circuit_breaker,
+    parse_retry_after
+)
+
+# Política sem espera, para testes rápidos
+FAST_POLICY = RetryPolicy(max_attempts=3, base_delay=0, max_delay=1)
+
+
+@pytest.mark.unit
+class TestRetry:
+    """Testes para call_with_retry."""
+    
+    def test_transient_error_is_retried(self):
+        """Testa que erros transitórios são repetidos até o sucesso."""
+        func = Mock(side_effect=[TransientError('503'), TransientError('503'), 'ok'])
+        
+        assert call_with_retry(func, 'test_retry_ok', policy=FAST_POLICY) == 'ok'
+        assert func.call_count == 3
+    
+    def test_fatal_error_is_not_retried(self):
+        """Testa que erros fatais são propagados imediatamente."""
+        func = Mock(side_effect=MicrosoftGraphAPIError('400'))
+        
+        with pytest.raises(MicrosoftGraphAPIError):
+            call_with_retry(func, 'test_retry_fatal', policy=FAST_POLICY)
+        
+        assert func.call_count == 1
+    
+    def test_retry_after_beyond_deadline_gives_up(self):
+        """Testa que um Retry-After maior que o prazo restante não é aguardado."""
+        func = Mock(side_effect=TransientError('429', retry_after=10))
+        
+        with patch('utils.resilience.time.sleep') as mock_sleep:
+            with pytest.raises(TransientError):
+                call_with_retry(
+                    func, 'test_retry_deadline', deadline=Deadline(1), policy=FAST_POLICY
+                )
+        
+        assert func.call_count == 1
+        mock_sleep.assert_not_called()
+    
+    def test_retry_after_is_honored(self):
+        """Testa que a espera usa o Retry-After informado pelo servidor."""
+        func = Mock(side_effect=[TransientError('429', retry_after=0.5), 'ok'])
+        
+        with patch('utils.resilience.time.sleep') as mock_sleep:
+            call_with_retry(func, 'test_retry_after', policy=FAST_POLICY)
+        
+        mock_sleep.assert_called_once_with(0.5)
+    
+    def test_parse_retry_after(self):
+        """Testa a leitura do header Retry-After."""
+        assert parse_retry_after('3') == 3.0
+        assert parse_retry_after(None) is None
+        assert parse_retry_after('invalido') is None
+
+
+@pytest.mark.unit
+class TestCircuitBreaker:
+    """Testes para o circuit breaker."""
+    
+    def test_opens_after_threshold_and_fails_fast(self):
+        """Testa que o circuito abre após falhas consecutivas."""
+        breaker = get_circuit_breaker('test_breaker_open')
+        breaker.failure_threshold = 2
+        func = Mock(side_effect=TransientError('503'))
+        
+        with pytest.raises(TransientError):
+            call_with_retry(func, 'test_breaker_open', policy=FAST_POLICY)
+        
+        assert breaker.state == STATE_OPEN
+        calls = func.call_count
+        
+        with pytest.raises(CircuitOpenError):
+            call_with_retry(func, 'test_breaker_open', policy=FAST_POLICY)
+        
+        assert func.call_count == calls
+    
+    def test_half_open_closes_on_success(self):
+        """Testa que a chamada de teste bem-sucedida fecha o circuito."""
+        breaker = CircuitBreaker('test_half_open', failure_threshold=1, reset_timeout=0)
+        breaker.record_failure()
+        assert breaker.state == STATE_OPEN
+        
+        breaker.before_call()  # Período de espera zero: permite o teste
+        breaker.record_success()
+        
+        assert breaker.state == STATE_CLOSED
@@ -0,0 +1,57 @@
+"""
+Testes unitários para o registro de serviços lazy.
+"""
+
+import pytest
+from unittest.mock import Mock
+
+from utils.service_registry import ServiceRegistry
+
+
+@pytest.mark.unit
+class TestServiceRegistry:
+    """Testes para o registro de serviços e o proxy LazyService."""
+    
+    @pytest.fixture
+    def registry(self):
+        """Fixture que retorna um registro vazio."""
+        return ServiceRegistry()
+    
+    def test_service_created_on_first_use(self, registry):
+        """Testa que a factory só é chamada no primeiro acesso."""
+        factory = Mock(return_value=Mock(value=42))
+        service = registry.register('servico', factory)
+        
+        factory.assert_not_called()
+        assert not service.is_initialized
+        
+        assert service.value == 42
+        assert service.value == 42
+        
+        factory.assert_called_once()
+        assert registry.initialized_services() == ['servico']
+    
+    def test_reset_recreates_instance(self, registry):
+        """Testa que reset força a criação de uma nova instância."""
+        factory = Mock(side_effect=[Mock(value=1), Mock(value=2)])
+        service = registry.register('servico', factory)
+        
+        assert service.value == 1
+        registry.reset()
+        assert service.value == 2
+    
+    def test_setattr_forwards_to_instance(self, registry):
+        """Testa que atributos definidos no proxy vão para a instância."""
+        instance = Mock()
+        service = registry.register('servico', lambda: instance)
+        
+        service.token = 'abc'
+        
+        assert instance.token == 'abc'
+    
+    def test_lambda_import_does_not_load_heavy_clients(self):
+        """Testa que importar o handler não carrega o Excel Service."""
+        import lambda_function  # noqa: F401
+        from utils.service_registry import registry as global_registry
+        
+        assert 'excel_service' not in global_registry.initialized_services()
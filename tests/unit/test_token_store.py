@@ -0,0 +1,129 @@
+"""
+Testes unitários para o armazenamento de tokens e o refresh single-flight.
+"""
+
+import time
+import pytest
+from moto import mock_dynamodb
+import boto3
+from unittest.mock import Mock, patch
+
+from data_access.token_store import (
+    CachedTokenStore,
+    DynamoDBTokenStore,
+    FileTokenStore,
+    MemoryTokenStore,
+)
+from services.excel_service import ExcelService
+from config.settings import TOKEN_TABLE_NAME
+
+
+def _tokens(access_token='at', valid_for=3600):
+    """Cria um conjunto de tokens válido por valid_for segundos."""
+    return {
+        'access_token': access_token,
+        'refresh_token': 'rt',
+        'expiration_time': time.time() + valid_for
+    }
+
+
+@pytest.mark.unit
+class TestDynamoDBTokenStore:
+    """Testes para o armazenamento de tokens no DynamoDB."""
+    
+    @pytest.fixture
+    def store(self, monkeypatch):
+        """Fixture que retorna o armazenamento com uma tabela mockada."""
+        monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+        
+        with mock_dynamodb():
+            dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
+            dynamodb.create_table(
+                TableName=TOKEN_TABLE_NAME,
+                KeySchema=[{'AttributeName': 'token_id', 'KeyType': 'HASH'}],
+                AttributeDefinitions=[{'AttributeName': 'token_id', 'AttributeType': 'S'}],
+                BillingMode='PAY_PER_REQUEST'
+            )
+            
+            yield DynamoDBTokenStore()
+    
+    def test_save_and_load(self, store):
+        """Testa salvar e carregar os tokens."""
+        assert store.load() is None
+        
+        store.save(_tokens('novo'))
+        
+        assert store.load()['access_token'] == 'novo'
+    
+    def test_refresh_lock_is_exclusive(self, store):
+        """Testa que apenas um container obtém o lock de refresh."""
+        assert store.try_acquire_refresh_lock('container-a', 30) is True
+        assert store.try_acquire_refresh_lock('container-b', 30) is False
+        
+        # Salvar tokens não remove o lock
+        store.save(_tokens())
+        assert store.try_acquire_refresh_lock('container-b', 30) is False
+        
+        store.release_refresh_lock('container-a')
+        assert store.try_acquire_refresh_lock('container-b', 30) is True
+    
+    def test_cached_store_reads_local_copy(self, store, tmp_path):
+        """Testa que o cache local evita a leitura do DynamoDB."""
+        cache = FileTokenStore(str(tmp_path / 'tokens.json'))
+        cached_store = CachedTokenStore(store, cache, min_validity_seconds=60)
+        
+        cached_store.save(_tokens('compartilhado'))
+        store.save(_tokens('mais-novo'))
+        
+        assert cached_store.load()['access_token'] == 'compartilhado'
+
+
+@pytest.mark.unit
+class TestExcelServiceTokenRefresh:
+    """Testes para o refresh single-flight do ExcelService."""
+    
+    @pytest.fixture
+    def service(self):
+        """Fixture que retorna o serviço com armazenamento em memória."""
+        with patch('services.excel_service.MS_GRAPH_ACCESS_TOKEN', None), \
+                patch('services.excel_service.MS_GRAPH_REFRESH_TOKEN', 'rt-env'):
+            return ExcelService(token_store=MemoryTokenStore())
+    
+    @patch('services.excel_service.http_session')
+    def test_uses_token_refreshed_by_other_container(self, mock_session, service):
+        """Testa que um token já renovado no armazenamento é reutilizado."""
+        service.token_store.save(_tokens('do-outro-container'))
+        
+        headers = service._get_headers()
+        
+        assert headers['Authorization'] == 'Bearer do-outro-container'
+        mock_session.request.assert_not_called()
+    
+    @patch('services.excel_service.http_session')
+    def test_refresh_saves_to_store(self, mock_session, service):
+        """Testa que o token renovado é salvo para os demais containers."""
+        mock_session.request.return_value = Mock(
+            status_code=200,
+            json=Mock(return_value={
+                'access_token': 'renovado', 'refresh_token': 'rt-novo', 'expires_in': 3600
+            })
+        )
+        
+        service._get_headers()
+        
+        assert service.token_store.load()['refresh_token'] == 'rt-novo'
+        assert mock_session.request.call_count == 1
+    
+    @patch('services.excel_service.http_session')
+    def test_proactive_refresh_skipped_while_other_container_refreshes(
+        self, mock_session, service
+    ):
+        """Testa que, sem o lock, o token ainda válido continua sendo usado."""
+        service.access_token = 'atual'
+        service.token_expiration_time = time.time() + 120  # Dentro da margem
+        service.token_store.try_acquire_refresh_lock('outro-container', 30)
+        
+        headers = service._get_headers()
+        
+        assert headers['Authorization'] == 'Bearer atual'
+        mock_session.request.assert_not_called()
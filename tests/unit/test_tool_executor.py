@@ -4,9 +4,13 @@ Testes unitários para o ToolExecutor.
 
 import pytest
 import json
+import threading
+import time
 from unittest.mock import Mock, patch
 
 from tools.tool_executor import ToolExecutor
+from tools.execution_engine import current_tool_context
+from utils.deadline import Deadline
 from utils.exceptions import ToolExecutionError
 
 
@@ -73,6 +77,75 @@ class TestToolExecutor:
         
         assert 'ausente' in str(exc_info.value).lower()
     
+    @patch('tools.tool_executor.excel_service')
+    def test_bulk_add_expenses_success(self, mock_excel_service, executor):
+        """Testa que bulk_add_expenses grava todas as despesas em uma chamada."""
+        arguments = {
+            'workbook_id': 'workbook123',
+            'worksheet_name': 'Despesas',
+            'expenses': [
+                {'date': '2025-10-21', 'description': 'Almoço',
+                 'category': 'Alimentação', 'amount': 45.5},
+                {'date': '2025-10-21', 'description': 'Uber',
+                 'category': 'Transporte', 'amount': '20'},
+                {'date': '2025-10-21', 'description': 'Café',
+                 'category': 'Alimentação', 'amount': 'R$ 12,50'}
+            ]
+        }
+        
+        result = json.loads(executor.execute_tool('bulk_add_expenses', arguments))
+        
+        assert result['count'] == 3
+        assert result['total'] == 78.0
+        mock_excel_service.add_expenses.assert_called_once()
+        expenses = mock_excel_service.add_expenses.call_args.kwargs['expenses']
+        assert [expense['amount'] for expense in expenses] == [45.5, 20.0, 12.5]
+    
+    def test_bulk_add_expenses_invalid_amount(self, executor):
+        """Testa que um valor não numérico vira erro da ferramenta."""
+        arguments = {
+            'workbook_id': 'workbook123',
+            'worksheet_name': 'Despesas',
+            'expenses': [{'date': '2025-10-21', 'description': 'Almoço',
+                          'category': 'Alimentação', 'amount': 'muito'}]
+        }
+        
+        with pytest.raises(ToolExecutionError, match="'amount' inválido na despesa 1"):
+            executor.execute_tool('bulk_add_expenses', arguments)
+    
+    def test_bulk_add_expenses_invalid_item(self, executor):
+        """Testa bulk_add_expenses com uma despesa incompleta."""
+        arguments = {
+            'workbook_id': 'workbook123',
+            'worksheet_name': 'Despesas',
+            'expenses': [{'date': '2025-10-21', 'description': 'Almoço'}]
+        }
+        
+        with pytest.raises(ToolExecutionError) as exc_info:
+            executor.execute_tool('bulk_add_expenses', arguments)
+        
+        assert 'despesa 1' in str(exc_info.value)
+    
+    @patch('services.expense_store.EXPENSE_BACKEND', 'ledger')
+    @patch('tools.tool_executor.excel_service')
+    def test_ledger_backend_receives_sender(self, mock_excel_service, executor):
+        """Testa que, com EXPENSE_BACKEND=ledger, a despesa vai para o ledger do remetente."""
+        senders = []
+        mock_ledger = Mock()
+        mock_ledger.add_expense.side_effect = lambda **kwargs: senders.append(
+            current_tool_context().sender_id
+        )
+        
+        # Mock explícito: não instanciar o ledger real (arquivo SQLite)
+        with patch('services.expense_ledger.expense_ledger', mock_ledger):
+            executor.execute_tool('add_expense', {
+                'workbook_id': 'wb', 'worksheet_name': 'Despesas', 'date': '2025-10-21',
+                'description': 'Almoço', 'category': 'Alimentação', 'amount': 45
+            }, sender_id='whatsapp:+5511')
+        
+        assert senders == ['whatsapp:+5511']
+        mock_excel_service.add_expense.assert_not_called()
+    
     @patch('tools.tool_executor.excel_service')
     def test_get_expense_history_success(self, mock_excel_service, executor):
         """Testa execução bem-sucedida de get_expense_history."""
@@ -100,11 +173,102 @@ class TestToolExecutor:
         result = json.loads(result_json)
         assert result['success'] is True
         assert result['count'] == 1
-        assert len(result['expenses']) == 1
+        assert result['columns'] == ['date', 'description', 'category', 'amount']
+        assert result['rows'] == [['2025-10-20', 'Almoço', 'Alimentação', 45.50]]
+        assert result['truncated'] is False
+        assert 'summary' not in result
         
         # Verificar que o serviço foi chamado
         mock_excel_service.get_expense_history.assert_called_once()
     
+    @patch('tools.tool_executor.excel_service')
+    def test_get_expense_history_paginates_long_history(self, mock_excel_service, executor):
+        """Testa que históricos longos são paginados, com cursor e agregados."""
+        mock_excel_service.get_expense_history.return_value = [
+            {
+                'date': '2025-10-20',
+                'description': f'Despesa {index}',
+                'category': 'Alimentação' if index % 2 else 'Transporte',
+                'amount': 10.0
+            }
+            for index in range(2000)
+        ]
+        arguments = {'workbook_id': 'wb', 'worksheet_name': 'Despesas'}
+        
+        first_json = executor.execute_tool('get_expense_history', arguments)
+        first = json.loads(first_json)
+        second = json.loads(executor.execute_tool(
+            'get_expense_history', {**arguments, 'cursor': first['next_cursor']}
+        ))
+        
+        assert len(first_json.encode('utf-8')) <= executor.shaper.max_bytes
+        assert first['truncated'] is True
+        assert first['count'] == 2000
+        assert first['summary']['total'] == 20000.0
+        assert first['summary']['categories'][0]['count'] == 1000
+        assert second['rows'][0][1] == f"Despesa {first['returned']}"
+    
+    @patch('tools.tool_executor.excel_service')
+    def test_get_expense_history_rejects_cursor_of_other_query(self, mock_excel_service, executor):
+        """Testa que um cursor não pode ser reaproveitado em outra consulta."""
+        mock_excel_service.get_expense_history.return_value = [
+            {'date': '2025-10-20', 'description': 'x', 'category': 'Lazer', 'amount': 1.0}
+        ] * 100
+        
+        first = json.loads(executor.execute_tool('get_expense_history', {
+            'workbook_id': 'wb', 'worksheet_name': 'Despesas', 'limit': 10
+        }))
+        
+        with pytest.raises(ToolExecutionError):
+            executor.execute_tool('get_expense_history', {
+                'workbook_id': 'wb', 'worksheet_name': 'Despesas',
+                'filters': {'category': 'Lazer'}, 'cursor': first['next_cursor']
+            })
+    
+    @patch('tools.tool_executor.excel_service')
+    def test_get_expense_summary_success(self, mock_excel_service, executor):
+        """Testa que get_expense_summary retorna apenas os agregados."""
+        mock_excel_service.get_expense_summary.return_value = {
+            'start_date': '2025-10-01', 'end_date': None,
+            'total': 45.5, 'count': 1, 'categories': []
+        }
+        
+        result = json.loads(executor.execute_tool('get_expense_summary', {
+            'workbook_id': 'wb', 'worksheet_name': 'Despesas',
+            'start_date': '2025-10-01', 'categories': 'Alimentação'
+        }))
+        
+        assert result['success'] is True
+        assert result['total'] == 45.5
+        kwargs = mock_excel_service.get_expense_summary.call_args.kwargs
+        assert kwargs['categories'] == ['Alimentação']
+    
+    @patch('services.expense_analytics.expense_analytics')
+    def test_analyze_expenses_success(self, mock_analytics, executor):
+        """Testa que analyze_expenses repassa o agrupamento pedido."""
+        mock_analytics.group_by.return_value = {
+            'group_by': 'month', 'total': 100.0, 'count': 2, 'groups': []
+        }
+        
+        result = json.loads(executor.execute_tool('analyze_expenses', {
+            'workbook_id': 'wb', 'worksheet_name': 'Despesas', 'group_by': 'month'
+        }))
+        
+        assert result['success'] is True
+        assert result['total'] == 100.0
+        kwargs = mock_analytics.group_by.call_args.kwargs
+        assert kwargs['by'] == 'month'
+    
+    @patch('services.expense_analytics.expense_analytics')
+    def test_analyze_expenses_invalid_grouping(self, mock_analytics, executor):
+        """Testa que agrupamentos inválidos viram ToolExecutionError."""
+        mock_analytics.group_by.side_effect = ValueError("Agrupamento não suportado: year")
+        
+        with pytest.raises(ToolExecutionError):
+            executor.execute_tool('analyze_expenses', {
+                'workbook_id': 'wb', 'worksheet_name': 'Despesas', 'group_by': 'year'
+            })
+    
     @patch('tools.tool_executor.excel_service')
     def test_tool_execution_with_exception(self, mock_excel_service, executor):
         """Testa comportamento quando ferramenta lança exceção."""
@@ -122,4 +286,116 @@ class TestToolExecutor:
         
         with pytest.raises(ToolExecutionError):
             executor.execute_tool('add_expense', arguments)
+    
+    @patch('tools.tool_executor.excel_service')
+    def test_execute_tools_runs_in_parallel(self, mock_excel_service, executor):
+        """Testa que tool calls de uma rodada executam em paralelo."""
+        def slow_history(**kwargs):
+            time.sleep(0.2)
+            return []
+        
+        mock_excel_service.get_expense_history.side_effect = slow_history
+        calls = [
+            {
+                'tool_call_id': f'call_{i}',
+                'tool_name': 'get_expense_history',
+                'arguments': {'workbook_id': 'wb', 'worksheet_name': 'Despesas'}
+            }
+            for i in range(3)
+        ]
+        
+        start = time.perf_counter()
+        results = executor.execute_tools(calls)
+        elapsed = time.perf_counter() - start
+        
+        assert [r['tool_call_id'] for r in results] == ['call_0', 'call_1', 'call_2']
+        assert all(r['success'] for r in results)
+        assert all(r['duration_ms'] >= 200 for r in results)
+        assert elapsed < 0.5
+    
+    def test_execute_tools_returns_errors_as_outputs(self, executor):
+        """Testa que erros viram outputs sem interromper as demais chamadas."""
+        calls = [
+            {'tool_call_id': 'call_1', 'tool_name': 'nonexistent_tool', 'arguments': {}},
+            {'tool_call_id': 'call_2', 'tool_name': 'add_expense', 'arguments': {}},
+        ]
+        
+        results = executor.execute_tools(calls)
+        
+        assert [r['success'] for r in results] == [False, False]
+        assert json.loads(results[0]['output'])['error'] == 'Erro na execução'
+    
+    @patch('tools.tool_executor.excel_service')
+    def test_execute_tool_timeout_returns_structured_output(self, mock_excel_service, executor):
+        """Testa que o timeout vira output estruturado em vez de exceção."""
+        mock_excel_service.get_expense_history.side_effect = lambda **kwargs: time.sleep(0.5)
+        
+        start = time.perf_counter()
+        output = executor.execute_tool(
+            'get_expense_history',
+            {'workbook_id': 'wb', 'worksheet_name': 'Despesas'},
+            deadline=Deadline(0.1)
+        )
+        elapsed = time.perf_counter() - start
+        
+        result = json.loads(output)
+        assert result['timed_out'] is True
+        assert result['tool'] == 'get_expense_history'
+        assert elapsed < 0.4
+    
+    def test_execute_tool_runs_outside_main_thread(self, executor):
+        """Testa que a ferramenta roda em thread do pool com contexto de execução."""
+        seen = {}
+        
+        def probe(arguments):
+            seen['thread'] = threading.current_thread()
+            seen['context'] = current_tool_context()
+            return {'ok': True}
+        
+        executor.tools['probe'] = probe
+        output = executor.execute_tool('probe', {})
+        
+        assert json.loads(output) == {'ok': True}
+        assert seen['thread'] is not threading.main_thread()
+        assert seen['context'].tool_name == 'probe'
+        assert current_tool_context() is None
 
+
+@pytest.mark.unit
+class TestToolConcurrencyConfiguration:
+    """Testes para a configuração TOOL_CONCURRENCY_LIMITS."""
+    
+    def test_limits_are_parsed(self):
+        """Testa o formato ferramenta=limite, ignorando itens vazios."""
+        from config.settings import parse_tool_concurrency_limits
+        
+        assert parse_tool_concurrency_limits(' add_expense=2, get_expense_history = 3,') == {
+            'add_expense': 2, 'get_expense_history': 3
+        }
+    
+    @pytest.mark.parametrize('spec', ['add_expense=two', 'add_expense', '=2', 'add_expense=0'])
+    def test_malformed_limit_is_rejected_by_validation(self, spec):
+        """Testa que um valor inválido é recusado pela validação, com o item na mensagem."""
+        from config import settings
+        from utils.exceptions import ConfigurationError
+        
+        with patch.object(settings, 'TOOL_CONCURRENCY_LIMITS', spec), \
+                patch.object(settings, '_configuration_validated', False):
+            with pytest.raises(ConfigurationError, match='TOOL_CONCURRENCY_LIMITS'):
+                settings.validate_configuration_once()
+    
+    def test_malformed_limit_does_not_break_imports(self):
+        """Testa que o import das configurações não falha com um valor inválido."""
+        import os
+        import subprocess
+        import sys
+        
+        result = subprocess.run(
+            [sys.executable, '-c', 'import config.settings, tools.execution_engine'],
+            env={**os.environ, 'TOOL_CONCURRENCY_LIMITS': 'add_expense=two'},
+            cwd=os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+            capture_output=True,
+            text=True
+        )
+        
+        assert result.returncode == 0, result.stderr
@@ -3,6 +3,8 @@ Testes unitários para o TwilioService.
 """
 
 import pytest
+from unittest.mock import Mock, patch
+
 from services.twilio_service import TwilioService
 
 
@@ -60,4 +62,25 @@ class TestTwilioService:
         # Deve gerar XML válido mesmo com mensagem vazia
         assert '<Response>' in twiml
         assert '</Response>' in twiml
-
+    
+    def test_create_empty_response(self, service):
+        """Testa TwiML vazio usado no modo assíncrono."""
+        twiml = service.create_empty_response()
+        
+        assert '<Response' in twiml
+        assert '<Message>' not in twiml
+    
+    @patch('services.twilio_service.TWILIO_WHATSAPP_NUMBER', 'whatsapp:+14155238886')
+    def test_send_message_splits_long_body(self, service):
+        """Testa que mensagens longas são divididas em partes."""
+        mock_client = Mock()
+        mock_client.messages.create.return_value = Mock(sid='SM123')
+        service._client = mock_client
+        
+        sids = service.send_message('whatsapp:+5511999999999', 'a' * 2000)
+        
+        assert sids == ['SM123', 'SM123']
+        assert mock_client.messages.create.call_count == 2
+        first_call = mock_client.messages.create.call_args_list[0]
+        assert first_call[1]['to'] == 'whatsapp:+5511999999999'
+        assert len(first_call[1]['body']) == 1600
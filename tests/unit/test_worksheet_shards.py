@@ -0,0 +1,261 @@
+"""
+Testes unitários para as abas de despesas por período (shards).
+"""
+
+import json
+import re
+import time
+import pytest
+from datetime import date
+from unittest.mock import Mock, patch
+
+from data_access.token_store import MemoryTokenStore
+from services.excel_service import ExcelService
+from services.worksheet_shards import (
+    WORKSHEET_COMPACTION_JOB,
+    expense_day,
+    select_worksheets,
+    shard_name,
+    shard_period
+)
+from utils.exceptions import MicrosoftGraphAPIError
+
+TODAY = date.today()
+THIS_MONTH = f"Despesas_{TODAY.year:04d}_{TODAY.month:02d}"
+
+
+class FakeWorkbook:
+    """Simula as abas de um workbook nas rotas do Graph usadas pelo ExcelService."""
+
+    ADDRESS = re.compile(r"range\(address='A(\d+):D(\d+)'\)")
+
+    def __init__(self, sheets):
+        self.sheets = {name: [list(row) for row in rows] for name, rows in sheets.items()}
+        self.calls = []
+
+    def _sheet(self, url):
+        name = url.split('/worksheets/')[1].split('/')[0]
+        if name not in self.sheets:
+            raise MicrosoftGraphAPIError("ItemNotFound", status_code=404)
+        return name
+
+    def request(self, method, url, error_message, **kwargs):
+        self.calls.append((method, url))
+        body = kwargs.get('json')
+
+        if url.endswith('/workbook/worksheets'):
+            return Mock(json=Mock(return_value={'value': [{'name': n} for n in self.sheets]}))
+        if url.endswith('/worksheets/add'):
+            self.sheets.setdefault(body['name'], [])
+            return Mock(json=Mock(return_value={'name': body['name']}))
+        if '/worksheets/' not in url:
+            # Metadados do workbook (sem versão: o cache fica de fora)
+            return Mock(json=Mock(return_value={}))
+
+        name = self._sheet(url)
+        rows = self.sheets[name]
+
+        if method == 'DELETE':
+            del self.sheets[name]
+            return Mock(json=Mock(return_value={}))
+
+        # O usedRange começa na primeira linha preenchida
+        top = next((i for i, row in enumerate(rows) if any(cell not in ('', None) for cell in row)), 0)
+        if url.endswith('usedRange(valuesOnly=true)'):
+            return Mock(json=Mock(return_value={'rowIndex': top, 'rowCount': len(rows) - top}))
+        if url.endswith('/usedRange'):
+            return Mock(json=Mock(return_value={
+                'rowIndex': top, 'values': [list(row) for row in rows[top:]]
+            }))
+
+        first, last = (int(value) for value in self.ADDRESS.search(url).groups())
+        while len(rows) < last:
+            rows.append(['', '', '', ''])
+        for offset, row in enumerate(range(first - 1, last)):
+            rows[row] = ['', '', '', ''] if url.endswith('/clear') else list(body['values'][offset])
+        return Mock(json=Mock(return_value={}))
+
+
+@pytest.mark.unit
+class TestShardRules:
+    """Testes para os nomes e períodos das abas."""
+
+    def test_shard_name_archives_old_months(self):
+        """Testa que meses antigos vão para a aba anual no particionamento mensal."""
+        today = date(2026, 10, 18)
+
+        assert shard_name('Despesas', date(2026, 3, 10), 'month', today) == 'Despesas_2026_03'
+        assert shard_name('Despesas', date(2025, 9, 30), 'month', today) == 'Despesas_2025'
+        assert shard_name('Despesas', date(2026, 3, 10), 'year', today) == 'Despesas_2026'
+
+    def test_shard_period(self):
+        """Testa o período das abas anuais e mensais."""
+        assert shard_period('Despesas', 'Despesas_2026') == (date(2026, 1, 1), date(2026, 12, 31))
+        assert shard_period('Despesas', 'Despesas_2024_02') == (date(2024, 2, 1), date(2024, 2, 29))
+        assert shard_period('Despesas', 'Despesas_2026_13') is None
+        assert shard_period('Despesas', 'Resumo_2026') is None
+
+    def test_select_worksheets_for_period(self):
+        """Testa que apenas as abas que cobrem o período são lidas (e a base, se existir)."""
+        names = ['Resumo', 'Despesas_2026_03', 'Despesas', 'Despesas_2025', 'Despesas_2026_02']
+
+        assert select_worksheets('Despesas', names, '2026-03-01', '2026-03-31') == [
+            'Despesas', 'Despesas_2026_03'
+        ]
+        assert select_worksheets('Despesas', names[:2], '2026-02-01') == ['Despesas_2026_03']
+        assert select_worksheets('Despesas', names, end_date='2025-12-31') == [
+            'Despesas', 'Despesas_2025'
+        ]
+
+    def test_expense_day_accepts_excel_serials(self):
+        """Testa a conversão de datas ISO e números de série do Excel."""
+        assert expense_day('2026-03-10') == date(2026, 3, 10)
+        assert expense_day(46091) == date(2026, 3, 10)
+        assert expense_day('10/03/2026') is None
+
+
+@pytest.mark.unit
+class TestExcelServiceSharding:
+    """Testes para a escrita, leitura e compactação das abas de período."""
+
+    @pytest.fixture(autouse=True)
+    def monthly_sharding(self):
+        """Habilita o particionamento mensal durante os testes."""
+        with patch('services.excel_service.EXCEL_WORKSHEET_SHARDING', 'month'):
+            yield
+
+    @pytest.fixture
+    def service(self):
+        """Fixture que retorna o serviço sem $batch e sem sessões."""
+        with patch('services.excel_service.GRAPH_BATCH_WINDOW_MS', 0):
+            service = ExcelService(token_store=MemoryTokenStore())
+        service.access_token = 'token'
+        service.token_expiration_time = time.time() + 3600
+        return service
+
+    def test_writes_create_period_sheet_and_schedule_compaction(self, service):
+        """Testa que a despesa vai para a aba do mês, criada com cabeçalho na primeira escrita."""
+        workbook = FakeWorkbook({'Despesas': [['Data', 'Descrição', 'Categoria', 'Valor']]})
+        expense = {'date': TODAY.isoformat(), 'description': 'Almoço', 'category': 'Alimentação', 'amount': 45}
+        queue = Mock()
+
+        with patch.object(service, '_request', side_effect=workbook.request), \
+                patch('services.queue_service.message_queue', queue):
+            service.add_expenses('wb', 'Despesas', [expense])
+            service.add_expenses('wb', 'Despesas', [expense])
+
+        assert workbook.sheets[THIS_MONTH] == [
+            ['Data', 'Descrição', 'Categoria', 'Valor'],
+            [TODAY.isoformat(), 'Almoço', 'Alimentação', 45],
+            [TODAY.isoformat(), 'Almoço', 'Alimentação', 45],
+        ]
+        assert len(workbook.sheets['Despesas']) == 1
+        queue.enqueue.assert_called_once_with(
+            {'type': WORKSHEET_COMPACTION_JOB, 'workbook_id': 'wb', 'worksheet_name': 'Despesas'}
+        )
+
+    def test_period_query_reads_only_matching_sheets(self, service):
+        """Testa que a leitura de um mês não toca as abas dos outros períodos."""
+        header = ['Data', 'Descrição', 'Categoria', 'Valor']
+        workbook = FakeWorkbook({
+            'Despesas_2024': [header, ['2024-05-01', 'Antiga', 'Lazer', 10]],
+            THIS_MONTH: [header, [TODAY.isoformat(), 'Almoço', 'Alimentação', 45]],
+        })
+        start = TODAY.replace(day=1).isoformat()
+
+        with patch.object(service, '_request', side_effect=workbook.request):
+            expenses = service.load_expenses('wb', 'Despesas', start, TODAY.isoformat())
+
+        assert [expense['description'] for expense in expenses] == ['Almoço']
+        assert not any('Despesas_2024' in url for _, url in workbook.calls)
+
+    def test_summary_sums_period_sheets(self, service):
+        """Testa que o resumo avalia as funções apenas nas abas do período, e soma os resultados."""
+        workbook = FakeWorkbook({'Despesas_2025': [], 'Despesas_2026_01': [], 'Despesas_2026_02': []})
+
+        def request(method, url, error_message, **kwargs):
+            if '/functions/' in url:
+                sheets.append(kwargs['json']['values'][0]['Address'].split('!')[0])
+                return Mock(json=Mock(return_value={'value': 10 if url.endswith('sumIfs') else 1}))
+            return workbook.request(method, url, error_message, **kwargs)
+
+        sheets = []
+        with patch.object(service, '_request', side_effect=request):
+            summary = service.get_expense_summary('wb', 'Despesas', '2026-01-15', '2026-02-10')
+
+        assert sorted(set(sheets)) == ["'Despesas_2026_01'", "'Despesas_2026_02'"]
+        assert (summary['total'], summary['count']) == (20.0, 2)
+
+    def test_compaction_moves_base_rows_and_archives_months(self, service):
+        """Testa a compactação: linhas da base para as abas de período, meses antigos para a aba anual."""
+        header = ['Data', 'Descrição', 'Categoria', 'Valor']
+        old = date(TODAY.year - 2, 6, 1)
+        workbook = FakeWorkbook({
+            'Despesas': [
+                header,
+                [(old - date(1899, 12, 30)).days, 'Legado', 'Lazer', 5],
+                ['sem data', 'Ajuste', 'Outros', 1],
+                [TODAY.isoformat(), 'Recente', 'Lazer', 7],
+            ],
+            f"Despesas_{old.year}_06": [header, [old.isoformat(), 'Mensal', 'Lazer', 3]],
+        })
+
+        with patch.object(service, '_request', side_effect=workbook.request):
+            assert service.compact_worksheets('wb', 'Despesas') == 3
+
+        assert workbook.sheets[f"Despesas_{old.year}"][1:] == [
+            [old.isoformat(), 'Legado', 'Lazer', 5],
+            [old.isoformat(), 'Mensal', 'Lazer', 3],
+        ]
+        assert workbook.sheets[THIS_MONTH][1:] == [[TODAY.isoformat(), 'Recente', 'Lazer', 7]]
+        assert f"Despesas_{old.year}_06" not in workbook.sheets
+        assert workbook.sheets['Despesas'][1] == ['sem data', 'Ajuste', 'Outros', 1]
+        assert workbook.sheets['Despesas'][2:] == [['', '', '', ''], ['', '', '', '']]
+
+    def test_compaction_uses_the_used_range_position(self, service):
+        """Testa a compactação de uma base com linhas vazias no topo, e o descarte dos caches da aba removida."""
+        header = ['Data', 'Descrição', 'Categoria', 'Valor']
+        blank = ['', '', '', '']
+        old = date(TODAY.year - 2, 6, 1)
+        archived = f"Despesas_{old.year}_06"
+        workbook = FakeWorkbook({
+            'Despesas': [
+                blank,
+                blank,
+                header,
+                [TODAY.isoformat(), 'Recente', 'Lazer', 7],
+                ['sem data', 'Ajuste', 'Outros', 1],
+            ],
+            archived: [header, [old.isoformat(), 'Mensal', 'Lazer', 3]],
+        })
+
+        with patch.object(service, '_request', side_effect=workbook.request), \
+                patch.object(service.row_cursors, 'invalidate') as invalidate_cursor, \
+                patch.object(service.history_cache, 'invalidate') as invalidate_cache:
+            assert service.compact_worksheets('wb', 'Despesas') == 2
+
+        assert workbook.sheets['Despesas'] == [
+            blank, blank, header, ['sem data', 'Ajuste', 'Outros', 1], blank
+        ]
+        assert workbook.sheets[THIS_MONTH][1:] == [[TODAY.isoformat(), 'Recente', 'Lazer', 7]]
+        invalidate_cursor.assert_any_call('wb', archived)
+        invalidate_cache.assert_any_call('wb', archived)
+
+    @patch('worker_function.process_queued_message')
+    def test_worker_routes_compaction_jobs(self, mock_process):
+        """Testa que jobs de compactação não passam pelo fluxo de conversação."""
+        from worker_function import worker_handler
+
+        event = {'Records': [{
+            'messageId': 'm1',
+            'body': json.dumps({
+                'type': WORKSHEET_COMPACTION_JOB, 'workbook_id': 'wb', 'worksheet_name': 'Despesas'
+            })
+        }]}
+
+        mock_excel = Mock()
+        with patch('services.excel_service.excel_service', mock_excel):
+            assert worker_handler(event, None) == {'batchItemFailures': []}
+
+        mock_excel.compact_worksheets.assert_called_once_with('wb', 'Despesas')
+        mock_process.assert_not_called()
@@ -0,0 +1,262 @@
+"""
+Testes unitários para o journal e a gravação write-behind no Excel.
+"""
+
+import json
+import pytest
+from moto import mock_dynamodb
+import boto3
+from unittest.mock import Mock, patch
+
+from data_access.expense_journal import DynamoDBExpenseJournal, FileExpenseJournal
+from services.queue_service import LocalMessageQueue
+from services.write_behind import JOURNAL_FLUSH_JOB, WriteBehindExcel
+from utils.metrics import put_metric
+from config.settings import JOURNAL_TABLE_NAME
+
+
+def _entry(entry_id, worksheet_name='Despesas', created_at=1.0):
+    """Cria uma despesa no formato gravado no journal."""
+    return {
+        'entry_id': entry_id,
+        'workbook_id': 'wb',
+        'worksheet_name': worksheet_name,
+        'table_name': None,
+        'date': '2026-03-10',
+        'description': 'Almoço',
+        'category': 'Alimentação',
+        'amount': 45.5,
+        'created_at': created_at
+    }
+
+
+def _expense(amount=45, category='Alimentação', date='2026-03-10'):
+    """Cria uma despesa no formato das ferramentas."""
+    return {'date': date, 'description': 'Almoço', 'category': category, 'amount': amount}
+
+
+@pytest.fixture
+def dynamodb_journal(monkeypatch):
+    """Fixture que retorna o journal com uma tabela DynamoDB mockada."""
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+
+    with mock_dynamodb():
+        dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
+        dynamodb.create_table(
+            TableName=JOURNAL_TABLE_NAME,
+            KeySchema=[
+                {'AttributeName': 'workbook_id', 'KeyType': 'HASH'},
+                {'AttributeName': 'entry_id', 'KeyType': 'RANGE'}
+            ],
+            AttributeDefinitions=[
+                {'AttributeName': 'workbook_id', 'AttributeType': 'S'},
+                {'AttributeName': 'entry_id', 'AttributeType': 'S'}
+            ],
+            BillingMode='PAY_PER_REQUEST'
+        )
+
+        yield DynamoDBExpenseJournal()
+
+
+@pytest.fixture(params=['file', 'dynamodb'])
+def journal(request, tmp_path):
+    """Fixture que retorna cada implementação do journal."""
+    if request.param == 'file':
+        return FileExpenseJournal(str(tmp_path / 'journal.json'))
+    return request.getfixturevalue('dynamodb_journal')
+
+
+@pytest.mark.unit
+class TestExpenseJournal:
+    """Testes para os journals (arquivo e DynamoDB)."""
+
+    def test_append_pending_and_remove(self, journal):
+        """Testa que as despesas ficam pendentes, em ordem, até serem removidas."""
+        journal.append([_entry('0002-a'), _entry('0001-b')])
+
+        pending = journal.pending('wb')
+        assert [entry['entry_id'] for entry in pending] == ['0001-b', '0002-a']
+        assert pending[0]['amount'] == 45.5
+        assert pending[0]['table_name'] is None
+        assert journal.pending('outro') == []
+
+        journal.remove('wb', ['0001-b'])
+
+        assert [entry['entry_id'] for entry in journal.pending('wb')] == ['0002-a']
+
+    def test_flush_lock_is_exclusive(self, journal):
+        """Testa que apenas um worker obtém o lock de flush do workbook."""
+        assert journal.try_acquire_flush_lock('wb', 'worker-a', 60) is True
+        assert journal.try_acquire_flush_lock('wb', 'worker-b', 60) is False
+
+        journal.release_flush_lock('wb', 'worker-a')
+        assert journal.try_acquire_flush_lock('wb', 'worker-b', 60) is True
+
+
+@pytest.mark.unit
+class TestWriteBehindExcel:
+    """Testes para a gravação write-behind."""
+
+    @pytest.fixture
+    def queue(self, tmp_path):
+        """Fixture que retorna uma fila local isolada."""
+        return LocalMessageQueue(str(tmp_path / 'queue.json'))
+
+    @pytest.fixture
+    def excel(self):
+        """Fixture que retorna um serviço de Excel simulado, com uma despesa gravada."""
+        excel = Mock()
+        excel.load_expenses.return_value = [_expense(10, 'Lazer')]
+        excel.get_expense_history.return_value = [_expense(10, 'Lazer')]
+        excel.get_expense_summary.return_value = {
+            'start_date': '2026-03-01', 'end_date': '2026-03-31', 'total': 10.0, 'count': 1,
+            'categories': [{'category': 'Alimentação', 'total': 0.0, 'count': 0}]
+        }
+        return excel
+
+    @pytest.fixture
+    def buffer(self, tmp_path, queue, excel):
+        """Fixture que retorna o write-behind com journal em arquivo e Excel simulado."""
+        journal = FileExpenseJournal(str(tmp_path / 'journal.json'))
+        return WriteBehindExcel(journal=journal, queue=queue, excel=excel)
+
+    def test_add_is_acknowledged_without_excel(self, buffer, queue, excel):
+        """Testa que o lançamento grava no journal e agenda o flush, sem chamar o Excel."""
+        assert buffer.add_expense('wb', 'Despesas', _expense()) == {'count': 1, 'flush_scheduled': True}
+
+        excel.add_expenses.assert_not_called()
+        [(_, message)] = queue.receive()
+        assert message == {'type': JOURNAL_FLUSH_JOB, 'workbook_id': 'wb'}
+
+    def test_reads_include_unflushed_expenses(self, buffer, excel):
+        """Testa que histórico e resumo incluem as despesas ainda no journal."""
+        buffer.add_expenses('wb', 'Despesas', [
+            _expense(45), _expense(5, date='2026-04-01'), _expense(2, 'ALIMENTAÇÃO')
+        ])
+        buffer.add_expense('wb', 'Outra', _expense(99))
+
+        history = buffer.get_expense_history('wb', 'Despesas', {'category': 'Alimentação'})
+        assert [expense['amount'] for expense in history] == [10, 45.0, 5.0]
+
+        # Categorias comparadas sem diferenciar maiúsculas, como o SUMIFS
+        summary = buffer.get_expense_summary(
+            'wb', 'Despesas', '2026-03-01', '2026-03-31', ['Alimentação']
+        )
+        assert summary['total'] == 57.0
+        assert summary['count'] == 3
+        assert summary['categories'] == [{'category': 'Alimentação', 'total': 47.0, 'count': 2}]
+
+    def test_load_without_pending_keeps_excel_list(self, buffer, excel):
+        """Testa que, sem pendências, a lista do Excel é retornada sem cópia."""
+        assert buffer.load_expenses('wb', 'Despesas') is excel.load_expenses.return_value
+
+    @patch('services.write_behind.put_metric')
+    def test_flush_batches_per_worksheet(self, mock_metric, buffer, excel):
+        """Testa que o flush grava uma vez por planilha e esvazia o journal."""
+        buffer.add_expenses('wb', 'Despesas', [_expense(1), _expense(2)])
+        buffer.add_expense('wb', 'Despesas', _expense(3))
+        buffer.add_expense('wb', 'Outra', _expense(4))
+
+        assert buffer.flush('wb') == 4
+        assert excel.add_expenses.call_count == 2
+
+        first = excel.add_expenses.call_args_list[0].kwargs
+        assert first['worksheet_name'] == 'Despesas'
+        assert [expense['amount'] for expense in first['expenses']] == [1.0, 2.0, 3.0]
+
+        assert buffer.journal.pending('wb') == []
+        assert buffer.lag_seconds('wb') == 0.0
+        metrics = [call.args[0] for call in mock_metric.call_args_list]
+        assert metrics == ['ExpenseJournalLagSeconds', 'ExpenseJournalFlushed']
+
+    def test_pending_keeps_order_within_the_same_millisecond(self, buffer):
+        """Testa que lançamentos no mesmo milissegundo não se intercalam no journal."""
+        with patch('services.write_behind.time.time', return_value=1700000000.0):
+            buffer.add_expenses('wb', 'Despesas', [_expense(1), _expense(2)])
+            buffer.add_expenses('wb', 'Despesas', [_expense(3), _expense(4)])
+
+        pending = buffer.journal.pending('wb')
+        assert [entry['amount'] for entry in pending] == [1.0, 2.0, 3.0, 4.0]
+
+    @patch('services.write_behind.put_metric')
+    def test_failed_flush_keeps_entries_for_retry(self, mock_metric, buffer, excel):
+        """Testa que uma falha no Excel mantém as despesas no journal e libera o lock."""
+        buffer.add_expense('wb', 'Despesas', _expense())
+        excel.add_expenses.side_effect = RuntimeError('Graph indisponível')
+
+        with pytest.raises(RuntimeError):
+            buffer.flush('wb')
+
+        mock_metric.assert_any_call('ExpenseJournalFlushFailures', 1)
+        assert len(buffer.journal.pending('wb')) == 1
+
+        excel.add_expenses.side_effect = None
+        assert buffer.flush('wb') == 1
+
+    def test_concurrent_flush_is_left_to_the_lock_holder(self, buffer, excel):
+        """Testa que o flush concorrente termina sem erro (não volta para a fila nem vai para a DLQ)."""
+        buffer.add_expense('wb', 'Despesas', _expense())
+        assert buffer.journal.try_acquire_flush_lock('wb', 'outro-worker', 60)
+
+        assert buffer.flush('wb') == 0
+
+        excel.add_expenses.assert_not_called()
+        assert len(buffer.journal.pending('wb')) == 1
+
+    def test_entry_added_before_lock_release_is_flushed(self, buffer, queue, excel):
+        """Testa a corrida entre dois workers: o job que encontra o lock ocupado não perde a despesa."""
+        other_worker = WriteBehindExcel(journal=buffer.journal, queue=queue, excel=excel)
+        release = buffer.journal.release_flush_lock
+        results = []
+
+        def release_after_race(workbook_id, holder):
+            # O dono do lock já viu o journal vazio; outro worker lança e tenta o flush
+            if not results:
+                other_worker.add_expense('wb', 'Despesas', _expense(2))
+                results.append(other_worker.flush('wb'))
+            release(workbook_id, holder)
+
+        buffer.add_expense('wb', 'Despesas', _expense(1))
+
+        with patch.object(buffer.journal, 'release_flush_lock', side_effect=release_after_race):
+            assert buffer.flush('wb') == 2
+
+        assert results == [0]
+        assert excel.add_expenses.call_count == 2
+        assert buffer.journal.pending('wb') == []
+
+    @patch('worker_function.process_queued_message')
+    def test_worker_routes_flush_jobs(self, mock_process):
+        """Testa que jobs de flush não passam pelo fluxo de conversação."""
+        from worker_function import worker_handler
+
+        event = {'Records': [{
+            'messageId': 'm1',
+            'body': json.dumps({'type': JOURNAL_FLUSH_JOB, 'workbook_id': 'wb'})
+        }]}
+
+        # Mock explícito: não instanciar o write-behind real (journal em arquivo)
+        mock_buffer = Mock()
+        with patch('services.write_behind.write_behind_excel', mock_buffer):
+            assert worker_handler(event, None) == {'batchItemFailures': []}
+
+        mock_buffer.flush.assert_called_once_with('wb')
+        mock_process.assert_not_called()
+
+
+@pytest.mark.unit
+class TestMetrics:
+    """Testes para a publicação de métricas (Embedded Metric Format)."""
+
+    def test_put_metric_writes_emf_in_lambda(self, monkeypatch, capsys):
+        """Testa que, no Lambda, a métrica é uma linha JSON no formato EMF."""
+        monkeypatch.setenv('AWS_LAMBDA_FUNCTION_NAME', 'FinancialAssistantWorker')
+
+        put_metric('ExpenseJournalLagSeconds', 12.5, 'Seconds', Workbook='wb')
+
+        document = json.loads(capsys.readouterr().out.strip())
+        assert document['ExpenseJournalLagSeconds'] == 12.5
+        assert document['Workbook'] == 'wb'
+        [directive] = document['_aws']['CloudWatchMetrics']
+        assert directive['Dimensions'] == [['Workbook']]
+        assert directive['Metrics'] == [{'Name': 'ExpenseJournalLagSeconds', 'Unit': 'Seconds'}]
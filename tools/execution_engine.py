@@ -0,0 +1,329 @@
+"""
+Motor de execução de ferramentas (tools) em threads.
+
+Substitui o timeout por signal.alarm(), que só funciona na thread
+principal e não permite execuções concorrentes. Cada ferramenta roda
+em uma thread do pool, com um prazo derivado do tempo restante do
+Lambda e um token de cancelamento cooperativo: quando o prazo se
+esgota, o chamador recebe um resultado de timeout imediatamente e a
+ferramenta é sinalizada para parar no próximo ponto de verificação.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from typing import Dict, Any, Callable, List, Optional, Tuple
+
+from config.settings import (
+    TOOL_EXECUTION_TIMEOUT_SECONDS,
+    TOOL_MAX_CONCURRENCY,
+    TOOL_CONCURRENCY_LIMITS,
+    parse_tool_concurrency_limits
+)
+from utils.deadline import Deadline
+from utils.logger import setup_logger
+from utils.exceptions import DeadlineExceededError
+
+# Logger específico deste módulo
+logger = setup_logger(__name__)
+
+# Status possíveis do resultado de uma execução
+STATUS_SUCCESS = "success"
+STATUS_ERROR = "error"
+STATUS_TIMEOUT = "timeout"
+
+# Contexto da ferramenta em execução na thread atual
+_local = threading.local()
+
+
+class CancellationToken:
+    """
+    Token de cancelamento cooperativo.
+
+    Threads não podem ser interrompidas à força em Python; a ferramenta
+    consulta o token (diretamente ou via ToolContext.check()) entre
+    etapas e encerra a execução quando ele foi cancelado.
+    """
+
+    def __init__(self):
+        """Inicializa o token não cancelado."""
+        self._event = threading.Event()
+
+    def cancel(self) -> None:
+        """Sinaliza o cancelamento."""
+        self._event.set()
+
+    @property
+    def is_cancelled(self) -> bool:
+        """Indica se o cancelamento foi sinalizado."""
+        return self._event.is_set()
+
+
+class ToolContext:
+    """
+    Contexto de uma execução de ferramenta: prazo, token de cancelamento
+    e remetente da mensagem que originou a tool call.
+
+    Fica disponível para o código da ferramenta (e dos serviços que ela
+    chama) através de current_tool_context().
+    """
+
+    def __init__(
+        self,
+        tool_name: str,
+        deadline: Deadline,
+        token: CancellationToken,
+        sender_id: Optional[str] = None
+    ):
+        """
+        Args:
+            tool_name: Nome da ferramenta em execução
+            deadline: Prazo da execução
+            token: Token de cancelamento da execução
+            sender_id: Remetente da mensagem (opcional)
+        """
+        self.tool_name = tool_name
+        self.deadline = deadline
+        self.token = token
+        self.sender_id = sender_id
+
+    def remaining(self) -> float:
+        """Retorna o tempo restante da execução em segundos."""
+        return self.deadline.remaining()
+
+    def check(self) -> None:
+        """
+        Ponto de verificação cooperativo.
+
+        Raises:
+            DeadlineExceededError: Se a execução foi cancelada ou o prazo expirou
+        """
+        if self.token.is_cancelled:
+            raise DeadlineExceededError(f"Ferramenta '{self.tool_name}' cancelada")
+        self.deadline.check(self.tool_name)
+
+
+def current_tool_context() -> Optional[ToolContext]:
+    """
+    Retorna o contexto da ferramenta em execução na thread atual.
+
+    Returns:
+        ToolContext ou None se a thread atual não está executando uma ferramenta
+    """
+    return getattr(_local, "context", None)
+
+
+def bind_tool_context(func: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    Propaga o contexto da ferramenta atual para outra thread.
+
+    Útil quando a ferramenta dispara chamadas em threads auxiliares:
+    elas passam a respeitar o mesmo prazo e cancelamento.
+
+    Args:
+        func: Função a executar na outra thread
+
+    Returns:
+        Função que instala o contexto capturado antes de chamar func
+    """
+    context = current_tool_context()
+
+    def run(*args: Any, **kwargs: Any) -> Any:
+        previous = getattr(_local, "context", None)
+        _local.context = context
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _local.context = previous
+
+    return run
+
+
+class ToolExecutionEngine:
+    """
+    Executa funções de ferramentas em um pool de threads com prazo.
+
+    Nunca lança exceção por timeout: cada execução resulta em um dict
+    {'status', 'value', 'error', 'duration_ms'}, com status
+    'success', 'error' ou 'timeout'.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = TOOL_MAX_CONCURRENCY,
+        concurrency_limits: Optional[Dict[str, int]] = None,
+        default_timeout: float = TOOL_EXECUTION_TIMEOUT_SECONDS
+    ):
+        """
+        Inicializa o motor (o pool é criado no primeiro uso).
+
+        Args:
+            max_workers: Número máximo de ferramentas executando ao mesmo tempo
+            concurrency_limits: Limite de execuções simultâneas por ferramenta
+                                (padrão: TOOL_CONCURRENCY_LIMITS)
+            default_timeout: Timeout máximo de uma rodada de execuções (segundos)
+        
+        Raises:
+            ConfigurationError: Se TOOL_CONCURRENCY_LIMITS for inválido
+        """
+        if concurrency_limits is None:
+            concurrency_limits = parse_tool_concurrency_limits(TOOL_CONCURRENCY_LIMITS)
+
+        self.max_workers = max_workers
+        self.default_timeout = default_timeout
+
+        # Limites de concorrência por ferramenta
+        self._semaphores: Dict[str, threading.BoundedSemaphore] = {
+            name: threading.BoundedSemaphore(limit)
+            for name, limit in concurrency_limits.items()
+        }
+
+        # Pool de threads criado no primeiro uso
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+
+    def run(
+        self,
+        tool_name: str,
+        func: Callable[[], Any],
+        deadline: Optional[Deadline] = None,
+        sender_id: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Executa uma única função de ferramenta.
+
+        Args:
+            tool_name: Nome da ferramenta
+            func: Função sem argumentos que executa a ferramenta
+            deadline: Prazo da requisição (opcional)
+            sender_id: Remetente da mensagem (opcional, ver ToolContext)
+
+        Returns:
+            dict: Resultado da execução (ver run_many)
+        """
+        return self.run_many([(tool_name, func)], deadline, sender_id)[0]
+
+    def run_many(
+        self,
+        jobs: List[Tuple[str, Callable[[], Any]]],
+        deadline: Optional[Deadline] = None,
+        sender_id: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Executa várias funções de ferramentas concorrentemente.
+
+        Todas compartilham o prazo da rodada: o menor entre default_timeout
+        e o tempo restante da requisição.
+
+        Args:
+            jobs: Lista de tuplas (tool_name, func)
+            deadline: Prazo da requisição (opcional)
+            sender_id: Remetente da mensagem (opcional, ver ToolContext)
+
+        Returns:
+            list: Resultados na MESMA ordem dos jobs, no formato:
+                  {
+                      'status': 'success' | 'error' | 'timeout',
+                      'value': Any,            # retorno da função (sucesso)
+                      'error': Exception,      # exceção lançada (erro)
+                      'duration_ms': float
+                  }
+        """
+        if not jobs:
+            return []
+
+        timeout = self.default_timeout
+        if deadline is not None:
+            timeout = deadline.limit(timeout)
+        round_deadline = Deadline(timeout)
+
+        pool = self._get_pool()
+        start = time.perf_counter()
+        pending = []
+
+        for tool_name, func in jobs:
+            context = ToolContext(tool_name, round_deadline, CancellationToken(), sender_id)
+            future = pool.submit(self._run_job, context, func)
+            pending.append((context, future))
+
+        results = []
+
+        for context, future in pending:
+            try:
+                results.append(future.result(timeout=round_deadline.remaining()))
+
+            except FuturesTimeoutError:
+                # Não bloquear: sinalizar o cancelamento e seguir em frente
+                context.token.cancel()
+                future.cancel()
+
+                logger.error(
+                    f"Timeout: ferramenta '{context.tool_name}' excedeu o prazo de {timeout:.1f}s"
+                )
+                results.append({
+                    'status': STATUS_TIMEOUT,
+                    'value': None,
+                    'error': DeadlineExceededError(
+                        f"Ferramenta '{context.tool_name}' excedeu o prazo de {timeout:.1f}s"
+                    ),
+                    'duration_ms': (time.perf_counter() - start) * 1000
+                })
+
+        return results
+
+    def _run_job(self, context: ToolContext, func: Callable[[], Any]) -> Dict[str, Any]:
+        """
+        Executa uma função na thread do pool, com limite por ferramenta.
+
+        Args:
+            context: Contexto da execução
+            func: Função da ferramenta
+
+        Returns:
+            dict: Resultado da execução
+        """
+        semaphore = self._semaphores.get(context.tool_name)
+        acquired = False
+        start = time.perf_counter()
+        _local.context = context
+
+        try:
+            if semaphore:
+                acquired = semaphore.acquire(timeout=context.remaining())
+                if not acquired:
+                    raise DeadlineExceededError(
+                        f"Ferramenta '{context.tool_name}' aguardou vaga além do prazo"
+                    )
+
+            context.check()
+            value = func()
+            status, error = STATUS_SUCCESS, None
+
+        except DeadlineExceededError as e:
+            value, status, error = None, STATUS_TIMEOUT, e
+
+        except Exception as e:
+            value, status, error = None, STATUS_ERROR, e
+
+        finally:
+            if acquired:
+                semaphore.release()
+            _local.context = None
+
+        return {
+            'status': status,
+            'value': value,
+            'error': error,
+            'duration_ms': (time.perf_counter() - start) * 1000
+        }
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        """Retorna o pool de threads, criando-o no primeiro uso."""
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(
+                        max_workers=self.max_workers,
+                        thread_name_prefix='tool'
+                    )
+        return self._pool
@@ -0,0 +1,233 @@
+"""
+Controle do tamanho dos outputs das ferramentas enviados ao Assistant.
+
+Cada output vira tokens de entrada da próxima etapa do run: históricos
+longos deixam o run mais lento e caro e podem passar do limite de
+tamanho do output. Este módulo mantém os outputs dentro de um orçamento
+de bytes (TOOL_OUTPUT_MAX_BYTES):
+
+- JSON compacto (sem espaços) e listas de registros em colunas
+  ({'columns': [...], 'rows': [[...]]}, sem repetir as chaves);
+- paginação com cursores opacos, validados contra a consulta original;
+- corte das listas que ainda excederem o orçamento, com a flag
+  'truncated' para o Assistant saber que há mais dados (e pedir a
+  próxima página ou usar os agregados incluídos pela ferramenta).
+"""
+
+import base64
+import hashlib
+import json
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from config.settings import TOOL_OUTPUT_MAX_BYTES
+from utils.logger import setup_logger
+from utils.exceptions import ToolExecutionError
+
+# Logger específico deste módulo
+logger = setup_logger(__name__)
+
+
+def encode(value: Any) -> str:
+    """Serializa o valor em JSON compacto (UTF-8, sem espaços)."""
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+
+
+def encoded_size(value: Any) -> int:
+    """Tamanho do valor serializado, em bytes."""
+    return len(encode(value).encode('utf-8'))
+
+
+def to_columns(records: Sequence[Dict[str, Any]], columns: Sequence[str]) -> Dict[str, Any]:
+    """
+    Converte uma lista de registros para o formato em colunas.
+
+    Args:
+        records: Registros (dicts) com as chaves em columns
+        columns: Ordem das colunas
+
+    Returns:
+        dict: {'columns': [...], 'rows': [[...], ...]}
+    """
+    return {
+        'columns': list(columns),
+        'rows': [[record.get(column) for column in columns] for record in records]
+    }
+
+
+def query_fingerprint(*parts: Any) -> str:
+    """Identificador curto de uma consulta (para validar cursores)."""
+    digest = hashlib.sha1(encode(parts).encode('utf-8')).hexdigest()
+    return digest[:12]
+
+
+def encode_cursor(offset: int, fingerprint: str) -> str:
+    """Cria o cursor opaco da próxima página."""
+    raw = f"{offset}:{fingerprint}".encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: Optional[str], fingerprint: str) -> int:
+    """
+    Retorna a posição indicada pelo cursor (0 se não houver cursor).
+
+    Raises:
+        ToolExecutionError: Se o cursor for inválido ou de outra consulta
+    """
+    if not cursor:
+        return 0
+
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        offset, cursor_fingerprint = base64.urlsafe_b64decode(padded).decode('utf-8').split(':', 1)
+        offset = int(offset)
+    except (ValueError, UnicodeDecodeError):
+        raise ToolExecutionError("Cursor de paginação inválido")
+
+    if cursor_fingerprint != fingerprint or offset < 0:
+        raise ToolExecutionError(
+            "Cursor de paginação não corresponde a esta consulta; "
+            "refaça a consulta sem cursor"
+        )
+
+    return offset
+
+
+class OutputShaper:
+    """
+    Mantém os outputs das ferramentas dentro do orçamento de bytes.
+    """
+
+    def __init__(self, max_bytes: int = TOOL_OUTPUT_MAX_BYTES):
+        """
+        Args:
+            max_bytes: Tamanho máximo do output serializado (bytes)
+        """
+        self.max_bytes = max_bytes
+
+    def paginate(
+        self,
+        items: Sequence[Any],
+        build: Callable[[Sequence[Any]], Dict[str, Any]],
+        cursor: Optional[str],
+        fingerprint: str,
+        limit: int
+    ) -> Dict[str, Any]:
+        """
+        Monta uma página de itens que caiba no orçamento.
+
+        A página começa na posição do cursor e tem até 'limit' itens;
+        se o output ainda exceder o orçamento, a página é reduzida à
+        metade até caber (no mínimo um item).
+
+        Args:
+            items: Todos os itens da consulta
+            build: Monta o output a partir dos itens da página
+            cursor: Cursor recebido do Assistant (None na primeira página)
+            fingerprint: Identificador da consulta (ver query_fingerprint)
+            limit: Máximo de itens por página
+
+        Returns:
+            dict: Output de build() com 'next_cursor' e 'truncated'
+
+        Raises:
+            ToolExecutionError: Se o cursor for inválido
+        """
+        offset = decode_cursor(cursor, fingerprint)
+        page = items[offset:offset + max(limit, 1)]
+
+        while True:
+            end = offset + len(page)
+            has_more = end < len(items)
+
+            output = build(page)
+            output['next_cursor'] = encode_cursor(end, fingerprint) if has_more else None
+            output['truncated'] = has_more
+
+            if len(page) <= 1 or encoded_size(output) <= self.max_bytes:
+                return output
+
+            page = page[:len(page) // 2]
+
+    def shape(self, tool_name: str, value: Any) -> str:
+        """
+        Serializa o resultado de uma ferramenta respeitando o orçamento.
+
+        Resultados dentro do orçamento só são compactados. Acima dele, a
+        maior lista do resultado é cortada até caber, com 'truncated' e
+        a quantidade de itens omitidos.
+
+        Args:
+            tool_name: Nome da ferramenta (para log)
+            value: Resultado da ferramenta
+
+        Returns:
+            str: Output em JSON compacto
+        """
+        text = encode(value)
+        size = len(text.encode('utf-8'))
+
+        if size <= self.max_bytes or not isinstance(value, dict):
+            return text
+
+        path, items = self._largest_list(value)
+        if items is None:
+            logger.warning(
+                f"Output de {tool_name} com {size} bytes excede o orçamento "
+                f"({self.max_bytes}) e não tem lista para cortar"
+            )
+            return text
+
+        shaped, kept = self._fit(value, path, items)
+
+        logger.info(
+            f"Output de {tool_name} reduzido de {size} para "
+            f"{encoded_size(shaped)} bytes ({kept} de {len(items)} itens)"
+        )
+        return encode(shaped)
+
+    def _fit(self, value: Dict[str, Any], path: Tuple[str, ...], items: List[Any]) -> Tuple[Dict[str, Any], int]:
+        """Corta a lista em 'path' (busca binária) até o resultado caber."""
+        low, high = 0, len(items)
+        best = self._with_items(value, path, items, 0)
+
+        while low < high:
+            middle = (low + high + 1) // 2
+            candidate = self._with_items(value, path, items, middle)
+            if encoded_size(candidate) <= self.max_bytes:
+                best, low = candidate, middle
+            else:
+                high = middle - 1
+
+        return best, low
+
+    @staticmethod
+    def _with_items(value: Dict[str, Any], path: Tuple[str, ...], items: List[Any], count: int) -> Dict[str, Any]:
+        """Cópia do resultado com apenas os primeiros 'count' itens da lista."""
+        shaped = dict(value)
+        shaped['truncated'] = True
+        shaped['omitted'] = len(items) - count
+
+        target = shaped
+        for key in path[:-1]:
+            target[key] = dict(target[key])
+            target = target[key]
+        target[path[-1]] = items[:count]
+
+        return shaped
+
+    @staticmethod
+    def _largest_list(value: Dict[str, Any]) -> Tuple[Tuple[str, ...], Optional[List[Any]]]:
+        """Localiza a maior lista do resultado (no primeiro ou segundo nível)."""
+        best_path: Tuple[str, ...] = ()
+        best: Optional[List[Any]] = None
+
+        candidates = [((key,), item) for key, item in value.items()]
+        for key, item in value.items():
+            if isinstance(item, dict):
+                candidates.extend(((key, inner), nested) for inner, nested in item.items())
+
+        for path, item in candidates:
+            if isinstance(item, list) and (best is None or len(item) > len(best)):
+                best_path, best = path, item
+
+        return best_path, best
@@ -7,26 +7,28 @@ e executando-os de forma segura.
 """
 
 import json
-import signal
-from typing import Dict, Any, Callable
+from typing import Dict, Any, Callable, List, Optional
 
+from config.settings import TOOL_OUTPUT_PAGE_SIZE
 from services.excel_service import excel_service
-from config.settings import TOOL_EXECUTION_TIMEOUT_SECONDS
+from services.expense_filters import parse_amount
+from services.expense_store import expense_store
+from tools.execution_engine import (
+    ToolExecutionEngine,
+    STATUS_SUCCESS,
+    STATUS_TIMEOUT
+)
+from tools.output_shaper import OutputShaper, query_fingerprint, to_columns
+from utils.deadline import Deadline
 from utils.logger import setup_logger
 from utils.exceptions import ToolExecutionError
+from utils.service_registry import registry
 
 # Logger específico deste módulo
 logger = setup_logger(__name__)
 
-
-class TimeoutException(Exception):
-    """Exceção lançada quando uma ferramenta excede o timeout."""
-    pass
-
-
-def timeout_handler(signum, frame):
-    """Handler para timeout de execução de ferramentas."""
-    raise TimeoutException("Execução da ferramenta excedeu o timeout")
+# Colunas das despesas nos outputs (formato em colunas, ver output_shaper)
+EXPENSE_COLUMNS = ('date', 'description', 'category', 'amount')
 
 
 class ToolExecutor:
@@ -34,7 +36,9 @@ class ToolExecutor:
     Executor responsável por mapear e executar ferramentas do Assistant.
     
     Registra ferramentas disponíveis e fornece execução segura
-    com timeout e validação de argumentos.
+    com prazo e validação de argumentos. As ferramentas rodam em
+    threads (ToolExecutionEngine), e tool calls independentes de uma
+    mesma rodada são executadas em paralelo.
     """
     
     def __init__(self):
@@ -42,9 +46,21 @@ class ToolExecutor:
         # Mapeamento de nomes de ferramentas para funções Python
         self.tools: Dict[str, Callable] = {
             'add_expense': self._add_expense,
-            'get_expense_history': self._get_expense_history
+            'bulk_add_expenses': self._bulk_add_expenses,
+            'get_expense_history': self._get_expense_history,
+            'get_expense_summary': self._get_expense_summary,
+            'analyze_expenses': self._analyze_expenses,
+            'top_expenses': self._top_expenses,
+            'expense_running_total': self._expense_running_total,
+            'compare_expense_periods': self._compare_expense_periods
         }
         
+        # Motor de execução em threads (prazo e limites de concorrência)
+        self.engine = ToolExecutionEngine()
+        
+        # Mantém os outputs dentro do orçamento de tamanho (TOOL_OUTPUT_MAX_BYTES)
+        self.shaper = OutputShaper()
+        
         logger.info(
             f"ToolExecutor inicializado com {len(self.tools)} ferramentas: "
             f"{list(self.tools.keys())}"
@@ -53,14 +69,21 @@ class ToolExecutor:
     def execute_tool(
         self,
         tool_name: str,
-        arguments: Dict[str, Any]
+        arguments: Dict[str, Any],
+        deadline: Optional[Deadline] = None,
+        sender_id: Optional[str] = None
     ) -> str:
         """
         Executa uma ferramenta com os argumentos fornecidos.
         
+        Se a ferramenta exceder o prazo, retorna um resultado de timeout
+        estruturado (ver _timeout_output) em vez de lançar exceção.
+        
         Args:
             tool_name: Nome da ferramenta a executar
             arguments: Argumentos da ferramenta (como dict)
+            deadline: Prazo da requisição (opcional)
+            sender_id: Remetente da mensagem (opcional, dono das despesas no ledger)
         
         Returns:
             str: Resultado da execução (como JSON string)
@@ -72,53 +95,188 @@ class ToolExecutor:
             f"Executando ferramenta: {tool_name} com argumentos: {arguments}"
         )
         
-        # Verificar se a ferramenta existe
-        if tool_name not in self.tools:
-            error_msg = (
-                f"Ferramenta '{tool_name}' não encontrada. "
-                f"Ferramentas disponíveis: {list(self.tools.keys())}"
-            )
-            logger.error(error_msg)
-            raise ToolExecutionError(error_msg)
+        self._validate_tool(tool_name)
         
-        try:
-            # Configurar timeout para execução
-            # NOTA: signal.alarm() funciona apenas em sistemas Unix
-            # Para Windows ou Lambda, considere usar threading.Timer
-            if hasattr(signal, 'SIGALRM'):
-                signal.signal(signal.SIGALRM, timeout_handler)
-                signal.alarm(TOOL_EXECUTION_TIMEOUT_SECONDS)
-            
-            # Executar ferramenta
-            tool_function = self.tools[tool_name]
-            result = tool_function(arguments)
-            
-            # Cancelar alarme
-            if hasattr(signal, 'SIGALRM'):
-                signal.alarm(0)
-            
-            # Converter resultado para JSON
-            result_json = json.dumps(result, ensure_ascii=False)
+        result = self.engine.run(
+            tool_name,
+            self._bind(tool_name, arguments),
+            deadline,
+            sender_id
+        )
+        return self._unwrap(tool_name, result)
+    
+    def execute_tools(
+        self,
+        tool_calls: List[Dict[str, Any]],
+        deadline: Optional[Deadline] = None,
+        sender_id: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Executa várias tool calls de uma mesma rodada em paralelo.
+        
+        As execuções usam o pool de threads do ToolExecutionEngine
+        (TOOL_MAX_CONCURRENCY) e respeitam os limites por ferramenta
+        (TOOL_CONCURRENCY_LIMITS). Erros e timeouts não interrompem as
+        demais chamadas: viram outputs para o Assistant poder lidar.
+        
+        Args:
+            tool_calls: Lista de chamadas no formato:
+                        [
+                            {
+                                'tool_call_id': str,
+                                'tool_name': str,
+                                'arguments': dict
+                            },
+                            ...
+                        ]
+            deadline: Prazo da requisição (opcional)
+            sender_id: Remetente da mensagem (opcional, dono das despesas no ledger)
+        
+        Returns:
+            list: Resultados na MESMA ordem das chamadas, no formato:
+                  [
+                      {
+                          'tool_call_id': str,
+                          'output': str,
+                          'success': bool,
+                          'duration_ms': float
+                      },
+                      ...
+                  ]
+        """
+        if not tool_calls:
+            return []
+        
+        jobs = []
+        for call in tool_calls:
+            tool_name = call['tool_name']
+            if tool_name in self.tools:
+                jobs.append((tool_name, self._bind(tool_name, call['arguments'])))
+            else:
+                jobs.append((tool_name, lambda name=tool_name: self._validate_tool(name)))
+        
+        results = []
+        for call, result in zip(tool_calls, self.engine.run_many(jobs, deadline, sender_id)):
+            try:
+                output = self._unwrap(call['tool_name'], result)
+                success = result['status'] == STATUS_SUCCESS
+                
+            except ToolExecutionError as e:
+                output = self._error_output(str(e))
+                success = False
             
             logger.info(
-                f"Ferramenta {tool_name} executada com sucesso. "
-                f"Resultado: {result_json[:200]}..."  # Log parcial
+                f"Tool {call['tool_name']} ({call['tool_call_id']}) "
+                f"levou {result['duration_ms']:.0f}ms"
             )
-            
-            return result_json
-            
-        except TimeoutException:
+            results.append({
+                'tool_call_id': call['tool_call_id'],
+                'output': output,
+                'success': success,
+                'duration_ms': result['duration_ms']
+            })
+        
+        if len(results) > 1:
+            total_ms = sum(result['duration_ms'] for result in results)
+            slowest_ms = max(result['duration_ms'] for result in results)
+            logger.info(
+                f"{len(results)} tool calls executadas em paralelo. "
+                f"Mais lenta: {slowest_ms:.0f}ms (soma sequencial: {total_ms:.0f}ms)"
+            )
+        
+        return results
+    
+    def _validate_tool(self, tool_name: str) -> None:
+        """
+        Verifica se a ferramenta existe.
+        
+        Raises:
+            ToolExecutionError: Se a ferramenta não estiver registrada
+        """
+        if tool_name not in self.tools:
             error_msg = (
-                f"Timeout: Ferramenta '{tool_name}' excedeu "
-                f"{TOOL_EXECUTION_TIMEOUT_SECONDS}s"
+                f"Ferramenta '{tool_name}' não encontrada. "
+                f"Ferramentas disponíveis: {list(self.tools.keys())}"
             )
             logger.error(error_msg)
             raise ToolExecutionError(error_msg)
+    
+    def _expense_store(self):
+        """
+        Armazenamento das despesas configurado (ver services.expense_store).
+        
+        Returns:
+            excel_service, expense_ledger ou write_behind_excel (mesma
+            interface: add_expenses, get_expense_history...)
+        """
+        return expense_store(excel_service)
+    
+    def _bind(self, tool_name: str, arguments: Dict[str, Any]) -> Callable[[], Any]:
+        """Cria a função sem argumentos executada pelo motor."""
+        tool_function = self.tools[tool_name]
+        return lambda: tool_function(arguments)
+    
+    def _unwrap(self, tool_name: str, result: Dict[str, Any]) -> str:
+        """
+        Converte o resultado do motor em output (JSON string) para o Assistant.
+        
+        Args:
+            tool_name: Nome da ferramenta executada
+            result: Resultado retornado pelo ToolExecutionEngine
+        
+        Returns:
+            str: Output da ferramenta (resultado ou timeout estruturado)
+        
+        Raises:
+            ToolExecutionError: Se a ferramenta falhou
+        """
+        if result['status'] == STATUS_TIMEOUT:
+            logger.error(f"Ferramenta '{tool_name}' excedeu o prazo: {result['error']}")
+            return self._timeout_output(tool_name, str(result['error']))
+        
+        if result['status'] != STATUS_SUCCESS:
+            error = result['error']
+            if isinstance(error, ToolExecutionError):
+                raise error
             
-        except Exception as e:
-            error_msg = f"Erro ao executar ferramenta '{tool_name}': {str(e)}"
+            error_msg = f"Erro ao executar ferramenta '{tool_name}': {str(error)}"
             logger.error(error_msg)
-            raise ToolExecutionError(error_msg) from e
+            raise ToolExecutionError(error_msg) from error
+        
+        # Converter resultado para JSON compacto, dentro do orçamento de tamanho
+        result_json = self.shaper.shape(tool_name, result['value'])
+        
+        logger.info(
+            f"Ferramenta {tool_name} executada com sucesso. "
+            f"Resultado: {result_json[:200]}..."  # Log parcial
+        )
+        
+        return result_json
+    
+    def _error_output(self, message: str) -> str:
+        """Formata um erro de execução como output para o Assistant."""
+        return json.dumps(
+            {'error': 'Erro na execução', 'message': message},
+            ensure_ascii=False
+        )
+    
+    def _timeout_output(self, tool_name: str, message: str) -> str:
+        """
+        Formata um timeout como output para o Assistant.
+        
+        O Assistant recebe a indicação explícita de que a operação não
+        terminou a tempo (e pode não ter sido concluída), para informar
+        o usuário em vez de assumir sucesso ou falha.
+        """
+        return json.dumps(
+            {
+                'error': 'Tempo esgotado',
+                'timed_out': True,
+                'tool': tool_name,
+                'message': message
+            },
+            ensure_ascii=False
+        )
     
     def _add_expense(self, arguments: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -156,7 +314,7 @@ class ToolExecutor:
             'date': arguments['date'],
             'description': arguments['description'],
             'category': arguments['category'],
-            'amount': float(arguments['amount'])
+            'amount': self._amount(arguments['amount'])
         }
         
         logger.debug(
@@ -164,12 +322,15 @@ class ToolExecutor:
             f"R$ {expense_data['amount']}"
         )
         
-        # Chamar serviço Excel
-        result = excel_service.add_expense(
-            workbook_id=workbook_id,
-            worksheet_name=worksheet_name,
-            expense_data=expense_data
-        )
+        # Gravar no Excel (ou no ledger, ver _expense_store)
+        try:
+            self._expense_store().add_expense(
+                workbook_id=workbook_id,
+                worksheet_name=worksheet_name,
+                expense_data=expense_data
+            )
+        except ValueError as e:
+            raise ToolExecutionError(f"Despesa inválida: {str(e)}") from e
         
         return {
             'success': True,
@@ -177,6 +338,90 @@ class ToolExecutor:
             'data': expense_data
         }
     
+    @staticmethod
+    def _amount(value: Any, index: Optional[int] = None) -> float:
+        """
+        Converte o valor de uma despesa (aceita 'R$ 12,50').
+        
+        Raises:
+            ToolExecutionError: Se o valor não for numérico
+        """
+        amount = parse_amount(value)
+        if amount is None:
+            where = f" na despesa {index + 1}" if index is not None else ""
+            raise ToolExecutionError(f"Campo 'amount' inválido{where}: {value!r}")
+        return amount
+    
+    def _bulk_add_expenses(self, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Ferramenta para adicionar várias despesas ao Excel de uma vez.
+        
+        Todas as despesas são gravadas em uma única escrita no Excel
+        (ex: várias despesas ditadas em uma mesma mensagem de áudio).
+        
+        Args:
+            arguments: Dict contendo:
+                - workbook_id: ID do workbook
+                - worksheet_name: Nome da planilha
+                - expenses: Lista de despesas, cada uma com
+                  date, description, category e amount
+                - table_name: (opcional) Nome da tabela do Excel
+        
+        Returns:
+            dict: Resultado da operação
+        """
+        # Validar argumentos obrigatórios
+        required_fields = ['workbook_id', 'worksheet_name', 'expenses']
+        
+        for field in required_fields:
+            if field not in arguments:
+                raise ToolExecutionError(
+                    f"Campo obrigatório '{field}' ausente nos argumentos"
+                )
+        
+        items = arguments['expenses']
+        if not isinstance(items, list) or not items:
+            raise ToolExecutionError(
+                "Campo 'expenses' deve ser uma lista com ao menos uma despesa"
+            )
+        
+        expense_fields = ['date', 'description', 'category', 'amount']
+        expenses = []
+        
+        for index, item in enumerate(items):
+            for field in expense_fields:
+                if not isinstance(item, dict) or field not in item:
+                    raise ToolExecutionError(
+                        f"Campo obrigatório '{field}' ausente na despesa {index + 1}"
+                    )
+            
+            expenses.append({
+                'date': item['date'],
+                'description': item['description'],
+                'category': item['category'],
+                'amount': self._amount(item['amount'], index)
+            })
+        
+        logger.debug(f"Adicionando {len(expenses)} despesas em lote")
+        
+        # Uma única escrita para todas as despesas (Excel ou ledger)
+        try:
+            self._expense_store().add_expenses(
+                workbook_id=arguments['workbook_id'],
+                worksheet_name=arguments['worksheet_name'],
+                expenses=expenses,
+                table_name=arguments.get('table_name')
+            )
+        except ValueError as e:
+            raise ToolExecutionError(f"Despesa inválida: {str(e)}") from e
+        
+        return {
+            'success': True,
+            'message': f'{len(expenses)} despesas adicionadas com sucesso',
+            'count': len(expenses),
+            'total': round(sum(expense['amount'] for expense in expenses), 2)
+        }
+    
     def _get_expense_history(self, arguments: Dict[str, Any]) -> Dict[str, Any]:
         """
         Ferramenta para recuperar histórico de despesas do Excel.
@@ -185,10 +430,16 @@ class ToolExecutor:
             arguments: Dict contendo:
                 - workbook_id: ID do workbook
                 - worksheet_name: Nome da planilha
-                - filters: (opcional) Filtros a aplicar
+                - filters: (opcional) Filtros a aplicar (período, valores,
+                  categorias, trecho da descrição, ordenação e limite; ver
+                  services/expense_filters.py)
+                - limit: (opcional) Máximo de despesas na página
+                - cursor: (opcional) next_cursor da página anterior
         
         Returns:
-            dict: Lista de despesas
+            dict: Página de despesas em colunas ('columns'/'rows'), com
+                  'next_cursor' e 'truncated'; se houver mais páginas,
+                  inclui os agregados de todas as despesas em 'summary'
         """
         # Validar argumentos obrigatórios
         required_fields = ['workbook_id', 'worksheet_name']
@@ -204,24 +455,265 @@ class ToolExecutor:
         worksheet_name = arguments['worksheet_name']
         filters = arguments.get('filters')
         
+        try:
+            limit = int(arguments.get('limit') or TOOL_OUTPUT_PAGE_SIZE)
+        except (TypeError, ValueError):
+            raise ToolExecutionError("Campo 'limit' deve ser um número inteiro")
+        
         logger.debug(
             f"Recuperando histórico de despesas com filtros: {filters}"
         )
         
-        # Chamar serviço Excel
-        expenses = excel_service.get_expense_history(
-            workbook_id=workbook_id,
-            worksheet_name=worksheet_name,
-            filters=filters
+        try:
+            expenses = self._expense_store().get_expense_history(
+                workbook_id=workbook_id,
+                worksheet_name=worksheet_name,
+                filters=filters
+            )
+        except ValueError as e:
+            raise ToolExecutionError(f"Filtro inválido: {str(e)}") from e
+        
+        summary = None
+        
+        def build(page: List[Dict[str, Any]]) -> Dict[str, Any]:
+            nonlocal summary
+            
+            output = {
+                'success': True,
+                'count': len(expenses),
+                'returned': len(page),
+                **to_columns(page, EXPENSE_COLUMNS)
+            }
+            
+            # Página parcial: agregados de todas as despesas, para o Assistant
+            # responder sem precisar buscar as demais páginas
+            if len(page) < len(expenses):
+                if summary is None:
+                    summary = self._summarize_expenses(expenses)
+                output['summary'] = summary
+            
+            return output
+        
+        return self.shaper.paginate(
+            expenses,
+            build,
+            arguments.get('cursor'),
+            query_fingerprint(workbook_id, worksheet_name, filters),
+            limit
         )
+    
+    def _summarize_expenses(self, expenses: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Calcula os agregados de uma lista de despesas (total e por categoria).
+        
+        Valores que não são números são ignorados nos totais.
+        """
+        totals: Dict[str, float] = {}
+        counts: Dict[str, int] = {}
+        
+        for expense in expenses:
+            category = expense.get('category') or 'Sem categoria'
+            counts[category] = counts.get(category, 0) + 1
+            
+            amount = parse_amount(expense.get('amount'))
+            totals[category] = totals.get(category, 0.0) + (amount or 0.0)
+        
+        categories = sorted(totals, key=totals.get, reverse=True)
         
         return {
-            'success': True,
+            'total': round(sum(totals.values()), 2),
             'count': len(expenses),
-            'expenses': expenses
+            'categories': [
+                {
+                    'category': category,
+                    'total': round(totals[category], 2),
+                    'count': counts[category]
+                }
+                for category in categories
+            ]
+        }
+    
+    def _get_expense_summary(self, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Ferramenta para obter totais de despesas calculados no Excel.
+        
+        Prefira esta ferramenta a get_expense_history para perguntas
+        como "quanto gastei em alimentação este mês": apenas os
+        agregados são retornados, qualquer que seja o tamanho da planilha.
+        
+        Args:
+            arguments: Dict contendo:
+                - workbook_id: ID do workbook
+                - worksheet_name: Nome da planilha
+                - start_date: (opcional) Data inicial YYYY-MM-DD
+                - end_date: (opcional) Data final YYYY-MM-DD
+                - categories: (opcional) Categorias com total próprio
+        
+        Returns:
+            dict: Totais gerais e por categoria
+        """
+        # Validar argumentos obrigatórios
+        required_fields = ['workbook_id', 'worksheet_name']
+        
+        for field in required_fields:
+            if field not in arguments:
+                raise ToolExecutionError(
+                    f"Campo obrigatório '{field}' ausente nos argumentos"
+                )
+        
+        categories = arguments.get('categories')
+        if isinstance(categories, str):
+            categories = [categories]
+        
+        try:
+            summary = self._expense_store().get_expense_summary(
+                workbook_id=arguments['workbook_id'],
+                worksheet_name=arguments['worksheet_name'],
+                start_date=arguments.get('start_date'),
+                end_date=arguments.get('end_date'),
+                categories=categories
+            )
+        except ValueError as e:
+            raise ToolExecutionError(f"Data inválida (use YYYY-MM-DD): {str(e)}") from e
+        
+        return {
+            'success': True,
+            **summary
+        }
+    
+    def _run_analytics(
+        self,
+        arguments: Dict[str, Any],
+        operation: str,
+        extra_required: Optional[List[str]] = None,
+        **kwargs: Any
+    ) -> Dict[str, Any]:
+        """
+        Valida os argumentos comuns e executa uma análise do expense_analytics.
+        
+        Args:
+            arguments: Argumentos da tool call (workbook_id, worksheet_name,
+                       start_date, end_date e categories opcionais)
+            operation: Método do ExpenseAnalyticsService a chamar
+            extra_required: Campos obrigatórios além de workbook/planilha
+            **kwargs: Argumentos específicos da operação
+        
+        Returns:
+            dict: Resultado da análise
+        """
+        # Import adiado: NumPy só é carregado quando uma análise é pedida
+        from services.expense_analytics import expense_analytics
+        
+        required_fields = ['workbook_id', 'worksheet_name'] + (extra_required or [])
+        
+        for field in required_fields:
+            if field not in arguments:
+                raise ToolExecutionError(
+                    f"Campo obrigatório '{field}' ausente nos argumentos"
+                )
+        
+        categories = arguments.get('categories')
+        if isinstance(categories, str):
+            categories = [categories]
+        
+        try:
+            result = getattr(expense_analytics, operation)(
+                workbook_id=arguments['workbook_id'],
+                worksheet_name=arguments['worksheet_name'],
+                categories=categories,
+                **kwargs
+            )
+        except ValueError as e:
+            raise ToolExecutionError(f"Argumento inválido: {str(e)}") from e
+        
+        return {
+            'success': True,
+            **result
         }
+    
+    def _analyze_expenses(self, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Ferramenta para totais agrupados por categoria, mês ou semana.
+        
+        Args:
+            arguments: Dict contendo workbook_id, worksheet_name, group_by
+                       ('category', 'month' ou 'week') e, opcionalmente,
+                       start_date, end_date e categories
+        
+        Returns:
+            dict: Totais por grupo
+        """
+        return self._run_analytics(
+            arguments,
+            'group_by',
+            by=arguments.get('group_by', 'category'),
+            start_date=arguments.get('start_date'),
+            end_date=arguments.get('end_date')
+        )
+    
+    def _top_expenses(self, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Ferramenta para as maiores despesas (ou maiores categorias/meses).
+        
+        Args:
+            arguments: Dict contendo workbook_id, worksheet_name e,
+                       opcionalmente, limit, group_by, start_date,
+                       end_date e categories
+        
+        Returns:
+            dict: Maiores despesas ou grupos
+        """
+        return self._run_analytics(
+            arguments,
+            'top',
+            limit=arguments.get('limit', 5),
+            by=arguments.get('group_by'),
+            start_date=arguments.get('start_date'),
+            end_date=arguments.get('end_date')
+        )
+    
+    def _expense_running_total(self, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Ferramenta para o total acumulado ao longo do tempo.
+        
+        Args:
+            arguments: Dict contendo workbook_id, worksheet_name e,
+                       opcionalmente, period ('day', 'week' ou 'month'),
+                       start_date, end_date e categories
+        
+        Returns:
+            dict: Totais por período e acumulados
+        """
+        return self._run_analytics(
+            arguments,
+            'running_total',
+            period=arguments.get('period', 'day'),
+            start_date=arguments.get('start_date'),
+            end_date=arguments.get('end_date')
+        )
+    
+    def _compare_expense_periods(self, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Ferramenta para comparar os gastos de dois períodos.
+        
+        Args:
+            arguments: Dict contendo workbook_id, worksheet_name,
+                       current_start, current_end, previous_start,
+                       previous_end e, opcionalmente, categories
+        
+        Returns:
+            dict: Totais dos dois períodos e diferenças por categoria
+        """
+        period_fields = ['current_start', 'current_end', 'previous_start', 'previous_end']
+        
+        return self._run_analytics(
+            arguments,
+            'compare_periods',
+            extra_required=period_fields,
+            **{field: arguments.get(field) for field in period_fields}
+        )
 
 
-# Instância global do executor (singleton pattern)
-tool_executor = ToolExecutor()
+# Instância global do executor (singleton pattern, criada no primeiro uso)
+tool_executor = registry.register("tool_executor", ToolExecutor)
 
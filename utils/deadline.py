@@ -0,0 +1,94 @@
+"""
+Prazo (deadline) de execução de uma requisição.
+
+Este módulo representa o tempo restante de uma invocação do Lambda,
+permitindo que cada etapa do processamento use apenas a sua parte do
+orçamento em vez de timeouts fixos que somados excedem o limite da função.
+"""
+
+import time
+from typing import Any, Optional
+
+from utils.exceptions import DeadlineExceededError
+
+
+class Deadline:
+    """
+    Prazo absoluto de uma requisição, baseado em relógio monotônico.
+
+    Pode ser criado a partir do contexto do Lambda
+    (context.get_remaining_time_in_millis()) ou de um timeout fixo.
+    """
+
+    def __init__(self, timeout_seconds: float):
+        """
+        Cria um prazo que expira após timeout_seconds.
+
+        Args:
+            timeout_seconds: Tempo disponível a partir de agora (segundos)
+        """
+        self._expires_at = time.monotonic() + max(0.0, timeout_seconds)
+
+    @classmethod
+    def from_lambda_context(
+        cls,
+        context: Any,
+        reserve_seconds: float = 0.0,
+        default_seconds: float = 60.0
+    ) -> "Deadline":
+        """
+        Cria o prazo a partir do tempo restante da invocação do Lambda.
+
+        Args:
+            context: Contexto do Lambda (pode não ter o método, ex: testes locais)
+            reserve_seconds: Tempo reservado ao final (ex: para enviar a resposta)
+            default_seconds: Tempo usado quando o contexto não informa o restante
+
+        Returns:
+            Deadline: Prazo da requisição
+        """
+        get_remaining = getattr(context, "get_remaining_time_in_millis", None)
+
+        if callable(get_remaining):
+            available = get_remaining() / 1000.0
+        else:
+            available = default_seconds
+
+        return cls(available - reserve_seconds)
+
+    def remaining(self) -> float:
+        """Retorna o tempo restante em segundos (nunca negativo)."""
+        return max(0.0, self._expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        """Indica se o prazo já expirou."""
+        return self.remaining() <= 0
+
+    def limit(self, seconds: float) -> float:
+        """
+        Limita um timeout ao tempo restante do prazo.
+
+        Args:
+            seconds: Timeout desejado pela etapa
+
+        Returns:
+            float: O menor entre o timeout desejado e o tempo restante
+        """
+        return min(seconds, self.remaining())
+
+    def check(self, stage: Optional[str] = None) -> None:
+        """
+        Lança DeadlineExceededError se o prazo já expirou.
+
+        Args:
+            stage: Nome da etapa (usado na mensagem de erro)
+
+        Raises:
+            DeadlineExceededError: Se o prazo expirou
+        """
+        if self.expired():
+            where = f" em '{stage}'" if stage else ""
+            raise DeadlineExceededError(f"Prazo da requisição esgotado{where}")
+
+    def __repr__(self) -> str:
+        return f"<Deadline restante={self.remaining():.2f}s>"
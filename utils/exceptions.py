@@ -6,13 +6,34 @@ e operação, facilitando o tratamento de erros e debugging.
 """
 
 
+from typing import Optional
+
+
 class FinancialAssistantError(Exception):
     """
     Exceção base para todos os erros da aplicação.
     
     Todas as exceções customizadas devem herdar desta classe.
+    
+    Attributes:
+        retryable: Se a operação pode ser repetida (erro transitório,
+                   ex: 429/5xx) ou não (erro fatal, ex: 400/401)
+        retry_after: Espera sugerida pelo servidor antes de repetir
+                     (header Retry-After, em segundos), se houver
+        status_code: Status HTTP da resposta de erro, se houver
     """
-    pass
+    
+    def __init__(
+        self,
+        message: str = "",
+        retryable: bool = False,
+        retry_after: Optional[float] = None,
+        status_code: Optional[int] = None
+    ):
+        super().__init__(message)
+        self.retryable = retryable
+        self.retry_after = retry_after
+        self.status_code = status_code
 
 
 class OpenAIAPIError(FinancialAssistantError):
@@ -90,3 +111,48 @@ class ConfigurationError(FinancialAssistantError):
     """
     pass
 
+
+class QueueError(FinancialAssistantError):
+    """
+    Erro ao interagir com a fila de mensagens.
+    
+    Exemplos:
+    - Falha ao enfileirar mensagem no SQS
+    - Falha ao ler ou persistir a fila local
+    - Mensagem enfileirada inválida
+    """
+    pass
+
+
+class DeadlineExceededError(FinancialAssistantError):
+    """
+    Erro quando o prazo da requisição se esgota.
+    
+    Exemplos:
+    - Tempo restante do Lambda insuficiente para uma etapa
+    - Ferramenta cancelada por exceder o prazo
+    """
+    pass
+
+
+class TransientError(FinancialAssistantError):
+    """
+    Erro transitório: a mesma operação pode ter sucesso se repetida.
+    
+    Exemplos:
+    - Limite de requisições (HTTP 429)
+    - Indisponibilidade momentânea (HTTP 502/503/504)
+    """
+    
+    def __init__(self, message: str = "", retry_after: Optional[float] = None):
+        super().__init__(message, retryable=True, retry_after=retry_after)
+
+
+class CircuitOpenError(FinancialAssistantError):
+    """
+    Erro quando o circuit breaker de uma dependência está aberto.
+    
+    A chamada falha imediatamente, sem acessar a dependência, até
+    que o período de espera do circuito termine.
+    """
+    pass
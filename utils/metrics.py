@@ -0,0 +1,54 @@
+"""
+Métricas da aplicação no CloudWatch.
+
+Usa o Embedded Metric Format (EMF): cada métrica é uma linha JSON
+escrita no stdout do Lambda, que o CloudWatch Logs converte em métrica
+sem chamadas de API nem dependências extras. Fora do Lambda, as
+métricas vão apenas para o log (DEBUG).
+"""
+
+import json
+import os
+import sys
+import time
+from typing import Any
+
+from utils.logger import setup_logger
+
+# Logger específico deste módulo
+logger = setup_logger(__name__)
+
+# Namespace das métricas no CloudWatch
+METRICS_NAMESPACE = "FinancialAssistant"
+
+
+def put_metric(name: str, value: float, unit: str = "Count", **dimensions: Any) -> None:
+    """
+    Publica uma métrica.
+
+    Args:
+        name: Nome da métrica (ex: 'ExpenseJournalLagSeconds')
+        value: Valor
+        unit: Unidade do CloudWatch ('Count', 'Seconds', 'Milliseconds'...)
+        **dimensions: Dimensões da métrica (ex: Workbook='abc')
+    """
+    if not os.getenv("AWS_LAMBDA_FUNCTION_NAME"):
+        logger.debug(f"Métrica {name}={value} {unit} {dimensions}")
+        return
+
+    document = {
+        "_aws": {
+            "Timestamp": int(time.time() * 1000),
+            "CloudWatchMetrics": [{
+                "Namespace": METRICS_NAMESPACE,
+                "Dimensions": [list(dimensions)],
+                "Metrics": [{"Name": name, "Unit": unit}],
+            }],
+        },
+        name: value,
+        **{key: str(item) for key, item in dimensions.items()},
+    }
+
+    # Linha JSON pura (sem o prefixo do logger), exigida pelo EMF
+    sys.stdout.write(json.dumps(document) + "\n")
+    sys.stdout.flush()
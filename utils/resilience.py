@@ -0,0 +1,293 @@
+"""
+Políticas de resiliência para chamadas a serviços externos.
+
+Este módulo fornece retry com backoff exponencial (com jitter e
+respeitando o header Retry-After), limitado pelo prazo da requisição,
+e circuit breakers por dependência, que falham imediatamente enquanto
+uma dependência degradada estiver "aberta".
+
+A classificação entre erro transitório e fatal é feita pelos serviços,
+através do atributo 'retryable' das exceções da aplicação.
+"""
+
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Dict, Optional
+
+from config.settings import (
+    RETRY_MAX_ATTEMPTS,
+    RETRY_BASE_DELAY_SECONDS,
+    RETRY_MAX_DELAY_SECONDS,
+    CIRCUIT_BREAKER_FAILURE_THRESHOLD,
+    CIRCUIT_BREAKER_RESET_SECONDS
+)
+from utils.deadline import Deadline
+from utils.logger import setup_logger
+from utils.exceptions import FinancialAssistantError, CircuitOpenError
+
+# Logger específico deste módulo
+logger = setup_logger(__name__)
+
+# Status HTTP considerados transitórios
+RETRYABLE_STATUS_CODES = frozenset({408, 429, 500, 502, 503, 504})
+
+# Estados do circuit breaker
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Converte o header Retry-After em segundos.
+
+    Args:
+        value: Valor do header (segundos ou data HTTP)
+
+    Returns:
+        float ou None se o header estiver ausente ou inválido
+    """
+    if not value:
+        return None
+
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryPolicy:
+    """
+    Política de retry com backoff exponencial e jitter completo.
+
+    A espera da tentativa N é sorteada entre 0 e
+    min(max_delay, base_delay * 2^(N-1)), evitando que várias
+    invocações repitam as chamadas ao mesmo tempo.
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = RETRY_MAX_ATTEMPTS,
+        base_delay: float = RETRY_BASE_DELAY_SECONDS,
+        max_delay: float = RETRY_MAX_DELAY_SECONDS
+    ):
+        """
+        Args:
+            max_attempts: Número máximo de tentativas (incluindo a primeira)
+            base_delay: Espera base do backoff (segundos)
+            max_delay: Espera máxima entre tentativas (segundos)
+        """
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def backoff(self, attempt: int) -> float:
+        """
+        Calcula a espera após a tentativa informada.
+
+        Args:
+            attempt: Número da tentativa que falhou (começa em 1)
+
+        Returns:
+            float: Espera em segundos
+        """
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** (attempt - 1))))
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker de uma dependência externa.
+
+    Após failure_threshold falhas transitórias consecutivas, o circuito
+    abre e as chamadas falham imediatamente com CircuitOpenError. Depois
+    de reset_timeout segundos, uma chamada de teste é permitida
+    (half-open): se tiver sucesso o circuito fecha, senão abre novamente.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = CIRCUIT_BREAKER_FAILURE_THRESHOLD,
+        reset_timeout: float = CIRCUIT_BREAKER_RESET_SECONDS
+    ):
+        """
+        Args:
+            name: Nome da dependência (usado em logs e erros)
+            failure_threshold: Falhas consecutivas para abrir o circuito
+            reset_timeout: Tempo com o circuito aberto antes do teste (segundos)
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self._state = STATE_CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        """Retorna o estado atual do circuito."""
+        with self._lock:
+            return self._state
+
+    def before_call(self) -> None:
+        """
+        Verifica se a chamada pode ser feita.
+
+        Raises:
+            CircuitOpenError: Se o circuito estiver aberto
+        """
+        with self._lock:
+            if self._state == STATE_CLOSED:
+                return
+
+            if self._state == STATE_OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    raise CircuitOpenError(
+                        f"Dependência '{self.name}' temporariamente indisponível "
+                        f"(circuit breaker aberto)"
+                    )
+
+                logger.info(f"Circuit breaker '{self.name}' em teste (half-open)")
+                self._state = STATE_HALF_OPEN
+                return
+
+            # Half-open: apenas uma chamada de teste por vez
+            raise CircuitOpenError(
+                f"Dependência '{self.name}' em teste após indisponibilidade"
+            )
+
+    def record_success(self) -> None:
+        """Registra uma chamada bem-sucedida (fecha o circuito)."""
+        with self._lock:
+            if self._state != STATE_CLOSED:
+                logger.info(f"Circuit breaker '{self.name}' fechado")
+            self._state = STATE_CLOSED
+            self._failures = 0
+
+    def record_failure(self) -> None:
+        """Registra uma falha transitória (pode abrir o circuito)."""
+        with self._lock:
+            self._failures += 1
+
+            if self._state == STATE_HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != STATE_OPEN:
+                    logger.warning(
+                        f"Circuit breaker '{self.name}' aberto após "
+                        f"{self._failures} falha(s) consecutiva(s)"
+                    )
+                self._state = STATE_OPEN
+                self._opened_at = time.monotonic()
+
+    def reset(self) -> None:
+        """Fecha o circuito e zera as falhas (útil em testes)."""
+        with self._lock:
+            self._state = STATE_CLOSED
+            self._failures = 0
+
+
+# Circuit breakers por dependência (compartilhados entre invocações aquecidas)
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(dependency: str) -> CircuitBreaker:
+    """
+    Retorna o circuit breaker de uma dependência, criando-o se necessário.
+
+    Args:
+        dependency: Nome da dependência (ex: 'openai', 'microsoft_graph')
+
+    Returns:
+        CircuitBreaker: Circuit breaker da dependência
+    """
+    with _breakers_lock:
+        if dependency not in _breakers:
+            _breakers[dependency] = CircuitBreaker(dependency)
+        return _breakers[dependency]
+
+
+def call_with_retry(
+    func: Callable[[], Any],
+    dependency: str,
+    deadline: Optional[Deadline] = None,
+    policy: Optional[RetryPolicy] = None
+) -> Any:
+    """
+    Executa uma chamada externa com retry e circuit breaker.
+
+    Apenas erros com retryable=True são repetidos. A espera entre
+    tentativas respeita o Retry-After do servidor; se ela não couber no
+    prazo restante (ou exceder o máximo da política, sem prazo), o último
+    erro é propagado imediatamente.
+
+    Args:
+        func: Função sem argumentos que faz a chamada
+        dependency: Nome da dependência (seleciona o circuit breaker)
+        deadline: Prazo da requisição (opcional)
+        policy: Política de retry (padrão: configurações RETRY_*)
+
+    Returns:
+        Any: Retorno da função
+
+    Raises:
+        CircuitOpenError: Se o circuito da dependência estiver aberto
+        FinancialAssistantError: Último erro, se não for possível repetir
+    """
+    if policy is None:
+        policy = RetryPolicy()
+
+    breaker = get_circuit_breaker(dependency)
+    attempt = 0
+
+    while True:
+        attempt += 1
+        breaker.before_call()
+
+        try:
+            result = func()
+
+        except FinancialAssistantError as e:
+            if not e.retryable:
+                # Erro fatal: a dependência respondeu, o circuito não é afetado
+                breaker.record_success()
+                raise
+
+            breaker.record_failure()
+
+            if attempt >= policy.max_attempts or breaker.state == STATE_OPEN:
+                logger.error(f"'{dependency}' falhou após {attempt} tentativa(s): {str(e)}")
+                raise
+
+            delay = e.retry_after if e.retry_after is not None else policy.backoff(attempt)
+            budget = deadline.remaining() if deadline is not None else policy.max_delay
+
+            if delay > budget:
+                logger.error(
+                    f"'{dependency}' falhou e a espera de {delay:.2f}s excede o "
+                    f"tempo disponível ({budget:.2f}s): {str(e)}"
+                )
+                raise
+
+            logger.warning(
+                f"Falha transitória em '{dependency}' (tentativa {attempt}/"
+                f"{policy.max_attempts}): {str(e)}. Repetindo em {delay:.2f}s"
+            )
+            time.sleep(delay)
+            continue
+
+        except Exception:
+            # Erro não classificado: tratado como fatal
+            breaker.record_success()
+            raise
+
+        breaker.record_success()
+        return result
@@ -0,0 +1,134 @@
+"""
+Registro de serviços com inicialização sob demanda (lazy).
+
+Este módulo permite que os singletons da aplicação (clientes OpenAI,
+DynamoDB, Microsoft Graph, etc.) sejam criados apenas no primeiro uso,
+em vez de no import. Isso reduz o tempo de cold start do Lambda: uma
+mensagem que não usa ferramentas nunca paga pela inicialização do
+Excel Service, por exemplo.
+"""
+
+import threading
+from typing import Any, Callable, Dict, List
+
+from utils.logger import setup_logger
+
+# Logger específico deste módulo
+logger = setup_logger(__name__)
+
+
+class LazyService:
+    """
+    Proxy que cria a instância real do serviço no primeiro acesso.
+
+    Qualquer atributo acessado no proxy é repassado à instância real,
+    que é construída uma única vez (thread-safe) pela factory informada.
+    """
+
+    __slots__ = ("_name", "_factory", "_instance", "_lock")
+
+    def __init__(self, name: str, factory: Callable[[], Any]):
+        """
+        Inicializa o proxy sem construir o serviço.
+
+        Args:
+            name: Nome do serviço (usado em logs)
+            factory: Função/classe que cria a instância do serviço
+        """
+        object.__setattr__(self, "_name", name)
+        object.__setattr__(self, "_factory", factory)
+        object.__setattr__(self, "_instance", None)
+        object.__setattr__(self, "_lock", threading.Lock())
+
+    def get_instance(self) -> Any:
+        """
+        Retorna a instância do serviço, criando-a se necessário.
+
+        Returns:
+            Any: Instância real do serviço
+        """
+        instance = self._instance
+        if instance is None:
+            with self._lock:
+                instance = self._instance
+                if instance is None:
+                    logger.debug(f"Inicializando serviço sob demanda: {self._name}")
+                    instance = self._factory()
+                    object.__setattr__(self, "_instance", instance)
+        return instance
+
+    @property
+    def is_initialized(self) -> bool:
+        """Indica se a instância real já foi criada."""
+        return self._instance is not None
+
+    def reset(self) -> None:
+        """Descarta a instância atual (será recriada no próximo uso)."""
+        with self._lock:
+            object.__setattr__(self, "_instance", None)
+
+    def __getattr__(self, item: str) -> Any:
+        return getattr(self.get_instance(), item)
+
+    def __setattr__(self, key: str, value: Any) -> None:
+        setattr(self.get_instance(), key, value)
+
+    def __repr__(self) -> str:
+        state = "inicializado" if self.is_initialized else "pendente"
+        return f"<LazyService {self._name} ({state})>"
+
+
+class ServiceRegistry:
+    """
+    Registro central dos serviços da aplicação.
+
+    Mantém os proxies de todos os serviços registrados, permitindo
+    consultar quais já foram inicializados e reiniciá-los (útil em testes).
+    """
+
+    def __init__(self):
+        """Inicializa o registro vazio."""
+        self._services: Dict[str, LazyService] = {}
+
+    def register(self, name: str, factory: Callable[[], Any]) -> LazyService:
+        """
+        Registra um serviço e retorna seu proxy lazy.
+
+        Args:
+            name: Nome único do serviço
+            factory: Função/classe que cria a instância do serviço
+
+        Returns:
+            LazyService: Proxy que cria o serviço no primeiro uso
+        """
+        service = LazyService(name, factory)
+        self._services[name] = service
+        return service
+
+    def get(self, name: str) -> Any:
+        """
+        Retorna a instância de um serviço registrado.
+
+        Args:
+            name: Nome do serviço
+
+        Returns:
+            Any: Instância real do serviço
+
+        Raises:
+            KeyError: Se o serviço não estiver registrado
+        """
+        return self._services[name].get_instance()
+
+    def initialized_services(self) -> List[str]:
+        """Retorna os nomes dos serviços já inicializados."""
+        return [name for name, service in self._services.items() if service.is_initialized]
+
+    def reset(self) -> None:
+        """Descarta as instâncias de todos os serviços registrados."""
+        for service in self._services.values():
+            service.reset()
+
+
+# Instância global do registro (singleton pattern)
+registry = ServiceRegistry()
@@ -0,0 +1,279 @@
+"""
+Handler do worker que processa mensagens enfileiradas.
+
+No modo assíncrono, o webhook (lambda_function.py) apenas enfileira as
+mensagens recebidas. Este módulo consome a fila, executa todo o fluxo
+de conversação e entrega a resposta ao usuário pela API REST do Twilio.
+
+A mesma fila recebe os jobs que gravam no Excel as despesas pendentes:
+exportação do ledger (EXPENSE_BACKEND=ledger) e flush do journal do
+write-behind (EXCEL_WRITE_MODE=write_behind).
+
+Em produção, é acionado pelo SQS (event source mapping do Lambda).
+Localmente, pode consumir a fila local com drain_local_queue().
+"""
+
+import json
+from typing import Dict, Any, List, Optional
+
+from conversation_manager import conversation_manager
+from data_access.idempotency_repository import (
+    STATUS_IN_PROGRESS, claim_message, complete_message, release_message
+)
+from services.twilio_service import twilio_service
+from services.queue_service import message_queue
+from services.expense_ledger import LEDGER_EXPORT_JOB
+from services.write_behind import JOURNAL_FLUSH_JOB
+from services.worksheet_shards import WORKSHEET_COMPACTION_JOB
+from config.settings import LAMBDA_REPLY_RESERVE_SECONDS, validate_configuration_once
+from utils.deadline import Deadline
+from utils.logger import setup_logger
+from utils.exceptions import FinancialAssistantError, TransientError
+
+# Logger específico deste módulo
+logger = setup_logger(__name__)
+
+# Mensagem enviada quando o processamento falha com erro conhecido
+ERROR_REPLY = (
+    "Desculpe, ocorreu um erro ao processar sua mensagem. "
+    "Por favor, tente novamente em alguns instantes."
+)
+
+
+def worker_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    """
+    Handler do worker, invocado pelo SQS com um lote de mensagens.
+
+    Usa o formato de resposta de falhas parciais do SQS
+    (ReportBatchItemFailures): apenas as mensagens que falharam
+    voltam para a fila.
+
+    Args:
+        event: Evento do SQS contendo 'Records'
+        context: Contexto de execução do Lambda
+
+    Returns:
+        dict: {'batchItemFailures': [{'itemIdentifier': str}, ...]}
+    """
+    validate_configuration_once()
+
+    records = event.get("Records", [])
+    logger.info(f"=== Worker iniciado com {len(records)} mensagem(ns) ===")
+
+    failures: List[Dict[str, str]] = []
+
+    for record in records:
+        record_id = record.get("messageId", "")
+
+        try:
+            message = json.loads(record["body"])
+
+            job_handler = JOB_HANDLERS.get(message.get("type"))
+            if job_handler:
+                job_handler(message)
+                continue
+
+            deadline = Deadline.from_lambda_context(context, reserve_seconds=LAMBDA_REPLY_RESERVE_SECONDS)
+            process_queued_message(message, deadline)
+
+        except Exception as e:
+            logger.error(f"Falha ao processar mensagem {record_id}: {str(e)}", exc_info=True)
+            failures.append({"itemIdentifier": record_id})
+
+    logger.info(f"=== Worker finalizado. Falhas: {len(failures)} ===")
+    return {"batchItemFailures": failures}
+
+
+def process_queued_message(message: Dict[str, Any], deadline: Optional[Deadline] = None) -> str:
+    """
+    Processa uma mensagem enfileirada e envia a resposta ao usuário.
+
+    Erros conhecidos da aplicação resultam em uma resposta amigável
+    (não há reprocessamento, pois parte do fluxo pode já ter ocorrido).
+
+    A resposta é registrada na idempotência antes do envio: se o envio
+    pela API REST falhar, o erro é propagado e a nova entrega da
+    mensagem apenas reenvia a resposta registrada, sem repetir o fluxo
+    (despesas lançadas, run do Assistant). Entregas duplicadas de uma
+    resposta já enviada são descartadas, usando o MessageSid da mensagem.
+
+    Uma entrega duplicada que encontra a reserva ainda "em andamento"
+    (outro worker processando) volta para a fila como falha do lote e é
+    repetida após o visibility timeout; quando lock_expires_at já passou,
+    a reserva abandonada é assumida e a mensagem é processada.
+
+    Args:
+        message: Mensagem no formato enfileirado pelo webhook
+        deadline: Prazo da invocação (opcional)
+
+    Returns:
+        str: Texto da resposta enviada
+
+    Raises:
+        TwilioAPIError: Se houver erro ao enviar a resposta
+        TransientError: Se a mensagem ainda estiver reservada por outro worker
+    """
+    sender_id = message["sender_id"]
+
+    # Chave própria do worker (o webhook já usou o MessageSid puro)
+    message_sid = message.get("message_sid")
+    idempotency_key = f"worker:{message_sid}" if message_sid else ""
+
+    duplicate = claim_message(idempotency_key)
+    if duplicate is not None:
+        if duplicate.get("status") == STATUS_IN_PROGRESS:
+            raise TransientError(f"Mensagem {message_sid} ainda em processamento por outro worker")
+
+        response_text = duplicate.get("response")
+
+        if response_text is None or duplicate.get("delivered", True):
+            logger.info(f"Mensagem {message_sid} já processada pelo worker, ignorando")
+            return response_text or ""
+
+        logger.info(f"Mensagem {message_sid} já processada; reenviando a resposta registrada")
+        return _send_reply(idempotency_key, sender_id, response_text)
+
+    try:
+        response_text = conversation_manager.handle_incoming_message(
+            sender_id=sender_id,
+            message_text=message.get("message_text", ""),
+            media_url=message.get("media_url", ""),
+            media_content_type=message.get("media_content_type", ""),
+            deadline=deadline,
+        )
+
+    except FinancialAssistantError as e:
+        logger.error(f"Erro ao processar mensagem enfileirada: {str(e)}")
+        response_text = ERROR_REPLY
+
+    except Exception:
+        # Permitir que a nova entrega da mensagem seja processada
+        release_message(idempotency_key)
+        raise
+
+    complete_message(idempotency_key, response_text, delivered=False)
+    return _send_reply(idempotency_key, sender_id, response_text)
+
+
+def _send_reply(idempotency_key: str, sender_id: str, response_text: str) -> str:
+    """
+    Envia a resposta pela API REST e a marca como entregue.
+
+    Raises:
+        TwilioAPIError: Se houver erro ao enviar (a resposta continua
+                        registrada, para a próxima entrega reenviá-la)
+    """
+    twilio_service.send_message(to=sender_id, body=response_text)
+    complete_message(idempotency_key, response_text)
+    return response_text
+
+
+def process_ledger_export(message: Dict[str, Any]) -> int:
+    """
+    Exporta para o Excel as despesas pendentes do ledger de um remetente.
+
+    Jobs repetidos do mesmo remetente são baratos: o primeiro exporta
+    todas as pendentes e os demais não encontram nada a exportar (ou
+    encontram o lock ocupado e terminam, deixando a exportação para o
+    dono do lock).
+
+    Args:
+        message: Job no formato {'type': LEDGER_EXPORT_JOB, 'owner': str}
+
+    Returns:
+        int: Número de despesas exportadas
+
+    Raises:
+        MicrosoftGraphAPIError: Se houver erro ao gravar no Excel
+    """
+    # Import adiado: o ledger só é carregado quando há exportações
+    from services.expense_ledger import expense_ledger
+
+    return expense_ledger.export_pending(message["owner"])
+
+
+def process_journal_flush(message: Dict[str, Any]) -> int:
+    """
+    Grava no Excel as despesas do journal do write-behind de um workbook.
+
+    Args:
+        message: Job no formato {'type': JOURNAL_FLUSH_JOB, 'workbook_id': str}
+
+    Returns:
+        int: Número de despesas gravadas (0 se outro flush do mesmo
+             workbook estiver em andamento)
+
+    Raises:
+        MicrosoftGraphAPIError: Se houver erro ao gravar no Excel
+    """
+    # Import adiado: o journal só é carregado quando há flushes
+    from services.write_behind import write_behind_excel
+
+    return write_behind_excel.flush(message["workbook_id"])
+
+
+def process_worksheet_compaction(message: Dict[str, Any]) -> int:
+    """
+    Compacta as abas de período de uma planilha (ver EXCEL_WORKSHEET_SHARDING).
+
+    Agendada quando uma nova aba de período é criada.
+
+    Args:
+        message: Job no formato {'type': WORKSHEET_COMPACTION_JOB,
+                 'workbook_id': str, 'worksheet_name': str (nome base)}
+
+    Returns:
+        int: Número de linhas movidas
+
+    Raises:
+        MicrosoftGraphAPIError: Se houver erro ao ler ou gravar as abas
+    """
+    from services.excel_service import excel_service
+
+    return excel_service.compact_worksheets(message["workbook_id"], message["worksheet_name"])
+
+
+# Jobs internos da fila (as demais mensagens são conversas do webhook)
+JOB_HANDLERS = {
+    LEDGER_EXPORT_JOB: process_ledger_export,
+    JOURNAL_FLUSH_JOB: process_journal_flush,
+    WORKSHEET_COMPACTION_JOB: process_worksheet_compaction,
+}
+
+
+def drain_local_queue(max_messages: int = 10) -> int:
+    """
+    Processa as mensagens pendentes da fila (uso local/desenvolvimento).
+
+    Args:
+        max_messages: Número máximo de mensagens a processar
+
+    Returns:
+        int: Número de mensagens processadas com sucesso
+    """
+    processed = 0
+
+    for receipt, message in message_queue.receive(max_messages):
+        try:
+            job_handler = JOB_HANDLERS.get(message.get("type"), process_queued_message)
+            job_handler(message)
+            message_queue.delete(receipt)
+            processed += 1
+
+        except Exception as e:
+            logger.error(f"Falha ao processar mensagem local: {str(e)}", exc_info=True)
+            message_queue.release(receipt)
+
+    return processed
+
+
+# Para testes locais
+if __name__ == "__main__":
+    """
+    Processa as mensagens da fila local.
+
+    Execute: LOCAL_QUEUE_FILE=.local_queue.json python worker_function.py
+    """
+    print("Processando fila local...")
+    total = drain_local_queue()
+    print(f"\n{total} mensagem(ns) processada(s)")